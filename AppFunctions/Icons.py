@@ -0,0 +1,50 @@
+from functools import lru_cache
+from tkinter import PhotoImage
+
+from Application import App
+
+"""
+A convenient module for loading the icons displayed by the application. Each icon is only read from the icons directory
+and subsampled the first time it is used, and the same PhotoImage is then shared by every view which displays it.
+"""
+
+
+@lru_cache(maxsize=None)
+def load_icon(file_name: str, subsample: int):
+    """
+    Loads an icon from the icons directory and shrinks it, caching the result so the PNG is only read once per size.
+
+    :param file_name: Name of the icon file in the icons directory, e.g. "check.png"
+    :param subsample: The factor the icon is shrunk by in both dimensions
+    :return: PhotoImage
+    """
+    icon_image = PhotoImage(file=App.icons_dir + "\\" + file_name)
+    return icon_image.subsample(subsample, subsample)
+
+
+class DeferredIcons:
+    """
+    Read-only mapping of image name to icon, used where a set of icons might not be displayed straight away, e.g. the
+    condition icons of the patient lists, which are not needed until the production has been loaded. Each icon is only
+    loaded the first time it is looked up.
+    """
+    def __init__(self, icon_files: dict, subsample: int):
+        """
+        The constructor for the DeferredIcons class.
+
+        :param icon_files: Dictionary of image name to the name of its icon file in the icons directory
+        :param subsample: The factor every icon is shrunk by in both dimensions
+        """
+        self.icon_files: dict = icon_files
+        self.subsample: int = subsample
+
+    def __getitem__(self, image_name: str):
+        return load_icon(self.icon_files[image_name], self.subsample)
+
+    def __contains__(self, image_name: str):
+        return image_name in self.icon_files
+
+    def get(self, image_name: str, default=None):
+        if image_name in self.icon_files:
+            return self[image_name]
+        return default
@@ -1,4 +1,4 @@
-from tkinter import StringVar, Menu
+from tkinter import Menu
 from tkinter.ttk import Treeview
 
 from Application import App
@@ -7,44 +7,12 @@ from Application import App
 """
 
 This module provides common functions to be used by Treeview instances.
-These functions allow a Treeview to be sorted, fields within the Treeview to be searched for, the width of the 
-Treeview to be calibrated, and complex objects represented within the Treeview to be retrieved and viewed.
+These functions allow a Treeview to be sorted, the width of the Treeview to be calibrated, and complex objects 
+represented within the Treeview to be retrieved and viewed.
 
 """
 
 
-def search_treeview(tree_to_search: Treeview, detached_items: list, search_query: StringVar):
-    """
-    Search for a specified string within a Treeview object.
-    Each node which does not contain the specified string is detached and only matching values remain visible.
-    Once the search has been completed and the search term is removed, the detached nodes are reattached to the
-    Treeview object.
-
-    :param tree_to_search: The Treeview object to search
-    :param detached_items: A list object of all detached nodes within the tree
-    :param search_query:
-    :return: None
-    """
-    search_string: str = search_query.get()
-    for node in detached_items:
-        if tree_to_search.exists(node):
-            tree_to_search.reattach(node, '', 0)
-
-    if len(search_string) > 0:
-        for node in tree_to_search.get_children():
-            match: bool = False
-            for value in tree_to_search.item(node)['values']:
-                if search_string.lower() in str(value).lower():
-                    match = True
-                    break
-            if match:
-                tree_to_search.reattach(node, '', 0)
-            else:
-                detached_items.append(node)
-                tree_to_search.detach(node)
-    sort_treeview(tree_to_search, "Last Name", False)
-
-
 def sort_treeview(tree_to_sort: Treeview, column: str, is_descending: bool):
     """
     Function which sorts a specified column within a Treeview object. The option to display the sort in ascending
@@ -1,11 +1,11 @@
 import ctypes
 import os
-import shutil
+import queue
 import tkinter
 import logging
+import multiprocessing
 import sys
-import typing
-from zipfile import ZipFile
+import threading
 
 logger = logging.getLogger()
 
@@ -16,15 +16,16 @@ try:
     from Functions.ModelFactory import get_patient_data_from_specific_file, get_patient_medicine_data_xml
     from DataStructures.Models import PillpackPatient, Medication
     from DataStructures.Repositories import CollectedPatients
-    from Application import HomeScreen, PatientDetails, ProductionDirectorySettings
+    from Application import HomeScreen, ProductionDirectorySettings
     from Application.AppObserver import Observer
     from Application.WatchdogEventHandler import WatchdogEventHandler
+    from Application.IngestionWorker import IngestionWorker
+    from Application.ScanQueueWorker import ScanQueueWorker
+    from Application.StartupLoader import StartupLoader
+    from Application.WatchdogEventCoalescer import WatchdogEventCoalescer
     from Functions.ConfigSingleton import load_settings, consts, modify_pillpack_location
-    from Functions.DAOFunctions import (load_collected_patients_from_object,
-                                        load_prns_and_linked_medications_from_object,
-                                        save_collected_patients)
+    from Functions.Mutations import check_scanned_patients_and_save
     from watchdog.observers import Observer as WatchdogObserver
-    from watchdog.events import FileCreatedEvent, FileMovedEvent
 except Exception as e:
     error = e
     logger.error("{0}".format(e))
@@ -99,6 +100,10 @@ class App(tkinter.Tk):
         Constructor for the application class. The watchdog filesystem observer is started which begins monitoring the
         designated file path.
 
+        The saved production and the saved PRNs and linked medications are loaded by the startup loader in the
+        background, so the home screen is shown straight away with a progress indicator in place of the production.
+        Changes read by the ingestion worker and scanned scripts are held until the saved production has been loaded.
+
         If the filesystem observer cannot be started, or the specified file path is missing,
         an error is displayed to the user. Script checker can still be used when the filesystem observer is
         not functioning in a lesser state.
@@ -118,15 +123,31 @@ class App(tkinter.Tk):
         self.minsize(1080, 720)
         self.maxsize(1280, 820)
         self.group_production_name = ""
-        self.collected_patients = load_collected_patients_from_object()
-        self.loaded_prns_and_linked_medications: dict = load_prns_and_linked_medications_from_object()
+        self.collected_patients = CollectedPatients()
+        self.loaded_prns_and_linked_medications: dict = {}
+        self.production_changes = None
+        self.production_loaded = threading.Event()
+        self.startup_loader = StartupLoader(self, self.config)
         self.app_observer: Observer = Observer()
         self.total_medications = 0
         self.title_font = font.Font(family='Verdana', size=28, weight="bold")
         self.container = tkinter.Frame(self)
         self.container.pack(side="top", fill="both", expand=True)
+        self.patient_changes = queue.Queue()
+        self.ingestion_worker = IngestionWorker(self)
+        self.ingestion_worker.start()
+        self.event_coalescer = WatchdogEventCoalescer(
+            self.notify, self.config.get(consts.WATCHDOG_DEBOUNCE_KEY, consts.DEFAULT_WATCHDOG_DEBOUNCE_SECONDS)
+        )
+        self.event_coalescer.start()
+        self.scan_scripts_window = None
+        self.scan_worker = ScanQueueWorker(self)
+        self.scan_worker.start()
         self.bind("<<WatchdogEvent>>", self.on_watchdog_event)
+        self.bind("<<ScanResults>>", self.on_scan_results)
+        self.bind("<<ProductionLoaded>>", self.on_production_loaded)
         self.define_filesystem_observer_location()
+        self.startup_loader.start()
 
     def define_filesystem_observer_location(self):
         """
@@ -184,6 +205,7 @@ class App(tkinter.Tk):
         """
         match view_name:
             case consts.HOME_SCREEN:
+                from Application import PatientDetails
                 for patient_view_name in list(self.app_observer.connected_views):
                     patient_view = self.app_observer.connected_views[patient_view_name]
                     if isinstance(patient_view, PatientDetails.PatientMedicationDetails):
@@ -211,6 +233,7 @@ class App(tkinter.Tk):
                 frame.tkraise()
                 logger.info("Home screen view is now the current view.")
             case consts.VIEW_PATIENT_SCREEN:
+                from Application import PatientDetails
                 if isinstance(patient_to_view, PillpackPatient):
                     key = view_name + patient_to_view.first_name + patient_to_view.last_name
                     if self.app_observer.connected_views.__contains__(key):
@@ -260,96 +283,106 @@ class App(tkinter.Tk):
 
     def on_watchdog_event(self, event):
         """
-        Function which is called whenever a filesystem event is detected by the filesytem observer.
-        Currently, only Pillpaccare (ppc_processed) and AMCO (fd) file extensions are supported. When a file with
-        one of these extensions is detected by the filesystem observer, the appropriate data extraction procedure is
-        executed
+        Function which is called on the main thread whenever the ingestion worker has finished reading a file detected
+        by the filesystem observer. Currently, only Pillpaccare (ppc_processed) and AMCO (fd) file extensions are
+        supported.
 
-        A ppc_processed file extension is just an XML extension with a proprietary name. This means the data can
-        be extracted directly and parsed into a PillpackPatient object with no additional preparation required.
+        All copying, extracting and parsing of the file happens on the ingestion worker's thread. Only the resulting
+        patient changes are merged into the collected patients here, so the user interface is never blocked while a
+        file is read.
 
-        A fd file extension is a ZIP file with a propreitary name. This means that before extracting the XML data,
-        the ZIP file has to be copied and the appropriate XML files in the ZIP file have to be individually
-        extracted and parsed into their own respective PillpackPatient objects.
+        :param event: The <<WatchdogEvent>> virtual event generated by the ingestion worker
+        :return: None
+        """
+        if not self.production_loaded.is_set():
+            return
+        for patient_change in IngestionWorker.take_patient_changes(self.patient_changes):
+            logger.info("Applying {0} patient(s) read from {1}"
+                        .format(len(patient_change["Patients"]), patient_change["FileName"]))
+            self.ingestion_worker.handler.apply_patient_changes(patient_change["Patients"])
+
+    def on_scan_results(self, event):
+        """
+        Function which is called on the main thread whenever the scan queue worker has decoded one or more scanned
+        scripts. Every scan result waiting at that point is matched against the collected patients in the order the
+        scripts were scanned, the changed patients are saved together, and the views are redrawn once for the whole
+        batch rather than once per script.
 
-        The reason the file has to be copied before extraction is because a competing script is ran on fd files by the
-        Farmadosis .NET filesystem observer. Unless the fd file is copied and saved as a generic ZIP file, a race
-        condition would be created and data corruption/data locking would be a likely outcome.
+        :param event: The <<ScanResults>> virtual event generated by the scan queue worker
+        :return: None
+        """
+        if not self.production_loaded.is_set():
+            return
+        scan_results: list = self.scan_worker.take_scan_results()
+        if len(scan_results) == 0:
+            return
+        script_patients: list = [scan_result["Patient"] for scan_result in scan_results
+                                 if isinstance(scan_result["Patient"], PillpackPatient)]
+        failed_scans: int = len(scan_results) - len(script_patients)
+        check_scanned_patients_and_save(self.collected_patients, script_patients)
+        logger.info("Applied {0} scanned script(s). {1} script(s) could not be read. {2} scan(s) pending."
+                    .format(len(script_patients), failed_scans, self.scan_worker.pending_scans))
+        if self.scan_scripts_window is not None and self.scan_scripts_window.winfo_exists():
+            self.scan_scripts_window.on_scan_results(failed_scans)
+        self.app_observer.update_all()
+
+    def on_production_loaded(self, event):
+        """
+        Function which is called on the main thread once the startup loader has loaded the saved production. The empty
+        production the application started with is replaced, the progress indicator on the home screen is hidden, and
+        any patient changes or scan results which arrived while the production was loading are applied.
 
-        :param event: Any filesystem event which occurs in the filepath the observer is listening e.g. Create, move,
-        rename, delete
+        If the saved production could not be loaded, the application is closed rather than continuing with an empty
+        production which would overwrite the saved patients the next time the production is saved.
+
+        :param event: The <<ProductionLoaded>> virtual event generated by the startup loader
         :return: None
         """
-        watchdog_event = self.queue.get()
-        full_path = ""
-        if isinstance(watchdog_event, FileCreatedEvent):
-            full_path = str(watchdog_event.src_path)
-        if isinstance(watchdog_event, FileMovedEvent):
-            full_path = str(watchdog_event.dest_path)
-        logger.info("Full path of file monitored by watchdog observer: {0}".format(full_path))
-        split_file_name = full_path.rsplit('\\')
-        file_name = split_file_name[len(split_file_name) - 1]
-        file_extension = full_path.rsplit('.')[1]
-        if file_extension == "ppc_processed":
-            logger.info("The modified file has a ppc_processed file extension. Executing patient(s) update...")
-            self.handler.extract_patient_data_from_ppc_xml(file_name)
-            save_collected_patients(self.collected_patients)
-            self.app_observer.update_all()
-        elif file_extension == "fd":
-            copied_zip_file_name = self.config["pillpackDataLocation"] + "\\farma_copy.zip"
-            shutil.copyfile(watchdog_event.dest_path, copied_zip_file_name)
-            with ZipFile(copied_zip_file_name, 'r') as farmadosis_zip:
-                for info in farmadosis_zip.infolist():
-                    if info.filename.endswith('.xml'):
-                        with farmadosis_zip.open(info.filename) as binary_file:
-                            self.handler.extract_patient_data_from_fd_xml(binary_file)
-            os.remove(copied_zip_file_name)
-            save_collected_patients(self.collected_patients)
-            self.app_observer.update_all()
+        if self.startup_loader.error is not None:
+            logger.error("The saved production could not be loaded. Closing the application.")
+            self.destroy()
+            return
+        self.collected_patients = self.startup_loader.collected_patients
+        self.loaded_prns_and_linked_medications = self.startup_loader.prns_and_linked_medications
+        self.production_changes = self.startup_loader.production_changes
+        self.production_loaded.set()
+        home_screen = self.app_observer.connected_views.get(consts.HOME_SCREEN)
+        if isinstance(home_screen, HomeScreen.HomeScreen):
+            home_screen.set_production_loading(False)
+        self.app_observer.update_all()
+        self.on_watchdog_event(event)
+        self.on_scan_results(event)
 
     def notify(self, event):
         """
         Function which queues each filesystem event detected by the filesystem observer before processing.
-        This prevents race conditions and allows every event to be processed with certainty.
+        This prevents race conditions and allows every event to be processed with certainty. Events reach this
+        function through the WatchdogEventCoalescer, so each version of a file is only queued once.
 
         :param event: Any filesystem event which occurs in the filepath the observer is listening e.g. Create, move,
         rename, delete
         :return: None
         """
         self.queue.put(event)
-        self.event_generate("<<WatchdogEvent>>", when="tail")
         logger.info("Watchdog event {0} has been added to the queue.".format(event))
 
     @staticmethod
-    def match_patient_to_pillpack_patient(patient_to_be_matched: PillpackPatient, pillpack_patient_dict: dict):
+    def match_patient_to_pillpack_patient(patient_to_be_matched: PillpackPatient, collected_patients):
         """
-        IMPORTANT: FUNCTION NEEDS REWRITTEN - NO LOGIC FLOW TO INDICATE A PATIENT COULD NOT BE FOUND WITHIN SPECIFIED
-        DICTIONARY
-
-        Static function which checks if any arbitrary PillpackPatient object is contained as a value in any arbitrary
-        dictionary.
+        Static function which finds the pillpack production patient with the same name as any arbitrary
+        PillpackPatient object, e.g. a patient read from a scanned script.
 
-        As is standard in Script Checker, a PillpackPatient will be stored in a dictionary with the last name of said
-        patient as the dictionary's key. If more than one patient has the same last name, the value in the dictionary
-        will be a list of PillpackPatient objects.
+        The production patient is looked up by the patient's normalised last name and first name in the patient
+        identity index of the collected patients, so no list of patients has to be searched. If more than one
+        production patient has the same name, the first of them is returned.
 
-        If the specified PillpackPatient object is found in the specified dictionary, that PillpackPatient object will
-        be the return value. If no such PillpackPatient object can be found, a None value is returned instead.
+        If no such production patient can be found, the specified PillpackPatient object itself is returned.
 
-        :param patient_to_be_matched: PillpackPatient object to be searched for within the dictionary
-        :param pillpack_patient_dict: Dictionary in which to search for the PillpackPatient object
-        :return: PillpackPatient, or None
+        :param patient_to_be_matched: PillpackPatient object to be searched for within the production
+        :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object holding the production
+        :return: PillpackPatient
         """
-        pillpack_patients: list = pillpack_patient_dict.get(
-            patient_to_be_matched.last_name.lower())
-        if pillpack_patients is None:
-            pillpack_patients = []
-        pillpack_patients = list(
-            filter
-            (lambda entity:
-             typing.cast(PillpackPatient, entity).first_name.lower() == patient_to_be_matched.first_name.lower(),
-             pillpack_patients)
-        )
+        pillpack_patients: list = collected_patients.get_patient_identity_index().find_by_name(patient_to_be_matched)
         matching_pillpack_patient: PillpackPatient = pillpack_patients[0] if (
                 len(pillpack_patients) > 0) else patient_to_be_matched
         return matching_pillpack_patient
@@ -360,12 +393,16 @@ if __name__ == '__main__':
     """
     The main App loop. The filesystem observer attempts to start, as well as the main tkinter loop of the application.
     """
+    multiprocessing.freeze_support()
     if getattr(sys, 'frozen', False):
         if is_admin():
             try:
                 app = App()
                 app.iconbitmap(icons_dir + "\\script_checker_prototype_icon.ico")
                 app.mainloop()
+                app.ingestion_worker.stop()
+                app.scan_worker.stop()
+                app.event_coalescer.stop()
                 app.filesystem_observer.stop()
                 if app.config["pillpackDataLocation"] != consts.UNSET_LOCATION:
                     app.filesystem_observer.join()
@@ -380,6 +417,9 @@ if __name__ == '__main__':
             app = App()
             app.iconbitmap(icons_dir + "\\script_checker_prototype_icon.ico")
             app.mainloop()
+            app.ingestion_worker.stop()
+            app.scan_worker.stop()
+            app.event_coalescer.stop()
             app.filesystem_observer.stop()
             if app.config["pillpackDataLocation"] != consts.UNSET_LOCATION:
                 app.filesystem_observer.join()
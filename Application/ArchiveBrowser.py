@@ -0,0 +1,163 @@
+import datetime
+import logging
+import threading
+from tkinter import TclError, Toplevel, Label, Entry, Button, StringVar, Text, Listbox, filedialog
+from tkinter.ttk import Treeview
+
+import App
+from Functions.MedicationDiff import (diff_patient_medications, format_medication_diff, format_dosages,
+                                      get_medication_summary)
+from Functions.ProductionArchive import find_patient_in_archives, diff_archived_patients
+
+ARCHIVE_BROWSER_COLUMNS = ("Archived On", "Production", "First Name", "Last Name", "Date of Birth", "Archive")
+
+
+class ArchiveBrowser(Toplevel):
+    """
+    Window which finds a patient in any number of archived productions, and shows how their production medications
+    changed between them. Only the records holding the patient are read from each archive, so many archives can be
+    searched without loading the productions they hold. The search runs on a background thread, so the application is
+    not blocked while the archives are read.
+
+    Selecting a result shows the changes since the patient's previous archived production, and selecting two results
+    shows the changes between them.
+    """
+    def __init__(self, parent, master: App.App):
+        """
+        The constructor for the ArchiveBrowser class.
+
+        :param parent: The view which opened the window
+        :param master: The App base class holding the production
+        """
+        super().__init__(parent)
+        self.geometry("900x600")
+        self.master: App.App = master
+        self.archive_file_names: list = []
+        self.archived_patients: list = []
+        self.search_thread = None
+        self.search_results = None
+        self.first_name_variable = StringVar()
+        self.last_name_variable = StringVar()
+        self.date_of_birth_variable = StringVar()
+
+        self.add_archives_button = Button(self, text="Add Archives...", command=self.add_archives)
+        self.add_archives_button.grid(row=0, column=0, padx=25, pady=(25, 10), sticky="ew")
+        self.archives_listbox = Listbox(self, height=3)
+        self.archives_listbox.grid(row=0, column=1, columnspan=5, padx=(0, 25), pady=(25, 10), sticky="ew")
+        Label(self, text="First name:").grid(row=1, column=0, padx=25, pady=10, sticky="w")
+        self.first_name_entry = Entry(self, textvariable=self.first_name_variable)
+        self.first_name_entry.grid(row=1, column=1, pady=10, sticky="ew")
+        Label(self, text="Last name:").grid(row=1, column=2, padx=10, pady=10, sticky="w")
+        self.last_name_entry = Entry(self, textvariable=self.last_name_variable)
+        self.last_name_entry.grid(row=1, column=3, pady=10, sticky="ew")
+        Label(self, text="Date of birth (YYYY-MM-DD):").grid(row=1, column=4, padx=10, pady=10, sticky="w")
+        self.date_of_birth_entry = Entry(self, textvariable=self.date_of_birth_variable, width=12)
+        self.date_of_birth_entry.grid(row=1, column=5, padx=(0, 25), pady=10, sticky="ew")
+        self.search_button = Button(self, text="Search", command=self.start_search)
+        self.search_button.grid(row=2, column=0, padx=25, pady=10, sticky="ew")
+        self.status_label = Label(self, text="", wraplength=600, justify="left")
+        self.status_label.grid(row=2, column=1, columnspan=5, padx=(0, 25), pady=10, sticky="w")
+        self.results_tree = Treeview(self, columns=ARCHIVE_BROWSER_COLUMNS, show="headings", height=8)
+        for column in ARCHIVE_BROWSER_COLUMNS:
+            self.results_tree.heading(column, text=column)
+            self.results_tree.column(column, width=140)
+        self.results_tree.grid(row=3, column=0, columnspan=6, padx=25, pady=10, sticky="nsew")
+        self.diff_text = Text(self, height=12, wrap="word", state="disabled")
+        self.diff_text.grid(row=4, column=0, columnspan=6, padx=25, pady=(10, 25), sticky="nsew")
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_columnconfigure(3, weight=1)
+        self.grid_rowconfigure(3, weight=1)
+        self.grid_rowconfigure(4, weight=1)
+        self.results_tree.bind("<<TreeviewSelect>>", self.show_selected_diff)
+        self.bind("<<ArchiveSearchFinished>>", self.on_search_finished)
+
+    def add_archives(self):
+        archive_file_names = filedialog.askopenfilenames(parent=self,
+                                                         initialdir=self.master.config.get("pillpackDataLocation"),
+                                                         title="Select Production Archives",
+                                                         filetypes=(("ZIP files", "*.zip"), ))
+        for archive_file_name in archive_file_names:
+            if archive_file_name not in self.archive_file_names:
+                self.archive_file_names.append(archive_file_name)
+                self.archives_listbox.insert("end", archive_file_name)
+
+    def start_search(self):
+        """
+        Starts searching the chosen archives for the patient on a background thread.
+
+        :return: None
+        """
+        first_name: str = self.first_name_variable.get().strip()
+        last_name: str = self.last_name_variable.get().strip()
+        date_of_birth = None
+        if len(self.archive_file_names) == 0 or first_name == "" or last_name == "":
+            self.status_label.configure(text="*Add at least one archive, and enter a first and last name", fg="red")
+            return
+        if self.date_of_birth_variable.get().strip() != "":
+            try:
+                date_of_birth = datetime.date.fromisoformat(self.date_of_birth_variable.get().strip())
+            except ValueError:
+                self.status_label.configure(text="*The date of birth must be in the form YYYY-MM-DD", fg="red")
+                return
+        self.status_label.configure(text="Searching {0} archive(s)...".format(len(self.archive_file_names)),
+                                    fg="black")
+        self.search_button.configure(state="disabled")
+        self.search_thread = threading.Thread(target=self.run_search, name="ArchiveSearch", daemon=True,
+                                              args=(list(self.archive_file_names), first_name, last_name,
+                                                    date_of_birth))
+        self.search_thread.start()
+
+    def run_search(self, archive_file_names: list, first_name: str, last_name: str, date_of_birth):
+        try:
+            self.search_results = diff_archived_patients(find_patient_in_archives(archive_file_names, first_name,
+                                                                                  last_name, date_of_birth))
+        except Exception as e:
+            logging.error("Failed to search the production archives: {0}".format(e))
+            self.search_results = None
+        try:
+            self.event_generate("<<ArchiveSearchFinished>>", when="tail")
+        except (TclError, RuntimeError) as e:
+            logging.warning("Could not notify the archive browser: {0}".format(e))
+
+    def on_search_finished(self, event):
+        self.search_button.configure(state="normal")
+        self.results_tree.delete(*self.results_tree.get_children())
+        self.set_diff_text("")
+        if self.search_results is None:
+            self.status_label.configure(text="Failed to search the archives. See the log for details.", fg="red")
+            return
+        self.archived_patients = self.search_results
+        for row_number, archived_patient in enumerate(self.archived_patients):
+            patient = archived_patient["Patient"]
+            self.results_tree.insert("", "end", iid=str(row_number), values=(
+                "{0:%Y-%m-%d %H:%M}".format(archived_patient["ArchivedOn"]), archived_patient["ProductionGroupName"],
+                patient.first_name, patient.last_name, patient.date_of_birth, archived_patient["ArchiveFile"]))
+        self.status_label.configure(text="Found the patient in {0} archived production(s)"
+                                    .format(len(self.archived_patients)), fg="black")
+
+    def show_selected_diff(self, event):
+        selected_rows: list = sorted(int(row) for row in self.results_tree.selection())
+        if len(selected_rows) == 1:
+            archived_patient: dict = self.archived_patients[selected_rows[0]]
+            if archived_patient["Diff"] is None:
+                self.set_diff_text("Earliest archived production of this patient:\n" + "\n".join(
+                    "{0} {1}".format(medication_name, format_dosages(dosages)) for medication_name, dosages
+                    in sorted(get_medication_summary(archived_patient["Patient"]).items())))
+            else:
+                self.set_diff_text("Changes since the previous archived production:\n"
+                                   + format_medication_diff(archived_patient["Diff"]))
+        elif len(selected_rows) == 2:
+            earlier_patient: dict = self.archived_patients[selected_rows[0]]
+            later_patient: dict = self.archived_patients[selected_rows[1]]
+            self.set_diff_text("Changes between {0:%Y-%m-%d} and {1:%Y-%m-%d}:\n{2}".format(
+                earlier_patient["ArchivedOn"], later_patient["ArchivedOn"],
+                format_medication_diff(diff_patient_medications(earlier_patient["Patient"],
+                                                                later_patient["Patient"]))))
+        else:
+            self.set_diff_text("")
+
+    def set_diff_text(self, text: str):
+        self.diff_text.configure(state="normal")
+        self.diff_text.delete("1.0", "end")
+        self.diff_text.insert("1.0", text)
+        self.diff_text.configure(state="disabled")
@@ -0,0 +1,167 @@
+import logging
+import os
+import queue
+import threading
+from tkinter import (TclError, Toplevel, Label, Entry, Button, Checkbutton, BooleanVar, StringVar, OptionMenu,
+                     filedialog)
+from tkinter.ttk import Progressbar
+
+import App
+from Functions.BatchDocumentGeneration import (generate_documents, select_patients, format_document_report,
+                                               PATIENT_FILTER_CODES, KARDEX_DOCUMENT, DISPENSATION_LIST_DOCUMENT)
+from Functions.ConfigSingleton import consts, modify_setting
+
+
+class GenerateDocuments(Toplevel):
+    """
+    Window which generates the kardex and/or dispensation list of every patient in the production with a chosen status
+    into an output directory. The documents are generated by a background job across a pool of worker processes, so the
+    application is not blocked while they are rendered. The job reports its progress after every document and can be
+    cancelled at any time.
+    """
+    def __init__(self, parent, master: App.App):
+        """
+        The constructor for the GenerateDocuments class. The output directory defaults to the last directory documents
+        were generated into, or to the pillpack data location if documents have not been generated before.
+
+        :param parent: The view which opened the window
+        :param master: The App base class holding the production
+        """
+        super().__init__(parent)
+        self.geometry("600x400")
+        self.attributes('-topmost', 'true')
+        self.master: App.App = master
+        self.job_thread = None
+        self.cancel_event = threading.Event()
+        self.progress_updates = queue.Queue()
+        self.document_report = None
+        self.filter_variable = StringVar(value=consts.READY_TO_PRODUCE_STRING)
+        self.kardex_variable = BooleanVar(value=True)
+        self.dispensation_list_variable = BooleanVar(value=False)
+        self.output_directory_variable = StringVar(value=self.master.config.get(
+            consts.DOCUMENT_OUTPUT_DIRECTORY_KEY, self.master.config.get("pillpackDataLocation", "")))
+
+        Label(self, text="Generate documents for:").grid(row=0, column=0, padx=25, pady=(25, 10), sticky="w")
+        self.filter_menu = OptionMenu(self, self.filter_variable, *PATIENT_FILTER_CODES.keys())
+        self.filter_menu.grid(row=0, column=1, padx=25, pady=(25, 10), sticky="ew")
+        self.kardex_checkbutton = Checkbutton(self, text="Kardex", variable=self.kardex_variable)
+        self.kardex_checkbutton.grid(row=1, column=0, padx=25, pady=10, sticky="w")
+        self.dispensation_list_checkbutton = Checkbutton(self, text="Dispensation list",
+                                                         variable=self.dispensation_list_variable)
+        self.dispensation_list_checkbutton.grid(row=1, column=1, padx=25, pady=10, sticky="w")
+        Label(self, text="Output directory:").grid(row=2, column=0, padx=25, pady=10, sticky="w")
+        self.output_directory_entry = Entry(self, textvariable=self.output_directory_variable, width=40)
+        self.output_directory_entry.grid(row=2, column=1, padx=25, pady=10, sticky="ew")
+        self.browse_button = Button(self, text="Browse...", command=self.choose_output_directory)
+        self.browse_button.grid(row=2, column=2, padx=(0, 25), pady=10)
+        self.progress_bar = Progressbar(self, mode="determinate")
+        self.progress_bar.grid(row=3, column=0, columnspan=3, padx=25, pady=10, sticky="ew")
+        self.status_label = Label(self, text="", wraplength=500, justify="left")
+        self.status_label.grid(row=4, column=0, columnspan=3, padx=25, pady=10, sticky="w")
+        self.generate_button = Button(self, text="Generate", command=self.start_job)
+        self.generate_button.grid(row=5, column=0, padx=25, pady=10, sticky="ew")
+        self.cancel_button = Button(self, text="Cancel", command=self.cancel_job, state="disabled")
+        self.cancel_button.grid(row=5, column=1, padx=25, pady=10, sticky="ew")
+        self.bind("<<DocumentProgress>>", self.on_document_progress)
+        self.bind("<<DocumentsGenerated>>", self.on_documents_generated)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def choose_output_directory(self):
+        output_directory = filedialog.askdirectory(parent=self, initialdir=self.output_directory_variable.get())
+        if output_directory:
+            self.output_directory_variable.set(os.path.normpath(output_directory))
+
+    def get_document_types(self):
+        document_types: list = []
+        if self.kardex_variable.get():
+            document_types.append(KARDEX_DOCUMENT)
+        if self.dispensation_list_variable.get():
+            document_types.append(DISPENSATION_LIST_DOCUMENT)
+        return tuple(document_types)
+
+    def start_job(self):
+        """
+        Selects the patients with the chosen status and starts the job generating their documents on a background
+        thread. The output directory is saved to the settings, so it is offered again the next time.
+
+        :return: None
+        """
+        document_types: tuple = self.get_document_types()
+        output_directory: str = self.output_directory_variable.get().strip()
+        if len(document_types) == 0 or output_directory == "":
+            self.status_label.configure(text="*Choose at least one document type and an output directory", fg="red")
+            return
+        patients: list = select_patients(self.master.collected_patients,
+                                         PATIENT_FILTER_CODES[self.filter_variable.get()])
+        if len(patients) == 0:
+            self.status_label.configure(text="No patients in the production are {0}"
+                                        .format(self.filter_variable.get().lower()), fg="red")
+            return
+        if output_directory != self.master.config.get(consts.DOCUMENT_OUTPUT_DIRECTORY_KEY):
+            modify_setting(consts.DOCUMENT_OUTPUT_DIRECTORY_KEY, output_directory)
+            self.master.config[consts.DOCUMENT_OUTPUT_DIRECTORY_KEY] = output_directory
+        self.cancel_event.clear()
+        self.progress_bar.configure(maximum=len(patients) * len(document_types), value=0)
+        self.status_label.configure(text="Generating {0} document(s)...".format(len(patients) * len(document_types)),
+                                    fg="black")
+        for widget in (self.filter_menu, self.kardex_checkbutton, self.dispensation_list_checkbutton,
+                       self.output_directory_entry, self.browse_button, self.generate_button):
+            widget.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+        self.job_thread = threading.Thread(target=self.run_job, name="DocumentGenerationJob", daemon=True,
+                                           args=(patients, self.master.collected_patients.production_group_name,
+                                                 output_directory, document_types,
+                                                 self.master.config.get(consts.DOCUMENT_GENERATION_PROCESSES_KEY)))
+        self.job_thread.start()
+
+    def run_job(self, patients: list, production_name: str, output_directory: str, document_types: tuple,
+                number_of_processes: int = None):
+        try:
+            self.document_report = generate_documents(patients, production_name, output_directory, document_types,
+                                                      number_of_processes, self.report_progress, self.cancel_event)
+        except Exception as e:
+            logging.error("Failed to generate documents: {0}".format(e))
+            self.document_report = None
+        self.notify("<<DocumentsGenerated>>")
+
+    def report_progress(self, finished_documents: int, total_documents: int):
+        self.progress_updates.put((finished_documents, total_documents))
+        self.notify("<<DocumentProgress>>")
+
+    def notify(self, event_name: str):
+        try:
+            self.event_generate(event_name, when="tail")
+        except (TclError, RuntimeError) as e:
+            logging.warning("Could not notify the document generation window: {0}".format(e))
+
+    def on_document_progress(self, event):
+        finished_documents, total_documents = None, None
+        while True:
+            try:
+                finished_documents, total_documents = self.progress_updates.get_nowait()
+            except queue.Empty:
+                break
+        if finished_documents is not None:
+            self.progress_bar.configure(value=finished_documents)
+            self.status_label.configure(text="Generated {0} of {1} document(s)..."
+                                        .format(finished_documents, total_documents))
+
+    def on_documents_generated(self, event):
+        self.on_document_progress(event)
+        for widget in (self.filter_menu, self.kardex_checkbutton, self.dispensation_list_checkbutton,
+                       self.output_directory_entry, self.browse_button, self.generate_button):
+            widget.configure(state="normal")
+        self.cancel_button.configure(state="disabled")
+        if self.document_report is None:
+            self.status_label.configure(text="Failed to generate the documents. See the log for details.", fg="red")
+        else:
+            self.status_label.configure(text=format_document_report(self.document_report), fg="black")
+
+    def cancel_job(self):
+        self.cancel_event.set()
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="Cancelling... Documents already being generated will be finished.")
+
+    def close(self):
+        self.cancel_event.set()
+        self.destroy()
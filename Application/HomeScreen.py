@@ -1,20 +1,21 @@
-import datetime
 import logging
 import tkinter
-from tkinter import Frame, PhotoImage, Label, Button, Entry, Menu, StringVar, font, filedialog
+from tkinter import Frame, Label, Button, Entry, Menu, StringVar, font, filedialog
 from tkinter.ttk import Treeview
 
 import App
-from AppFunctions.TreeviewFunctions import popup_menu, calibrate_width, retrieve_patient_from_tree, search_treeview, \
-    sort_treeview
+from AppFunctions.Icons import load_icon, DeferredIcons
+from AppFunctions.TreeviewFunctions import popup_menu, calibrate_width, retrieve_patient_from_tree
 from AppFunctions.Warnings import display_warning_if_pillpack_data_is_not_empty, \
     display_warning_if_pillpack_data_is_empty
 from Application.ScanScripts import ScanScripts
 from Application.LoadNewProduction import PopulatePatientData
+from Application.VirtualPatientList import VirtualPatientList
 from Functions.ConfigSingleton import warning_constants, consts
-from Functions.DAOFunctions import save_collected_patients, archive_pillpack_production
+from Functions.DAOFunctions import save_collected_patients, archive_pillpack_production, reset_collected_patients
 from DataStructures.Models import PillpackPatient
-from DataStructures.Repositories import CollectedPatients
+from DataStructures.PatientRowModel import PATIENT_COLUMNS, READY_TO_PRODUCE_IMAGE, DO_NOT_PRODUCE_IMAGE, \
+    WARNING_IMAGE, NO_SCRIPTS_SCANNED_IMAGE
 import SideBar
 
 
@@ -24,22 +25,17 @@ class HomeScreen(Frame):
         self.tab_variable = tkinter.DoubleVar(value=75.0)
         self.font = font.Font(family='Verdana', size=14, weight="normal")
         self.master: App.App = master
-        warning_image_path = App.icons_dir + "\\warning.png"
-        warning_image = PhotoImage(file=warning_image_path)
-        self.warning_image = warning_image.subsample(30, 30)
-        ready_to_produce_path = App.icons_dir + "\\check.png"
-        ready_to_produce = PhotoImage(file=ready_to_produce_path)
-        self.ready_to_produce_image = ready_to_produce.subsample(30, 30)
-        no_scripts_scanned_path = App.icons_dir + "\\question.png"
-        no_scripts_scanned_image = PhotoImage(file=no_scripts_scanned_path)
-        self.no_scripts_scanned_image = no_scripts_scanned_image.subsample(30, 30)
-        do_not_produce_path = App.icons_dir + "\\remove.png"
-        do_not_produce_image = PhotoImage(file=do_not_produce_path)
-        self.do_not_produce_image = do_not_produce_image.subsample(30, 30)
+        self.row_images: DeferredIcons = DeferredIcons({
+            READY_TO_PRODUCE_IMAGE: "check.png",
+            DO_NOT_PRODUCE_IMAGE: "remove.png",
+            WARNING_IMAGE: "warning.png",
+            NO_SCRIPTS_SCANNED_IMAGE: "question.png"
+        }, 30)
         self.list_of_trees = []
+        self.displayed_collected_patients = None
 
-        side_bar = SideBar.SideBar(self, self.master)
-        side_bar.pack(side="left", fill="both")
+        self.side_bar = SideBar.SideBar(self, self.master)
+        self.side_bar.pack(side="left", fill="both")
 
         container_frame = tkinter.ttk.Frame(self)
         container_frame.pack(side="top", fill="both")
@@ -49,42 +45,36 @@ class HomeScreen(Frame):
         options_frame.columnconfigure(1, weight=1)
         options_frame.columnconfigure(2, weight=1)
         options_frame.grid(row=0, column=1, pady=(25, 5), sticky="ew")
-        load_pillpack_image = App.icons_dir + "\\pillpack-data.png"
         load_pillpack_label = Label(options_frame, text="Load Pillpack Production Data", font=self.font, wraplength=150,
                                     justify="center")
-        load_pillpack_button_image = PhotoImage(file=load_pillpack_image)
-        self.pillpack_button_image = load_pillpack_button_image.subsample(5, 5)
-        load_pillpack_button = Button(options_frame, image=self.pillpack_button_image,
-                                      command=lambda: display_warning_if_pillpack_data_is_not_empty
-                                      (self.master,
-                                       self.open_populate_patients_window,
-                                       warning_constants.PILLPACK_DATA_OVERWRITE_WARNING)
-                                      )
+        self.pillpack_button_image = load_icon("pillpack-data.png", 5)
+        self.load_pillpack_button = Button(options_frame, image=self.pillpack_button_image,
+                                           command=lambda: display_warning_if_pillpack_data_is_not_empty
+                                           (self.master,
+                                            self.open_populate_patients_window,
+                                            warning_constants.PILLPACK_DATA_OVERWRITE_WARNING)
+                                           )
         load_pillpack_label.grid(row=1, column=0, sticky="nsew")
-        load_pillpack_button.grid(row=2, column=0, sticky="nsew")
+        self.load_pillpack_button.grid(row=2, column=0, sticky="nsew")
 
-        scan_scripts_image = App.icons_dir + "\\scan_scripts.png"
         scan_scripts_label = Label(options_frame, text="Scan scripts", font=self.font, wraplength=100, justify="center")
-        scan_scripts_button_image = PhotoImage(file=scan_scripts_image)
-        self.scripts_button_image = scan_scripts_button_image.subsample(5, 5)
-        scan_scripts_button = Button(options_frame, image=self.scripts_button_image,
-                                     command=lambda: display_warning_if_pillpack_data_is_empty
-                                     (self.master,
-                                      self.open_scan_scripts_window,
-                                      warning_constants.NO_LOADED_PILLPACK_DATA_WARNING)
-                                     )
+        self.scripts_button_image = load_icon("scan_scripts.png", 5)
+        self.scan_scripts_button = Button(options_frame, image=self.scripts_button_image,
+                                          command=lambda: display_warning_if_pillpack_data_is_empty
+                                          (self.master,
+                                           self.open_scan_scripts_window,
+                                           warning_constants.NO_LOADED_PILLPACK_DATA_WARNING)
+                                          )
         scan_scripts_label.grid(row=1, column=1, sticky="nsew")
-        scan_scripts_button.grid(row=2, column=1, sticky="nsew")
+        self.scan_scripts_button.grid(row=2, column=1, sticky="nsew")
 
         archive_production_label = Label(options_frame, text="Archive production data", font=self.font, wraplength=120,
                                          justify="center")
-        archive_production_image = App.icons_dir + "\\archive.png"
-        archive_production_button_image = PhotoImage(file=archive_production_image)
-        self.archive_button_production_image = archive_production_button_image.subsample(5, 5)
-        archive_production_button = Button(options_frame, image=self.archive_button_production_image,
-                                           command=lambda: self.confirm_production_archival(self.master))
+        self.archive_button_production_image = load_icon("archive.png", 5)
+        self.archive_production_button = Button(options_frame, image=self.archive_button_production_image,
+                                                command=lambda: self.confirm_production_archival(self.master))
         archive_production_label.grid(row=1, column=2, sticky="nsew")
-        archive_production_button.grid(row=2, column=2, sticky="nsew")
+        self.archive_production_button.grid(row=2, column=2, sticky="nsew")
 
         self.group_production_name_var = StringVar()
         self.group_production_name_var.set(self.master.collected_patients.production_group_name)
@@ -95,6 +85,8 @@ class HomeScreen(Frame):
                                                  textvariable=self.group_production_name_var,
                                                  font=production_font)
         self.group_production_name_label.grid(row=3, column=1)
+        self.loading_production_label = Label(options_frame, text="Loading saved production...", font=self.font)
+        self.loading_production_progress_bar = tkinter.ttk.Progressbar(options_frame, mode="indeterminate")
 
         paned_window = tkinter.ttk.PanedWindow(container_frame)
         paned_window.grid(row=3, column=1, pady=(25, 5), sticky="nsew", rowspan=4)
@@ -111,131 +103,122 @@ class HomeScreen(Frame):
         self.production_patients_results.rowconfigure(index=1, weight=1)
         results_notebook.add(self.production_patients_results, text="Patients in Pillpack Production")
 
-        self.columns = ('First Name',
-                        'Last Name',
-                        'Date of Birth',
-                        'Start Date',
-                        'No. of Medications',
-                        'Condition')
-
-        self.production_patients_tree = Treeview(self.production_patients_results,
-                                                 columns=self.columns,
-                                                 height=10)
-        self.production_right_click_menu = Menu(self.production_patients_tree, tearoff=0)
+        self.columns = PATIENT_COLUMNS
+
+        self.production_patients_list = VirtualPatientList(self.production_patients_results,
+                                                           self.columns,
+                                                           self.row_images,
+                                                           height=10)
+        self.production_right_click_menu = Menu(self.production_patients_list.tree, tearoff=0)
         self.production_right_click_menu.add_command(label="View Patient",
                                                      command=lambda: self.on_treeview_double_click(
-                                                         self.production_patients_tree)
+                                                         self.production_patients_list.tree)
                                                      )
         self.production_right_click_menu.add_command(label="Delete Patient",
                                                      command=lambda: self.delete_patient_and_remove_from_tree(
-                                                         self.production_patients_tree)
+                                                         self.production_patients_list.tree)
                                                      )
-        self.production_patients_tree.bind("<Button-3>", lambda e: popup_menu(e,
-                                                                              self.production_patients_tree,
-                                                                              self.production_right_click_menu)
-                                           )
-        calibrate_width(self.production_patients_tree, self.columns, 150)
-        self.production_patients_tree["displaycolumns"] = (
+        self.production_patients_list.tree.bind("<Button-3>", lambda e: popup_menu(e,
+                                                                                   self.production_patients_list.tree,
+                                                                                   self.production_right_click_menu)
+                                                )
+        calibrate_width(self.production_patients_list.tree, self.columns, 150)
+        self.production_patients_list.tree["displaycolumns"] = (
             'Date of Birth', 'Start Date', 'No. of Medications', 'Condition'
         )
-        self.detached_production_patient_nodes: list = []
-        self.list_of_trees.append([self.production_patients_tree,
+        self.list_of_trees.append([self.production_patients_list,
                                    self.production_patients_results,
                                    self.master.collected_patients.pillpack_patient_dict,
-                                   self.detached_production_patient_nodes,
                                    consts.SHOW_ALL_RESULTS_STRING,
                                    consts.SHOW_ALL_RESULTS_CODE])
 
         self.perfect_match_patients = tkinter.ttk.Frame(results_notebook)
         results_notebook.add(self.perfect_match_patients, text="Perfectly Matched Patients")
 
-        self.perfect_patients_tree = Treeview(self.perfect_match_patients,
-                                              columns=self.columns,
-                                              height=10)
-        self.perfect_patients_right_click_menu = Menu(self.perfect_patients_tree, tearoff=0)
+        self.perfect_patients_list = VirtualPatientList(self.perfect_match_patients,
+                                                        self.columns,
+                                                        self.row_images,
+                                                        height=10)
+        self.perfect_patients_right_click_menu = Menu(self.perfect_patients_list.tree, tearoff=0)
         self.perfect_patients_right_click_menu.add_command(label="View Patient",
                                                            command=lambda: self.on_treeview_double_click(
-                                                               self.perfect_patients_tree)
+                                                               self.perfect_patients_list.tree)
                                                            )
         self.perfect_patients_right_click_menu.add_command(label="Delete Patient",
                                                            command=lambda: self.delete_patient_and_remove_from_tree(
-                                                               self.perfect_patients_tree)
+                                                               self.perfect_patients_list.tree)
                                                            )
-        self.perfect_patients_tree.bind("<Button-3>", lambda e: popup_menu(e,
-                                                                           self.perfect_patients_tree,
-                                                                           self.perfect_patients_right_click_menu)
-                                        )
-        calibrate_width(self.perfect_patients_tree, self.columns, 150)
-        self.perfect_patients_tree["displaycolumns"] = (
+        self.perfect_patients_list.tree.bind("<Button-3>", lambda e: popup_menu(e,
+                                                                                self.perfect_patients_list.tree,
+                                                                                self.perfect_patients_right_click_menu)
+                                             )
+        calibrate_width(self.perfect_patients_list.tree, self.columns, 150)
+        self.perfect_patients_list.tree["displaycolumns"] = (
             'Date of Birth', 'Start Date', 'No. of Medications', 'Condition'
         )
-        self.detached_perfect_patient_nodes: list = []
-        self.list_of_trees.append([self.perfect_patients_tree,
+        self.list_of_trees.append([self.perfect_patients_list,
                                    self.perfect_match_patients,
                                    self.master.collected_patients.matched_patients,
-                                   self.detached_perfect_patient_nodes,
                                    consts.SHOW_ALL_RESULTS_STRING,
                                    consts.SHOW_ALL_RESULTS_CODE])
 
         self.minor_mismatch_patients = tkinter.ttk.Frame(results_notebook)
         results_notebook.add(self.minor_mismatch_patients, text="Minor Mismatched Patients")
 
-        self.imperfect_patients_tree = Treeview(self.minor_mismatch_patients,
-                                                columns=self.columns,
-                                                height=10)
-        self.imperfect_patients_right_click_menu = Menu(self.imperfect_patients_tree, tearoff=0)
+        self.imperfect_patients_list = VirtualPatientList(self.minor_mismatch_patients,
+                                                          self.columns,
+                                                          self.row_images,
+                                                          height=10)
+        self.imperfect_patients_right_click_menu = Menu(self.imperfect_patients_list.tree, tearoff=0)
         self.imperfect_patients_right_click_menu.add_command(label="View Patient",
                                                              command=lambda: self.on_treeview_double_click(
-                                                                 self.imperfect_patients_tree)
+                                                                 self.imperfect_patients_list.tree)
                                                              )
         self.imperfect_patients_right_click_menu.add_command(label="Delete Patient",
                                                              command=lambda: self.delete_patient_and_remove_from_tree(
-                                                                 self.imperfect_patients_tree)
+                                                                 self.imperfect_patients_list.tree)
                                                              )
-        self.imperfect_patients_tree.bind("<Button-3>", lambda e: popup_menu(e,
-                                                                             self.imperfect_patients_tree,
-                                                                             self.imperfect_patients_right_click_menu)
-                                          )
-        calibrate_width(self.imperfect_patients_tree, self.columns, 150)
-        self.imperfect_patients_tree["displaycolumns"] = (
+        self.imperfect_patients_list.tree.bind("<Button-3>", lambda e: popup_menu(e,
+                                                                                  self.imperfect_patients_list.tree,
+                                                                                  self.imperfect_patients_right_click_menu)
+                                               )
+        calibrate_width(self.imperfect_patients_list.tree, self.columns, 150)
+        self.imperfect_patients_list.tree["displaycolumns"] = (
             'Date of Birth', 'Start Date', 'No. of Medications', 'Condition'
         )
-        self.detached_imperfect_patient_nodes: list = []
-        self.list_of_trees.append([self.imperfect_patients_tree,
+        self.list_of_trees.append([self.imperfect_patients_list,
                                    self.minor_mismatch_patients,
                                    self.master.collected_patients.minor_mismatch_patients,
-                                   self.detached_imperfect_patient_nodes,
                                    consts.SHOW_ALL_RESULTS_STRING,
                                    consts.SHOW_ALL_RESULTS_CODE])
 
         self.severe_mismatch_patients = tkinter.ttk.Frame(results_notebook)
         results_notebook.add(self.severe_mismatch_patients, text="Severely Mismatched Patients")
 
-        self.mismatched_patients_tree = Treeview(self.severe_mismatch_patients,
-                                                 columns=self.columns,
-                                                 height=10)
-        self.mismatched_right_click_menu = Menu(self.mismatched_patients_tree, tearoff=0)
+        self.mismatched_patients_list = VirtualPatientList(self.severe_mismatch_patients,
+                                                           self.columns,
+                                                           self.row_images,
+                                                           height=10)
+        self.mismatched_right_click_menu = Menu(self.mismatched_patients_list.tree, tearoff=0)
         self.mismatched_right_click_menu.add_command(label="View Patient",
                                                      command=lambda: self.on_treeview_double_click(
-                                                         self.mismatched_patients_tree)
+                                                         self.mismatched_patients_list.tree)
                                                      )
         self.mismatched_right_click_menu.add_command(label="Delete Patient",
                                                      command=lambda: self.delete_patient_and_remove_from_tree(
-                                                         self.mismatched_patients_tree)
+                                                         self.mismatched_patients_list.tree)
                                                      )
-        self.mismatched_patients_tree.bind("<Button-3>", lambda e: popup_menu(e,
-                                                                              self.mismatched_patients_tree,
-                                                                              self.mismatched_right_click_menu)
-                                           )
-        calibrate_width(self.mismatched_patients_tree, self.columns, 150)
-        self.mismatched_patients_tree["displaycolumns"] = (
+        self.mismatched_patients_list.tree.bind("<Button-3>", lambda e: popup_menu(e,
+                                                                                   self.mismatched_patients_list.tree,
+                                                                                   self.mismatched_right_click_menu)
+                                                )
+        calibrate_width(self.mismatched_patients_list.tree, self.columns, 150)
+        self.mismatched_patients_list.tree["displaycolumns"] = (
             'Date of Birth', 'Start Date', 'No. of Medications', 'Condition'
         )
-        self.detatched_mismatched_patient_nodes = []
-        self.list_of_trees.append([self.mismatched_patients_tree,
+        self.list_of_trees.append([self.mismatched_patients_list,
                                    self.severe_mismatch_patients,
                                    self.master.collected_patients.severe_mismatch_patients,
-                                   self.detatched_mismatched_patient_nodes,
                                    consts.SHOW_ALL_RESULTS_STRING,
                                    consts.SHOW_ALL_RESULTS_CODE])
 
@@ -245,6 +228,7 @@ class HomeScreen(Frame):
         self.update()
         self.script_window = None
         self.populate_patients_window = None
+        self.set_production_loading(not self.master.production_loaded.is_set())
 
     def delete_patient_and_remove_from_tree(self, tree_to_delete_from: Treeview):
         if isinstance(tree_to_delete_from, Treeview):
@@ -255,48 +239,39 @@ class HomeScreen(Frame):
                 self.master.collected_patients.remove_minor_mismatched_patient(selected_patient)
                 self.master.collected_patients.remove_severely_mismatched_patient(selected_patient)
                 self.master.collected_patients.remove_patient(selected_patient)
-                tree_to_delete_from.delete(tree_to_delete_from.focus())
                 save_collected_patients(self.master.collected_patients)
                 self.update()
 
     def _update_list_of_trees(self):
-        self.list_of_trees[0] = ([self.production_patients_tree,
+        self.list_of_trees[0] = ([self.production_patients_list,
                                   self.production_patients_results,
                                   self.master.collected_patients.pillpack_patient_dict,
-                                  self.detached_production_patient_nodes,
-                                  self.list_of_trees[0][4],
-                                  self.list_of_trees[0][5]])
-        self.list_of_trees[1] = ([self.perfect_patients_tree,
+                                  self.list_of_trees[0][3],
+                                  self.list_of_trees[0][4]])
+        self.list_of_trees[1] = ([self.perfect_patients_list,
                                   self.perfect_match_patients,
                                   self.master.collected_patients.matched_patients,
-                                  self.detached_perfect_patient_nodes,
-                                  self.list_of_trees[1][4],
-                                  self.list_of_trees[1][5]])
-        self.list_of_trees[2] = ([self.imperfect_patients_tree,
+                                  self.list_of_trees[1][3],
+                                  self.list_of_trees[1][4]])
+        self.list_of_trees[2] = ([self.imperfect_patients_list,
                                   self.minor_mismatch_patients,
                                   self.master.collected_patients.minor_mismatch_patients,
-                                  self.detached_imperfect_patient_nodes,
-                                  self.list_of_trees[2][4],
-                                  self.list_of_trees[2][5]])
-        self.list_of_trees[3] = ([self.mismatched_patients_tree,
+                                  self.list_of_trees[2][3],
+                                  self.list_of_trees[2][4]])
+        self.list_of_trees[3] = ([self.mismatched_patients_list,
                                   self.severe_mismatch_patients,
                                   self.master.collected_patients.severe_mismatch_patients,
-                                  self.detatched_mismatched_patient_nodes,
-                                  self.list_of_trees[3][4],
-                                  self.list_of_trees[3][5]])
+                                  self.list_of_trees[3][3],
+                                  self.list_of_trees[3][4]])
         logging.info("Updated list of patient trees.")
 
     def set_tree_widgets(self):
         for i in range(len(self.list_of_trees)):
-            tree: Treeview = self.list_of_trees[i][0]
+            patient_list: VirtualPatientList = self.list_of_trees[i][0]
             results_location = self.list_of_trees[i][1]
             associated_dict: dict = self.list_of_trees[i][2]
-            detached_nodes: list = self.list_of_trees[i][3]
 
-            tree.heading('#0', text="Patient Name")
-            for col in self.columns:
-                tree.heading(col, text=col)
-            tree.bind('<Double-1>', lambda event, e=tree: self.on_treeview_double_click(e))
+            patient_list.tree.bind('<Double-1>', lambda event, e=patient_list.tree: self.on_treeview_double_click(e))
             filter_label = Label(results_location, font=self.font, text="Filter results: ")
             filter_combobox = tkinter.ttk.Combobox(results_location,
                                                    state="readonly",
@@ -309,31 +284,30 @@ class HomeScreen(Frame):
                                                            consts.MANUALLY_CHECKED_STRING
                                                            ]
                                                    )
-            filter_combobox.current(self.list_of_trees[i][5])
+            filter_combobox.current(self.list_of_trees[i][4])
             filter_combobox.bind("<<ComboboxSelected>>",
-                                 lambda event, e=(filter_combobox, tree, associated_dict, i):
-                                 self._on_filter_selected(e[0].get(), e[1], e[2], e[3]))
+                                 lambda event, e=(filter_combobox, i):
+                                 self._on_filter_selected(e[0].get(), e[1]))
             search_variable: StringVar = StringVar()
             search_variable.trace("w",
-                                  lambda name, index, mode, args=(tree, detached_nodes, search_variable):
-                                  search_treeview(args[0], args[1], args[2])
+                                  lambda name, index, mode, args=(patient_list, search_variable):
+                                  args[0].search(args[1].get())
                                   )
             search_bar_label = Label(results_location, font=self.font, text="Search: ")
             search_bar = Entry(results_location, width=50, textvariable=search_variable)
-            scrollbar = tkinter.ttk.Scrollbar(results_location, orient='vertical', command=tree.yview)
-            tree.configure(yscrollcommand=scrollbar.set)
             filter_label.grid(row=0, column=0)
             filter_combobox.grid(row=1, column=0)
             search_bar_label.grid(row=2, column=0)
             search_bar.grid(row=3, column=0)
-            tree.grid(row=4, column=0, sticky="ew")
-            scrollbar.grid(row=4, column=1, sticky="ns")
-            logging.info("Set all widgets for tree {0} using results from {1} and associated dictionary {2}. "
-                         "Nodes currently detatched from tree {0}: {3}"
-                         .format(tree, results_location, associated_dict, detached_nodes))
-
-    def _refresh_patient_status(self):
-        for patient_list in self.master.collected_patients.pillpack_patient_dict.values():
+            patient_list.grid(row=4, column=0, columnspan=2, sticky="ew")
+            logging.info("Set all widgets for tree {0} using results from {1} and associated dictionary {2}."
+                         .format(patient_list.tree, results_location, associated_dict))
+
+    def _refresh_patient_status(self, changed_last_names=None):
+        if changed_last_names is None:
+            changed_last_names = self.master.collected_patients.pillpack_patient_dict.keys()
+        for last_name in changed_last_names:
+            patient_list = self.master.collected_patients.pillpack_patient_dict.get(last_name)
             if isinstance(patient_list, list):
                 for patient in patient_list:
                     if isinstance(patient, PillpackPatient):
@@ -341,101 +315,67 @@ class HomeScreen(Frame):
                         logging.info("Patient {0} {1}'s status is {2}"
                                      .format(patient.first_name, patient.last_name, patient.ready_to_produce_code))
 
-    def _refresh_treeview(self, tree_to_refresh: tkinter.ttk.Treeview, dictionary: dict):
-        iterator = dictionary.values()
-        for patient_list in iterator:
-            if isinstance(patient_list, list):
-                for patient in patient_list:
-                    if isinstance(patient, PillpackPatient):
-                        matching_pillpack_patient: PillpackPatient = (
-                            self.master.match_patient_to_pillpack_patient
-                            (patient, self.master.collected_patients.pillpack_patient_dict)
-                        )
-                        key = patient.first_name + " " + patient.last_name
-                        if not tree_to_refresh.exists(key):
-                            tree_to_refresh.insert('', 'end', key, text=key)
-                            tree_to_refresh.set(key, 'First Name', patient.first_name)
-                            tree_to_refresh.set(key, 'Last Name', patient.last_name)
-                            logging.info("New Patient {0} {1} added to tree {2}"
-                                         .format(patient.first_name, patient.last_name, tree_to_refresh))
-                        if matching_pillpack_patient.date_of_birth == datetime.date.today():
-                            tree_to_refresh.set(key, 'Date of Birth', "Not provided...")
-                        else:
-                            tree_to_refresh.set(key, 'Date of Birth', matching_pillpack_patient.date_of_birth)
-                        if matching_pillpack_patient.start_date == datetime.date.today():
-                            tree_to_refresh.set(key, 'Start Date',
-                                                str(matching_pillpack_patient.start_date) + " URGENT")
-                        else:
-                            tree_to_refresh.set(key, 'Start Date', matching_pillpack_patient.start_date)
-                        tree_to_refresh.set(key, 'No. of Medications',
-                                            len(matching_pillpack_patient.production_medications_dict))
-                        if matching_pillpack_patient.manually_checked_flag:
-                            tree_to_refresh.set(key, 'Condition', "Manually Checked")
-                            tree_to_refresh.item(key, image=self.ready_to_produce_image)
-                        else:
-                            if len(matching_pillpack_patient.incorrect_dosages_dict) > 0:
-                                tree_to_refresh.set(key, 'Condition', "Incorrect dosages")
-                                tree_to_refresh.item(key, image=self.do_not_produce_image)
-                            elif len(matching_pillpack_patient.unknown_medications_dict) > 0:
-                                tree_to_refresh.set(key, 'Condition', "Unknown medications")
-                                tree_to_refresh.item(key, image=self.do_not_produce_image)
-                            elif len(matching_pillpack_patient.missing_medications_dict) > 0:
-                                tree_to_refresh.set(key, 'Condition', "Missing medications")
-                                tree_to_refresh.item(key, image=self.warning_image)
-                            elif (len(matching_pillpack_patient.matched_medications_dict)
-                                  == len(matching_pillpack_patient.production_medications_dict)):
-                                tree_to_refresh.set(key, 'Condition', "Ready to produce")
-                                tree_to_refresh.item(key, image=self.ready_to_produce_image)
-                            else:
-                                tree_to_refresh.set(key, 'Condition', "No scripts yet scanned")
-                                tree_to_refresh.item(key, image=self.no_scripts_scanned_image)
-                    else:
-                        logging.error("Item in patient list: {0} is not of type PillpackPatient".format(patient))
-        sort_treeview(tree_to_refresh, "Last Name", False)
-
-    def _filter_treeview(self, tree_to_filter: Treeview, dictionary_to_reference: dict, search_code: int = None):
-        if search_code is not None:
-            iterator = dictionary_to_reference.values()
-            for patient_list in iterator:
-                if isinstance(patient_list, list):
-                    for patient in patient_list:
-                        if isinstance(patient, PillpackPatient):
-                            matching_pillpack_patient: PillpackPatient = (
-                                self.master.match_patient_to_pillpack_patient
-                                (patient, self.master.collected_patients.pillpack_patient_dict)
-                            )
-                            key = patient.first_name + " " + patient.last_name
-                            if (tree_to_filter.exists(key)
-                                    and matching_pillpack_patient.ready_to_produce_code != search_code):
-                                tree_to_filter.delete(key)
-                                logging.info("Removed patient {0} {1} from tree. The search code of the filter ({2}) "
-                                             "did not match the patient's production status code ({3})."
-                                             .format(patient.first_name, patient.last_name,
-                                                     search_code, patient.ready_to_produce_code))
-                        else:
-                            logging.error("Item in patient list: {0} is not of type PillpackPatient".format(patient))
-        else:
-            self._refresh_treeview(tree_to_filter, dictionary_to_reference)
+    def _refresh_treeview(self, tree_index: int, changed_last_names=None):
+        """
+        Brings a patient list up to date with its associated dictionary. Only the rows of patients stored under the
+        changed last names are recomputed, and only the visible rows are redrawn. If changed_last_names is None, every
+        row is recomputed.
+        """
+        patient_list: VirtualPatientList = self.list_of_trees[tree_index][0]
+        dictionary: dict = self.list_of_trees[tree_index][2]
+        filter_code: int = self.list_of_trees[tree_index][4]
+        collected_patients = self.master.collected_patients
+        changes: dict = patient_list.refresh(dictionary,
+                                             lambda patient: self.master.match_patient_to_pillpack_patient(
+                                                 patient, collected_patients),
+                                             changed_last_names,
+                                             None if filter_code == consts.SHOW_ALL_RESULTS_CODE else filter_code)
+        logging.info("Refreshed tree {0}: {1} row(s) inserted, {2} row(s) deleted and {3} row(s) updated."
+                     .format(patient_list.tree, len(changes["Inserted"]), len(changes["Deleted"]),
+                             len(changes["Updated"])))
 
     def clear_all_trees(self):
         for i in range(len(self.list_of_trees)):
-            tree: Treeview = self.list_of_trees[i][0]
-            tree.delete(*tree.get_children())
+            patient_list: VirtualPatientList = self.list_of_trees[i][0]
+            patient_list.clear()
 
     def update(self):
         logging.info("HomeScreen update function called.")
+        changed_last_names = self.master.collected_patients.take_changed_last_names()
+        if self.displayed_collected_patients is not self.master.collected_patients:
+            changed_last_names = None
+            self.displayed_collected_patients = self.master.collected_patients
         self._update_list_of_trees()
-        self._refresh_patient_status()
-        self.set_tree_widgets()
+        self._refresh_patient_status(changed_last_names)
         self.group_production_name_var.set(self.master.collected_patients.production_group_name)
         self.master.group_production_name = self.group_production_name_var.get()
         for i in range(len(self.list_of_trees)):
-            tree: Treeview = self.list_of_trees[i][0]
-            associated_dict: dict = self.list_of_trees[i][2]
-            self._refresh_treeview(tree, associated_dict)
-            self._on_filter_selected(self.list_of_trees[i][4], tree, associated_dict, i)
+            self._refresh_treeview(i, changed_last_names)
         logging.info("HomeScreen update function call complete")
 
+    def set_production_loading(self, loading: bool):
+        """
+        Shows or hides the progress indicator displayed while the saved production is loaded in the background. While
+        it is shown, the buttons which load, scan into or archive a production are disabled, so the production being
+        loaded cannot be replaced or changed before it has been displayed.
+
+        :param loading: Whether the saved production is still being loaded
+        :return: None
+        """
+        button_state: str = "disabled" if loading else "normal"
+        for button in (self.load_pillpack_button, self.scan_scripts_button, self.archive_production_button,
+                       self.side_bar.scan_scripts_button, self.side_bar.archive_production_data_button,
+                       self.side_bar.load_previous_production_data_button, self.side_bar.generate_documents_button):
+            button.configure(state=button_state)
+        if loading:
+            self.loading_production_label.grid(row=4, column=1, sticky="ew")
+            self.loading_production_progress_bar.grid(row=5, column=1, pady=(5, 0), sticky="ew")
+            self.loading_production_progress_bar.start(15)
+        else:
+            self.loading_production_progress_bar.stop()
+            self.loading_production_progress_bar.grid_remove()
+            self.loading_production_label.grid_remove()
+
     def open_scan_scripts_window(self):
         if self.script_window is None or not self.script_window.winfo_exists():
             logging.info("No Scan Scripts view has been instantiated. Creating new Scan Scripts view...")
@@ -466,11 +406,25 @@ class HomeScreen(Frame):
         archive_file = filedialog.asksaveasfile(initialfile="Untitled", defaultextension=".zip",
                                                 filetypes=[("ZIP files", ".zip"), ("All files", ".*")])
         if archive_file:
-            archive_pillpack_production(archive_file, self.master.config, self.master.collected_patients)
-            self.master.collected_patients = CollectedPatients()
+            if not archive_pillpack_production(archive_file, self.master.config, self.master.collected_patients):
+                self.display_archival_failure()
+                return
+            self.master.collected_patients = reset_collected_patients(self.master.config,
+                                                                      self.master.collected_patients)
             self.clear_all_trees()
             self.update()
 
+    def display_archival_failure(self):
+        failure = tkinter.Toplevel(master=self.master)
+        failure.attributes('-topmost', 'true')
+        failure.geometry("400x160")
+        failure_label = Label(failure, text="The production could not be archived. The current production has been "
+                                            "kept, and nothing has been removed. Check the log for details.",
+                              wraplength=300)
+        failure_label.grid(row=0, column=0, pady=25, padx=50, sticky="ew")
+        ok_button = Button(failure, text="OK", command=failure.destroy)
+        ok_button.grid(row=1, column=0, padx=50, sticky="ew")
+
     def open_populate_patients_window(self):
         if self.populate_patients_window is None or not self.populate_patients_window.winfo_exists():
             logging.info("No Populate Patients view has been instatiated. Creating new Populate Patients view...")
@@ -480,44 +434,20 @@ class HomeScreen(Frame):
             logging.info("Populate Patients view is now in focus.")
             self.populate_patients_window.focus()
 
-    def _on_filter_selected(self, selected_filter: str, treeview_to_filter: Treeview, dictionary_to_reference: dict,
-                            tree_index: int):
-        match selected_filter:
-            case consts.SHOW_ALL_RESULTS_STRING:
-                self.list_of_trees[tree_index][4] = consts.SHOW_ALL_RESULTS_STRING
-                self.list_of_trees[tree_index][5] = consts.SHOW_ALL_RESULTS_CODE
-                self._refresh_treeview(treeview_to_filter, dictionary_to_reference)
-                logging.info("'All Results' patient filter has been applied.")
-            case consts.NOTHING_TO_COMPARE_STRING:
-                self.list_of_trees[tree_index][4] = consts.NOTHING_TO_COMPARE_STRING
-                self.list_of_trees[tree_index][5] = consts.NOTHING_TO_COMPARE_CODE
-                self._refresh_treeview(treeview_to_filter, dictionary_to_reference)
-                self._filter_treeview(treeview_to_filter, dictionary_to_reference, consts.NOTHING_TO_COMPARE_CODE)
-                logging.info("'Nothing Yet Scanned' patient filter has been applied.")
-            case consts.MISSING_MEDICATIONS_STRING:
-                self.list_of_trees[tree_index][4] = consts.MISSING_MEDICATIONS_STRING
-                self.list_of_trees[tree_index][5] = consts.MISSING_MEDICATIONS_CODE
-                self._refresh_treeview(treeview_to_filter, dictionary_to_reference)
-                self._filter_treeview(treeview_to_filter, dictionary_to_reference, consts.MISSING_MEDICATIONS_CODE)
-                logging.info("'Missing Medications' patient filter has been applied.")
-            case consts.DO_NOT_PRODUCE_STRING:
-                self.list_of_trees[tree_index][4] = consts.DO_NOT_PRODUCE_STRING
-                self.list_of_trees[tree_index][5] = consts.DO_NOT_PRODUCE_CODE
-                self._refresh_treeview(treeview_to_filter, dictionary_to_reference)
-                self._filter_treeview(treeview_to_filter, dictionary_to_reference, consts.DO_NOT_PRODUCE_CODE)
-                logging.info("'Do Not Produce' patient filter has been applied.")
-            case consts.READY_TO_PRODUCE_STRING:
-                self.list_of_trees[tree_index][4] = consts.READY_TO_PRODUCE_STRING
-                self.list_of_trees[tree_index][5] = consts.READY_TO_PRODUCE_CODE
-                self._refresh_treeview(treeview_to_filter, dictionary_to_reference)
-                self._filter_treeview(treeview_to_filter, dictionary_to_reference, consts.READY_TO_PRODUCE_CODE)
-                logging.info("'Ready to Produce' patient filter has been applied.")
-            case consts.MANUALLY_CHECKED_STRING:
-                self.list_of_trees[tree_index][4] = consts.MANUALLY_CHECKED_STRING
-                self.list_of_trees[tree_index][5] = consts.MANUALLY_CHECKED_CODE
-                self._refresh_treeview(treeview_to_filter, dictionary_to_reference)
-                self._filter_treeview(treeview_to_filter, dictionary_to_reference, consts.MANUALLY_CHECKED_CODE)
-                logging.info("'Manually Checked' patient filter has been applied.")
+    def _on_filter_selected(self, selected_filter: str, tree_index: int):
+        filter_codes: dict = {
+            consts.SHOW_ALL_RESULTS_STRING: consts.SHOW_ALL_RESULTS_CODE,
+            consts.READY_TO_PRODUCE_STRING: consts.READY_TO_PRODUCE_CODE,
+            consts.NOTHING_TO_COMPARE_STRING: consts.NOTHING_TO_COMPARE_CODE,
+            consts.MISSING_MEDICATIONS_STRING: consts.MISSING_MEDICATIONS_CODE,
+            consts.DO_NOT_PRODUCE_STRING: consts.DO_NOT_PRODUCE_CODE,
+            consts.MANUALLY_CHECKED_STRING: consts.MANUALLY_CHECKED_CODE
+        }
+        if filter_codes.__contains__(selected_filter):
+            self.list_of_trees[tree_index][3] = selected_filter
+            self.list_of_trees[tree_index][4] = filter_codes[selected_filter]
+            self._refresh_treeview(tree_index)
+            logging.info("'{0}' patient filter has been applied.".format(selected_filter))
 
     def on_treeview_double_click(self, tree_to_select_from: Treeview):
         if isinstance(tree_to_select_from, Treeview):
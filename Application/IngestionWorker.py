@@ -0,0 +1,99 @@
+import logging
+import queue
+import threading
+from tkinter import TclError
+
+from watchdog.events import FileCreatedEvent, FileMovedEvent
+
+from Application.WatchdogEventHandler import WatchdogEventHandler
+
+
+class IngestionWorker(threading.Thread):
+    """
+    Background thread which consumes the filesystem events queued by App.notify, so that copying, unzipping and
+    parsing the production files detected by the filesystem observer never blocks the tkinter main loop.
+
+    Each processed file produces a compact patient change, holding the name of the file and the PillpackPatient objects
+    read from it. Patient changes are put on the application's patient_changes queue, and a <<WatchdogEvent>> is
+    generated so that the main thread can merge the patients into the collected patients and redraw the views.
+    """
+    def __init__(self, application):
+        """
+        The constructor for the IngestionWorker class. The thread is a daemon thread, so it never prevents the
+        application from closing.
+
+        :param application: The App base class which holds the event queue and the loaded production data
+        """
+        threading.Thread.__init__(self, name="IngestionWorker", daemon=True)
+        self.application = application
+        self.handler: WatchdogEventHandler = WatchdogEventHandler(application)
+
+    def read_patients_from_event(self, watchdog_event):
+        """
+        Reads every patient from the file referenced by a filesystem event. Currently, only Pillpaccare
+        (ppc_processed) and AMCO (fd) file extensions are supported.
+
+        :param watchdog_event: A file created or file moved event from the filesystem observer
+        :return: Tuple of the file name and the list of PillpackPatient objects read from the file
+        """
+        full_path = ""
+        if isinstance(watchdog_event, FileCreatedEvent):
+            full_path = str(watchdog_event.src_path)
+        if isinstance(watchdog_event, FileMovedEvent):
+            full_path = str(watchdog_event.dest_path)
+        logging.info("Full path of file monitored by watchdog observer: {0}".format(full_path))
+        split_file_name = full_path.rsplit('\\')
+        file_name = split_file_name[len(split_file_name) - 1]
+        file_extension = full_path.rsplit('.')[-1]
+        list_of_patients: list = []
+        if file_extension == "ppc_processed":
+            logging.info("The modified file has a ppc_processed file extension. Reading patient(s)...")
+            list_of_patients = self.handler.read_patient_data_from_ppc_xml(file_name)
+        elif file_extension == "fd":
+            logging.info("The modified file has a fd file extension. Reading patient(s)...")
+            list_of_patients = self.handler.read_patient_data_from_fd_file(full_path)
+        return file_name, list_of_patients
+
+    def run(self):
+        """Files are only read once the saved production has been loaded, as reading them needs the saved PRNs and
+        linked medications. Events detected before then wait on the queue."""
+        self.application.production_loaded.wait()
+        while True:
+            watchdog_event = self.application.queue.get()
+            if watchdog_event is None:
+                logging.info("Ingestion worker stopped.")
+                break
+            try:
+                file_name, list_of_patients = self.read_patients_from_event(watchdog_event)
+            except Exception as e:
+                logging.error("Failed to read patients from watchdog event {0}: {1}".format(watchdog_event, e))
+                continue
+            if len(list_of_patients) > 0:
+                patient_change: dict = {
+                    "FileName": file_name,
+                    "Patients": list_of_patients
+                }
+                self.application.patient_changes.put(patient_change)
+                try:
+                    self.application.event_generate("<<WatchdogEvent>>", when="tail")
+                except (TclError, RuntimeError) as e:
+                    logging.warning("Could not notify the main thread of changes from {0}: {1}".format(file_name, e))
+                logging.info("Read {0} patient(s) from {1}".format(len(list_of_patients), file_name))
+
+    def stop(self):
+        self.application.queue.put(None)
+
+    @staticmethod
+    def take_patient_changes(patient_changes: queue.Queue):
+        """
+        Takes every patient change currently waiting on the queue without blocking.
+
+        :param patient_changes: The queue of patient changes filled by the ingestion worker
+        :return: List of patient changes, oldest first
+        """
+        list_of_changes: list = []
+        while True:
+            try:
+                list_of_changes.append(patient_changes.get_nowait())
+            except queue.Empty:
+                return list_of_changes
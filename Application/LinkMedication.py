@@ -84,6 +84,7 @@ class LinkMedication(Toplevel):
 
     def link_medication(self, selected_medication: Medication):
         self.selected_patient.add_medication_link(self.linking_medication, selected_medication)
+        self.application.collected_patients.mark_patients_changed([self.selected_patient])
         save_collected_patients(self.application.collected_patients)
         update_current_prns_and_linked_medications(self.selected_patient,
                                                    self.application.collected_patients,
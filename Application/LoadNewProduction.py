@@ -2,19 +2,20 @@ import datetime
 import logging
 import threading
 from tkinter import Toplevel, Label, Entry, Button
-from tkinter.ttk import Treeview
-
-from tkcalendar import Calendar
 
 import App
+from Application.VirtualPatientList import VirtualPatientList
 from Functions.ConfigSingleton import consts
-from Functions.DAOFunctions import save_collected_patients
-from Functions.ModelFactory import get_patient_medicine_data_ppc
-from DataStructures.Repositories import CollectedPatients
+from Functions.DAOFunctions import (save_collected_patients, reset_collected_patients,
+                                    record_prns_and_linked_medications_cycle)
+from Functions.ModelFactory import get_patient_medicine_data_ppc_parallel
+from Functions.PatientHistory import record_loaded_production
 
 
 class PopulatePatientData(Toplevel):
     def __init__(self, parent, master: App.App):
+        """tkcalendar (and babel with it) is slow to import, so it is only imported when this window is first opened."""
+        from tkcalendar import Calendar
         super().__init__(parent)
         self.geometry("600x400")
         self.attributes('-topmost', 'true')
@@ -67,35 +68,31 @@ class PopulatePatientData(Toplevel):
     def threaded_get_production_data(self, earliest_start_date: datetime.date = None):
         self.loading_message_thread.join()
         logging.info("Loading message thread finished.")
-        self.master.collected_patients = CollectedPatients()
+        self.master.collected_patients = reset_collected_patients(self.master.config, self.master.collected_patients)
         self.master.collected_patients.production_group_name = self.production_group_input.get()
         self.master.collected_patients.set_pillpack_patient_dict(
-            get_patient_medicine_data_ppc(self.master.loaded_prns_and_linked_medications, consts.PPC_SEPARATING_TAG,
-                                          self.master.config, earliest_start_date=earliest_start_date)
+            get_patient_medicine_data_ppc_parallel(self.master.loaded_prns_and_linked_medications,
+                                                   consts.PPC_SEPARATING_TAG, self.master.config,
+                                                   earliest_start_date=earliest_start_date)
         )
         save_collected_patients(self.master.collected_patients)
+        record_prns_and_linked_medications_cycle(self.master.loaded_prns_and_linked_medications,
+                                                 self.master.collected_patients, self.master.config)
+        self.master.production_changes = record_loaded_production(self.master.collected_patients)
         return
 
     def execute_loading_message(self):
+        self.parent.clear_all_trees()
         for trees_results_and_dicts in self.parent.list_of_trees:
-            tree: Treeview = trees_results_and_dicts[0]
-            key = "loading"
-            tree.delete(*tree.get_children())
-            tree.insert('', 'end', key, text=key)
-            tree.set(key, 'First Name', "Loading...")
-            tree.set(key, 'Last Name', "Loading...")
-            tree.set(key, 'Date of Birth', "Loading...")
-            tree.set(key, 'Start Date', "Loading...")
-            tree.set(key, 'No. of Medications', "Loading...")
-            tree.set(key, 'Condition', "Loading...")
+            patient_list: VirtualPatientList = trees_results_and_dicts[0]
+            patient_list.set_message("Loading...")
 
     def delete_loading_message(self):
         self.get_production_thread.join()
         logging.info("Production data re-population finished.")
         for trees_results_and_dicts in self.parent.list_of_trees:
-            tree: Treeview = trees_results_and_dicts[0]
-            key = "loading"
-            tree.delete(key)
+            patient_list: VirtualPatientList = trees_results_and_dicts[0]
+            patient_list.set_message(None)
         return
 
     def threaded_update(self):
@@ -13,7 +13,10 @@ from Functions.ConfigSingleton import consts
 from Functions.DAOFunctions import save_collected_patients, update_current_prns_and_linked_medications
 from Application.SideBar import SideBar
 from Application.HomeScreen import HomeScreen
+from DataStructures.MedicationStatusTable import MedicationStatus
 from DataStructures.Models import PillpackPatient, Medication
+from DataStructures.PatientIdentityIndex import get_identity_key
+from Functions.MedicationDiff import format_medication_diff
 
 
 class PatientMedicationDetails(Frame):
@@ -72,6 +75,8 @@ class PatientMedicationDetails(Frame):
         self.changes_toggle_button.grid(row=1, column=2)
         self.generate_kardex_button.grid(row=2, column=1)
         self.generate_prns_button.grid(row=3, column=1)
+        self.changes_since_last_cycle_label = Label(self.display_frame, wraplength=300, justify="left")
+        self.changes_since_last_cycle_label.grid(row=4, column=1, rowspan=3, sticky="n")
 
         self.production_medication_frame = LabelFrame(self.display_frame)
         self.production_medication_frame.columnconfigure(0, weight=1)
@@ -111,6 +116,7 @@ class PatientMedicationDetails(Frame):
     def _on_manually_checked_button_click(self):
         self.patient_object.manually_checked(not self.patient_object.manually_checked_flag)
         logging.info("Patient Manually checked flag set to: {0}". format(self.patient_object.manually_checked_flag))
+        self.master.collected_patients.mark_patients_changed([self.patient_object])
         save_collected_patients(self.master.collected_patients)
         self.master.app_observer.update_all()
 
@@ -137,7 +143,7 @@ class PatientMedicationDetails(Frame):
             generate_dispensation_list_for_current_cycle(self.patient_object, self.master.group_production_name)
 
     def _check_if_any_scripts_are_scanned(self):
-        if len(self.patient_object.matched_medications_dict) > 0:
+        if self.patient_object.get_medication_count(MedicationStatus.MATCHED) > 0:
             generate_dispensation_list_for_current_cycle(self.patient_object, self.master.group_production_name)
         else:
             window = PatientDispensationDetails(self, self.master, self.patient_object,
@@ -321,6 +327,18 @@ class PatientMedicationDetails(Frame):
                         logging.warning("Dosage in production: {0} Dosage on script: {1}"
                                         .format(medication.dosage, medication_in_production.dosage))
 
+    def show_changes_since_last_cycle(self):
+        production_changes = self.master.production_changes
+        if production_changes is None or production_changes["PreviousCycle"] is None:
+            self.changes_since_last_cycle_label.configure(text="")
+            return
+        identity_key: tuple = get_identity_key(self.patient_object)
+        changes_text: str = "Not in the last cycle" if identity_key in production_changes["NewPatients"] \
+            else format_medication_diff(production_changes["Changes"].get(identity_key,
+                                                                          {"Added": [], "Removed": [], "Changed": []}))
+        self.changes_since_last_cycle_label.configure(text="Changes since {0}:\n{1}".format(
+            production_changes["PreviousCycle"]["ProductionGroupName"], changes_text))
+
     @staticmethod
     def clear_label_frame(frame_to_clear: LabelFrame):
         for widget in frame_to_clear.winfo_children():
@@ -353,6 +371,7 @@ class PatientMedicationDetails(Frame):
             medication_dict.pop(selected_medication.medication_name)
         self.patient_object.add_medication_to_prn_dict(selected_medication)
         self.patient_object.add_medication_to_prns_for_current_cycle(selected_medication)
+        self.master.collected_patients.mark_patients_changed([self.patient_object])
         save_collected_patients(self.master.collected_patients)
         update_current_prns_and_linked_medications(self.patient_object,
                                                    self.master.collected_patients,
@@ -367,6 +386,7 @@ class PatientMedicationDetails(Frame):
                 self.patient_object.add_medication_to_missing_dict(selected_medication)
             else:
                 self.patient_object.add_medication_to_unknown_dict(selected_medication)
+            self.master.collected_patients.mark_patients_changed([self.patient_object])
             save_collected_patients(self.master.collected_patients)
             update_current_prns_and_linked_medications(self.patient_object,
                                                        self.master.collected_patients,
@@ -375,6 +395,7 @@ class PatientMedicationDetails(Frame):
 
     def add_medication_to_ignore_dict(self, selected_medication: Medication):
         self.patient_object.add_medication_to_ignore_dict(selected_medication)
+        self.master.collected_patients.mark_patients_changed([self.patient_object])
         save_collected_patients(self.master.collected_patients)
         update_current_prns_and_linked_medications(self.patient_object,
                                                    self.master.collected_patients,
@@ -386,6 +407,7 @@ class PatientMedicationDetails(Frame):
             correct_dosage_medication: Medication = self.patient_object.production_medications_dict[
                 selected_medication.medication_name]
             self.patient_object.remove_medication_from_ignore_dict(selected_medication, correct_dosage_medication)
+            self.master.collected_patients.mark_patients_changed([self.patient_object])
             save_collected_patients(self.master.collected_patients)
             update_current_prns_and_linked_medications(self.patient_object,
                                                        self.master.collected_patients,
@@ -395,12 +417,14 @@ class PatientMedicationDetails(Frame):
     def update(self):
         logging.info("PatientMedicationDetails update function called.")
         self.patient_object.determine_ready_to_produce_code()
-        if (len(self.patient_object.matched_medications_dict) != len(self.patient_object.production_medications_dict)
+        if (self.patient_object.get_medication_count(MedicationStatus.MATCHED)
+                != self.patient_object.get_medication_count(MedicationStatus.PRODUCTION)
                 and not self.patient_object.manually_checked_flag):
             self.generate_prns_button.configure(state="disabled")
         else:
             self.generate_prns_button.configure(state="normal")
         self.check_if_patient_is_ready_for_production()
+        self.show_changes_since_last_cycle()
         self.clear_label_frame(self.production_medication_frame)
         self.clear_label_frame(self.matched_medication_frame)
         self.clear_label_frame(self.missing_medication_frame)
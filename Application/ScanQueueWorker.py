@@ -0,0 +1,81 @@
+import logging
+import queue
+import threading
+from tkinter import TclError
+
+from Functions.Mutations import read_patient_from_script
+
+
+class ScanQueueWorker(threading.Thread):
+    """
+    Background thread which decodes the scripts scanned into the Scan Scripts window, so that the entry widget only has
+    to queue the raw text read by the scanner and is always ready for the next scan.
+
+    Scripts are decoded in the order they were scanned. Each decoded script produces a scan result, holding the raw text
+    of the script and the PillpackPatient object read from it (or None if the script could not be read). Scan results
+    are put on the worker's scan_results queue, and a <<ScanResults>> event is generated so that the main thread can
+    match every waiting result against the collected patients, save them, and redraw the views once per batch.
+    """
+    def __init__(self, application):
+        """
+        The constructor for the ScanQueueWorker class. The thread is a daemon thread, so it never prevents the
+        application from closing.
+
+        :param application: The App base class which is notified whenever scan results are waiting
+        """
+        threading.Thread.__init__(self, name="ScanQueueWorker", daemon=True)
+        self.application = application
+        self.scanned_scripts = queue.Queue()
+        self.scan_results = queue.Queue()
+        self.pending_scans: int = 0
+
+    def enqueue(self, scanned_input: str):
+        """
+        Queues the raw text of a scanned script to be decoded. The script counts as pending until its scan result has
+        been applied on the main thread.
+
+        :param scanned_input: The text read from the barcode on the script
+        :return: None
+        """
+        self.pending_scans += 1
+        self.scanned_scripts.put(scanned_input)
+        logging.info("Script queued for scanning. {0} scan(s) pending.".format(self.pending_scans))
+
+    def take_scan_results(self):
+        """
+        Takes every scan result currently waiting on the queue without blocking, and marks those scans as no longer
+        pending. Must only be called on the main thread.
+
+        :return: List of scan results, in the order the scripts were scanned
+        """
+        list_of_results: list = []
+        while True:
+            try:
+                list_of_results.append(self.scan_results.get_nowait())
+            except queue.Empty:
+                self.pending_scans -= len(list_of_results)
+                return list_of_results
+
+    def run(self):
+        while True:
+            scanned_input = self.scanned_scripts.get()
+            if scanned_input is None:
+                logging.info("Scan queue worker stopped.")
+                break
+            try:
+                script_patient_object = read_patient_from_script(scanned_input)
+            except Exception as e:
+                logging.error("Failed to read patient from scanned script: {0}".format(e))
+                script_patient_object = None
+            scan_result: dict = {
+                "ScannedInput": scanned_input,
+                "Patient": script_patient_object
+            }
+            self.scan_results.put(scan_result)
+            try:
+                self.application.event_generate("<<ScanResults>>", when="tail")
+            except (TclError, RuntimeError) as e:
+                logging.warning("Could not notify the main thread of a scanned script: {0}".format(e))
+
+    def stop(self):
+        self.scanned_scripts.put(None)
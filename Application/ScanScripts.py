@@ -2,11 +2,12 @@ import logging
 import tkinter
 import App
 from functools import reduce
-from tkinter import Toplevel, PhotoImage, Label, Entry, Button
+from tkinter import Toplevel, Label, Entry, Button
 from tkinter.ttk import Treeview
 
+from AppFunctions.Icons import load_icon
 from Functions.ConfigSingleton import consts
-from Functions.Mutations import scan_script_and_check_medications
+from DataStructures.MedicationStatusTable import MedicationStatus
 from DataStructures.Models import PillpackPatient
 
 
@@ -14,12 +15,8 @@ class ScanScripts(Toplevel):
     def __init__(self, parent, master: App.App):
         super().__init__(parent)
         self.attributes('-topmost', 'true')
-        warning_image_path = App.icons_dir + "\\warning.png"
-        warning_image = PhotoImage(file=warning_image_path)
-        self.warning_image = warning_image.subsample(40, 40)
-        ready_to_produce_path = App.icons_dir + "\\check.png"
-        ready_to_produce = PhotoImage(file=ready_to_produce_path)
-        self.ready_to_produce = ready_to_produce.subsample(40, 40)
+        self.warning_image = load_icon("warning.png", 40)
+        self.ready_to_produce = load_icon("check.png", 40)
         self.patient_tree = None
         self.matched_patients = None
         self.minor_mismatched_patients = None
@@ -31,9 +28,12 @@ class ScanScripts(Toplevel):
         self.label = Label(self, text="Scan scripts below: ")
         self.label.pack(padx=20, pady=20)
         self.entry = Entry(self, width=400)
-        self.entry.bind("<Return>", lambda func: [self.scan_scripts(self.main_application, self.entry.get()),
-                                                  self.main_application.app_observer.update_all()])
+        self.entry.bind("<Return>", lambda func: self.queue_scanned_script(self.main_application, self.entry.get()))
         self.entry.pack(padx=20, pady=20)
+        self.pending_scans_label = Label(self)
+        self.pending_scans_label.pack()
+        self.update_pending_scans()
+        self.main_application.scan_scripts_window = self
 
         all_patients: list = list(self.main_application.collected_patients.pillpack_patient_dict.values())
         if len(all_patients) > 0:
@@ -66,34 +66,60 @@ class ScanScripts(Toplevel):
         self.patient_tree.bind('<Double-1>', self.on_treeview_double_click)
         self.patient_tree.pack(padx=20)
 
-    def scan_scripts(self, application: App, script_input: str):
+    def queue_scanned_script(self, application: App, script_input: str):
+        """
+        Queues the text read by the scanner to be decoded and matched by the application's scan queue worker, and
+        clears the entry so the next script can be scanned straight away.
+
+        :param application: The App base class which holds the scan queue worker
+        :param script_input: The text read from the barcode on the script
+        :return: None
+        """
         logging.info("Scanning script...")
-        if scan_script_and_check_medications(application.collected_patients, script_input):
-            logging.info("Patient information retrieved from scanned script successfully.")
-            self.patient_tree.set('perfect_matches', 'No. of Patients',
-                                  str(len(self.main_application.collected_patients.matched_patients)) + "/"
-                                  + str(len(self.reduced_patients)))
-            self.__iterate_patients(application.collected_patients.matched_patients.values(), 'perfect_matches')
-            self.patient_tree.set('minor_mismatches', 'No. of Patients',
-                                  str(len(self.main_application.collected_patients.minor_mismatch_patients)) + "/"
-                                  + str(len(self.reduced_patients)))
-            self.__iterate_patients(application.collected_patients.minor_mismatch_patients, 'minor_mismatches')
-            self.patient_tree.set('severe_mismatches', 'No. of Patients',
-                                  len(application.collected_patients.severe_mismatch_patients))
-            self.__iterate_patients(application.collected_patients.severe_mismatch_patients, 'severe_mismatches')
-        else:
-            logging.warning("Could not retrieve patient information from scanned script.")
+        application.scan_worker.enqueue(script_input)
+        self.update_pending_scans()
+        self.entry.delete(0, tkinter.END)
+        self.entry.focus()
+
+    def update_pending_scans(self):
+        self.pending_scans_label.configure(
+            text="Pending scans: {0}".format(self.main_application.scan_worker.pending_scans)
+        )
+
+    def on_scan_results(self, failed_scans: int):
+        """
+        Called by the App base class once a batch of scanned scripts has been matched against the collected patients.
+        The patient tree and the pending scans counter are redrawn once for the whole batch, and a single warning is
+        shown if any of the scripts in the batch could not be read.
+
+        :param failed_scans: The number of scripts in the batch which could not be read
+        :return: None
+        """
+        application: App = self.main_application
+        self.update_pending_scans()
+        self.patient_tree.set('perfect_matches', 'No. of Patients',
+                              str(len(self.main_application.collected_patients.matched_patients)) + "/"
+                              + str(len(self.reduced_patients)))
+        self.__iterate_patients(application.collected_patients.matched_patients.values(), 'perfect_matches')
+        self.patient_tree.set('minor_mismatches', 'No. of Patients',
+                              str(len(self.main_application.collected_patients.minor_mismatch_patients)) + "/"
+                              + str(len(self.reduced_patients)))
+        self.__iterate_patients(application.collected_patients.minor_mismatch_patients, 'minor_mismatches')
+        self.patient_tree.set('severe_mismatches', 'No. of Patients',
+                              len(application.collected_patients.severe_mismatch_patients))
+        self.__iterate_patients(application.collected_patients.severe_mismatch_patients, 'severe_mismatches')
+        if failed_scans > 0:
+            logging.warning("Could not retrieve patient information from {0} scanned script(s).".format(failed_scans))
             warning = Toplevel(master=self.master)
             warning.attributes('-topmost', 'true')
             warning.geometry("400x200")
-            warning_label = Label(warning, text="Failed to interpret script XML...",
-                                  wraplength=300)
+            warning_label = Label(warning, text="Failed to interpret script XML of {0} script(s)..."
+                                  .format(failed_scans), wraplength=300)
             warning_label.grid(row=0, column=0, pady=25, sticky="ew", columnspan=2)
             ok_button = Button(warning, text="OK", command=warning.destroy)
             ok_button.grid(row=1, column=0, padx=50, sticky="ew", columnspan=2)
-            warning.grab_set()
-        self.entry.delete(0, tkinter.END)
-        self.entry.focus()
+            """The warning does not grab input, so the scanner can keep typing into the entry"""
+            self.entry.focus()
 
     def __iterate_patients(self, iterator, tree_parent_id):
         for patient_list in iterator:
@@ -102,13 +128,13 @@ class ScanScripts(Toplevel):
                     if isinstance(patient, PillpackPatient):
                         matching_pillpack_patient: PillpackPatient = (
                             self.main_application.match_patient_to_pillpack_patient
-                            (patient, self.main_application.collected_patients.pillpack_patient_dict)
+                            (patient, self.main_application.collected_patients)
                         )
                         if self.patient_tree.exists(patient.first_name + " " + patient.last_name):
                             logging.info("Patient {0} {1} exists within {2}."
                                          .format(patient.first_name, patient.last_name, iterator))
-                            if (len(patient.matched_medications_dict) ==
-                                    len(matching_pillpack_patient.production_medications_dict)):
+                            if (patient.get_medication_count(MedicationStatus.MATCHED) ==
+                                    matching_pillpack_patient.get_medication_count(MedicationStatus.PRODUCTION)):
                                 self.patient_tree.item(patient.first_name + " " + patient.last_name,
                                                        text=patient.first_name + " " + patient.last_name,
                                                        image=self.ready_to_produce)
@@ -121,7 +147,8 @@ class ScanScripts(Toplevel):
                                 logging.info("Patient {0} {1} is awaiting medications."
                                              .format(patient.first_name, patient.last_name))
                         else:
-                            if len(patient.matched_medications_dict) == len(matching_pillpack_patient.production_medications_dict):
+                            if (patient.get_medication_count(MedicationStatus.MATCHED) ==
+                                    matching_pillpack_patient.get_medication_count(MedicationStatus.PRODUCTION)):
                                 logging.info("Patient {0} {1} does not exist within {2}. Creating new tree entry."
                                              .format(patient.first_name, patient.last_name, iterator))
                                 self.patient_tree.insert(tree_parent_id, 'end',
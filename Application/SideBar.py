@@ -3,9 +3,12 @@ from tkinter import Frame, Button, filedialog, Toplevel, Label
 from zipfile import ZipFile
 
 from AppFunctions.Warnings import display_warning_if_pillpack_data_is_empty
+from Application.ArchiveBrowser import ArchiveBrowser
+from Application.GenerateDocuments import GenerateDocuments
 from Application.ScanScripts import ScanScripts
 from Functions.ConfigSingleton import consts, warning_constants
-from Functions.DAOFunctions import load_collected_patients_from_zip_file, save_collected_patients
+from Functions.DAOFunctions import load_collected_patients_from_zip_file, save_collected_patients, \
+    reset_collected_patients
 
 
 class SideBar(Frame):
@@ -33,6 +36,18 @@ class SideBar(Frame):
                                                            command=lambda: self.master.show_frame
                                                            (consts.VIEW_PILLPACK_FOLDER_LOCATION))
         self.view_pillpack_folder_location_button.grid(row=4, column=0, pady=50)
+        self.generate_documents_button = Button(self, text="Generate Kardexes/Dispensation Lists",
+                                                wraplength=150,
+                                                command=lambda: display_warning_if_pillpack_data_is_empty
+                                                (self.master,
+                                                 self.open_generate_documents_window,
+                                                 warning_constants.NO_LOADED_PILLPACK_DATA_WARNING))
+        self.generate_documents_button.grid(row=5, column=0, pady=50)
+        self.generate_documents_window = None
+        self.browse_archives_button = Button(self, text="Browse Archived Patients", wraplength=150,
+                                             command=self.open_archive_browser)
+        self.browse_archives_button.grid(row=6, column=0, pady=50)
+        self.archive_browser = None
 
     def open_production_archive(self):
         archived_production_path = filedialog.askopenfilename(initialdir=self.master.config["pillpackDataLocation"],
@@ -54,7 +69,9 @@ class SideBar(Frame):
                                                 command=warning.destroy)
                         archive_button.grid(row=1, column=0, padx=50, sticky="ew")
                     else:
-                        self.master.collected_patients = loaded_collected_patients
+                        self.master.collected_patients = reset_collected_patients(
+                            self.master.config, self.master.collected_patients, loaded_collected_patients
+                        )
                         save_collected_patients(self.master.collected_patients)
                         self.master.app_observer.update_all()
                         success = Toplevel(master=self.master)
@@ -73,3 +90,15 @@ class SideBar(Frame):
             self.script_window.grab_set()
         else:
             self.script_window.focus()
+
+    def open_generate_documents_window(self):
+        if self.generate_documents_window is None or not self.generate_documents_window.winfo_exists():
+            self.generate_documents_window = GenerateDocuments(self, self.master)
+        else:
+            self.generate_documents_window.focus()
+
+    def open_archive_browser(self):
+        if self.archive_browser is None or not self.archive_browser.winfo_exists():
+            self.archive_browser = ArchiveBrowser(self, self.master)
+        else:
+            self.archive_browser.focus()
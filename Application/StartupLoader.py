@@ -0,0 +1,49 @@
+import logging
+import threading
+import time
+from tkinter import TclError
+
+from Functions.DAOFunctions import load_collected_patients_from_object, load_prns_and_linked_medications_from_object
+from Functions.PatientHistory import load_production_changes
+
+
+class StartupLoader(threading.Thread):
+    """
+    Background thread which loads the saved production and the saved PRNs and linked medications when the application
+    starts, so that the home screen can be displayed straight away rather than after every saved patient has been
+    unpickled. The changes to the saved production since the last cycle are read from the patient history, without
+    loading any patient.
+
+    Once both have been loaded (or loading has failed), a <<ProductionLoaded>> event is generated so that the main
+    thread can replace the empty production the application started with and redraw the views.
+    """
+    def __init__(self, application, config):
+        """
+        The constructor for the StartupLoader class. The thread is a daemon thread, so it never prevents the
+        application from closing.
+
+        :param application: The App base class which is notified once the saved production has been loaded
+        :param config: The loaded settings, which decide which patient repository the production is loaded from
+        """
+        threading.Thread.__init__(self, name="StartupLoader", daemon=True)
+        self.application = application
+        self.config = config
+        self.collected_patients = None
+        self.prns_and_linked_medications: dict = {}
+        self.production_changes = None
+        self.error = None
+
+    def run(self):
+        load_start = time.perf_counter()
+        try:
+            self.collected_patients = load_collected_patients_from_object(self.config)
+            self.prns_and_linked_medications = load_prns_and_linked_medications_from_object()
+            self.production_changes = load_production_changes()
+            logging.info("Loaded the saved production in {0:.3f}s".format(time.perf_counter() - load_start))
+        except Exception as e:
+            logging.error("Failed to load the saved production: {0}".format(e))
+            self.error = e
+        try:
+            self.application.event_generate("<<ProductionLoaded>>", when="tail")
+        except (TclError, RuntimeError) as e:
+            logging.warning("Could not notify the main thread that the saved production was loaded: {0}".format(e))
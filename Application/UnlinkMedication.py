@@ -38,6 +38,7 @@ class UnlinkMedication(Toplevel):
             medication_in_key: Medication = self.selected_patient.matched_medications_dict[
                 self.medication_key_to_be_unlinked]
             self.selected_patient.remove_medication_link(medication_in_key)
+            self.application.collected_patients.mark_patients_changed([self.selected_patient])
             save_collected_patients(self.application.collected_patients)
             update_current_prns_and_linked_medications(self.selected_patient,
                                                        self.application.collected_patients,
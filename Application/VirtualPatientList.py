@@ -0,0 +1,273 @@
+import bisect
+import logging
+import tkinter
+from tkinter.ttk import Treeview, Scrollbar
+
+from DataStructures.PatientRowModel import PatientRowModel
+
+
+class VirtualPatientList(tkinter.ttk.Frame):
+    """
+    Class which displays the rows of a PatientRowModel in a Treeview which only ever holds one item per visible row,
+    no matter how many patients are in the production. The items are reused as "slots": scrolling, sorting and
+    searching only change which rows of the model are copied into the slots, and a slot is only reconfigured when the
+    row it displays has changed. Memory use and redraw time therefore stay the same regardless of production size.
+
+    The rows which match the current search are found with the search index of the row model, and kept in a list sorted
+    by the current sort column, which is updated incrementally when rows of the model are inserted, deleted or changed.
+    Rows are sorted by last name until a column heading is clicked; clicking the same heading again reverses the order.
+
+    The slot items hold the same values as the items of a regular patient Treeview, so the Treeview functions used to
+    show a popup menu or to retrieve the selected patient can be called with the tree attribute of this class.
+    """
+    def __init__(self, parent, columns: tuple, row_images: dict, height: int = 10):
+        """
+        The constructor for the VirtualPatientList class.
+
+        :param parent: The widget which contains the list
+        :param columns: Tuple of the column names of the rows in the row model
+        :param row_images: Dictionary of the PhotoImage displayed for each image name used by the row model
+        :param height: The number of visible rows
+        """
+        tkinter.ttk.Frame.__init__(self, parent)
+        self.row_model: PatientRowModel = PatientRowModel()
+        self.columns: tuple = columns
+        self.row_images: dict = row_images
+        self.height: int = height
+        self.first_visible_row: int = 0
+        self.sort_column: str = "Last Name"
+        self.sort_descending: bool = False
+        self.search_string: str = ""
+        self.focused_key = None
+        self.message = None
+        self.__visible_rows: list = []
+        self.__sort_keys_by_key: dict = {}
+        self.__slot_contents: list = [None] * height
+        self.tree: Treeview = Treeview(self, columns=columns, height=height, selectmode="browse")
+        self.scrollbar: Scrollbar = Scrollbar(self, orient='vertical', command=self.__on_scrollbar)
+        self.tree.heading('#0', text="Patient Name", command=lambda: self.sort_by('#0'))
+        for column in columns:
+            self.tree.heading(column, text=column, command=lambda e=column: self.sort_by(e))
+        for i in range(height):
+            self.tree.insert('', 'end', self.__get_slot(i))
+            self.tree.detach(self.__get_slot(i))
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_to(
+            self.first_visible_row - int(event.delta / 120) * 3))
+        self.tree.bind("<Up>", lambda event: self.__move_focus(-1))
+        self.tree.bind("<Down>", lambda event: self.__move_focus(1))
+        self.tree.bind("<Prior>", lambda event: self.__move_focus(-self.height))
+        self.tree.bind("<Next>", lambda event: self.__move_focus(self.height))
+        self.tree.bind("<Home>", lambda event: self.__move_focus(-len(self.__visible_rows)))
+        self.tree.bind("<End>", lambda event: self.__move_focus(len(self.__visible_rows)))
+        self.tree.grid(row=0, column=0, sticky="ew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.columnconfigure(0, weight=1)
+        self.__render()
+
+    @staticmethod
+    def __get_slot(index: int):
+        return "slot{0}".format(index)
+
+    def __len__(self):
+        return len(self.__visible_rows)
+
+    def __get_sort_key(self, key: str):
+        if self.sort_column == '#0':
+            return key, key
+        return self.row_model.rows[key]["Values"][self.columns.index(self.sort_column)], key
+
+    def __matches_search(self, key: str):
+        return self.row_model.search_index.matches(key, self.search_string)
+
+    def __add_visible_row(self, key: str):
+        if self.__matches_search(key):
+            sort_key = self.__get_sort_key(key)
+            bisect.insort(self.__visible_rows, sort_key)
+            self.__sort_keys_by_key[key] = sort_key
+
+    def __remove_visible_row(self, key: str):
+        sort_key = self.__sort_keys_by_key.pop(key, None)
+        if sort_key is not None:
+            self.__visible_rows.pop(bisect.bisect_left(self.__visible_rows, sort_key))
+
+    def __rebuild_visible_rows(self):
+        if len(self.search_string) == 0:
+            matching_keys = self.row_model.rows.keys()
+        else:
+            matching_keys = self.row_model.search_index.search(self.search_string)
+        self.__sort_keys_by_key = {key: self.__get_sort_key(key) for key in matching_keys}
+        self.__visible_rows = sorted(self.__sort_keys_by_key.values())
+
+    def get_key_at(self, row_index: int):
+        """
+        Finds the row displayed at a given position, taking the current sort order into account.
+
+        :param row_index: Position of the row among all rows matching the current search
+        :return: The key of the row at that position
+        """
+        if self.sort_descending:
+            row_index = len(self.__visible_rows) - 1 - row_index
+        return self.__visible_rows[row_index][-1]
+
+    def get_row_index(self, key: str):
+        """
+        Finds the position of a row among all rows matching the current search.
+
+        :param key: The key of the row
+        :return: The position of the row, or None if the row does not match the current search
+        """
+        sort_key = self.__sort_keys_by_key.get(key)
+        if sort_key is None:
+            return None
+        row_index = bisect.bisect_left(self.__visible_rows, sort_key)
+        return len(self.__visible_rows) - 1 - row_index if self.sort_descending else row_index
+
+    def refresh(self, patient_dict, match_patient, changed_last_names=None, filter_code: int = None):
+        """
+        Refreshes the row model with the patients stored under the changed last names (see PatientRowModel.refresh),
+        then applies the inserted, deleted and updated rows to the rows matching the current search and redraws the
+        visible rows.
+
+        :return: The changes made to the row model
+        """
+        changes: dict = self.row_model.refresh(patient_dict, match_patient, changed_last_names, filter_code)
+        if changed_last_names is None:
+            self.__rebuild_visible_rows()
+        else:
+            for key in changes["Deleted"]:
+                self.__remove_visible_row(key)
+            for key in changes["Updated"].keys():
+                self.__remove_visible_row(key)
+                self.__add_visible_row(key)
+            for key in changes["Inserted"]:
+                self.__add_visible_row(key)
+        self.__render()
+        return changes
+
+    def search(self, search_string: str):
+        """
+        Only displays the rows with at least one value containing the search string, ignoring case. An empty search
+        string displays every row.
+
+        :param search_string: The string to search for
+        :return: None
+        """
+        self.search_string = search_string.lower()
+        self.__rebuild_visible_rows()
+        self.first_visible_row = 0
+        self.__render()
+        logging.info("Searched for '{0}'. {1} row(s) match.".format(search_string, len(self.__visible_rows)))
+
+    def sort_by(self, column: str):
+        """
+        Sorts the rows by the given column. If the rows are already sorted by that column, the order is reversed.
+
+        :param column: The column to sort by, or '#0' to sort by patient name
+        :return: None
+        """
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+            self.__rebuild_visible_rows()
+        self.__render()
+
+    def set_message(self, message):
+        """
+        Displays a single row with the message in every column in place of the rows (e.g. while a production is
+        loading). Setting the message to None displays the rows again.
+
+        :param message: The message to display, or None
+        :return: None
+        """
+        self.message = message
+        self.__render()
+
+    def clear(self):
+        self.row_model.clear()
+        self.__visible_rows = []
+        self.__sort_keys_by_key = {}
+        self.first_visible_row = 0
+        self.focused_key = None
+        self.__render()
+
+    def scroll_to(self, first_visible_row: int):
+        """
+        Scrolls the list so that the row at the given position is the first visible row.
+
+        :param first_visible_row: Position of the row among all rows matching the current search
+        :return: "break", so that no other bindings scroll the Treeview itself
+        """
+        self.first_visible_row = first_visible_row
+        self.__render()
+        return "break"
+
+    def __on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.__visible_rows)))
+        elif args[0] == "scroll":
+            number_of_rows = int(args[1]) * (self.height if args[2] == "pages" else 1)
+            self.scroll_to(self.first_visible_row + number_of_rows)
+
+    def __move_focus(self, offset: int):
+        if len(self.__visible_rows) == 0:
+            return "break"
+        row_index = self.get_row_index(self.focused_key) if self.focused_key is not None else None
+        row_index = 0 if row_index is None else max(0, min(len(self.__visible_rows) - 1, row_index + offset))
+        self.focused_key = self.get_key_at(row_index)
+        if row_index < self.first_visible_row:
+            self.first_visible_row = row_index
+        elif row_index >= self.first_visible_row + self.height:
+            self.first_visible_row = row_index - self.height + 1
+        self.__render()
+        return "break"
+
+    def __render(self):
+        """
+        Copies the rows which are currently visible into the slots. Slots which already display the same row are left
+        untouched, and slots beyond the last row are detached. The focused patient stays selected while it is visible.
+        """
+        focused_slot = self.tree.focus()
+        for i in range(self.height):
+            if focused_slot == self.__get_slot(i) and self.__slot_contents[i] is not None:
+                self.focused_key = self.__slot_contents[i]["Key"]
+        if self.message is not None:
+            visible_contents: list = [{"Key": None, "Values": (self.message,) * len(self.columns), "Image": None}]
+            self.first_visible_row = 0
+        else:
+            self.first_visible_row = max(0, min(self.first_visible_row, len(self.__visible_rows) - self.height))
+            visible_contents: list = [
+                self.row_model.rows[self.get_key_at(row_index)]
+                for row_index in range(self.first_visible_row,
+                                       min(len(self.__visible_rows), self.first_visible_row + self.height))
+            ]
+        focused_slot = ""
+        for i in range(self.height):
+            slot = self.__get_slot(i)
+            content = visible_contents[i] if i < len(visible_contents) else None
+            if content is not self.__slot_contents[i]:
+                if content is None:
+                    self.tree.detach(slot)
+                else:
+                    if self.__slot_contents[i] is None:
+                        self.tree.move(slot, '', i)
+                    self.tree.item(slot,
+                                   text=content["Key"] if content["Key"] is not None else self.message,
+                                   values=content["Values"],
+                                   image=self.row_images.get(content["Image"], ""))
+                self.__slot_contents[i] = content
+            if content is not None and content["Key"] is not None and content["Key"] == self.focused_key:
+                focused_slot = slot
+        if focused_slot != "":
+            self.tree.selection_set(focused_slot)
+            self.tree.focus(focused_slot)
+        elif self.tree.focus() != "" or len(self.tree.selection()) > 0:
+            """The focused slot now displays a different patient, so it must not stay selected."""
+            self.tree.selection_remove(*self.tree.selection())
+            self.tree.focus("")
+        if len(self.__visible_rows) == 0 or self.message is not None:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.first_visible_row / len(self.__visible_rows),
+                               min(1.0, (self.first_visible_row + self.height) / len(self.__visible_rows)))
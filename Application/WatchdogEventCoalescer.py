@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from watchdog.events import FileMovedEvent
+
+
+class WatchdogEventCoalescer:
+    """
+    Class which sits between the WatchdogEventHandler and App.notify, so that every version of a file written to the
+    pillpack data location is only processed once.
+
+    Writers frequently create a file and then rename it, or write it in several chunks, which causes the filesystem
+    observer to raise several events for the same file. Events are therefore debounced per path: an event is only
+    forwarded once no further events have been received for its path within the debounce window, and once the size
+    and modification time of the file have stopped changing between two checks. A file whose size and modification
+    time match the last version forwarded for that path is not forwarded again. The versions of the most recently
+    forwarded paths are remembered, up to a fixed number of paths.
+
+    Files with an immediate extension (Farmadosis .fd files by default) are forwarded as soon as their event arrives,
+    without waiting for the debounce window, since the Farmadosis script may move or delete the file shortly after
+    writing it. Only their duplicate versions are skipped.
+
+    Counters of events received, files forwarded for processing, duplicate versions skipped and files which
+    disappeared before they settled are kept for diagnostics.
+    """
+    def __init__(self, forward_event, debounce_seconds: float = 1.0, immediate_extensions: tuple = (".fd",),
+                 max_processed_versions: int = 1024):
+        """
+        The constructor for the WatchdogEventCoalescer class.
+
+        :param forward_event: Function called with the latest event for a path once that file has settled
+        :param debounce_seconds: Time in seconds a path has to be quiet for before its file is checked
+        :param immediate_extensions: Extensions of the files forwarded as soon as their event arrives
+        :param max_processed_versions: Number of paths the last forwarded version is remembered for
+        """
+        self.forward_event = forward_event
+        self.debounce_seconds: float = debounce_seconds
+        self.immediate_extensions: tuple = tuple(extension.lower() for extension in immediate_extensions)
+        self.max_processed_versions: int = max_processed_versions
+        self.__condition = threading.Condition()
+        self.__pending_events: dict = {}
+        self.__processed_versions: OrderedDict = OrderedDict()
+        self.__stopped: bool = False
+        self.__thread = threading.Thread(target=self.__run, name="WatchdogEventCoalescer", daemon=True)
+        self.events_received: int = 0
+        self.files_processed: int = 0
+        self.duplicate_versions_skipped: int = 0
+        self.files_disappeared: int = 0
+
+    @staticmethod
+    def get_event_path(event):
+        if isinstance(event, FileMovedEvent):
+            return str(event.dest_path)
+        return str(event.src_path)
+
+    @staticmethod
+    def read_file_version(file_path: str):
+        try:
+            file_stat = os.stat(file_path)
+            return file_stat.st_size, file_stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def get_counters(self):
+        with self.__condition:
+            return {
+                "EventsReceived": self.events_received,
+                "FilesProcessed": self.files_processed,
+                "DuplicateVersionsSkipped": self.duplicate_versions_skipped,
+                "FilesDisappeared": self.files_disappeared,
+                "PendingFiles": len(self.__pending_events)
+            }
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify()
+
+    def __record_processed_version(self, file_path: str, file_version: tuple):
+        """Remembers the version of a file being forwarded, returning False if that version was already forwarded.
+        The least recently forwarded path is forgotten once the versions of too many paths are remembered."""
+        if self.__processed_versions.get(file_path) == file_version:
+            self.duplicate_versions_skipped += 1
+            logging.info("File {0} has already been processed in its current version. Skipping.".format(file_path))
+            return False
+        self.__processed_versions[file_path] = file_version
+        self.__processed_versions.move_to_end(file_path)
+        while len(self.__processed_versions) > self.max_processed_versions:
+            self.__processed_versions.popitem(last=False)
+        self.files_processed += 1
+        return True
+
+    def __submit_immediately(self, event, file_path: str):
+        file_version = self.read_file_version(file_path)
+        with self.__condition:
+            self.events_received += 1
+            self.__pending_events.pop(file_path, None)
+            if file_version is None:
+                self.files_disappeared += 1
+                logging.info("File {0} no longer exists. Ignoring its watchdog event.".format(file_path))
+                return
+            if not self.__record_processed_version(file_path, file_version):
+                return
+        try:
+            self.forward_event(event)
+        except Exception as e:
+            logging.error("Failed to forward watchdog event {0}: {1}".format(event, e))
+
+    def submit(self, event):
+        """
+        Records a filesystem event. Any earlier event for the same path which has not been forwarded yet is replaced,
+        and the debounce window for that path starts again. Events for files with an immediate extension are
+        forwarded straight away.
+
+        :param event: A file created or file moved event from the filesystem observer
+        :return: None
+        """
+        file_path = self.get_event_path(event)
+        if file_path.lower().endswith(self.immediate_extensions):
+            self.__submit_immediately(event, file_path)
+            return
+        with self.__condition:
+            self.events_received += 1
+            self.__pending_events[file_path] = {
+                "Event": event,
+                "Deadline": time.monotonic() + self.debounce_seconds,
+                "Version": None
+            }
+            self.__condition.notify()
+        logging.info("Watchdog event for {0} received and debounced.".format(file_path))
+
+    def __take_settled_events(self):
+        """Checks every pending path whose debounce window has passed. Returns the events which are ready to be
+        forwarded and the time until the next pending path is due."""
+        settled_events: list = []
+        now = time.monotonic()
+        for file_path, pending_event in list(self.__pending_events.items()):
+            if pending_event["Deadline"] > now:
+                continue
+            file_version = self.read_file_version(file_path)
+            if file_version is None:
+                self.__pending_events.pop(file_path)
+                self.files_disappeared += 1
+                logging.info("File {0} no longer exists. Ignoring its watchdog event(s).".format(file_path))
+            elif file_version != pending_event["Version"]:
+                pending_event["Version"] = file_version
+                pending_event["Deadline"] = now + self.debounce_seconds
+            else:
+                self.__pending_events.pop(file_path)
+                if self.__record_processed_version(file_path, file_version):
+                    settled_events.append(pending_event["Event"])
+        next_deadline = min((pending_event["Deadline"] for pending_event in self.__pending_events.values()),
+                            default=None)
+        return settled_events, None if next_deadline is None else max(0.0, next_deadline - now)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                if self.__stopped:
+                    break
+                settled_events, time_until_next_deadline = self.__take_settled_events()
+                if len(settled_events) == 0:
+                    self.__condition.wait(time_until_next_deadline)
+                    continue
+            for event in settled_events:
+                try:
+                    self.forward_event(event)
+                except Exception as e:
+                    logging.error("Failed to forward watchdog event {0}: {1}".format(event, e))
+            logging.info("Watchdog event counters: {0}".format(self.get_counters()))
@@ -1,4 +1,8 @@
 import logging
+import os
+import shutil
+from zipfile import ZipFile
+
 import App
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 
@@ -12,23 +16,44 @@ class WatchdogEventHandler(FileSystemEventHandler):
         FileSystemEventHandler.__init__(self)
         self.app: App.App = application
 
-    def extract_patient_data_from_ppc_xml(self, file_name: str):
-        list_of_patients = (get_patient_data_from_specific_file
-                            (self.app.loaded_prns_and_linked_medications, file_name,
-                             "OrderInfo",
-                             self.app.config))
+    def read_patient_data_from_ppc_xml(self, file_name: str):
+        return get_patient_data_from_specific_file(self.app.loaded_prns_and_linked_medications, file_name,
+                                                   "OrderInfo", self.app.config)
+
+    def read_patient_data_from_fd_file(self, fd_file_path: str):
+        """
+        The fd file is copied to a generic ZIP file before it is read, since the Farmadosis .NET filesystem observer
+        runs a competing script on the original file.
+        """
+        list_of_patients: list = []
+        copied_zip_file_name = self.app.config["pillpackDataLocation"] + "\\farma_copy.zip"
+        shutil.copyfile(fd_file_path, copied_zip_file_name)
+        with ZipFile(copied_zip_file_name, 'r') as farmadosis_zip:
+            for info in farmadosis_zip.infolist():
+                if info.filename.endswith('.xml'):
+                    with farmadosis_zip.open(info.filename) as binary_file:
+                        list_of_patients.extend(get_patient_medicine_data_xml(
+                            self.app.loaded_prns_and_linked_medications,
+                            binary_file
+                        ))
+        os.remove(copied_zip_file_name)
+        return list_of_patients
+
+    def apply_patient_changes(self, list_of_patients: list):
         self.update_existing_patient_dicts(list_of_patients)
-        save_collected_patients(self.app.collected_patients)
+        self.app.collected_patients.mark_patients_changed(list_of_patients)
+        save_collected_patients(self.app.collected_patients, list_of_patients)
         self.app.app_observer.update_all()
 
+    def extract_patient_data_from_ppc_xml(self, file_name: str):
+        self.apply_patient_changes(self.read_patient_data_from_ppc_xml(file_name))
+
     def extract_patient_data_from_fd_xml(self, binary_file):
         list_of_patients: list = get_patient_medicine_data_xml(
             self.app.loaded_prns_and_linked_medications,
-            binary_file.read()
+            binary_file
         )
-        self.update_existing_patient_dicts(list_of_patients)
-        save_collected_patients(self.app.collected_patients)
-        self.app.app_observer.update_all()
+        self.apply_patient_changes(list_of_patients)
 
     def update_existing_patient_dicts(self, list_of_patients: list):
         for patient in list_of_patients:
@@ -65,7 +90,7 @@ class WatchdogEventHandler(FileSystemEventHandler):
                 logging.warning("Object {0} is not of type PillpackPatient".format(patient))
 
     def on_created(self, event: FileSystemEvent) -> None:
-        self.app.notify(event)
+        self.app.event_coalescer.submit(event)
 
     def on_moved(self, event: FileSystemEvent) -> None:
-        self.app.notify(event)
+        self.app.event_coalescer.submit(event)
@@ -0,0 +1,174 @@
+"""
+
+Module which contains the MedicationNameIndex, a compiled index of medication names which is used to find every known
+medication name that appears as a substring of a given piece of text, without checking each name one at a time.
+
+"""
+
+
+class MedicationNameIndex:
+    """
+    Class which defines an Aho-Corasick automaton over a set of medication names. Once compiled, the index finds every
+    indexed medication name which is a substring of a given text (e.g. a medication name on a scanned script) in a
+    single pass over that text, regardless of how many names are indexed. Matching is exact and case-sensitive, so the
+    results are identical to checking `name in text` for every indexed name.
+
+    Names keep the order in which they were added, mirroring the insertion order of the dictionary they index, so that
+    the "first" matching name is the same one a linear scan over that dictionary would have found. Names may be added
+    and removed at any time; the automaton is recompiled lazily on the next query.
+    """
+
+    def __init__(self, medication_names=()):
+        """
+        The constructor for the MedicationNameIndex class.
+
+        :param medication_names: Optional iterable of medication names to populate the index with, in order
+        """
+        self._order: dict = {}
+        self._next_order: int = 0
+        self._transitions: list = [{}]
+        self._failure_links: list = [0]
+        self._output_links: list = [-1]
+        self._terminals: list = [None]
+        self._compiled: bool = True
+        self._requires_rebuild: bool = False
+        for medication_name in medication_names:
+            self.add(medication_name)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, medication_name):
+        return self._order.__contains__(medication_name)
+
+    def add(self, medication_name: str):
+        """
+        Adds a medication name to the end of the index. Names which are already indexed are ignored, which matches the
+        behaviour of assigning an existing key in a dictionary.
+
+        :param medication_name: The medication name to add
+        :return: None
+        """
+        if not self._order.__contains__(medication_name):
+            self._order[medication_name] = self._next_order
+            self._next_order += 1
+            if not self._requires_rebuild:
+                self.__insert_into_trie(medication_name)
+            self._compiled = False
+
+    def remove(self, medication_name: str):
+        """
+        Removes a medication name from the index. The trie is rebuilt from the remaining names on the next query.
+
+        :param medication_name: The medication name to remove
+        :return: None
+        """
+        if self._order.__contains__(medication_name):
+            self._order.pop(medication_name)
+            self._requires_rebuild = True
+            self._compiled = False
+
+    def clear(self):
+        """
+        Removes every medication name from the index.
+
+        :return: None
+        """
+        self.__init__()
+
+    def find_all(self, text: str):
+        """
+        Finds every indexed medication name which is a substring of the given text.
+
+        :param text: The text to search (e.g. a medication name taken from a scanned script)
+        :return: A set of every indexed medication name contained within the text
+        """
+        self.__compile()
+        transitions = self._transitions
+        failure_links = self._failure_links
+        output_links = self._output_links
+        terminals = self._terminals
+        found: set = set()
+        if terminals[0] is not None:
+            found.add(terminals[0])
+        state = 0
+        for character in text:
+            while state != 0 and character not in transitions[state]:
+                state = failure_links[state]
+            state = transitions[state].get(character, 0)
+            output_state = state if terminals[state] is not None else output_links[state]
+            while output_state > 0:
+                found.add(terminals[output_state])
+                output_state = output_links[output_state]
+        return found
+
+    def first_contained_in(self, text: str):
+        """
+        Finds the earliest added medication name which is a substring of the given text.
+
+        :param text: The text to search (e.g. a medication name taken from a scanned script)
+        :return: The earliest added medication name contained within the text, or None if there are no matches
+        """
+        return self.earliest_of(self.find_all(text))
+
+    def earliest_of(self, medication_names):
+        """
+        Finds whichever of the given indexed medication names was added to the index first. This is used with the
+        results of find_all when they have already been computed.
+
+        :param medication_names: Iterable of indexed medication names
+        :return: The earliest added medication name, or None if no names are given
+        """
+        return min(medication_names, key=self._order.__getitem__, default=None)
+
+    def __insert_into_trie(self, medication_name: str):
+        state = 0
+        for character in medication_name:
+            next_state = self._transitions[state].get(character)
+            if next_state is None:
+                next_state = len(self._transitions)
+                self._transitions[state][character] = next_state
+                self._transitions.append({})
+                self._failure_links.append(0)
+                self._output_links.append(-1)
+                self._terminals.append(None)
+            state = next_state
+        self._terminals[state] = medication_name
+
+    def __compile(self):
+        """
+        Rebuilds the trie if names have been removed, then computes the failure and output links of every node with a
+        breadth first traversal of the trie.
+        """
+        if self._compiled:
+            return
+        if self._requires_rebuild:
+            self._transitions = [{}]
+            self._failure_links = [0]
+            self._output_links = [-1]
+            self._terminals = [None]
+            for medication_name in self._order.keys():
+                self.__insert_into_trie(medication_name)
+            self._requires_rebuild = False
+        queue: list = []
+        for next_state in self._transitions[0].values():
+            self._failure_links[next_state] = 0
+            self._output_links[next_state] = -1
+            queue.append(next_state)
+        position = 0
+        while position < len(queue):
+            state = queue[position]
+            position += 1
+            for character, next_state in self._transitions[state].items():
+                failure_state = self._failure_links[state]
+                while failure_state != 0 and character not in self._transitions[failure_state]:
+                    failure_state = self._failure_links[failure_state]
+                failure_state = self._transitions[failure_state].get(character, 0)
+                if failure_state == next_state:
+                    failure_state = 0
+                self._failure_links[next_state] = failure_state
+                self._output_links[next_state] = (failure_state if self._terminals[failure_state] is not None
+                                                  and failure_state != 0
+                                                  else self._output_links[failure_state])
+                queue.append(next_state)
+        self._compiled = True
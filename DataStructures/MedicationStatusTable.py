@@ -0,0 +1,218 @@
+import enum
+from collections.abc import Mapping
+
+"""
+
+Module which contains the MedicationStatusTable, which records the status of every medication of a patient (in the
+production, matched, missing, etc.) as a set of flags on a single entry per medication name, instead of holding each
+medication in a separate dictionary for each status.
+
+"""
+
+
+class MedicationStatus(enum.IntFlag):
+    """
+    The statuses a medication of a patient can have. A medication can have several statuses at once, e.g. a production
+    medication which has been matched against a scanned script is both PRODUCTION and MATCHED.
+    """
+    PRODUCTION = 1
+    MATCHED = 2
+    MISSING = 4
+    UNKNOWN = 8
+    INCORRECT_DOSAGE = 16
+    PRN = 32
+    IGNORED = 64
+    LINKED = 128
+
+
+MEDICATION_WARNING_STATUSES = MedicationStatus.MISSING | MedicationStatus.UNKNOWN | MedicationStatus.INCORRECT_DOSAGE
+
+
+class MedicationStatusEntry:
+    """
+    The statuses of a single medication name. Most statuses of a name hold the same Medication object, so only the
+    first Medication object is stored directly, and any status holding a different Medication object (e.g. the
+    medication read from a scanned script, or the medication a linked medication is linked to) is stored separately.
+    """
+    __slots__ = ("flags", "medication", "other_medications")
+
+    def __init__(self, medication):
+        self.flags: int = 0
+        self.medication = medication
+        self.other_medications = None
+
+    def get_medication(self, status: MedicationStatus):
+        if self.other_medications is not None:
+            return self.other_medications.get(status, self.medication)
+        return self.medication
+
+    def set_medication(self, status: MedicationStatus, medication):
+        if medication is self.medication:
+            if self.other_medications is not None:
+                self.other_medications.pop(status, None)
+        else:
+            if self.other_medications is None:
+                self.other_medications = {}
+            self.other_medications[status] = medication
+
+    def remove_medication(self, status: MedicationStatus):
+        if self.other_medications is not None:
+            self.other_medications.pop(status, None)
+            if len(self.other_medications) == 0:
+                self.other_medications = None
+
+
+class MedicationStatusTable:
+    """
+    Class which holds one MedicationStatusEntry per medication name, and a count of the medications with each status.
+    Adding a status to or removing a status from a medication is a single dictionary lookup and a change to the flags
+    of its entry, and the number of medications with a given status is read from the counts without iterating over
+    any medications.
+
+    Medications with a given status are read through a MedicationStatusView, a read-only mapping of medication name to
+    Medication object which behaves like the dictionary that used to hold the medications with that status, and are
+    listed in the order they were given the status. That is the order of the entries, unless a medication which is
+    already in the table is given a status that a medication after it already has, e.g. a missing medication removed
+    from and added back to the production. Only then is the order of the names with that status stored separately.
+    """
+    __slots__ = ("entries", "counts", "ordered_names")
+
+    def __init__(self):
+        """
+        The constructor for the MedicationStatusTable class. The table starts without any medications.
+        """
+        self.entries: dict = {}
+        self.counts: list = [0] * len(MedicationStatus)
+        self.ordered_names = None
+
+    @staticmethod
+    def get_count_index(status: MedicationStatus):
+        return status.bit_length() - 1
+
+    def count(self, status: MedicationStatus):
+        return self.counts[self.get_count_index(status)]
+
+    def has(self, status: MedicationStatus, medication_name):
+        entry = self.entries.get(medication_name)
+        return entry is not None and entry.flags & status != 0
+
+    def get(self, status: MedicationStatus, medication_name):
+        entry = self.entries.get(medication_name)
+        if entry is not None and entry.flags & status != 0:
+            return entry.get_medication(status)
+        return None
+
+    def add(self, status: MedicationStatus, medication_name, medication):
+        """
+        Gives a medication the status, unless the medication already has it.
+
+        :param status: The status to give the medication
+        :param medication_name: The name of the medication
+        :param medication: The Medication object to hold for that status
+        :return: True if the medication did not have the status yet, otherwise False
+        """
+        entry = self.entries.get(medication_name)
+        count_index: int = self.get_count_index(status)
+        if entry is None:
+            entry = MedicationStatusEntry(medication)
+            self.entries[medication_name] = entry
+        elif entry.flags & status != 0:
+            return False
+        elif (self.counts[count_index] > 0 and (self.ordered_names is None or count_index not in self.ordered_names)
+              and self.__has_status_after(status, medication_name)):
+            if self.ordered_names is None:
+                self.ordered_names = {}
+            self.ordered_names[count_index] = self.get_names(status)
+        if self.ordered_names is not None and count_index in self.ordered_names:
+            self.ordered_names[count_index].append(medication_name)
+        entry.set_medication(status, medication)
+        entry.flags |= status
+        self.counts[count_index] += 1
+        return True
+
+    def __has_status_after(self, status: MedicationStatus, medication_name):
+        """Returns whether any medication after the entry of a medication name has the status."""
+        entries = iter(self.entries.items())
+        for entry_name, entry in entries:
+            if entry_name == medication_name:
+                break
+        return any(entry.flags & status != 0 for entry_name, entry in entries)
+
+    def remove(self, statuses: MedicationStatus, medication_name):
+        """
+        Removes one or more statuses from a medication. The medication's entry is removed once it has no statuses left.
+
+        :param statuses: The status, or the combination of statuses, to remove
+        :param medication_name: The name of the medication
+        :return: The statuses which the medication had and no longer has
+        """
+        entry = self.entries.get(medication_name)
+        if entry is None:
+            return MedicationStatus(0)
+        removed_statuses = MedicationStatus(entry.flags & statuses)
+        for status in removed_statuses:
+            entry.remove_medication(status)
+            count_index: int = self.get_count_index(status)
+            self.counts[count_index] -= 1
+            if self.ordered_names is not None and count_index in self.ordered_names:
+                self.ordered_names[count_index].remove(medication_name)
+                if self.counts[count_index] == 0:
+                    del self.ordered_names[count_index]
+                    if len(self.ordered_names) == 0:
+                        self.ordered_names = None
+        entry.flags &= ~statuses
+        if entry.flags == 0:
+            self.entries.pop(medication_name)
+        return removed_statuses
+
+    def replace(self, status: MedicationStatus, medications: Mapping):
+        """
+        Replaces every medication with the status by the medications of a dictionary.
+
+        :param status: The status to replace the medications of
+        :param medications: Dictionary of medication name to Medication object
+        :return: None
+        """
+        for medication_name in self.get_names(status):
+            self.remove(status, medication_name)
+        for medication_name, medication in medications.items():
+            self.add(status, medication_name, medication)
+
+    def get_names(self, status: MedicationStatus):
+        """Returns the names of the medications with the status, in the order they were given the status."""
+        if self.ordered_names is not None and self.get_count_index(status) in self.ordered_names:
+            return list(self.ordered_names[self.get_count_index(status)])
+        return [medication_name for medication_name, entry in self.entries.items() if entry.flags & status != 0]
+
+
+class MedicationStatusView(Mapping):
+    """
+    Read-only mapping of medication name to Medication object, of every medication in a MedicationStatusTable with a
+    given status. The view always reflects the current contents of the table; its length is read from the table's
+    counts and looking up a medication name is a single dictionary lookup. Iterating over the view iterates over the
+    names which had the status when the iteration started, in the order they were given the status, so statuses can be
+    changed while iterating.
+    """
+    __slots__ = ("table", "status")
+
+    def __init__(self, table: MedicationStatusTable, status: MedicationStatus):
+        self.table: MedicationStatusTable = table
+        self.status: MedicationStatus = status
+
+    def __getitem__(self, medication_name):
+        entry = self.table.entries.get(medication_name)
+        if entry is None or entry.flags & self.status == 0:
+            raise KeyError(medication_name)
+        return entry.get_medication(self.status)
+
+    def __contains__(self, medication_name):
+        return self.table.has(self.status, medication_name)
+
+    def __iter__(self):
+        return iter(self.table.get_names(self.status))
+
+    def __len__(self):
+        return self.table.count(self.status)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
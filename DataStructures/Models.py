@@ -1,7 +1,12 @@
 import datetime
+import sys
 import types
 import logging
 
+from DataStructures.MedicationIndex import MedicationNameIndex
+from DataStructures.MedicationStatusTable import (MedicationStatus, MedicationStatusTable, MedicationStatusView,
+                                                  MEDICATION_WARNING_STATUSES)
+
 """
 
 Module which contains the models/structures which will hold relevant application data. Mutation functions and basic
@@ -19,6 +24,78 @@ consts.PRN_KEY = "prns_dict"
 consts.LINKED_MEDS_KEY = "linked_meds_dict"
 consts.COLLECTED_PATIENTS_FILE = '../Application/Patients.pk1'
 consts.PRNS_AND_LINKED_MEDICATIONS_FILE = '../Application/PrnsAndLinkedMeds.pk1'
+consts.EMPTY_MEDICATIONS_LIST = ()
+
+
+def intern_medication_name(medication_name):
+    """
+    Interns a medication name, so that every Medication object (and every dictionary key) with the same name shares a
+    single string, however many patients and productions the name appears in.
+    """
+    return sys.intern(medication_name) if type(medication_name) is str else medication_name
+
+
+def get_slot_state(instance, slot_names: tuple):
+    return {slot_name: getattr(instance, slot_name) for slot_name in slot_names}
+
+
+def read_pickled_state(state):
+    """
+    Reads the state of a pickled Model object. Objects pickled before the Model classes were slotted hold their
+    attributes in a plain dictionary, while the default pickling of slotted objects produces a tuple of the instance
+    dictionary (always None here) and the dictionary of slot values. Both are read into a single dictionary.
+
+    :param state: The pickled state
+    :return: Dictionary of the pickled attributes by name
+    """
+    if isinstance(state, tuple):
+        merged_state: dict = {}
+        for partial_state in state:
+            if isinstance(partial_state, dict):
+                merged_state.update(partial_state)
+        return merged_state
+    elif isinstance(state, dict):
+        return state
+    else:
+        return {}
+
+
+def lazy_status_container(slot_name: str, empty_container):
+    """
+    Creates a property for a status container (e.g. the list of PRN medications for the current cycle) of a
+    PillpackPatient which is only allocated once a medication is added to it. Until then, reading the property returns
+    the shared, read-only empty container, and assigning an empty container to the property releases the stored one.
+
+    :param slot_name: The name of the slot holding the container, or None while the container is empty
+    :param empty_container: The read-only empty container returned while the container is not allocated
+    :return: The property
+    """
+    def get_container(self):
+        container = getattr(self, slot_name)
+        return empty_container if container is None else container
+
+    def set_container(self, container):
+        setattr(self, slot_name, container if container is not None and len(container) > 0 else None)
+
+    return property(get_container, set_container)
+
+
+def medication_status_dict(status: MedicationStatus):
+    """
+    Creates a property which reads the medications of a PillpackPatient with a given status (e.g. the missing
+    medications) as a read-only dictionary of medication name to Medication object. Assigning a dictionary to the
+    property replaces every medication with that status.
+
+    :param status: The MedicationStatus of the medications
+    :return: The property
+    """
+    def get_medications(self):
+        return MedicationStatusView(self.medication_statuses, status)
+
+    def set_medications(self, medications):
+        self.medication_statuses.replace(status, medications if medications is not None else {})
+
+    return property(get_medications, set_medications)
 
 
 class Medication:
@@ -28,7 +105,11 @@ class Medication:
 
     If using the kardex generation or dispensation list generation features, doctor's orders, the script code,
     dispensation code and the medication type (tablet/capsule) also need to be provided.
+
+    Medication objects are slotted and their names are interned, since a production holds many thousands of them.
     """
+    __slots__ = ("medication_name", "doctors_orders", "code", "disp_code", "med_type", "dosage", "start_date",
+                 "morning_dosage", "afternoon_dosage", "evening_dosage", "night_dosage")
 
     def __init__(self, medication_name: str, dosage: float, start_date: datetime,
                  doctors_orders: str = None,
@@ -47,7 +128,7 @@ class Medication:
         :param disp_code: The dispensation code of the medication
         :param med_type: The type of medication being taken (tablet/capsule)
         """
-        self.medication_name: str = medication_name
+        self.medication_name: str = intern_medication_name(medication_name)
         self.doctors_orders: str = doctors_orders
         self.code: str = code
         self.disp_code: str = disp_code
@@ -59,6 +140,22 @@ class Medication:
         self.evening_dosage = None
         self.night_dosage = None
 
+    def __getstate__(self):
+        return get_slot_state(self, self.__slots__)
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled Medication object, including those pickled before the class was slotted. Any attribute
+        missing from the pickled state is set to None.
+
+        :param state: The pickled state
+        :return: None
+        """
+        state = read_pickled_state(state)
+        for slot_name in self.__slots__:
+            setattr(self, slot_name, state.get(slot_name))
+        self.medication_name = intern_medication_name(self.medication_name)
+
     def __hash__(self):
         return hash((self.medication_name, self.dosage))
 
@@ -99,7 +196,37 @@ class PillpackPatient:
     If using the kardex/dispensation list generation features, various other details will be obtained from any
     scanned in scripts. If there are no scripts scanned in, then these details will have to be entered by the user
     manually.
+
+    PillpackPatient objects are slotted. The status of each of the patient's medications (in the production, matched,
+    missing, etc.) is held in a single MedicationStatusTable, and the dictionaries of medications with each status are
+    read-only views of that table. Only non-empty dictionaries are pickled, in the same format as before, and patients
+    pickled before the class was slotted are migrated when they are loaded.
     """
+    PATIENT_FIELDS = ("title", "first_name", "middle_name", "last_name", "healthcare_no", "date_of_birth",
+                      "start_date", "surgery", "address", "postcode", "script_no", "surgery_address",
+                      "surgery_postcode", "doctor_id_no", "doctor_name", "surgery_id_no", "script_id",
+                      "script_issuer", "script_date", "manually_checked_flag", "ready_to_produce_code")
+    STATUS_DICTS = {
+        "production_medications_dict": MedicationStatus.PRODUCTION,
+        "matched_medications_dict": MedicationStatus.MATCHED,
+        "missing_medications_dict": MedicationStatus.MISSING,
+        "unknown_medications_dict": MedicationStatus.UNKNOWN,
+        "incorrect_dosages_dict": MedicationStatus.INCORRECT_DOSAGE,
+        "prn_medications_dict": MedicationStatus.PRN,
+        "medications_to_ignore": MedicationStatus.IGNORED,
+        "linked_medications": MedicationStatus.LINKED
+    }
+    __slots__ = PATIENT_FIELDS + ("medication_statuses", "_prns_for_current_cycle", "production_medications_index")
+
+    production_medications_dict = medication_status_dict(MedicationStatus.PRODUCTION)
+    matched_medications_dict = medication_status_dict(MedicationStatus.MATCHED)
+    missing_medications_dict = medication_status_dict(MedicationStatus.MISSING)
+    unknown_medications_dict = medication_status_dict(MedicationStatus.UNKNOWN)
+    incorrect_dosages_dict = medication_status_dict(MedicationStatus.INCORRECT_DOSAGE)
+    prn_medications_dict = medication_status_dict(MedicationStatus.PRN)
+    medications_to_ignore = medication_status_dict(MedicationStatus.IGNORED)
+    linked_medications = medication_status_dict(MedicationStatus.LINKED)
+    prns_for_current_cycle = lazy_status_container("_prns_for_current_cycle", consts.EMPTY_MEDICATIONS_LIST)
 
     def __init__(self, first_name, last_name, date_of_birth,
                  title: str = None,
@@ -126,7 +253,8 @@ class PillpackPatient:
         The constructor also defines a set of dictionaries which contain production medications, correctly matched
         medications, missing medications, unknown medications, incorrectly dosed medications, all known PRN medications,
         PRN medications for this current cycle only, ignored problem medications and equivalent medications
-        respectively.
+        respectively. All but the list of PRN medications for the current cycle are views of a single table of
+        medication statuses.
 
         :param first_name: First name of the patient
         :param last_name: Last name of the patient
@@ -168,15 +296,18 @@ class PillpackPatient:
         self.script_date: str = script_date
         self.manually_checked_flag: bool = False
         self.ready_to_produce_code: int = 0
-        self.production_medications_dict: dict = {}
-        self.matched_medications_dict: dict = {}
-        self.missing_medications_dict: dict = {}
-        self.unknown_medications_dict: dict = {}
-        self.incorrect_dosages_dict: dict = {}
-        self.prn_medications_dict: dict = {}
-        self.prns_for_current_cycle: list = []
-        self.medications_to_ignore: dict = {}
-        self.linked_medications: dict = {}
+        self.medication_statuses: MedicationStatusTable = MedicationStatusTable()
+        self._prns_for_current_cycle = None
+        self.production_medications_index = None
+
+    def get_medication_count(self, status: MedicationStatus):
+        """
+        Returns the number of the patient's medications with the given status, without counting them.
+
+        :param status: The MedicationStatus to count
+        :return: The number of medications with that status
+        """
+        return self.medication_statuses.count(status)
 
     def manually_checked(self, manually_checked: bool):
         """
@@ -205,53 +336,50 @@ class PillpackPatient:
         :return: None
         """
         if not self.manually_checked_flag:
-            if len(self.unknown_medications_dict) > 0:
+            if self.get_medication_count(MedicationStatus.UNKNOWN) > 0:
                 self.ready_to_produce_code = consts.DO_NOT_PRODUCE
-            elif len(self.incorrect_dosages_dict) > 0:
+            elif self.get_medication_count(MedicationStatus.INCORRECT_DOSAGE) > 0:
                 self.ready_to_produce_code = consts.DO_NOT_PRODUCE
-            elif len(self.missing_medications_dict) > 0:
+            elif self.get_medication_count(MedicationStatus.MISSING) > 0:
                 self.ready_to_produce_code = consts.MISSING_MEDICATIONS
-            elif len(self.matched_medications_dict) == len(self.production_medications_dict):
+            elif (self.get_medication_count(MedicationStatus.MATCHED)
+                  == self.get_medication_count(MedicationStatus.PRODUCTION)):
                 self.ready_to_produce_code = consts.READY_TO_PRODUCE_CODE
             else:
                 self.ready_to_produce_code = consts.NOTHING_TO_COMPARE
         else:
             self.ready_to_produce_code = consts.MANUALLY_CHECKED
 
-    @staticmethod
-    def __add_to_dict_of_medications(medication_to_add: Medication, dict_to_add_to: dict,
+    def __add_to_dict_of_medications(self, medication_to_add: Medication, status: MedicationStatus,
                                      name_of_dict: str):
         """
-        Static function which provides generic logic to add a Medication object to an arbitrary dictionary. This
-        function will be implemented elsewhere and the dictionary to add a Medication object to will be defined there.
+        Function which provides generic logic to give a Medication object a status, i.e. to add it to the dictionary of
+        medications with that status. This function will be implemented elsewhere and the status will be defined there.
 
-        :param medication_to_add: The Medication to add to the arbitrary dictionary
-        :param dict_to_add_to: The dictionary for the Medication object to be added to
+        :param medication_to_add: The Medication to add to the dictionary of medications with the status
+        :param status: The MedicationStatus to give the Medication object
         :param name_of_dict: The name of the dictionary (only used for logging purposes to improve readability)
         :return: None
         """
         if isinstance(medication_to_add, Medication):
-            if not dict_to_add_to.__contains__(medication_to_add.medication_name):
-                dict_to_add_to[medication_to_add.medication_name] = medication_to_add
+            if self.medication_statuses.add(status, medication_to_add.medication_name, medication_to_add):
                 logging.info("Added medication {0} to dictionary {1}"
                              .format(medication_to_add.medication_name, name_of_dict))
 
-    @staticmethod
-    def __remove_from_dict_of_medications(medication_to_remove: Medication, dict_to_remove_from: dict,
+    def __remove_from_dict_of_medications(self, medication_to_remove: Medication, status: MedicationStatus,
                                           name_of_dict: str):
         """
-        Static function which provides generic logic to remove a Medication object from an arbitrary dictionary. This
-        function will be implemented elsewhere and the dictionary to remove a Medication object from will be defined
-        there.
+        Function which provides generic logic to remove a status from a Medication object, i.e. to remove it from the
+        dictionary of medications with that status. This function will be implemented elsewhere and the status will be
+        defined there.
 
-        :param medication_to_remove: The Medication to remove from the arbitrary dictionary
-        :param dict_to_remove_from: The dictionary for the Medication object to be removed from
+        :param medication_to_remove: The Medication to remove from the dictionary of medications with the status
+        :param status: The MedicationStatus to remove from the Medication object
         :param name_of_dict: The name of the dictionary (only used for logging purposes to improve readability)
         :return: None
         """
         if isinstance(medication_to_remove, Medication):
-            if dict_to_remove_from.__contains__(medication_to_remove.medication_name):
-                dict_to_remove_from.pop(medication_to_remove.medication_name)
+            if self.medication_statuses.remove(status, medication_to_remove.medication_name):
                 logging.info("Removed medication {0} from dictionary {1}"
                              .format(medication_to_remove.medication_name, name_of_dict))
 
@@ -262,16 +390,34 @@ class PillpackPatient:
         medication to the missing medications dictionary.
         :return: None
         """
+        production_medications_index: MedicationNameIndex = self.get_production_medications_index()
+        medications_within_matched_names: set = set()
+        for matched_medication_name in self.matched_medications_dict.keys():
+            medications_within_matched_names.update(production_medications_index.find_all(matched_medication_name))
         for medication in self.production_medications_dict.keys():
-            substring_results = [key for key in self.matched_medications_dict.keys() if medication in key]
             if (not self.matched_medications_dict.__contains__(medication)
                     and not self.medications_to_ignore.__contains__(medication)):
                 medication_object: Medication = self.production_medications_dict[medication]
                 if (not self.check_for_medication_linkage(medication_object)
                         and not self.missing_medications_dict.__contains__(medication)
-                        and not len(substring_results) > 0):
+                        and not medications_within_matched_names.__contains__(medication)):
                     self.add_medication_to_missing_dict(medication_object)
 
+    def get_production_medications_index(self):
+        """
+        Returns the compiled index of production medication names, which is used to find the production medications
+        whose names appear within a medication name from a scanned script. The index is rebuilt from the production
+        medications dictionary if it does not exist yet (e.g. for patients loaded from an older save file) or if it has
+        fallen out of step with the dictionary.
+        :return: MedicationNameIndex of the production medication names
+        """
+        production_medications_index = self.production_medications_index
+        if (production_medications_index is None
+                or len(production_medications_index) != len(self.production_medications_dict)):
+            production_medications_index = MedicationNameIndex(self.production_medications_dict.keys())
+            self.production_medications_index = production_medications_index
+        return production_medications_index
+
     def check_for_medication_linkage(self, medication: Medication):
         """
         Checks for an existing medication linkage in the linked medications dictionary. If the specified medication
@@ -296,8 +442,11 @@ class PillpackPatient:
         :param med_to_be_added: The Medication object to be added to the production medications dictionary
         :return: None
         """
-        self.__add_to_dict_of_medications(med_to_be_added, self.production_medications_dict,
+        production_medications_index: MedicationNameIndex = self.get_production_medications_index()
+        self.__add_to_dict_of_medications(med_to_be_added, MedicationStatus.PRODUCTION,
                                           "Production Medications")
+        if isinstance(med_to_be_added, Medication):
+            production_medications_index.add(med_to_be_added.medication_name)
 
     def remove_medication_from_production_dict(self, med_to_be_removed: Medication):
         """
@@ -307,8 +456,11 @@ class PillpackPatient:
         :param med_to_be_removed: The Medication object to be removed from the production medications dictionary
         :return: None
         """
-        self.__remove_from_dict_of_medications(med_to_be_removed, self.production_medications_dict,
+        production_medications_index: MedicationNameIndex = self.get_production_medications_index()
+        self.__remove_from_dict_of_medications(med_to_be_removed, MedicationStatus.PRODUCTION,
                                                "Production Medications")
+        if isinstance(med_to_be_removed, Medication):
+            production_medications_index.remove(med_to_be_removed.medication_name)
 
     def add_medication_to_matched_dict(self, med_to_be_added):
         """
@@ -318,7 +470,7 @@ class PillpackPatient:
         :param med_to_be_added: The Medication object to be added to the matched medications dictionary
         :return: None
         """
-        self.__add_to_dict_of_medications(med_to_be_added, self.matched_medications_dict,
+        self.__add_to_dict_of_medications(med_to_be_added, MedicationStatus.MATCHED,
                                           "Matched Medications")
 
     def remove_medication_from_matched_dict(self, med_to_be_removed: Medication):
@@ -329,7 +481,7 @@ class PillpackPatient:
         :param med_to_be_removed: The Medication object to be removed from the matched medications dictionary
         :return: None
         """
-        self.__remove_from_dict_of_medications(med_to_be_removed, self.matched_medications_dict,
+        self.__remove_from_dict_of_medications(med_to_be_removed, MedicationStatus.MATCHED,
                                                "Matched Medications")
 
     def add_medication_to_missing_dict(self, med_to_be_added):
@@ -340,7 +492,7 @@ class PillpackPatient:
         :param med_to_be_added: The Medication object to be added to the missing medications dictionary
         :return: None
         """
-        self.__add_to_dict_of_medications(med_to_be_added, self.missing_medications_dict,
+        self.__add_to_dict_of_medications(med_to_be_added, MedicationStatus.MISSING,
                                           "Missing Medications")
 
     def remove_medication_from_missing_dict(self, med_to_be_removed: Medication):
@@ -351,7 +503,7 @@ class PillpackPatient:
         :param med_to_be_removed: The Medication object to be removed from the missing medications dictionary
         :return: None
         """
-        self.__remove_from_dict_of_medications(med_to_be_removed, self.missing_medications_dict,
+        self.__remove_from_dict_of_medications(med_to_be_removed, MedicationStatus.MISSING,
                                                "Missing Medications")
 
     def add_medication_to_unknown_dict(self, med_to_be_added):
@@ -362,7 +514,7 @@ class PillpackPatient:
         :param med_to_be_added: The Medication object to be added to the unknown medications dictionary
         :return: None
         """
-        self.__add_to_dict_of_medications(med_to_be_added, self.unknown_medications_dict,
+        self.__add_to_dict_of_medications(med_to_be_added, MedicationStatus.UNKNOWN,
                                           "Unknown Medications")
 
     def remove_medication_from_unknown_dict(self, med_to_be_removed: Medication):
@@ -373,7 +525,7 @@ class PillpackPatient:
         :param med_to_be_removed: The Medication object to be removed from the unknown medications dictionary
         :return: None
         """
-        self.__remove_from_dict_of_medications(med_to_be_removed, self.unknown_medications_dict,
+        self.__remove_from_dict_of_medications(med_to_be_removed, MedicationStatus.UNKNOWN,
                                                "Unknown Medications")
 
     def add_medication_to_incorrect_dosage_dict(self, med_to_be_added: Medication):
@@ -384,7 +536,7 @@ class PillpackPatient:
         :param med_to_be_added: The Medication object to be added to the incorrect dosage medications dictionary
         :return: None
         """
-        self.__add_to_dict_of_medications(med_to_be_added, self.incorrect_dosages_dict,
+        self.__add_to_dict_of_medications(med_to_be_added, MedicationStatus.INCORRECT_DOSAGE,
                                           "Incorrect Dosage Medications")
 
     def remove_medication_from_incorrect_dosage_dict(self, med_to_be_removed: Medication):
@@ -395,9 +547,23 @@ class PillpackPatient:
         :param med_to_be_removed: The Medication object to be removed from the incorrect dosage medications dictionary
         :return: None
         """
-        self.__remove_from_dict_of_medications(med_to_be_removed, self.incorrect_dosages_dict,
+        self.__remove_from_dict_of_medications(med_to_be_removed, MedicationStatus.INCORRECT_DOSAGE,
                                                "Incorrect Dosage Medications")
 
+    def clear_medication_warnings(self, medication: Medication):
+        """
+        Removes a Medication object from the dictionaries of missing, unknown and incorrect dosage medications in a
+        single transition of its status.
+
+        :param medication: The Medication object to clear the warnings of
+        :return: None
+        """
+        if isinstance(medication, Medication):
+            cleared_statuses = self.medication_statuses.remove(MEDICATION_WARNING_STATUSES, medication.medication_name)
+            if cleared_statuses:
+                logging.info("Cleared warning(s) {0} of medication {1}"
+                             .format(cleared_statuses.name, medication.medication_name))
+
     def add_medication_to_prn_dict(self, med_to_be_added: Medication):
         """
         Implementation of the __add_to_dict_of_medications function. Adds a Medication object to the dictionary of
@@ -406,7 +572,7 @@ class PillpackPatient:
         :param med_to_be_added: The Medication object to be added to the dictionary of all PRN medications
         :return: None
         """
-        self.__add_to_dict_of_medications(med_to_be_added, self.prn_medications_dict,
+        self.__add_to_dict_of_medications(med_to_be_added, MedicationStatus.PRN,
                                           "PRN Medications")
 
     def remove_medication_from_prn_dict(self, med_to_be_removed: Medication):
@@ -417,7 +583,7 @@ class PillpackPatient:
         :param med_to_be_removed: The Medication object to be removed from the dictionary of all PRN medications
         :return: None
         """
-        self.__remove_from_dict_of_medications(med_to_be_removed, self.prn_medications_dict,
+        self.__remove_from_dict_of_medications(med_to_be_removed, MedicationStatus.PRN,
                                                "PRN Medications")
 
     def add_medication_to_prns_for_current_cycle(self, med_to_be_added: Medication):
@@ -438,7 +604,9 @@ class PillpackPatient:
                     dupe = True
         if not dupe and isinstance(med_to_be_added, Medication):
             print("added " + med_to_be_added.medication_name)
-            self.prns_for_current_cycle.append(med_to_be_added)
+            if self._prns_for_current_cycle is None:
+                self._prns_for_current_cycle = []
+            self._prns_for_current_cycle.append(med_to_be_added)
 
     def remove_medication_from_prns_for_current_cycle(self, med_to_be_removed: Medication):
         """
@@ -448,10 +616,11 @@ class PillpackPatient:
         :param med_to_be_removed: The Medication object to be removed from the current cycle PRN medications dictionary
         :return: None
         """
-        try:
-            self.prns_for_current_cycle.remove(med_to_be_removed)
-        except ValueError as e:
-            logging.error(e)
+        if self.prns_for_current_cycle.__contains__(med_to_be_removed):
+            self._prns_for_current_cycle.remove(med_to_be_removed)
+        else:
+            logging.error("Medication {0} is not in the PRN medications for the current cycle."
+                          .format(getattr(med_to_be_removed, "medication_name", med_to_be_removed)))
 
     def add_medication_link(self, linking_med: Medication, med_to_be_linked: Medication):
         """
@@ -468,7 +637,7 @@ class PillpackPatient:
                 self.remove_medication_from_unknown_dict(linking_med)
                 self.remove_medication_from_missing_dict(med_to_be_linked)
                 self.add_medication_to_matched_dict(linking_med)
-                self.linked_medications[linking_med.medication_name] = med_to_be_linked
+                self.medication_statuses.add(MedicationStatus.LINKED, linking_med.medication_name, med_to_be_linked)
 
     def remove_medication_link(self, medication_to_unlink: Medication):
         """
@@ -485,7 +654,7 @@ class PillpackPatient:
             self.add_medication_to_unknown_dict(medication_to_unlink)
             self.add_medication_to_missing_dict(linked_medication)
             self.remove_medication_from_matched_dict(medication_to_unlink)
-            self.linked_medications.pop(medication_to_unlink.medication_name)
+            self.medication_statuses.remove(MedicationStatus.LINKED, medication_to_unlink.medication_name)
 
     def add_medication_to_ignore_dict(self, med_to_be_added: Medication):
         """
@@ -495,7 +664,7 @@ class PillpackPatient:
         :param med_to_be_added: Medication object to be added to the ignored problem medications dictionary
         :return: None
         """
-        self.__add_to_dict_of_medications(med_to_be_added, self.medications_to_ignore,
+        self.__add_to_dict_of_medications(med_to_be_added, MedicationStatus.IGNORED,
                                           "Medications to Ignore")
         self.remove_medication_from_incorrect_dosage_dict(med_to_be_added)
         self.remove_medication_from_missing_dict(med_to_be_added)
@@ -510,12 +679,53 @@ class PillpackPatient:
         :param med_with_correct_dosage: Medication object which has the expected dosage
         :return: None
         """
-        self.__remove_from_dict_of_medications(med_to_be_removed, self.medications_to_ignore,
+        self.__remove_from_dict_of_medications(med_to_be_removed, MedicationStatus.IGNORED,
                                                "Medications to Ignore")
         self.remove_medication_from_matched_dict(med_to_be_removed)
         self.add_medication_to_incorrect_dosage_dict(med_to_be_removed)
         self.add_medication_to_missing_dict(med_with_correct_dosage)
 
+    def __getstate__(self):
+        """
+        Overrides the default getstate function so that the patient is pickled as a dictionary of its fields and of its
+        non-empty dictionaries (and list) of medications, in the same format as patients pickled before the class was
+        slotted. The production medications index, which can always be rebuilt from the production medications
+        dictionary, is not pickled along with the patient.
+        :return: Dictionary of the instance's attributes, minus the empty containers and the production medications index
+        """
+        state: dict = get_slot_state(self, self.PATIENT_FIELDS)
+        for container_name, status in self.STATUS_DICTS.items():
+            if self.get_medication_count(status) > 0:
+                state[container_name] = dict(getattr(self, container_name))
+        if self._prns_for_current_cycle is not None and len(self._prns_for_current_cycle) > 0:
+            state["prns_for_current_cycle"] = self._prns_for_current_cycle
+        return state
+
+    def __setstate__(self, state):
+        """
+        Overrides the default setstate function so that patients pickled before the class was slotted (whose state is
+        their instance dictionary) can still be loaded. Fields missing from the pickled state are set to None, the
+        pickled dictionaries of medications are read into a table of medication statuses, medication names are interned
+        and the production medications index is rebuilt on first use.
+        :param state: The pickled state
+        :return: None
+        """
+        state = read_pickled_state(state)
+        for field_name in self.PATIENT_FIELDS:
+            setattr(self, field_name, state.get(field_name))
+        if self.manually_checked_flag is None:
+            self.manually_checked_flag = False
+        if self.ready_to_produce_code is None:
+            self.ready_to_produce_code = 0
+        self.medication_statuses = MedicationStatusTable()
+        for container_name, status in self.STATUS_DICTS.items():
+            container = state.get(container_name)
+            if isinstance(container, dict):
+                for medication_name, medication in container.items():
+                    self.medication_statuses.add(status, intern_medication_name(medication_name), medication)
+        self.prns_for_current_cycle = state.get("prns_for_current_cycle")
+        self.production_medications_index = None
+
     def __hash__(self):
         """
         Overrides the default hash function
@@ -562,3 +772,46 @@ class PillpackPatient:
         :return: True if the hash matches, otherwise false
         """
         return not (self.__hash__() == other.__hash__())
+
+
+class PillpackOrderMedication:
+    """
+    Lightweight record of a single MedItem read from a pillpack production order. Only the raw text values which are
+    required to build a Medication object are kept, so that an order can be held in memory without a full XML document
+    tree.
+    """
+    __slots__ = ("medication_name", "number_of_doses", "start_date", "dose_list")
+
+    def __init__(self, medication_name: str = "", number_of_doses: int = 0, start_date: str = None,
+                 dose_list: str = None):
+        """
+        The constructor for the PillpackOrderMedication class.
+
+        :param medication_name: Text of the first MedNm tag of the MedItem
+        :param number_of_doses: Total number of MedItemDose tags in the MedItem
+        :param start_date: Text of the TakeDt tag of the first MedItemDose, or None if there is no such tag
+        :param dose_list: Text of the DoseList tag of the first MedItemDose, or None if there is no such tag
+        """
+        self.medication_name: str = medication_name
+        self.number_of_doses: int = number_of_doses
+        self.start_date: str = start_date
+        self.dose_list: str = dose_list
+
+
+class PillpackOrder:
+    """
+    Lightweight record of a single OrderInfo read from a pillpack production file. Holds the patient's name and date of
+    birth exactly as they appear in the file, along with a PillpackOrderMedication record for every MedItem.
+    """
+    __slots__ = ("patient_name", "birthday", "medications")
+
+    def __init__(self, patient_name: str = None, birthday: str = None):
+        """
+        The constructor for the PillpackOrder class.
+
+        :param patient_name: Text of the PtntNm tag, formatted as "Last name, First name"
+        :param birthday: Text of the Birthday tag, formatted as YYYYMMDD
+        """
+        self.patient_name: str = patient_name
+        self.birthday: str = birthday
+        self.medications: list = []
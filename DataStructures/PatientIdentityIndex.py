@@ -0,0 +1,127 @@
+from collections.abc import Mapping
+
+from DataStructures.Models import PillpackPatient
+
+"""
+
+Module which contains the PatientIdentityIndex, a hash index of the production patients by their normalised identity,
+which is used to find the production patient matching a patient read from a script without comparing the script
+patient against every production patient with the same last name.
+
+"""
+
+
+def normalise_name(name):
+    """Lowercases a name and collapses any runs of whitespace, so names which only differ in case or spacing match."""
+    if name is None:
+        return ""
+    return " ".join(str(name).lower().split())
+
+
+def get_name_key(patient: PillpackPatient):
+    return normalise_name(patient.last_name), normalise_name(patient.first_name)
+
+
+def get_identity_key(patient: PillpackPatient):
+    return normalise_name(patient.last_name), normalise_name(patient.first_name), patient.date_of_birth
+
+
+class PatientIdentityIndex:
+    """
+    Class which indexes every patient of a patient dictionary (lower case last name to list of PillpackPatient objects)
+    by their normalised (last name, first name, date of birth), and by their normalised (last name, first name) alone,
+    so both a perfect match and the patients whose date of birth does not match can be found with a single dictionary
+    lookup. Patients with the same identity are kept in the order of their last name's list.
+
+    The index is refreshed lazily: the repository marks the last names which have changed, and only the patients stored
+    under those last names are indexed again the next time the index is refreshed. Replacing the patient dictionary
+    with a different object indexes every patient again.
+    """
+    def __init__(self):
+        """
+        The constructor for the PatientIdentityIndex class. The index starts without any patients, and indexes every
+        patient of the patient dictionary it is first refreshed with.
+        """
+        self.__patient_dict = None
+        self.__changed_last_names = None
+        self.__indexed_patients: dict = {}
+        self.__patients_by_identity: dict = {}
+        self.__patients_by_name: dict = {}
+
+    def __len__(self):
+        return sum(len(patients_with_last_name) for patients_with_last_name in self.__indexed_patients.values())
+
+    def mark_changed(self, last_name_key: str):
+        if self.__changed_last_names is not None:
+            self.__changed_last_names.add(last_name_key)
+
+    def invalidate(self):
+        self.__changed_last_names = None
+
+    @staticmethod
+    def __add_to_index(index: dict, key, patient: PillpackPatient):
+        index.setdefault(key, []).append(patient)
+
+    @staticmethod
+    def __remove_from_index(index: dict, key, patient: PillpackPatient):
+        patients_with_key: list = [indexed_patient for indexed_patient in index.get(key, [])
+                                   if indexed_patient is not patient]
+        if len(patients_with_key) > 0:
+            index[key] = patients_with_key
+        else:
+            index.pop(key, None)
+
+    def __index_last_name(self, last_name_key: str, patients_with_last_name):
+        """Removes the patients previously indexed under a last name, then indexes its current patients."""
+        for identity_key, name_key, patient in self.__indexed_patients.pop(last_name_key, []):
+            self.__remove_from_index(self.__patients_by_identity, identity_key, patient)
+            self.__remove_from_index(self.__patients_by_name, name_key, patient)
+        indexed_patients: list = []
+        for patient in patients_with_last_name or []:
+            if isinstance(patient, PillpackPatient):
+                identity_key = get_identity_key(patient)
+                name_key = get_name_key(patient)
+                self.__add_to_index(self.__patients_by_identity, identity_key, patient)
+                self.__add_to_index(self.__patients_by_name, name_key, patient)
+                indexed_patients.append((identity_key, name_key, patient))
+        if len(indexed_patients) > 0:
+            self.__indexed_patients[last_name_key] = indexed_patients
+
+    def refresh(self, patient_dict: Mapping):
+        """
+        Brings the index up to date with a patient dictionary, indexing only the last names marked as changed unless
+        the index has been invalidated or the patient dictionary has been replaced.
+
+        :param patient_dict: Dictionary of lower case last name to list of PillpackPatient objects
+        :return: None
+        """
+        if patient_dict is not self.__patient_dict or self.__changed_last_names is None:
+            self.__patient_dict = patient_dict
+            self.__indexed_patients.clear()
+            self.__patients_by_identity.clear()
+            self.__patients_by_name.clear()
+            for last_name_key, patients_with_last_name in patient_dict.items():
+                self.__index_last_name(last_name_key, patients_with_last_name)
+        else:
+            for last_name_key in self.__changed_last_names:
+                self.__index_last_name(last_name_key, patient_dict.get(last_name_key))
+        self.__changed_last_names = set()
+
+    def find(self, patient: PillpackPatient):
+        """
+        Finds the indexed patients with the same normalised last name, first name and date of birth as a patient.
+
+        :param patient: The patient to look up, e.g. a patient read from a scanned script
+        :return: List of matching PillpackPatient objects
+        """
+        return list(self.__patients_by_identity.get(get_identity_key(patient), []))
+
+    def find_by_name(self, patient: PillpackPatient):
+        """
+        Finds the indexed patients with the same normalised last name and first name as a patient, regardless of their
+        date of birth.
+
+        :param patient: The patient to look up, e.g. a patient read from a scanned script
+        :return: List of matching PillpackPatient objects
+        """
+        return list(self.__patients_by_name.get(get_name_key(patient), []))
@@ -0,0 +1,203 @@
+import bisect
+import datetime
+import logging
+
+from DataStructures.MedicationStatusTable import MedicationStatus
+from DataStructures.Models import PillpackPatient
+from DataStructures.PatientSearchIndex import PatientSearchIndex
+
+
+"""
+
+Module which contains the PatientRowModel, an in-memory model of the rows displayed for a dictionary of patients. The
+model remembers the values of every row it has produced, so a view only has to insert, delete or change the rows and
+cells which differ after the patients stored under some last names have changed.
+
+"""
+
+PATIENT_COLUMNS = ('First Name',
+                   'Last Name',
+                   'Date of Birth',
+                   'Start Date',
+                   'No. of Medications',
+                   'Condition')
+READY_TO_PRODUCE_IMAGE = "ReadyToProduce"
+DO_NOT_PRODUCE_IMAGE = "DoNotProduce"
+WARNING_IMAGE = "Warning"
+NO_SCRIPTS_SCANNED_IMAGE = "NoScriptsScanned"
+
+
+def get_patient_row_key(patient: PillpackPatient):
+    return patient.first_name + " " + patient.last_name
+
+
+def build_patient_row(patient: PillpackPatient, matching_pillpack_patient: PillpackPatient):
+    """
+    Builds the row displayed for a patient. The names are taken from the patient itself, and every other column is
+    taken from the matching patient in the pillpack production.
+
+    :param patient: The PillpackPatient object stored in the dictionary being displayed
+    :param matching_pillpack_patient: The PillpackPatient object in the production which matches the patient
+    :return: Dictionary holding the row key, a tuple of the values of every column and the name of the row's image
+    """
+    if matching_pillpack_patient.date_of_birth == datetime.date.today():
+        date_of_birth = "Not provided..."
+    else:
+        date_of_birth = str(matching_pillpack_patient.date_of_birth)
+    if matching_pillpack_patient.start_date == datetime.date.today():
+        start_date = str(matching_pillpack_patient.start_date) + " URGENT"
+    else:
+        start_date = str(matching_pillpack_patient.start_date)
+    if matching_pillpack_patient.manually_checked_flag:
+        condition, image = "Manually Checked", READY_TO_PRODUCE_IMAGE
+    elif matching_pillpack_patient.get_medication_count(MedicationStatus.INCORRECT_DOSAGE) > 0:
+        condition, image = "Incorrect dosages", DO_NOT_PRODUCE_IMAGE
+    elif matching_pillpack_patient.get_medication_count(MedicationStatus.UNKNOWN) > 0:
+        condition, image = "Unknown medications", DO_NOT_PRODUCE_IMAGE
+    elif matching_pillpack_patient.get_medication_count(MedicationStatus.MISSING) > 0:
+        condition, image = "Missing medications", WARNING_IMAGE
+    elif (matching_pillpack_patient.get_medication_count(MedicationStatus.MATCHED)
+          == matching_pillpack_patient.get_medication_count(MedicationStatus.PRODUCTION)):
+        condition, image = "Ready to produce", READY_TO_PRODUCE_IMAGE
+    else:
+        condition, image = "No scripts yet scanned", NO_SCRIPTS_SCANNED_IMAGE
+    return {
+        "Key": get_patient_row_key(patient),
+        "Values": (patient.first_name,
+                   patient.last_name,
+                   date_of_birth,
+                   start_date,
+                   matching_pillpack_patient.get_medication_count(MedicationStatus.PRODUCTION),
+                   condition),
+        "Image": image
+    }
+
+
+class PatientRowModel:
+    """
+    Class which holds the rows currently displayed for a dictionary of patients, keyed by the patient's first and last
+    name, in the same order as a view sorted by the Last Name column.
+
+    Calling refresh with the last names which have changed since the previous refresh recomputes the rows of those
+    patients only, and returns the rows which have to be inserted or deleted and the cells which have to be changed to
+    bring a view up to date. Calling it without any last names recomputes every row, e.g. when a new production has
+    been loaded or a different filter has been selected.
+
+    A PatientSearchIndex of the values of every row is kept up to date with the rows, so views can search the rows
+    without checking each of them.
+    """
+    def __init__(self):
+        """
+        The constructor for the PatientRowModel class. The model starts without any rows.
+        """
+        self.rows: dict = {}
+        self.sorted_keys: list = []
+        self.search_index: PatientSearchIndex = PatientSearchIndex()
+        self.__keys_by_last_name: dict = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return self.rows.__contains__(key)
+
+    def clear(self):
+        self.rows.clear()
+        self.sorted_keys.clear()
+        self.search_index.clear()
+        self.__keys_by_last_name.clear()
+
+    @staticmethod
+    def __get_sort_key(row: dict):
+        return row["Values"][1], row["Key"]
+
+    def index_of(self, key: str):
+        """
+        Finds the position of a row when the rows are sorted by the Last Name column.
+
+        :param key: The key of the row
+        :return: The position of the row
+        """
+        return bisect.bisect_left(self.sorted_keys, self.__get_sort_key(self.rows[key]))
+
+    def keys_in_order(self):
+        return [key for last_name, key in self.sorted_keys]
+
+    def __insert_row(self, row: dict):
+        self.rows[row["Key"]] = row
+        bisect.insort(self.sorted_keys, self.__get_sort_key(row))
+        self.search_index.add(row["Key"], row["Values"])
+        self.__keys_by_last_name.setdefault(row["Values"][1].lower(), set()).add(row["Key"])
+
+    def __delete_row(self, key: str):
+        row: dict = self.rows.pop(key)
+        self.sorted_keys.pop(bisect.bisect_left(self.sorted_keys, self.__get_sort_key(row)))
+        self.search_index.remove(key)
+        keys_with_last_name: set = self.__keys_by_last_name.get(row["Values"][1].lower())
+        keys_with_last_name.discard(key)
+        if len(keys_with_last_name) == 0:
+            self.__keys_by_last_name.pop(row["Values"][1].lower())
+
+    def refresh(self, patient_dict, match_patient, changed_last_names=None, filter_code: int = None):
+        """
+        Recomputes the rows of every patient stored under the changed last names, and applies the differences to the
+        model.
+
+        :param patient_dict: The dictionary of patients being displayed, keyed by lowercase last name
+        :param match_patient: Function which returns the PillpackPatient in the production matching a given patient
+        :param changed_last_names: Iterable of the lowercase last names which have changed, or None to recompute every
+        row
+        :param filter_code: Only patients whose matching production patient has this ready to produce code are kept.
+        If None, every patient is kept.
+        :return: Dictionary of the keys of inserted rows (in sorted order), the keys of deleted rows, and for each
+        updated row, the changed cells by column name and the row's image if it has changed
+        """
+        if changed_last_names is None:
+            last_names_to_refresh = list(patient_dict.keys())
+            stale_keys: set = set(self.rows.keys())
+        else:
+            last_names_to_refresh = [last_name for last_name in changed_last_names
+                                     if patient_dict.__contains__(last_name)]
+            stale_keys: set = set()
+            for last_name in changed_last_names:
+                stale_keys.update(self.__keys_by_last_name.get(last_name, ()))
+        refreshed_rows: dict = {}
+        for last_name in last_names_to_refresh:
+            patient_list = patient_dict.get(last_name)
+            if isinstance(patient_list, list):
+                for patient in patient_list:
+                    if isinstance(patient, PillpackPatient):
+                        matching_pillpack_patient: PillpackPatient = match_patient(patient)
+                        if filter_code is None or matching_pillpack_patient.ready_to_produce_code == filter_code:
+                            row: dict = build_patient_row(patient, matching_pillpack_patient)
+                            refreshed_rows[row["Key"]] = row
+                    else:
+                        logging.error("Item in patient list: {0} is not of type PillpackPatient".format(patient))
+        changes: dict = {
+            "Inserted": [],
+            "Deleted": [],
+            "Updated": {}
+        }
+        for key in stale_keys.difference(refreshed_rows.keys()):
+            self.__delete_row(key)
+            changes["Deleted"].append(key)
+        for key, row in refreshed_rows.items():
+            existing_row = self.rows.get(key)
+            if existing_row is not None and self.__get_sort_key(existing_row) != self.__get_sort_key(row):
+                """The row has to move, so it is deleted and inserted again in its new position."""
+                self.__delete_row(key)
+                changes["Deleted"].append(key)
+                existing_row = None
+            if existing_row is None:
+                self.__insert_row(row)
+                changes["Inserted"].append(key)
+            elif existing_row != row:
+                self.rows[key] = row
+                self.search_index.add(key, row["Values"])
+                changes["Updated"][key] = {
+                    "Cells": {PATIENT_COLUMNS[i]: row["Values"][i] for i in range(len(PATIENT_COLUMNS))
+                              if existing_row["Values"][i] != row["Values"][i]},
+                    "Image": row["Image"] if existing_row["Image"] != row["Image"] else None
+                }
+        changes["Inserted"].sort(key=self.index_of)
+        return changes
@@ -0,0 +1,116 @@
+"""
+
+Module which contains the PatientSearchIndex, an incremental index of the values displayed for each patient row, which
+is used to find every row containing a search string without lowercasing and checking every value of every row.
+
+"""
+
+SEARCH_TEXT_SEPARATOR = "\n"
+TRIGRAM_LENGTH = 3
+
+
+class PatientSearchIndex:
+    """
+    Class which defines a trigram index over the lowercased values of each row (names, date of birth, start date,
+    number of medications and condition). The values of a row are joined with a separator which cannot be typed into
+    a search bar, so a search string never matches across two values, and the results are identical to checking
+    whether the search string is contained in any single value of the row, ignoring case.
+
+    Search strings of three or more characters are answered by intersecting the sets of rows containing each trigram
+    of the search string, and only those candidate rows are checked. The results of the previous search are kept, and
+    rows are added to or removed from them as the index changes, so when a search string is extended (e.g. as the user
+    types) only the previous results have to be checked.
+    """
+    def __init__(self):
+        """
+        The constructor for the PatientSearchIndex class. The index starts without any rows.
+        """
+        self.__search_texts: dict = {}
+        self.__rows_by_trigram: dict = {}
+        self.__last_search_string = None
+        self.__last_results: set = set()
+
+    def __len__(self):
+        return len(self.__search_texts)
+
+    @staticmethod
+    def get_search_text(values):
+        return SEARCH_TEXT_SEPARATOR.join(str(value).lower() for value in values)
+
+    @staticmethod
+    def get_trigrams(text: str):
+        return {text[i:i + TRIGRAM_LENGTH] for i in range(len(text) - TRIGRAM_LENGTH + 1)}
+
+    def add(self, key: str, values):
+        """
+        Adds a row to the index, replacing the values previously indexed for that row if there are any.
+
+        :param key: The key of the row
+        :param values: The values displayed in the row
+        :return: None
+        """
+        self.remove(key)
+        search_text: str = self.get_search_text(values)
+        self.__search_texts[key] = search_text
+        for trigram in self.get_trigrams(search_text):
+            self.__rows_by_trigram.setdefault(trigram, set()).add(key)
+        if self.__last_search_string is not None and self.__last_search_string in search_text:
+            self.__last_results.add(key)
+
+    def remove(self, key: str):
+        """
+        Removes a row from the index. Rows which are not indexed are ignored.
+
+        :param key: The key of the row
+        :return: None
+        """
+        search_text = self.__search_texts.pop(key, None)
+        if search_text is None:
+            return
+        for trigram in self.get_trigrams(search_text):
+            rows_with_trigram: set = self.__rows_by_trigram.get(trigram)
+            rows_with_trigram.discard(key)
+            if len(rows_with_trigram) == 0:
+                self.__rows_by_trigram.pop(trigram)
+        self.__last_results.discard(key)
+
+    def clear(self):
+        self.__init__()
+
+    def matches(self, key: str, search_string: str):
+        """
+        Checks whether any value of an indexed row contains the search string.
+
+        :param key: The key of the row
+        :param search_string: The lowercased search string
+        :return: True if the row contains the search string, otherwise False
+        """
+        return SEARCH_TEXT_SEPARATOR not in search_string and search_string in self.__search_texts.get(key, "")
+
+    def search(self, search_string: str):
+        """
+        Finds every row with at least one value containing the search string, ignoring case.
+
+        :param search_string: The string to search for. An empty search string matches every row.
+        :return: A set of the keys of the matching rows
+        """
+        search_string = search_string.lower()
+        if SEARCH_TEXT_SEPARATOR in search_string:
+            return set()
+        if len(search_string) == 0:
+            candidates = self.__search_texts.keys()
+        elif self.__last_search_string is not None and self.__last_search_string in search_string:
+            """Every row containing the new search string also contains the previous one."""
+            candidates = self.__last_results
+        elif len(search_string) >= TRIGRAM_LENGTH:
+            candidates = set()
+            rows_for_each_trigram: list = sorted((self.__rows_by_trigram.get(trigram, set())
+                                                  for trigram in self.get_trigrams(search_string)), key=len)
+            if len(rows_for_each_trigram[0]) > 0:
+                candidates = rows_for_each_trigram[0].intersection(*rows_for_each_trigram[1:])
+        else:
+            candidates = self.__search_texts.keys()
+        results: set = {key for key in candidates if search_string in self.__search_texts[key]}
+        self.__last_search_string = search_string
+        self.__last_results = results
+        return set(results)
@@ -0,0 +1,165 @@
+import logging
+import pickle
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+
+"""
+
+Module which contains the persistent store of the PRN and linked medications of every patient. The medications are
+kept between productions, so a patient's PRNs and links are applied again when they appear in a later production.
+
+"""
+
+
+class SQLitePrnsAndLinkedMedications(MutableMapping):
+    """
+
+    Dictionary-like store of the PRN and linked medications of every patient, kept in an embedded SQLite database. Keys
+    are the patient keys built by DAOFunctions.get_prns_and_linked_medications_key, and values are dictionaries of the
+    patient's PRN medications and linked medications, exactly as in the PrnsAndLinkedMeds pickle it replaces.
+
+    Each patient is a separate row, so reading a key only unpickles that patient's medications and assigning a key only
+    rewrites that patient's row, in its own transaction. Returned dictionaries are copies, so any change made to one has
+    to be assigned back to the store to be saved.
+
+    Every production loaded is counted as a cycle, and each patient's row records the last cycle they appeared in, so
+    the medications of patients who have not appeared for a number of cycles can be pruned.
+    """
+    def __init__(self, database_file: str = ":memory:"):
+        """
+        The constructor for the SQLitePrnsAndLinkedMedications class. The database file, its tables and its indexes are
+        created if they do not already exist.
+
+        :param database_file: Path to the SQLite database file. Defaults to a database held in memory.
+        """
+        self.database_file = database_file
+        self.__lock = threading.RLock()
+        self.__connection = sqlite3.connect(database_file, check_same_thread=False)
+        with self.__connection:
+            self.__connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS patient_medications (
+                    patient_key TEXT PRIMARY KEY,
+                    medications BLOB NOT NULL,
+                    last_seen_cycle INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS last_seen_cycle_index ON patient_medications (last_seen_cycle);
+                CREATE TABLE IF NOT EXISTS store_attributes (
+                    name TEXT PRIMARY KEY,
+                    value
+                );
+                """
+            )
+        logging.info("Opened PRN and linked medications database {0}".format(database_file))
+
+    def read_attribute(self, name: str, default):
+        with self.__lock:
+            row = self.__connection.execute("SELECT value FROM store_attributes WHERE name = ?", (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def write_attribute(self, name: str, value):
+        with self.__lock, self.__connection:
+            self.__connection.execute("INSERT OR REPLACE INTO store_attributes (name, value) VALUES (?, ?)",
+                                      (name, value))
+
+    @property
+    def current_cycle(self):
+        return self.read_attribute("current_cycle", 0)
+
+    def __getitem__(self, patient_key: str):
+        with self.__lock:
+            row = self.__connection.execute("SELECT medications FROM patient_medications WHERE patient_key = ?",
+                                            (patient_key,)).fetchone()
+        if row is None:
+            raise KeyError(patient_key)
+        return pickle.loads(row[0])
+
+    def __setitem__(self, patient_key: str, medications: dict):
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT INTO patient_medications (patient_key, medications, last_seen_cycle) VALUES (?, ?, ?) "
+                "ON CONFLICT (patient_key) DO UPDATE SET medications = excluded.medications, "
+                "last_seen_cycle = excluded.last_seen_cycle",
+                (patient_key, pickle.dumps(medications, pickle.HIGHEST_PROTOCOL), self.current_cycle))
+
+    def __delitem__(self, patient_key: str):
+        with self.__lock, self.__connection:
+            if self.__connection.execute("DELETE FROM patient_medications WHERE patient_key = ?",
+                                         (patient_key,)).rowcount == 0:
+                raise KeyError(patient_key)
+
+    def __contains__(self, patient_key):
+        with self.__lock:
+            return self.__connection.execute("SELECT 1 FROM patient_medications WHERE patient_key = ?",
+                                             (patient_key,)).fetchone() is not None
+
+    def __iter__(self):
+        with self.__lock:
+            rows: list = self.__connection.execute("SELECT patient_key FROM patient_medications "
+                                                   "ORDER BY patient_key").fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM patient_medications").fetchone()[0]
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, self.database_file)
+
+    def import_prns_and_linked_medications(self, prns_and_linked_medications: dict):
+        """
+        Adds the PRN and linked medications of every patient in a dictionary to the store in a single transaction, e.g.
+        those loaded from the PrnsAndLinkedMeds pickle of an older version. Patients already in the store are replaced.
+
+        :param prns_and_linked_medications: Dictionary of patient key to the patient's PRN and linked medications
+        :return: None
+        """
+        with self.__lock, self.__connection:
+            current_cycle: int = self.current_cycle
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO patient_medications (patient_key, medications, last_seen_cycle) "
+                "VALUES (?, ?, ?)",
+                [(patient_key, pickle.dumps(medications, pickle.HIGHEST_PROTOCOL), current_cycle)
+                 for patient_key, medications in prns_and_linked_medications.items()])
+        logging.info("Imported the PRN and linked medications of {0} patient(s)"
+                     .format(len(prns_and_linked_medications)))
+
+    def record_cycle(self, patient_keys):
+        """
+        Starts a new cycle, and records that the patients with the given keys appeared in it.
+
+        :param patient_keys: The keys of every patient in the production which was loaded
+        :return: The number of the new cycle
+        """
+        with self.__lock, self.__connection:
+            current_cycle: int = self.current_cycle + 1
+            self.__connection.execute("INSERT OR REPLACE INTO store_attributes (name, value) VALUES (?, ?)",
+                                      ("current_cycle", current_cycle))
+            self.__connection.executemany("UPDATE patient_medications SET last_seen_cycle = ? WHERE patient_key = ?",
+                                          [(current_cycle, patient_key) for patient_key in patient_keys])
+        return current_cycle
+
+    def prune(self, cycles_to_keep: int):
+        """
+        Removes the PRN and linked medications of every patient who has not appeared in any of the most recent cycles,
+        and compacts the database file.
+
+        :param cycles_to_keep: The number of cycles a patient can be absent from before their medications are removed
+        :return: The number of patients removed
+        """
+        with self.__lock:
+            with self.__connection:
+                pruned_patients: int = self.__connection.execute(
+                    "DELETE FROM patient_medications WHERE last_seen_cycle <= ?",
+                    (self.current_cycle - cycles_to_keep,)).rowcount
+            if pruned_patients > 0:
+                self.__connection.execute("VACUUM")
+        logging.info("Pruned the PRN and linked medications of {0} patient(s) not seen in {1} cycle(s)"
+                     .format(pruned_patients, cycles_to_keep))
+        return pruned_patients
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
@@ -1,6 +1,11 @@
 import logging
+import pickle
+import sqlite3
+import threading
+from collections.abc import MutableMapping
 
 from DataStructures.Models import PillpackPatient
+from DataStructures.PatientIdentityIndex import PatientIdentityIndex
 
 
 """
@@ -27,6 +32,31 @@ class CollectedPatients:
         self.matched_patients = {}
         self.minor_mismatch_patients = {}
         self.severe_mismatch_patients = {}
+        self.changed_last_names = set()
+        self._patient_identity_index = None
+
+    def __getstate__(self):
+        """The patient identity index is rebuilt from the pillpack patient dictionary, so it is never pickled."""
+        state: dict = self.__dict__.copy()
+        state.pop("_patient_identity_index", None)
+        return state
+
+    def get_patient_identity_index(self):
+
+        """
+        Retrieves the index of the pillpack production patients by their normalised identity, brought up to date with
+        the pillpack patient dictionary. Only the last names which have changed since the last call are indexed again.
+
+        CollectedPatients objects pickled by older versions, and those loaded from a pickle, do not have an index, so
+        one is created on demand.
+        :return: The PatientIdentityIndex of the pillpack production patients
+        """
+        patient_identity_index = getattr(self, "_patient_identity_index", None)
+        if patient_identity_index is None:
+            patient_identity_index = PatientIdentityIndex()
+            self._patient_identity_index = patient_identity_index
+        patient_identity_index.refresh(self.pillpack_patient_dict)
+        return patient_identity_index
 
     @staticmethod
     def __add_to_dict_of_patients(patient_to_add: PillpackPatient, dict_to_add_to: dict, name_of_dict: str):
@@ -140,8 +170,44 @@ class CollectedPatients:
         :return: None
         """
         self.pillpack_patient_dict = patient_dict
+        self.changed_last_names = None
+        if getattr(self, "_patient_identity_index", None) is not None:
+            self._patient_identity_index.invalidate()
         logging.info("Set patient pillpack dictionary as {0}".format(patient_dict))
 
+    def mark_patients_changed(self, changed_patients: list):
+
+        """
+        Records that the given patients have changed, so that views which display them only have to refresh the
+        patients stored under the same last names. Callers which modify a PillpackPatient object directly, rather than
+        through this class, should call this function before notifying the views.
+
+        CollectedPatients objects pickled by older versions do not have a record of changed last names, so one is
+        created on demand.
+        :param changed_patients: List of the PillpackPatient objects which have changed
+        :return: None
+        """
+        changed_last_names = getattr(self, "changed_last_names", set())
+        patient_identity_index = getattr(self, "_patient_identity_index", None)
+        for patient in changed_patients:
+            if isinstance(patient, PillpackPatient):
+                if changed_last_names is not None:
+                    changed_last_names.add(patient.last_name.lower())
+                if patient_identity_index is not None:
+                    patient_identity_index.mark_changed(patient.last_name.lower())
+        self.changed_last_names = changed_last_names
+
+    def take_changed_last_names(self):
+
+        """
+        Takes the record of changed last names, and starts a new, empty record.
+        :return: Set of the lowercase last names which have changed since the last call, or None if every patient
+        may have changed (e.g. the pillpack patient dictionary has been replaced)
+        """
+        changed_last_names = getattr(self, "changed_last_names", None)
+        self.changed_last_names = set()
+        return changed_last_names
+
     def add_patient(self, patient_to_add: PillpackPatient, status: str):
 
         """
@@ -155,6 +221,7 @@ class CollectedPatients:
         :param status: The status of the patient, being Unscanned, matched, minor mismatched, and unknown.
         :return: None
         """
+        self.mark_patients_changed([patient_to_add])
         patient_wrapper: dict = {
             "PatientObject": patient_to_add,
             "Status": status
@@ -183,6 +250,7 @@ class CollectedPatients:
         :param patient_to_add: PillpackPatient to be added to the dictionary
         :return: None
         """
+        self.mark_patients_changed([patient_to_add])
         self.__add_to_dict_of_patients(patient_to_add, self.pillpack_patient_dict, "Pillpack Patients")
 
     def add_matched_patient(self, patient_to_add: PillpackPatient):
@@ -194,6 +262,7 @@ class CollectedPatients:
         :param patient_to_add: PillpackPatient to be added to the dictionary
         :return: None
         """
+        self.mark_patients_changed([patient_to_add])
         self.__add_to_dict_of_patients(patient_to_add, self.matched_patients, "Matched Patients")
 
     def add_minor_mismatched_patient(self, patient_to_add: PillpackPatient):
@@ -205,6 +274,7 @@ class CollectedPatients:
         :param patient_to_add: PillpackPatient to be added to the dictionary
         :return: None
         """
+        self.mark_patients_changed([patient_to_add])
         self.__add_to_dict_of_patients(patient_to_add, self.minor_mismatch_patients, "Minor Mismatch Patients")
 
     def add_severely_mismatched_patient(self, patient_to_add: PillpackPatient):
@@ -216,6 +286,7 @@ class CollectedPatients:
         :param patient_to_add: PillpackPatient to be added to the dictionary
         :return: None
         """
+        self.mark_patients_changed([patient_to_add])
         self.__add_to_dict_of_patients(patient_to_add, self.severe_mismatch_patients, "Severe Mismatch Patients")
 
     def remove_patient(self, patient_to_remove: PillpackPatient):
@@ -230,6 +301,7 @@ class CollectedPatients:
         any value.
         :return: None
         """
+        self.mark_patients_changed([patient_to_remove])
         if self.all_patients.__contains__(patient_to_remove.last_name.lower()):
             logging.info("{0} contains patients with last name {1}"
                          .format(self.all_patients, patient_to_remove.last_name))
@@ -258,6 +330,7 @@ class CollectedPatients:
         :param patient_to_remove: PillpackPatient object to remove
         :return: None
         """
+        self.mark_patients_changed([patient_to_remove])
         self.__remove_from_dict_of_patients(patient_to_remove, self.pillpack_patient_dict,
                                             "Pillpack Patients")
 
@@ -270,6 +343,7 @@ class CollectedPatients:
         :param patient_to_remove: PillpackPatient object to remove
         :return: None
         """
+        self.mark_patients_changed([patient_to_remove])
         self.__remove_from_dict_of_patients(patient_to_remove, self.matched_patients,
                                             "Matched Patients")
 
@@ -282,6 +356,7 @@ class CollectedPatients:
         :param patient_to_remove: PillpackPatient object to remove
         :return: None
         """
+        self.mark_patients_changed([patient_to_remove])
         self.__remove_from_dict_of_patients(patient_to_remove, self.minor_mismatch_patients,
                                             "Minor Mismatched Patients")
 
@@ -294,6 +369,7 @@ class CollectedPatients:
         :param patient_to_remove: PillpackPatient object to remove
         :return: None
         """
+        self.mark_patients_changed([patient_to_remove])
         self.__remove_from_dict_of_patients(patient_to_remove, self.severe_mismatch_patients,
                                             "Severe Mismatched Patients")
 
@@ -308,5 +384,501 @@ class CollectedPatients:
         :param patient_to_be_updated: PillpackPatient object to update the old version
         :return: True statement if an update occurred successfully, False if no update occurred.
         """
+        self.mark_patients_changed([patient_to_be_updated])
         return self.__update_patient_dict(self.pillpack_patient_dict, patient_to_be_updated,
                                           "Pillpack Patients")
+
+
+class SQLitePatientDict(MutableMapping):
+    """
+
+    Dictionary-like view over one of the patient dictionaries stored by a SQLiteCollectedPatients repository. Keys are
+    lower case last names and values are lists of PillpackPatient objects (or lists of patient wrappers for the
+    all_patients dictionary), exactly as in the CollectedPatients dictionaries. Reading a key only loads the patients
+    with that last name from the database.
+
+    Returned lists are copies, so any change made to a list has to be assigned back to the view to be stored.
+    """
+    def __init__(self, repository, name_of_dict: str):
+        self.repository = repository
+        self.name_of_dict = name_of_dict
+
+    def __getitem__(self, last_name: str):
+        patients_with_last_name = self.repository.read_patient_group(self.name_of_dict, last_name)
+        if patients_with_last_name is None:
+            raise KeyError(last_name)
+        return patients_with_last_name
+
+    def __setitem__(self, last_name: str, patients_with_last_name: list):
+        self.repository.write_patient_group(self.name_of_dict, last_name, patients_with_last_name)
+
+    def __delitem__(self, last_name: str):
+        if not self.repository.delete_patient_group(self.name_of_dict, last_name):
+            raise KeyError(last_name)
+
+    def __contains__(self, last_name):
+        return self.repository.contains_patient_group(self.name_of_dict, last_name)
+
+    def __iter__(self):
+        return iter(self.repository.read_patient_group_keys(self.name_of_dict))
+
+    def __len__(self):
+        return self.repository.count_patient_groups(self.name_of_dict)
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, self.name_of_dict)
+
+
+class SQLiteCollectedPatients:
+    """
+
+    Alternative implementation of CollectedPatients which keeps all patient data in an embedded SQLite database rather
+    than in memory. It has the same public methods and patient dictionary fields as CollectedPatients, so either can be
+    used by the rest of the application.
+
+    Each patient is stored once as a pickled row, indexed on last name, first name and date of birth. The dictionaries a
+    patient belongs to (with their match status for the all_patients dictionary) are stored as separate, indexed rows,
+    so adding, removing or updating a patient only touches the rows for that patient's last name, and every change is
+    committed in its own transaction. Patients are only unpickled when their last name is looked up, and the same
+    PillpackPatient object is returned for a patient every time, no matter which dictionary it is read from.
+
+    Changes made directly to a PillpackPatient object are written to the database when save_patients is called.
+    """
+    def __init__(self, database_file: str = ":memory:"):
+        """
+        The constructor for the SQLiteCollectedPatients class. The database file, its tables and its indexes are
+        created if they do not already exist.
+
+        :param database_file: Path to the SQLite database file. Defaults to a database held in memory.
+        """
+        self.database_file = database_file
+        self.__lock = threading.RLock()
+        self.__connection = sqlite3.connect(database_file, check_same_thread=False)
+        self.__loaded_patients: dict = {}
+        self.__patient_ids: dict = {}
+        self.changed_last_names = set()
+        with self.__connection:
+            self.__connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS patients (
+                    patient_id INTEGER PRIMARY KEY,
+                    last_name_key TEXT NOT NULL,
+                    first_name TEXT NOT NULL,
+                    date_of_birth TEXT,
+                    patient_object BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS patient_identity_index
+                    ON patients (last_name_key, first_name, date_of_birth);
+                CREATE TABLE IF NOT EXISTS patient_groups (
+                    group_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name_of_dict TEXT NOT NULL,
+                    last_name_key TEXT NOT NULL,
+                    UNIQUE (name_of_dict, last_name_key)
+                );
+                CREATE TABLE IF NOT EXISTS patient_memberships (
+                    group_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    patient_id INTEGER NOT NULL,
+                    status TEXT,
+                    PRIMARY KEY (group_id, position)
+                );
+                CREATE INDEX IF NOT EXISTS membership_status_index ON patient_memberships (status);
+                CREATE INDEX IF NOT EXISTS membership_patient_index ON patient_memberships (patient_id);
+                CREATE TABLE IF NOT EXISTS repository_attributes (
+                    name TEXT PRIMARY KEY,
+                    value
+                );
+                """
+            )
+        self.pillpack_patient_dict = SQLitePatientDict(self, "pillpack_patient_dict")
+        self.all_patients = SQLitePatientDict(self, "all_patients")
+        self.matched_patients = SQLitePatientDict(self, "matched_patients")
+        self.minor_mismatch_patients = SQLitePatientDict(self, "minor_mismatch_patients")
+        self.severe_mismatch_patients = SQLitePatientDict(self, "severe_mismatch_patients")
+        self.__patient_identity_index = PatientIdentityIndex()
+        logging.info("Opened patient database {0}".format(database_file))
+
+    def __read_attribute(self, name: str, default):
+        with self.__lock:
+            row = self.__connection.execute("SELECT value FROM repository_attributes WHERE name = ?",
+                                            (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def __write_attribute(self, name: str, value):
+        with self.__lock, self.__connection:
+            self.__connection.execute("INSERT OR REPLACE INTO repository_attributes (name, value) VALUES (?, ?)",
+                                      (name, value))
+
+    @property
+    def production_group_name(self):
+        return self.__read_attribute("production_group_name", "")
+
+    @production_group_name.setter
+    def production_group_name(self, production_group_name: str):
+        self.__write_attribute("production_group_name", production_group_name)
+
+    @property
+    def ready_to_produce_code(self):
+        return self.__read_attribute("ready_to_produce_code", 0)
+
+    @ready_to_produce_code.setter
+    def ready_to_produce_code(self, ready_to_produce_code: int):
+        self.__write_attribute("ready_to_produce_code", ready_to_produce_code)
+
+    def __get_group_id(self, name_of_dict: str, last_name: str):
+        row = self.__connection.execute("SELECT group_id FROM patient_groups WHERE name_of_dict = ? "
+                                        "AND last_name_key = ?", (name_of_dict, last_name)).fetchone()
+        return None if row is None else row[0]
+
+    def __load_patient(self, patient_id: int):
+        patient = self.__loaded_patients.get(patient_id)
+        if patient is None:
+            row = self.__connection.execute("SELECT patient_object FROM patients WHERE patient_id = ?",
+                                            (patient_id,)).fetchone()
+            patient = pickle.loads(row[0])
+            self.__loaded_patients[patient_id] = patient
+            self.__patient_ids[id(patient)] = patient_id
+        return patient
+
+    def __store_patient(self, patient: PillpackPatient):
+        """Inserts the patient if this PillpackPatient object has not been stored before, otherwise overwrites its
+        stored row. Returns the patient's row id."""
+        patient_row = (patient.last_name.lower(), patient.first_name, str(patient.date_of_birth),
+                       pickle.dumps(patient, pickle.HIGHEST_PROTOCOL))
+        patient_id = self.__patient_ids.get(id(patient))
+        if patient_id is None:
+            patient_id = self.__connection.execute("INSERT INTO patients (last_name_key, first_name, date_of_birth, "
+                                                   "patient_object) VALUES (?, ?, ?, ?)", patient_row).lastrowid
+            self.__loaded_patients[patient_id] = patient
+            self.__patient_ids[id(patient)] = patient_id
+        else:
+            self.__connection.execute("UPDATE patients SET last_name_key = ?, first_name = ?, date_of_birth = ?, "
+                                      "patient_object = ? WHERE patient_id = ?", patient_row + (patient_id,))
+        return patient_id
+
+    def __remove_orphaned_patients(self, patient_ids):
+        for patient_id in set(patient_ids):
+            if self.__connection.execute("SELECT 1 FROM patient_memberships WHERE patient_id = ? LIMIT 1",
+                                         (patient_id,)).fetchone() is None:
+                self.__connection.execute("DELETE FROM patients WHERE patient_id = ?", (patient_id,))
+                patient = self.__loaded_patients.pop(patient_id, None)
+                if patient is not None:
+                    self.__patient_ids.pop(id(patient), None)
+
+    def read_patient_group(self, name_of_dict: str, last_name: str):
+        """
+        Reads the list of patients stored under a last name in one of the patient dictionaries.
+
+        :param name_of_dict: Name of the patient dictionary, e.g. pillpack_patient_dict
+        :param last_name: The lower case last name key
+        :return: List of PillpackPatient objects (or patient wrappers for all_patients), or None if the key is absent
+        """
+        with self.__lock:
+            group_id = self.__get_group_id(name_of_dict, last_name)
+            if group_id is None:
+                return None
+            memberships = self.__connection.execute("SELECT patient_id, status FROM patient_memberships "
+                                                    "WHERE group_id = ? ORDER BY position", (group_id,)).fetchall()
+            if name_of_dict == "all_patients":
+                return [{"PatientObject": self.__load_patient(patient_id), "Status": status}
+                        for patient_id, status in memberships]
+            return [self.__load_patient(patient_id) for patient_id, status in memberships]
+
+    def write_patient_group(self, name_of_dict: str, last_name: str, patients_with_last_name: list):
+        """
+        Replaces the list of patients stored under a last name in one of the patient dictionaries. If the last name is
+        already a key in the dictionary it keeps its position, otherwise it is added to the end.
+
+        :param name_of_dict: Name of the patient dictionary, e.g. pillpack_patient_dict
+        :param last_name: The lower case last name key
+        :param patients_with_last_name: List of PillpackPatient objects (or patient wrappers for all_patients)
+        :return: None
+        """
+        with self.__lock, self.__connection:
+            group_id = self.__get_group_id(name_of_dict, last_name)
+            previous_patient_ids: list = []
+            if group_id is None:
+                group_id = self.__connection.execute("INSERT INTO patient_groups (name_of_dict, last_name_key) "
+                                                     "VALUES (?, ?)", (name_of_dict, last_name)).lastrowid
+            else:
+                previous_patient_ids = [row[0] for row in self.__connection.execute(
+                    "SELECT patient_id FROM patient_memberships WHERE group_id = ?", (group_id,))]
+                self.__connection.execute("DELETE FROM patient_memberships WHERE group_id = ?", (group_id,))
+            memberships: list = []
+            for position, patient in enumerate(patients_with_last_name):
+                status = None
+                if isinstance(patient, dict):
+                    status = patient["Status"]
+                    patient = patient["PatientObject"]
+                memberships.append((group_id, position, self.__store_patient(patient), status))
+            self.__connection.executemany("INSERT INTO patient_memberships (group_id, position, patient_id, status) "
+                                          "VALUES (?, ?, ?, ?)", memberships)
+            self.__remove_orphaned_patients(previous_patient_ids)
+            if name_of_dict == "pillpack_patient_dict":
+                self.__patient_identity_index.mark_changed(last_name)
+
+    def delete_patient_group(self, name_of_dict: str, last_name: str):
+        """
+        Removes a last name key, and every patient stored under it, from one of the patient dictionaries.
+
+        :return: True if the key existed, otherwise False
+        """
+        with self.__lock, self.__connection:
+            group_id = self.__get_group_id(name_of_dict, last_name)
+            if group_id is None:
+                return False
+            previous_patient_ids: list = [row[0] for row in self.__connection.execute(
+                "SELECT patient_id FROM patient_memberships WHERE group_id = ?", (group_id,))]
+            self.__connection.execute("DELETE FROM patient_memberships WHERE group_id = ?", (group_id,))
+            self.__connection.execute("DELETE FROM patient_groups WHERE group_id = ?", (group_id,))
+            self.__remove_orphaned_patients(previous_patient_ids)
+            if name_of_dict == "pillpack_patient_dict":
+                self.__patient_identity_index.mark_changed(last_name)
+            return True
+
+    def contains_patient_group(self, name_of_dict: str, last_name: str):
+        with self.__lock:
+            return self.__get_group_id(name_of_dict, last_name) is not None
+
+    def read_patient_group_keys(self, name_of_dict: str):
+        with self.__lock:
+            return [row[0] for row in self.__connection.execute(
+                "SELECT last_name_key FROM patient_groups WHERE name_of_dict = ? ORDER BY group_id", (name_of_dict,))]
+
+    def count_patient_groups(self, name_of_dict: str):
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM patient_groups WHERE name_of_dict = ?",
+                                             (name_of_dict,)).fetchone()[0]
+
+    def find_patients(self, first_name: str, last_name: str, date_of_birth=None):
+        """
+        Looks up stored patients by name, and optionally date of birth, using the patient identity index.
+
+        :param first_name: First name of the patient
+        :param last_name: Last name of the patient
+        :param date_of_birth: Optional date of birth of the patient
+        :return: List of matching PillpackPatient objects
+        """
+        with self.__lock:
+            if date_of_birth is None:
+                rows = self.__connection.execute("SELECT patient_id FROM patients WHERE last_name_key = ? "
+                                                 "AND first_name = ?", (last_name.lower(), first_name)).fetchall()
+            else:
+                rows = self.__connection.execute("SELECT patient_id FROM patients WHERE last_name_key = ? "
+                                                 "AND first_name = ? AND date_of_birth = ?",
+                                                 (last_name.lower(), first_name, str(date_of_birth))).fetchall()
+            return [self.__load_patient(row[0]) for row in rows]
+
+    def get_patient_identity_index(self):
+        """
+        Retrieves the index of the pillpack production patients by their normalised identity, brought up to date with
+        the pillpack patient dictionary. The first call loads every pillpack production patient, after which only the
+        last names written since the last call are read from the database again.
+
+        :return: The PatientIdentityIndex of the pillpack production patients
+        """
+        with self.__lock:
+            self.__patient_identity_index.refresh(self.pillpack_patient_dict)
+            return self.__patient_identity_index
+
+    def get_patients_with_status(self, status: str):
+        """
+        Retrieves every patient in the all_patients dictionary with the given match status, using the status index.
+
+        :param status: The match status, e.g. PERFECT_MATCH
+        :return: List of PillpackPatient objects with that status
+        """
+        with self.__lock:
+            rows = self.__connection.execute("SELECT patient_id FROM patient_memberships WHERE status = ? "
+                                             "ORDER BY group_id, position", (status,)).fetchall()
+            return [self.__load_patient(row[0]) for row in rows]
+
+    def save_patients(self, changed_patients: list = None):
+        """
+        Writes changes made directly to PillpackPatient objects to the database in a single transaction.
+
+        :param changed_patients: The patients which have changed. If None, every patient which has been loaded from the
+        database is written.
+        :return: None
+        """
+        with self.__lock, self.__connection:
+            if changed_patients is None:
+                changed_patients = list(self.__loaded_patients.values())
+            for patient in changed_patients:
+                if isinstance(patient, PillpackPatient) and self.__patient_ids.__contains__(id(patient)):
+                    self.__store_patient(patient)
+        logging.info("Saved {0} patient(s) to patient database {1}".format(len(changed_patients), self.database_file))
+
+    def clear(self):
+        """
+        Removes every patient and resets the production group name and ready to produce code.
+
+        :return: None
+        """
+        with self.__lock, self.__connection:
+            for table in ("patient_memberships", "patient_groups", "patients", "repository_attributes"):
+                self.__connection.execute("DELETE FROM {0}".format(table))
+            self.__loaded_patients.clear()
+            self.__patient_ids.clear()
+            self.__patient_identity_index.invalidate()
+            self.changed_last_names = None
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+    def import_collected_patients(self, collected_patients: CollectedPatients):
+        """
+        Replaces the contents of the database with the patients of an in-memory CollectedPatients object, e.g. one
+        loaded from an older pickle file or a production archive.
+
+        :param collected_patients: The CollectedPatients object to import
+        :return: None
+        """
+        self.clear()
+        for name_of_dict in ("pillpack_patient_dict", "all_patients", "matched_patients", "minor_mismatch_patients",
+                             "severe_mismatch_patients"):
+            for last_name, patients_with_last_name in getattr(collected_patients, name_of_dict).items():
+                self.write_patient_group(name_of_dict, last_name, patients_with_last_name)
+        self.production_group_name = collected_patients.production_group_name
+        self.ready_to_produce_code = collected_patients.ready_to_produce_code
+
+    def to_collected_patients(self):
+        """
+        Copies every patient into an in-memory CollectedPatients object, e.g. so the production can be archived.
+
+        :return: CollectedPatients object holding the same patients
+        """
+        collected_patients = CollectedPatients()
+        collected_patients.production_group_name = self.production_group_name
+        collected_patients.ready_to_produce_code = self.ready_to_produce_code
+        for name_of_dict in ("pillpack_patient_dict", "all_patients", "matched_patients", "minor_mismatch_patients",
+                             "severe_mismatch_patients"):
+            setattr(collected_patients, name_of_dict, dict(getattr(self, name_of_dict).items()))
+        return collected_patients
+
+    def set_pillpack_patient_dict(self, patient_dict: dict):
+        """
+        Setter for the initial pillpack patient dictionary.
+        :param patient_dict: the dictionary to be stored as the pillpack patient dictionary.
+        :return: None
+        """
+        for last_name in list(self.pillpack_patient_dict.keys()):
+            self.delete_patient_group("pillpack_patient_dict", last_name)
+        for last_name, patients_with_last_name in patient_dict.items():
+            self.write_patient_group("pillpack_patient_dict", last_name, patients_with_last_name)
+        self.changed_last_names = None
+        logging.info("Set patient pillpack dictionary with {0} last names".format(len(patient_dict)))
+
+    def mark_patients_changed(self, changed_patients: list):
+        """
+        Records that the given patients have changed, so that views which display them only have to refresh the
+        patients stored under the same last names.
+
+        :param changed_patients: List of the PillpackPatient objects which have changed
+        :return: None
+        """
+        with self.__lock:
+            if self.changed_last_names is not None:
+                for patient in changed_patients:
+                    if isinstance(patient, PillpackPatient):
+                        self.changed_last_names.add(patient.last_name.lower())
+
+    def take_changed_last_names(self):
+        """
+        Takes the record of changed last names, and starts a new, empty record.
+
+        :return: Set of the lowercase last names which have changed since the last call, or None if every patient
+        may have changed
+        """
+        with self.__lock:
+            changed_last_names = self.changed_last_names
+            self.changed_last_names = set()
+            return changed_last_names
+
+    def __append_to_group(self, name_of_dict: str, patient_to_add):
+        patient: PillpackPatient = patient_to_add["PatientObject"] if isinstance(patient_to_add, dict) \
+            else patient_to_add
+        self.mark_patients_changed([patient])
+        patients_with_last_name = self.read_patient_group(name_of_dict, patient.last_name.lower())
+        if patients_with_last_name is None:
+            patients_with_last_name = []
+        patients_with_last_name.append(patient_to_add)
+        self.write_patient_group(name_of_dict, patient.last_name.lower(), patients_with_last_name)
+        logging.info("Added patient {0} {1} to the dictionary {2}"
+                     .format(patient.first_name, patient.last_name, name_of_dict))
+
+    def __remove_from_group(self, name_of_dict: str, patient_to_remove: PillpackPatient):
+        with self.__lock:
+            self.mark_patients_changed([patient_to_remove])
+            patients_with_last_name = self.read_patient_group(name_of_dict, patient_to_remove.last_name.lower())
+            if patients_with_last_name is None:
+                return
+            for i in range(len(patients_with_last_name)):
+                patient = patients_with_last_name[i]
+                if isinstance(patient, dict):
+                    patient = patient["PatientObject"]
+                if isinstance(patient, PillpackPatient) and patient.__eq__(patient_to_remove):
+                    patients_with_last_name.pop(i)
+                    logging.info("Located patient {0} {1} in {2}. Patient has been removed from dictionary {2}"
+                                 .format(patient_to_remove.first_name, patient_to_remove.last_name, name_of_dict))
+                    break
+            if len(patients_with_last_name) == 0:
+                self.delete_patient_group(name_of_dict, patient_to_remove.last_name.lower())
+                logging.info("No more patients with last name {0} exist within {1}. Removing last name key."
+                             .format(patient_to_remove.last_name, name_of_dict))
+            else:
+                self.write_patient_group(name_of_dict, patient_to_remove.last_name.lower(), patients_with_last_name)
+
+    def add_patient(self, patient_to_add: PillpackPatient, status: str):
+        self.__append_to_group("all_patients", {"PatientObject": patient_to_add, "Status": status})
+
+    def add_pillpack_patient(self, patient_to_add: PillpackPatient):
+        self.__append_to_group("pillpack_patient_dict", patient_to_add)
+
+    def add_matched_patient(self, patient_to_add: PillpackPatient):
+        self.__append_to_group("matched_patients", patient_to_add)
+
+    def add_minor_mismatched_patient(self, patient_to_add: PillpackPatient):
+        self.__append_to_group("minor_mismatch_patients", patient_to_add)
+
+    def add_severely_mismatched_patient(self, patient_to_add: PillpackPatient):
+        self.__append_to_group("severe_mismatch_patients", patient_to_add)
+
+    def remove_patient(self, patient_to_remove: PillpackPatient):
+        self.__remove_from_group("all_patients", patient_to_remove)
+
+    def remove_pillpack_patient(self, patient_to_remove: PillpackPatient):
+        self.__remove_from_group("pillpack_patient_dict", patient_to_remove)
+
+    def remove_matched_patient(self, patient_to_remove: PillpackPatient):
+        self.__remove_from_group("matched_patients", patient_to_remove)
+
+    def remove_minor_mismatched_patient(self, patient_to_remove: PillpackPatient):
+        self.__remove_from_group("minor_mismatch_patients", patient_to_remove)
+
+    def remove_severely_mismatched_patient(self, patient_to_remove: PillpackPatient):
+        self.__remove_from_group("severe_mismatch_patients", patient_to_remove)
+
+    def update_pillpack_patient_dict(self, patient_to_be_updated: PillpackPatient):
+        """
+        Replaces the stored patient equal to the given patient in the pillpack production dictionary.
+        :param patient_to_be_updated: PillpackPatient object to update the old version
+        :return: True statement if an update occurred successfully, False if no update occurred.
+        """
+        patient_is_updated = False
+        with self.__lock:
+            self.mark_patients_changed([patient_to_be_updated])
+            last_name: str = patient_to_be_updated.last_name.lower()
+            patients_with_last_name = self.read_patient_group("pillpack_patient_dict", last_name)
+            if patients_with_last_name is not None:
+                for i in range(0, len(patients_with_last_name)):
+                    if patients_with_last_name[i].__eq__(patient_to_be_updated):
+                        patients_with_last_name[i] = patient_to_be_updated
+                        patient_is_updated = True
+                        logging.info("Located patient {0} {1} in Pillpack Patients. Patient information has been "
+                                     "updated.".format(patient_to_be_updated.first_name,
+                                                       patient_to_be_updated.last_name))
+                if patient_is_updated:
+                    self.write_patient_group("pillpack_patient_dict", last_name, patients_with_last_name)
+        return patient_is_updated
@@ -0,0 +1,199 @@
+import datetime
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from DataStructures.Models import PillpackPatient
+from Functions.ConfigSingleton import consts
+
+"""
+
+Batch generation of the kardex and dispensation list documents of a whole production, e.g. the kardex of every patient
+who is ready to produce at the start of a cycle. The documents are the same as those generated one at a time from the
+patient view, and are named the same way, but are all written to a single output directory.
+
+Documents are rendered across a pool of worker processes, as rendering each document and encoding its datamatrices is
+CPU bound. The progress of the job is reported after every document, and a job can be cancelled between documents:
+documents which have not started are skipped, and those already being rendered are finished.
+
+The docx generation module is imported by the worker rendering each document, so importing this module does not import
+python-docx.
+
+"""
+
+KARDEX_DOCUMENT = "kardex"
+DISPENSATION_LIST_DOCUMENT = "dispensation"
+DOCUMENT_TYPES = (KARDEX_DOCUMENT, DISPENSATION_LIST_DOCUMENT)
+_DOCUMENT_FILE_NAME_SUFFIXES = {
+    KARDEX_DOCUMENT: "generated kardex",
+    DISPENSATION_LIST_DOCUMENT: "generated Dispensation list"
+}
+PATIENT_FILTER_CODES = {
+    consts.SHOW_ALL_RESULTS_STRING: consts.SHOW_ALL_RESULTS_CODE,
+    consts.READY_TO_PRODUCE_STRING: consts.READY_TO_PRODUCE_CODE,
+    consts.NOTHING_TO_COMPARE_STRING: consts.NOTHING_TO_COMPARE_CODE,
+    consts.MISSING_MEDICATIONS_STRING: consts.MISSING_MEDICATIONS_CODE,
+    consts.DO_NOT_PRODUCE_STRING: consts.DO_NOT_PRODUCE_CODE,
+    consts.MANUALLY_CHECKED_STRING: consts.MANUALLY_CHECKED_CODE
+}
+_INVALID_FILE_NAME_CHARACTERS = re.compile(r'[\\/:*?"<>|]')
+
+
+def get_default_document_name(patient: PillpackPatient, production_name: str, document_type: str):
+    """Returns the name a document is saved under by default, without its .docx extension."""
+    return "{0} {1} {2} {3} {4}".format(patient.first_name, patient.last_name, production_name,
+                                        datetime.date.today(), _DOCUMENT_FILE_NAME_SUFFIXES[document_type])
+
+
+def select_patients(collected_patients, filter_code: int = None):
+    """
+    Selects the patients in a production to generate documents for, in order of last name then first name.
+
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object holding the production
+    :param filter_code: Only patients with this ready to produce code are selected, e.g.
+    consts.READY_TO_PRODUCE_CODE. Every patient is selected if it is None or consts.SHOW_ALL_RESULTS_CODE.
+    :return: List of PillpackPatient objects
+    """
+    selected_patients: list = []
+    for patients_with_last_name in collected_patients.pillpack_patient_dict.values():
+        for patient in patients_with_last_name:
+            if isinstance(patient, PillpackPatient):
+                patient.determine_ready_to_produce_code()
+                if (filter_code is None or filter_code == consts.SHOW_ALL_RESULTS_CODE
+                        or patient.ready_to_produce_code == filter_code):
+                    selected_patients.append(patient)
+    selected_patients.sort(key=lambda patient: (str(patient.last_name).lower(), str(patient.first_name).lower()))
+    return selected_patients
+
+
+def plan_documents(patients: list, production_name: str, output_directory: str,
+                   document_types: tuple = (KARDEX_DOCUMENT,)):
+    """
+    Decides the file every document of a batch is written to. Characters which cannot be used in a file name are
+    replaced, and patients whose documents would have the same name are numbered, so no document overwrites another.
+
+    :param patients: List of PillpackPatient objects to generate documents for
+    :param production_name: Name of the production group printed on the documents
+    :param output_directory: Directory the documents are written to
+    :param document_types: The types of document generated for every patient
+    :return: List of (patient, document type, file path) tuples
+    """
+    planned_documents: list = []
+    used_file_names: set = set()
+    for patient in patients:
+        for document_type in document_types:
+            document_name = _INVALID_FILE_NAME_CHARACTERS.sub(
+                "_", get_default_document_name(patient, production_name, document_type))
+            file_name = document_name + ".docx"
+            copy_number = 2
+            while file_name.lower() in used_file_names:
+                file_name = "{0} ({1}).docx".format(document_name, copy_number)
+                copy_number += 1
+            used_file_names.add(file_name.lower())
+            planned_documents.append((patient, document_type, os.path.join(output_directory, file_name)))
+    return planned_documents
+
+
+def _generate_document(patient: PillpackPatient, production_name: str, document_type: str, file_path: str):
+    """Renders a single document, in a worker process when the batch is rendered in parallel. Returns the path of the
+    document and the error which stopped it being rendered, or None. Documents are generated strictly, so a datamatrix
+    which cannot be encoded or a template which cannot be rendered fails the document rather than saving it without."""
+    try:
+        from Functions.DocxGeneration import generate_kardex_doc_file, generate_dispensation_list_doc_file
+        if document_type == DISPENSATION_LIST_DOCUMENT:
+            generate_dispensation_list_doc_file(patient, production_name, file_path, strict=True)
+        else:
+            generate_kardex_doc_file(patient, production_name, file_path, strict=True)
+        return file_path, None
+    except Exception as e:
+        logging.error("Failed to generate {0}: {1}".format(file_path, e))
+        return file_path, str(e)
+
+
+def generate_documents(patients: list, production_name: str, output_directory: str,
+                       document_types: tuple = (KARDEX_DOCUMENT,), number_of_processes: int = None,
+                       progress_callback=None, cancel_event=None):
+    """
+    Generates the documents of every patient in a batch and writes them to an output directory.
+
+    :param patients: List of PillpackPatient objects to generate documents for
+    :param production_name: Name of the production group printed on the documents
+    :param output_directory: Directory the documents are written to. It is created if it does not exist.
+    :param document_types: The types of document generated for every patient, from DOCUMENT_TYPES
+    :param number_of_processes: Number of worker processes rendering the documents. Defaults to the number of CPUs. A
+    single process renders the documents in this process.
+    :param progress_callback: Called with the number of documents finished and the total number of documents after
+    every document is finished. It is called from the thread running the job.
+    :param cancel_event: threading.Event which cancels the documents not yet started when it is set
+    :return: Dictionary reporting the number of documents planned and generated, the documents which failed, whether
+    the job was cancelled and the time it took
+    """
+    job_start = time.perf_counter()
+    os.makedirs(output_directory, exist_ok=True)
+    planned_documents: list = plan_documents(patients, production_name, output_directory, document_types)
+    if number_of_processes is None:
+        number_of_processes = os.cpu_count() or 1
+    number_of_processes = max(1, min(number_of_processes, len(planned_documents)))
+    generated_documents: list = []
+    failed_documents: list = []
+
+    def record_result(result: tuple):
+        file_path, error = result
+        if error is None:
+            generated_documents.append(file_path)
+        else:
+            failed_documents.append((file_path, error))
+        if progress_callback is not None:
+            progress_callback(len(generated_documents) + len(failed_documents), len(planned_documents))
+
+    cancelled = False
+    if number_of_processes <= 1:
+        for patient, document_type, file_path in planned_documents:
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                break
+            record_result(_generate_document(patient, production_name, document_type, file_path))
+    else:
+        logging.info("Generating {0} document(s) across {1} worker process(es)"
+                     .format(len(planned_documents), number_of_processes))
+        with ProcessPoolExecutor(max_workers=number_of_processes) as executor:
+            futures: list = [executor.submit(_generate_document, patient, production_name, document_type, file_path)
+                             for patient, document_type, file_path in planned_documents]
+            for future in as_completed(futures):
+                if not future.cancelled():
+                    record_result(future.result())
+                if not cancelled and cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    for pending_future in futures:
+                        pending_future.cancel()
+    document_report: dict = {
+        "Documents": len(planned_documents),
+        "Generated": generated_documents,
+        "Failed": failed_documents,
+        "Cancelled": cancelled,
+        "Processes": number_of_processes,
+        "OutputDirectory": output_directory,
+        "TotalSeconds": time.perf_counter() - job_start
+    }
+    logging.info("Generated {0} of {1} document(s) in {2:.3f}s{3}".format(
+        len(generated_documents), len(planned_documents), document_report["TotalSeconds"],
+        " (cancelled)" if cancelled else ""))
+    return document_report
+
+
+def format_document_report(document_report: dict):
+    lines: list = [
+        "Documents planned: {0}".format(document_report["Documents"]),
+        "Generated: {0}".format(len(document_report["Generated"])),
+        "Failed: {0}".format(len(document_report["Failed"])),
+        "Render processes: {0}".format(document_report["Processes"]),
+        "Total: {0:.3f}s".format(document_report["TotalSeconds"]),
+        "Output directory: {0}".format(document_report["OutputDirectory"])
+    ]
+    if document_report["Cancelled"]:
+        lines.append("The job was cancelled before every document was generated")
+    for file_path, error in document_report["Failed"]:
+        lines.append("Failed to generate {0}: {1}".format(file_path, error))
+    return "\n".join(lines)
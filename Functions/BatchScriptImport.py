@@ -0,0 +1,190 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from DataStructures.Models import PillpackPatient
+from Functions.ConfigSingleton import consts, load_settings
+from Functions.DAOFunctions import load_collected_patients_from_object, save_collected_patients
+from Functions.Mutations import read_patient_from_script, check_scanned_patient_medications
+
+"""
+
+Headless batch import of scanned scripts, for re-entering the scripts scanned during a scanner outage or replaying a
+day's scans for load testing. Each line of the input is the raw text of one scanned script barcode, exactly as the
+scanner would type it into the Scan Scripts window.
+
+Scripts are decoded in parallel worker processes, then matched against the collected patients one at a time in the order
+they appear in the input, so the result is the same as scanning them one after another. The changed patients are saved
+once, after every script has been matched.
+
+Usage: python -m Functions.BatchScriptImport [file] [--processes N]
+If no file (or -) is given, the scripts are read from standard input.
+
+"""
+
+
+def read_scanned_inputs(input_stream):
+    for line in input_stream:
+        scanned_input = line.rstrip("\r\n")
+        if len(scanned_input.strip()) > 0:
+            yield scanned_input
+
+
+def _decode_scanned_inputs(scanned_inputs: list):
+    """Decodes a chunk of scanned scripts in a worker process. Returns the patient read from each script (or None if it
+    could not be read) with the time in seconds it took to decode."""
+    decoded_scripts: list = []
+    for scanned_input in scanned_inputs:
+        decode_start = time.perf_counter()
+        try:
+            script_patient_object = read_patient_from_script(scanned_input)
+        except Exception as e:
+            logging.error("Failed to read patient from scanned script: {0}".format(e))
+            script_patient_object = None
+        decoded_scripts.append((script_patient_object, time.perf_counter() - decode_start))
+    return decoded_scripts
+
+
+def _split_into_chunks(scanned_inputs: list, chunk_size: int):
+    return [scanned_inputs[i:i + chunk_size] for i in range(0, len(scanned_inputs), chunk_size)]
+
+
+def summarise_latencies(latencies: list):
+    """Summarises a list of per-script latencies in seconds as their mean, median, 95th percentile and maximum in
+    milliseconds."""
+    if len(latencies) == 0:
+        return {"Mean": 0.0, "Median": 0.0, "95thPercentile": 0.0, "Max": 0.0}
+    sorted_latencies: list = sorted(latencies)
+    return {
+        "Mean": 1000 * sum(sorted_latencies) / len(sorted_latencies),
+        "Median": 1000 * sorted_latencies[len(sorted_latencies) // 2],
+        "95thPercentile": 1000 * sorted_latencies[min(len(sorted_latencies) - 1, int(len(sorted_latencies) * 0.95))],
+        "Max": 1000 * sorted_latencies[-1]
+    }
+
+
+def import_scanned_scripts(collected_patients, scanned_inputs, number_of_processes: int = None,
+                           chunk_size: int = consts.SCRIPT_IMPORT_CHUNK_SIZE):
+    """
+    Decodes every scanned script, matches the patient of each script against the collected patients in input order,
+    and saves the changed patients once at the end.
+
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object to match the scripts against
+    :param scanned_inputs: Iterable of the raw text of each scanned script
+    :param number_of_processes: Number of worker processes decoding the scripts. Defaults to the number of CPUs. A
+    single process decodes the scripts in this process.
+    :param chunk_size: Number of scripts sent to a worker process at a time
+    :return: Dictionary reporting the number of scripts imported and failed, the time taken by each stage, the
+    throughput and the per-script latency of decoding and matching
+    """
+    import_start = time.perf_counter()
+    scanned_inputs = list(scanned_inputs)
+    if number_of_processes is None:
+        number_of_processes = os.cpu_count() or 1
+    chunks: list = _split_into_chunks(scanned_inputs, chunk_size)
+    decode_start = time.perf_counter()
+    decoded_scripts: list = []
+    if number_of_processes <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            decoded_scripts.extend(_decode_scanned_inputs(chunk))
+    else:
+        logging.info("Decoding {0} scanned script(s) across {1} worker process(es)"
+                     .format(len(scanned_inputs), min(number_of_processes, len(chunks))))
+        with ProcessPoolExecutor(max_workers=min(number_of_processes, len(chunks))) as executor:
+            for decoded_chunk in executor.map(_decode_scanned_inputs, chunks):
+                decoded_scripts.extend(decoded_chunk)
+    decode_seconds = time.perf_counter() - decode_start
+
+    match_start = time.perf_counter()
+    script_patients: list = []
+    match_latencies: list = []
+    for script_patient_object, decode_latency in decoded_scripts:
+        if isinstance(script_patient_object, PillpackPatient):
+            script_match_start = time.perf_counter()
+            check_scanned_patient_medications(collected_patients, script_patient_object)
+            match_latencies.append(time.perf_counter() - script_match_start)
+            script_patients.append(script_patient_object)
+    match_seconds = time.perf_counter() - match_start
+
+    save_start = time.perf_counter()
+    if len(script_patients) > 0:
+        save_collected_patients(collected_patients, script_patients)
+    save_seconds = time.perf_counter() - save_start
+    total_seconds = time.perf_counter() - import_start
+
+    import_report: dict = {
+        "Scripts": len(scanned_inputs),
+        "Imported": len(script_patients),
+        "Failed": len(scanned_inputs) - len(script_patients),
+        "Processes": min(number_of_processes, max(len(chunks), 1)),
+        "DecodeSeconds": decode_seconds,
+        "MatchSeconds": match_seconds,
+        "SaveSeconds": save_seconds,
+        "TotalSeconds": total_seconds,
+        "ScriptsPerSecond": len(scanned_inputs) / total_seconds if total_seconds > 0 else 0.0,
+        "DecodeLatencyMs": summarise_latencies([decode_latency for patient, decode_latency in decoded_scripts]),
+        "MatchLatencyMs": summarise_latencies(match_latencies)
+    }
+    logging.info("Imported {0} of {1} scanned script(s) in {2:.3f}s".format(import_report["Imported"],
+                                                                           import_report["Scripts"], total_seconds))
+    return import_report
+
+
+def format_import_report(import_report: dict):
+    lines: list = [
+        "Scripts read: {0}".format(import_report["Scripts"]),
+        "Imported: {0}".format(import_report["Imported"]),
+        "Failed to decode: {0}".format(import_report["Failed"]),
+        "Decode processes: {0}".format(import_report["Processes"]),
+        "Decode: {0:.3f}s, match: {1:.3f}s, save: {2:.3f}s, total: {3:.3f}s".format(
+            import_report["DecodeSeconds"], import_report["MatchSeconds"], import_report["SaveSeconds"],
+            import_report["TotalSeconds"]),
+        "Throughput: {0:.1f} scripts/s".format(import_report["ScriptsPerSecond"])
+    ]
+    for stage in ("DecodeLatencyMs", "MatchLatencyMs"):
+        latencies: dict = import_report[stage]
+        lines.append("{0} latency per script (ms): mean {1:.3f}, median {2:.3f}, p95 {3:.3f}, max {4:.3f}".format(
+            stage.replace("LatencyMs", ""), latencies["Mean"], latencies["Median"], latencies["95thPercentile"],
+            latencies["Max"]))
+    return "\n".join(lines)
+
+
+def import_scanned_scripts_file(config, collected_patients, file_name: str, number_of_processes: int = None):
+    """
+    Imports every scanned script in a file, or in standard input if the file name is -, into the collected patients.
+
+    :param config: The application settings
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object the scripts are matched against
+    :param file_name: Path of the file of scanned scripts, one per line, or - to read standard input
+    :param number_of_processes: Number of worker processes decoding the scripts. Defaults to the
+    scriptImportProcesses setting.
+    :return: The import report of import_scanned_scripts
+    """
+    if number_of_processes is None:
+        number_of_processes = config.get(consts.SCRIPT_IMPORT_PROCESSES_KEY)
+    if file_name == "-":
+        return import_scanned_scripts(collected_patients, read_scanned_inputs(sys.stdin), number_of_processes)
+    with open(file_name, 'r', encoding="utf-8") as input_file:
+        return import_scanned_scripts(collected_patients, read_scanned_inputs(input_file), number_of_processes)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Import a file of scanned script barcodes, one per line, into the "
+                                                 "current production.")
+    parser.add_argument("file", nargs="?", default="-",
+                        help="File of scanned scripts. Reads standard input if omitted or -.")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Number of worker processes decoding the scripts.")
+    arguments = parser.parse_args(argv)
+    config = load_settings()
+    collected_patients = load_collected_patients_from_object(config)
+    import_report: dict = import_scanned_scripts_file(config, collected_patients, arguments.file, arguments.processes)
+    print(format_import_report(import_report))
+    return import_report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+import argparse
+import csv
+import datetime
+import json
+import logging
+import sys
+
+from Functions.ConfigSingleton import consts, load_settings, set_objects_path
+
+"""
+
+Headless command line entry point for Script Checker, which runs the production loading, script matching, reporting
+and archiving of the Functions and DataStructures modules without importing tkinter or any other part of the
+Application package. It can therefore run on a server next to the PillpackCare export.
+
+Only this module and the settings are imported when the command starts; the modules each subcommand needs are imported
+by that subcommand, so e.g. producing a report never imports the XML parser or the production loader.
+
+Usage: python -m Functions.CommandLine [--settings FILE] [--objects-path DIR] [--data-location DIR] [--verbose]
+       <command> ...
+
+Commands:
+    load-production   Loads a new production from the pillpack data location, replacing the current production
+    scan              Matches a file (or standard input) of scanned script barcodes, one per line
+    report            Lists the patients in the current production and their condition
+    archive           Archives the current production to a zip file and starts an empty production
+    archive-query     Finds a patient in archived productions, and lists the changes to their medications between them
+    changes           Lists what changed for every patient since the last cycle, or the history of one patient
+    prune-prns        Removes the PRN and linked medications of patients who have not appeared in recent productions
+    documents         Generates the kardex and/or dispensation list of every patient with a status
+
+"""
+
+REPORT_FORMATS = ("text", "csv", "json")
+
+
+def _load_collected_patients(config):
+    from Functions.DAOFunctions import load_collected_patients_from_object
+    return load_collected_patients_from_object(config)
+
+
+def _close_collected_patients(collected_patients):
+    close = getattr(collected_patients, "close", None)
+    if close is not None:
+        close()
+
+
+def load_production(config, group_name: str, earliest_start_date: datetime.date = None,
+                    number_of_processes: int = None):
+    """
+    Loads every patient in the pillpack data location into a new production, replacing the current production, and
+    saves it.
+
+    :param config: The loaded settings
+    :param group_name: The name of the production group
+    :param earliest_start_date: Only patients starting on or after this date are loaded, if given
+    :param number_of_processes: Number of worker processes reading the production files
+    :return: The CollectedPatients (or SQLiteCollectedPatients) object holding the new production, and the changes to
+    it since the last cycle
+    """
+    from Functions.DAOFunctions import (reset_collected_patients, save_collected_patients,
+                                        load_prns_and_linked_medications_from_object,
+                                        record_prns_and_linked_medications_cycle)
+    from Functions.ModelFactory import get_patient_medicine_data_ppc_parallel
+    from Functions.PatientHistory import record_loaded_production
+    collected_patients = reset_collected_patients(config, _load_collected_patients(config))
+    collected_patients.production_group_name = group_name
+    prns_and_linked_medications = load_prns_and_linked_medications_from_object()
+    collected_patients.set_pillpack_patient_dict(
+        get_patient_medicine_data_ppc_parallel(prns_and_linked_medications,
+                                               consts.PPC_SEPARATING_TAG, config,
+                                               earliest_start_date=earliest_start_date,
+                                               number_of_processes=number_of_processes)
+    )
+    save_collected_patients(collected_patients)
+    record_prns_and_linked_medications_cycle(prns_and_linked_medications, collected_patients, config)
+    prns_and_linked_medications.close()
+    return collected_patients, record_loaded_production(collected_patients)
+
+
+def get_report_rows(collected_patients, condition: str = None):
+    """
+    Builds a row for every patient in the production, in the same form as the rows of the production list on the home
+    screen, sorted by last name and then first name.
+
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object holding the production
+    :param condition: Only patients with this condition (ignoring case) are included, if given
+    :return: List of dictionaries of column name to value
+    """
+    from DataStructures.PatientRowModel import PATIENT_COLUMNS, build_patient_row
+    report_rows: list = []
+    for patients_with_last_name in collected_patients.pillpack_patient_dict.values():
+        for patient in patients_with_last_name:
+            row_values: tuple = build_patient_row(patient, patient)["Values"]
+            if condition is None or row_values[-1].lower() == condition.lower():
+                report_rows.append(dict(zip(PATIENT_COLUMNS, row_values)))
+    report_rows.sort(key=lambda row: (row["Last Name"].lower(), row["First Name"].lower()))
+    return report_rows
+
+
+def write_report(report_rows: list, report_format: str, output):
+    from DataStructures.PatientRowModel import PATIENT_COLUMNS
+    match report_format:
+        case "json":
+            json.dump(report_rows, output, indent=2)
+            output.write("\n")
+        case "csv":
+            writer = csv.DictWriter(output, fieldnames=PATIENT_COLUMNS, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(report_rows)
+        case _:
+            output.write("\t".join(PATIENT_COLUMNS) + "\n")
+            for row in report_rows:
+                output.write("\t".join(str(row[column]) for column in PATIENT_COLUMNS) + "\n")
+            conditions: dict = {}
+            for row in report_rows:
+                conditions[row["Condition"]] = conditions.get(row["Condition"], 0) + 1
+            output.write("\n{0} patient(s)".format(len(report_rows)))
+            for condition, number_of_patients in sorted(conditions.items()):
+                output.write(", {0}: {1}".format(condition, number_of_patients))
+            output.write("\n")
+
+
+def _load_production_command(config, arguments):
+    from Functions.PatientHistory import format_production_changes
+    collected_patients, production_changes = load_production(config, arguments.group, arguments.start_date,
+                                                             arguments.processes)
+    number_of_patients: int = sum(len(patients_with_last_name) for patients_with_last_name
+                                  in collected_patients.pillpack_patient_dict.values())
+    print("Loaded {0} patient(s) into production {1}".format(number_of_patients, arguments.group))
+    if production_changes is not None:
+        print(format_production_changes(production_changes))
+    _close_collected_patients(collected_patients)
+
+
+def _scan_command(config, arguments):
+    from Functions.BatchScriptImport import import_scanned_scripts_file, format_import_report
+    collected_patients = _load_collected_patients(config)
+    print(format_import_report(import_scanned_scripts_file(config, collected_patients, arguments.file,
+                                                           arguments.processes)))
+    _close_collected_patients(collected_patients)
+
+
+def _report_command(config, arguments):
+    collected_patients = _load_collected_patients(config)
+    write_report(get_report_rows(collected_patients, arguments.condition), arguments.format, sys.stdout)
+    _close_collected_patients(collected_patients)
+
+
+def _archive_command(config, arguments):
+    from Functions.DAOFunctions import archive_pillpack_production, reset_collected_patients
+    collected_patients = _load_collected_patients(config)
+    if not archive_pillpack_production(arguments.output, config, collected_patients):
+        _close_collected_patients(collected_patients)
+        raise SystemExit("Failed to archive production {0} to {1}. Nothing was removed."
+                         .format(collected_patients.production_group_name, arguments.output))
+    _close_collected_patients(reset_collected_patients(config, collected_patients))
+    print("Archived production {0} to {1}".format(collected_patients.production_group_name, arguments.output))
+
+
+def _archive_query_command(config, arguments):
+    from Functions.MedicationDiff import format_medication_diff, format_dosages, get_medication_summary
+    from Functions.ProductionArchive import find_patient_in_archives, diff_archived_patients
+    archived_patients: list = diff_archived_patients(find_patient_in_archives(arguments.archives, arguments.first_name,
+                                                                              arguments.last_name,
+                                                                              arguments.date_of_birth))
+    for archived_patient in archived_patients:
+        patient = archived_patient["Patient"]
+        print("{0:%Y-%m-%d %H:%M} {1} ({2}, {3}): {4} {5}, born {6}".format(
+            archived_patient["ArchivedOn"], archived_patient["ProductionGroupName"], archived_patient["ArchiveFile"],
+            archived_patient["Member"], patient.first_name, patient.last_name, patient.date_of_birth))
+        if archived_patient["Diff"] is None:
+            for medication_name, dosages in sorted(get_medication_summary(patient).items()):
+                print("    {0} {1}".format(medication_name, format_dosages(dosages)))
+        else:
+            for line in format_medication_diff(archived_patient["Diff"]).split("\n"):
+                print("    " + line)
+    print("Found {0} archived record(s)".format(len(archived_patients)))
+
+
+def _changes_command(config, arguments):
+    from Functions.MedicationDiff import format_medication_diff, format_dosages, diff_medication_summaries
+    from Functions.PatientHistory import PatientHistoryStore, format_production_changes
+    with PatientHistoryStore(consts.PATIENT_HISTORY_DATABASE) as patient_history_store:
+        if arguments.last_name is None:
+            production_changes: dict = patient_history_store.get_production_changes()
+            print(format_production_changes(production_changes))
+            for identity_key, medication_diff in sorted(production_changes["Changes"].items(),
+                                                        key=lambda change: change[0][:2]):
+                print("{0}, {1}, born {2}:".format(identity_key[0], identity_key[1], identity_key[2]))
+                for line in format_medication_diff(medication_diff).split("\n"):
+                    print("    " + line)
+            for identity_key in production_changes["NewPatients"]:
+                print("New patient: {0}, {1}, born {2}".format(*identity_key))
+            for identity_key in production_changes["RemovedPatients"]:
+                print("No longer in production: {0}, {1}, born {2}".format(*identity_key))
+            return
+        previous_summaries: dict = {}
+        for patient_cycle in patient_history_store.get_patient_history(arguments.first_name or "", arguments.last_name,
+                                                                       arguments.date_of_birth):
+            cycle: dict = patient_cycle["Cycle"]
+            print("{0:%Y-%m-%d %H:%M} {1}{2}: {3}, {4}, born {5}".format(
+                cycle["RecordedOn"], cycle["ProductionGroupName"], "" if cycle["Archived"] else " (current)",
+                *patient_cycle["IdentityKey"]))
+            previous_summary = previous_summaries.get(patient_cycle["IdentityKey"])
+            if previous_summary is None:
+                for medication_name, dosages in sorted(patient_cycle["Summary"].items()):
+                    print("    {0} {1}".format(medication_name, format_dosages(dosages)))
+            else:
+                for line in format_medication_diff(diff_medication_summaries(previous_summary,
+                                                                             patient_cycle["Summary"])).split("\n"):
+                    print("    " + line)
+            previous_summaries[patient_cycle["IdentityKey"]] = patient_cycle["Summary"]
+
+
+def _prune_prns_command(config, arguments):
+    from Functions.DAOFunctions import load_prns_and_linked_medications_from_object
+    cycles_to_keep = arguments.cycles
+    if cycles_to_keep is None:
+        cycles_to_keep = config.get(consts.PRN_RETENTION_CYCLES_KEY) or consts.DEFAULT_PRN_RETENTION_CYCLES
+    prns_and_linked_medications = load_prns_and_linked_medications_from_object()
+    pruned_patients: int = prns_and_linked_medications.prune(cycles_to_keep)
+    print("Pruned {0} patient(s) not seen in {1} production(s). {2} patient(s) remain.".format(
+        pruned_patients, cycles_to_keep, len(prns_and_linked_medications)))
+    prns_and_linked_medications.close()
+
+
+def _documents_command(config, arguments):
+    from Functions.BatchDocumentGeneration import (generate_documents, select_patients, format_document_report,
+                                                   PATIENT_FILTER_CODES)
+    filter_codes: dict = {status.lower(): filter_code for status, filter_code in PATIENT_FILTER_CODES.items()}
+    if arguments.status.lower() not in filter_codes:
+        raise SystemExit("Unknown status {0}. Choose from: {1}".format(arguments.status,
+                                                                      ", ".join(PATIENT_FILTER_CODES.keys())))
+    output_directory = arguments.output or config.get(consts.DOCUMENT_OUTPUT_DIRECTORY_KEY)
+    if output_directory is None:
+        raise SystemExit("No output directory given, and no {0} setting".format(consts.DOCUMENT_OUTPUT_DIRECTORY_KEY))
+    number_of_processes = arguments.processes
+    if number_of_processes is None:
+        number_of_processes = config.get(consts.DOCUMENT_GENERATION_PROCESSES_KEY)
+    collected_patients = _load_collected_patients(config)
+    patients: list = select_patients(collected_patients, filter_codes[arguments.status.lower()])
+    document_report: dict = generate_documents(
+        patients, collected_patients.production_group_name, output_directory, tuple(arguments.type or ["kardex"]),
+        number_of_processes,
+        lambda finished, total: logging.info("Generated {0} of {1} document(s)".format(finished, total)))
+    print(format_document_report(document_report))
+    _close_collected_patients(collected_patients)
+
+
+def create_argument_parser():
+    parser = argparse.ArgumentParser(description="Headless Script Checker.")
+    parser.add_argument("--settings", default=None, help="Settings file. Defaults to settings.yaml next to the "
+                                                         "application.")
+    parser.add_argument("--objects-path", default=None, help="Directory the production is saved to and loaded from.")
+    parser.add_argument("--data-location", default=None, help="Pillpack data location, in place of the "
+                                                              "pillpackDataLocation setting.")
+    parser.add_argument("--verbose", action="store_true", help="Log progress to standard error.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load_production_parser = subparsers.add_parser("load-production", help="Load a new production.")
+    load_production_parser.add_argument("--group", required=True, help="Name of the production group.")
+    load_production_parser.add_argument("--start-date", type=datetime.date.fromisoformat, default=None,
+                                        help="Only load patients starting on or after this date (YYYY-MM-DD).")
+    load_production_parser.add_argument("--processes", type=int, default=None,
+                                        help="Number of worker processes reading the production files.")
+    load_production_parser.set_defaults(run_command=_load_production_command)
+
+    scan_parser = subparsers.add_parser("scan", help="Match a file of scanned scripts, one per line.")
+    scan_parser.add_argument("file", nargs="?", default="-",
+                             help="File of scanned scripts. Reads standard input if omitted or -.")
+    scan_parser.add_argument("--processes", type=int, default=None,
+                             help="Number of worker processes decoding the scripts.")
+    scan_parser.set_defaults(run_command=_scan_command)
+
+    report_parser = subparsers.add_parser("report", help="List the patients in the current production.")
+    report_parser.add_argument("--condition", default=None,
+                               help="Only list patients with this condition, e.g. \"Ready to produce\".")
+    report_parser.add_argument("--format", choices=REPORT_FORMATS, default="text")
+    report_parser.set_defaults(run_command=_report_command)
+
+    archive_parser = subparsers.add_parser("archive", help="Archive the current production to a zip file.")
+    archive_parser.add_argument("output", help="Zip file to archive the production to.")
+    archive_parser.set_defaults(run_command=_archive_command)
+
+    archive_query_parser = subparsers.add_parser("archive-query", help="Find a patient in archived productions.")
+    archive_query_parser.add_argument("archives", nargs="+", help="Zip files of archived productions.")
+    archive_query_parser.add_argument("--first-name", required=True, help="First name of the patient.")
+    archive_query_parser.add_argument("--last-name", required=True, help="Last name of the patient.")
+    archive_query_parser.add_argument("--date-of-birth", type=datetime.date.fromisoformat, default=None,
+                                      help="Date of birth of the patient (YYYY-MM-DD).")
+    archive_query_parser.set_defaults(run_command=_archive_query_command)
+
+    changes_parser = subparsers.add_parser("changes", help="List what changed since the last cycle.")
+    changes_parser.add_argument("--first-name", default=None, help="First name of a patient to list the history of.")
+    changes_parser.add_argument("--last-name", default=None, help="Last name of a patient to list the history of.")
+    changes_parser.add_argument("--date-of-birth", type=datetime.date.fromisoformat, default=None,
+                                help="Date of birth of the patient (YYYY-MM-DD).")
+    changes_parser.set_defaults(run_command=_changes_command)
+
+    prune_prns_parser = subparsers.add_parser("prune-prns", help="Remove the PRNs and linked medications of patients "
+                                                                 "not seen in recent productions.")
+    prune_prns_parser.add_argument("--cycles", type=int, default=None,
+                                   help="Number of productions a patient can be absent from. Defaults to the "
+                                        "prnRetentionCycles setting.")
+    prune_prns_parser.set_defaults(run_command=_prune_prns_command)
+
+    documents_parser = subparsers.add_parser("documents", help="Generate the documents of every patient with a "
+                                                               "status.")
+    documents_parser.add_argument("--output", default=None,
+                                  help="Directory the documents are written to. Defaults to the "
+                                       "documentOutputDirectory setting.")
+    documents_parser.add_argument("--type", action="append", choices=("kardex", "dispensation"),
+                                  help="Type of document to generate. Can be given more than once. Defaults to "
+                                       "kardex.")
+    documents_parser.add_argument("--status", default="Ready to produce",
+                                  help="Only generate documents for patients with this status, or \"All Patients\".")
+    documents_parser.add_argument("--processes", type=int, default=None,
+                                  help="Number of worker processes rendering the documents.")
+    documents_parser.set_defaults(run_command=_documents_command)
+    return parser
+
+
+def main(argv: list = None):
+    arguments = create_argument_parser().parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO if arguments.verbose else logging.WARNING,
+                        format='%(asctime)s | %(levelname)s | %(message)s')
+    if arguments.objects_path is not None:
+        set_objects_path(arguments.objects_path)
+    config = load_settings(arguments.settings) or {}
+    if arguments.data_location is not None:
+        config["pillpackDataLocation"] = arguments.data_location
+    arguments.run_command(config, arguments)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
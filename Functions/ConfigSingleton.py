@@ -38,6 +38,22 @@ consts.DO_NOT_PRODUCE = 4
 consts.MANUALLY_CHECKED = 5
 consts.PRN_KEY = "prns_dict"
 consts.LINKED_MEDS_KEY = "linked_meds_dict"
+consts.PRODUCTION_LOAD_PROCESSES_KEY = "productionLoadProcesses"
+consts.PARALLEL_LOAD_SPLIT_SIZE = 4 * 1024 * 1024
+consts.SCRIPT_IMPORT_PROCESSES_KEY = "scriptImportProcesses"
+consts.SCRIPT_IMPORT_CHUNK_SIZE = 256
+consts.DOCUMENT_GENERATION_PROCESSES_KEY = "documentGenerationProcesses"
+consts.DOCUMENT_OUTPUT_DIRECTORY_KEY = "documentOutputDirectory"
+consts.DATAMATRIX_CACHE_SIZE = 1024
+consts.DATAMATRIX_DISK_CACHE_KEY = "datamatrixDiskCache"
+consts.DATAMATRIX_DISK_CACHE_MAX_ENTRIES_KEY = "datamatrixDiskCacheMaxEntries"
+consts.DEFAULT_DATAMATRIX_DISK_CACHE_MAX_ENTRIES = 4096
+consts.PATIENT_REPOSITORY_KEY = "patientRepository"
+consts.SQLITE_PATIENT_REPOSITORY = "sqlite"
+consts.WATCHDOG_DEBOUNCE_KEY = "watchdogDebounceSeconds"
+consts.PRN_RETENTION_CYCLES_KEY = "prnRetentionCycles"
+consts.DEFAULT_PRN_RETENTION_CYCLES = 12
+consts.DEFAULT_WATCHDOG_DEBOUNCE_SECONDS = 1.0
 warning_constants = types.SimpleNamespace()
 warning_constants.PILLPACK_DATA_OVERWRITE_WARNING = "WARNING: You already have a pillpack production dataset open! " \
                                                     "If you reload the downloaded pillpack data, " \
@@ -54,25 +70,46 @@ bookmark_constants.MINOR_MISMATCH_PATIENTS_VIEW = 2
 bookmark_constants.SEVERE_MISMATCH_PATIENTS_VIEW = 3
 if getattr(sys, 'frozen', False):
     application_path = os.path.dirname(sys.executable)
-    objects_path = os.environ['APPDATA'] + "\\ScriptCheckerObjects"
+    objects_path = os.path.join(os.environ['APPDATA'], "ScriptCheckerObjects")
     if not os.path.exists(objects_path):
         os.makedirs(objects_path)
 else:
     application_path = os.path.dirname(os.path.abspath(os.path.join(os.path.dirname(__file__))))
     objects_path = application_path
 consts.APP_PATH = application_path
-consts.OBJECTS_PATH = objects_path
-consts.COLLECTED_PATIENTS_FILE = consts.OBJECTS_PATH + '\\Patients.pk1'
-consts.PRNS_AND_LINKED_MEDICATIONS_FILE = consts.OBJECTS_PATH + '\\PrnsAndLinkedMeds.pk1'
+consts.SETTINGS_FILE = os.path.join(application_path, "settings.yaml")
 
 
-def load_settings():
-    with open(application_path + "\\settings.yaml", 'r') as file:
+def set_objects_path(new_objects_path: str):
+    """Sets the directory the patient, PRN and linked medication files, the patient history and the datamatrix cache are
+    saved to and loaded from."""
+    consts.OBJECTS_PATH = new_objects_path
+    consts.COLLECTED_PATIENTS_FILE = os.path.join(new_objects_path, 'Patients.pk1')
+    consts.PRNS_AND_LINKED_MEDICATIONS_FILE = os.path.join(new_objects_path, 'PrnsAndLinkedMeds.pk1')
+    consts.PRNS_AND_LINKED_MEDICATIONS_DATABASE = os.path.join(new_objects_path, 'PrnsAndLinkedMeds.sqlite3')
+    consts.COLLECTED_PATIENTS_DATABASE = os.path.join(new_objects_path, 'Patients.sqlite3')
+    consts.PATIENT_HISTORY_DATABASE = os.path.join(new_objects_path, 'PatientHistory.sqlite3')
+    consts.DATAMATRIX_CACHE_DIRECTORY = os.path.join(new_objects_path, 'DatamatrixCache')
+
+
+set_objects_path(objects_path)
+
+
+def load_settings(settings_file: str = None):
+    with open(settings_file or consts.SETTINGS_FILE, 'r') as file:
         settings = file.read()
     return yaml.safe_load(settings)
 
 
+def modify_setting(key: str, value):
+    try:
+        settings = load_settings() or {}
+    except FileNotFoundError:
+        settings = {}
+    settings[key] = value
+    with open(consts.SETTINGS_FILE, 'w') as file:
+        yaml.dump(settings, file, sort_keys=False)
+
+
 def modify_pillpack_location(new_location: str):
-    location_json = {"pillpackDataLocation": new_location}
-    with open(application_path + "\\settings.yaml", 'w') as file:
-        yaml.dump(location_json, file, sort_keys=False)
+    modify_setting("pillpackDataLocation", new_location)
@@ -1,11 +1,17 @@
-from datetime import datetime
 import os
 import pickle
 from os import scandir
 from zipfile import ZipFile
 from Functions.ConfigSingleton import consts
+from Functions.DatamatrixCache import clear_datamatrix_cache
+from Functions.PatientJournal import (write_collected_patients_snapshot, append_collected_patients_changes,
+                                      load_collected_patients_with_journal, remove_collected_patients_files)
+from Functions.ProductionArchive import (add_production_to_archive, IndexedProductionArchive, LegacyProductionArchive,
+                                         ARCHIVE_MEMBER_SUFFIX, LEGACY_ARCHIVE_MEMBER_SUFFIX)
+from Functions.PatientHistory import record_archived_production
 from DataStructures.Models import PillpackPatient
-from DataStructures.Repositories import CollectedPatients
+from DataStructures.PrnsAndLinkedMedications import SQLitePrnsAndLinkedMedications
+from DataStructures.Repositories import CollectedPatients, SQLiteCollectedPatients
 
 import logging
 
@@ -21,29 +27,36 @@ def scan_pillpack_folder(filepath: str):
 
 
 def archive_pillpack_production(archive_file, config, collected_patients: CollectedPatients):
-    if config is not None:
-        archive_file_name = consts.OBJECTS_PATH + "archived_production_{0}.pk1".format(datetime.today().date())
-        ppc_processed_files = scan_pillpack_folder(config["pillpackDataLocation"])
-        pillpack_directory = config["pillpackDataLocation"] + "\\"
-        with ZipFile(archive_file.name, 'a') as archived_production_data:
-            for file in ppc_processed_files:
-                try:
-                    os.remove(pillpack_directory + file.name)
-                    logging.info("Removed file {0} from the pillpack directory {1}".format(file.name, pillpack_directory))
-                except FileNotFoundError as e:
-                    logging.exception("{0}\n Failed to located file...".format(e))
-            try:
-                save_to_file(collected_patients, archive_file_name)
-                archived_production_data.write(archive_file_name)
-                logging.info("Archived patient pickle file successfully.")
-            except Exception as e:
-                logging.error("Failed to write to production archive... {0}".format(e))
-            try:
-                os.remove(archive_file_name)
-                os.remove(consts.COLLECTED_PATIENTS_FILE)
-                logging.info("Removed the pickle file of this production")
-            except Exception as e:
-                logging.error("Failed to remove archive file and collected patients pickle file... {0}".format(e))
+    """The archive file is either the path of the zip file, or a file object opened on it. The production is streamed
+    into the zip file as an indexed archive, one last name at a time. Only once it has been archived are the processed
+    pillpack files and the saved production removed, the production recorded in the patient history as the last cycle,
+    and the datamatrices cached for its documents removed. Returns True if the production was archived, and False if
+    it was not, in which case nothing is removed."""
+    if config is None:
+        return False
+    try:
+        member_name = add_production_to_archive(archive_file if isinstance(archive_file, str)
+                                                else archive_file.name, collected_patients)
+        logging.info("Archived production to {0} successfully.".format(member_name))
+    except Exception as e:
+        logging.error("Failed to write to production archive... {0}".format(e))
+        return False
+    ppc_processed_files = scan_pillpack_folder(config["pillpackDataLocation"])
+    pillpack_directory = config["pillpackDataLocation"]
+    for file in ppc_processed_files:
+        try:
+            os.remove(os.path.join(pillpack_directory, file.name))
+            logging.info("Removed file {0} from the pillpack directory {1}".format(file.name, pillpack_directory))
+        except FileNotFoundError as e:
+            logging.exception("{0}\n Failed to located file...".format(e))
+    clear_datamatrix_cache()
+    record_archived_production(collected_patients)
+    try:
+        remove_collected_patients_files(consts.COLLECTED_PATIENTS_FILE)
+        logging.info("Removed the pickle file of this production")
+    except Exception as e:
+        logging.error("Failed to remove collected patients pickle file... {0}".format(e))
+    return True
 
 
 def load_object(object_file_name: str):
@@ -60,15 +73,26 @@ def load_object(object_file_name: str):
 
 
 def load_collected_patients_from_zip_file(archived_production: ZipFile):
+    """Loads the most recently archived production in the zip file, whether it was archived as an indexed archive or
+    pickled whole by an older version."""
     o = None
     try:
+        production_archives: list = []
         for info in archived_production.infolist():
-            if info.filename.endswith('.pk1'):
-                with archived_production.open(info.filename) as binary_file:
-                    o = pickle.loads(binary_file.read())
-                    logging.info("Loaded file {0} from archive {1} into memory".format(binary_file.name,
-                                                                                       archived_production.filename))
-                    break
+            if info.filename.endswith(ARCHIVE_MEMBER_SUFFIX):
+                production_archives.append(IndexedProductionArchive(archived_production.filename,
+                                                                    archived_production, info))
+            elif info.filename.endswith(LEGACY_ARCHIVE_MEMBER_SUFFIX):
+                production_archives.append(LegacyProductionArchive(archived_production.filename,
+                                                                   archived_production, info))
+        if len(production_archives) > 0:
+            production_archives.sort(key=lambda production_archive: production_archive.archived_on)
+            with production_archives[-1] as production_archive:
+                o = production_archive.load_collected_patients()
+                logging.info("Loaded file {0} from archive {1} into memory".format(production_archive.member_name,
+                                                                                   archived_production.filename))
+            for production_archive in production_archives:
+                production_archive.close()
     except Exception as e:
         o = None
         logging.error("{0} \nCould not load file from archive {1} into memory".format(e, archived_production.filename))
@@ -76,52 +100,135 @@ def load_collected_patients_from_zip_file(archived_production: ZipFile):
         return o
 
 
-def load_collected_patients_from_object():
-    collected_patients: CollectedPatients = load_object(consts.COLLECTED_PATIENTS_FILE)
+def uses_sqlite_patient_repository(config):
+    return isinstance(config, dict) and config.get(consts.PATIENT_REPOSITORY_KEY) == consts.SQLITE_PATIENT_REPOSITORY
+
+
+def load_collected_patients_from_object(config=None):
+    if uses_sqlite_patient_repository(config):
+        return load_collected_patients_from_database()
+    collected_patients: CollectedPatients = load_collected_patients_with_journal(consts.COLLECTED_PATIENTS_FILE)
     if collected_patients is None:
         collected_patients = CollectedPatients()
     return collected_patients
 
 
+def load_collected_patients_from_database():
+    collected_patients = SQLiteCollectedPatients(consts.COLLECTED_PATIENTS_DATABASE)
+    if (len(collected_patients.pillpack_patient_dict) == 0 and len(collected_patients.all_patients) == 0
+            and os.path.exists(consts.COLLECTED_PATIENTS_FILE)):
+        """The patient database is new, so any patients saved by the pickle based repository are moved into it."""
+        pickled_collected_patients = load_collected_patients_with_journal(consts.COLLECTED_PATIENTS_FILE)
+        if isinstance(pickled_collected_patients, CollectedPatients):
+            collected_patients.import_collected_patients(pickled_collected_patients)
+            logging.info("Imported patients from {0} into patient database {1}"
+                         .format(consts.COLLECTED_PATIENTS_FILE, consts.COLLECTED_PATIENTS_DATABASE))
+    return collected_patients
+
+
+def reset_collected_patients(config, current_collected_patients=None,
+                             replacement_collected_patients: CollectedPatients = None):
+    """Returns the repository to use for a new (or replacement) production, in place of the current one. The SQLite
+    repository is emptied and reused, rather than a second connection being opened to the same database."""
+    if uses_sqlite_patient_repository(config):
+        collected_patients = current_collected_patients
+        if not isinstance(collected_patients, SQLiteCollectedPatients):
+            collected_patients = SQLiteCollectedPatients(consts.COLLECTED_PATIENTS_DATABASE)
+        if isinstance(replacement_collected_patients, CollectedPatients):
+            collected_patients.import_collected_patients(replacement_collected_patients)
+        else:
+            collected_patients.clear()
+        return collected_patients
+    if isinstance(replacement_collected_patients, CollectedPatients):
+        return replacement_collected_patients
+    return CollectedPatients()
+
+
 def load_prns_and_linked_medications_from_object():
-    print(consts.PRNS_AND_LINKED_MEDICATIONS_FILE)
-    prns_and_linked_medications: dict = load_object(consts.PRNS_AND_LINKED_MEDICATIONS_FILE)
-    if prns_and_linked_medications is None:
-        prns_and_linked_medications = {}
+    """Opens the PRN and linked medications database. No patient's medications are read until that patient is built.
+    The first time it is opened, the PrnsAndLinkedMeds pickle of an older version is imported into it."""
+    logging.info("Loading PRNs and linked medications from {0}".format(consts.PRNS_AND_LINKED_MEDICATIONS_DATABASE))
+    prns_and_linked_medications = SQLitePrnsAndLinkedMedications(consts.PRNS_AND_LINKED_MEDICATIONS_DATABASE)
+    if not prns_and_linked_medications.read_attribute("imported_pickle_file", False):
+        if os.path.exists(consts.PRNS_AND_LINKED_MEDICATIONS_FILE):
+            legacy_prns_and_linked_medications = load_object(consts.PRNS_AND_LINKED_MEDICATIONS_FILE)
+            if isinstance(legacy_prns_and_linked_medications, dict):
+                prns_and_linked_medications.import_prns_and_linked_medications(legacy_prns_and_linked_medications)
+        prns_and_linked_medications.write_attribute("imported_pickle_file", True)
     return prns_and_linked_medications
 
 
-def save_collected_patients(collected_patients: CollectedPatients):
-    save_to_file(collected_patients, consts.COLLECTED_PATIENTS_FILE)
+def save_collected_patients(collected_patients: CollectedPatients, changed_patients: list = None):
+    """If the patients which have changed are known, only they are appended to the journal. Otherwise a full snapshot
+    of every patient is saved."""
+    if isinstance(collected_patients, SQLiteCollectedPatients):
+        collected_patients.save_patients(changed_patients)
+    elif changed_patients is None:
+        write_collected_patients_snapshot(collected_patients, consts.COLLECTED_PATIENTS_FILE)
+    else:
+        append_collected_patients_changes(collected_patients, consts.COLLECTED_PATIENTS_FILE, changed_patients)
 
 
 def save_prns_and_linked_medications(patient_prns_and_linked_medications_dict: dict):
     save_to_file(patient_prns_and_linked_medications_dict, consts.PRNS_AND_LINKED_MEDICATIONS_FILE)
 
 
+def get_prns_and_linked_medications_key(patient: PillpackPatient):
+    return patient.first_name.lower() + " " + patient.last_name.lower() + " " + str(patient.date_of_birth)
+
+
 def update_current_prns_and_linked_medications(patient: PillpackPatient,
                                                collected_patients: CollectedPatients,
                                                prns_and_linked_medications: dict):
+    """Only the patient's own record is written to the PRN and linked medications database. A plain dictionary is
+    saved to the PrnsAndLinkedMeds pickle in full."""
     if collected_patients.pillpack_patient_dict.__contains__(patient.last_name.lower()):
-        key: str = patient.first_name.lower() + " " + patient.last_name.lower() + " " + str(patient.date_of_birth)
+        key: str = get_prns_and_linked_medications_key(patient)
         prns_ignored_medications_sub_dict: dict = {
-            consts.PRN_KEY: patient.prn_medications_dict,
-            consts.LINKED_MEDS_KEY: patient.linked_medications
+            consts.PRN_KEY: dict(patient.prn_medications_dict),
+            consts.LINKED_MEDS_KEY: dict(patient.linked_medications)
         }
         prns_and_linked_medications[key] = prns_ignored_medications_sub_dict
-        save_prns_and_linked_medications(prns_and_linked_medications)
+        if not isinstance(prns_and_linked_medications, SQLitePrnsAndLinkedMedications):
+            save_prns_and_linked_medications(prns_and_linked_medications)
         logging.info("Updated patient {0} {1}'s PRNs and linked medications."
                      .format(patient.first_name, patient.last_name))
 
 
 def retrieve_prns_and_linked_medications(patient: PillpackPatient, prns_and_linked_medications: dict):
-    key = patient.first_name.lower() + " " + patient.last_name.lower() + " " + str(patient.date_of_birth)
-    if prns_and_linked_medications.__contains__(key):
-        patient.prn_medications_dict = prns_and_linked_medications[key][consts.PRN_KEY]
-        patient.linked_medications = prns_and_linked_medications[key][consts.LINKED_MEDS_KEY]
+    prns_and_linked_medications_sub_dict = prns_and_linked_medications.get(get_prns_and_linked_medications_key(patient))
+    if prns_and_linked_medications_sub_dict is not None:
+        patient.prn_medications_dict = prns_and_linked_medications_sub_dict[consts.PRN_KEY]
+        patient.linked_medications = prns_and_linked_medications_sub_dict[consts.LINKED_MEDS_KEY]
     return patient
 
 
+def record_prns_and_linked_medications_cycle(prns_and_linked_medications, collected_patients, config=None):
+    """
+    Records a newly loaded production as a cycle in the PRN and linked medications database, then prunes the
+    medications of the patients who have not appeared in the number of cycles given by the prnRetentionCycles setting.
+
+    :param prns_and_linked_medications: The loaded PRNs and linked medications
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object holding the new production
+    :param config: The loaded settings
+    :return: The number of patients whose medications were pruned
+    """
+    if not isinstance(prns_and_linked_medications, SQLitePrnsAndLinkedMedications):
+        return 0
+    try:
+        prns_and_linked_medications.record_cycle([get_prns_and_linked_medications_key(patient)
+                                                  for patients_with_last_name
+                                                  in collected_patients.pillpack_patient_dict.values()
+                                                  for patient in patients_with_last_name])
+        cycles_to_keep = consts.DEFAULT_PRN_RETENTION_CYCLES
+        if isinstance(config, dict) and config.get(consts.PRN_RETENTION_CYCLES_KEY) is not None:
+            cycles_to_keep = config[consts.PRN_RETENTION_CYCLES_KEY]
+        return prns_and_linked_medications.prune(cycles_to_keep)
+    except Exception as e:
+        logging.error("Failed to record the production in the PRN and linked medications database... {0}".format(e))
+        return 0
+
+
 def save_to_file(object_to_save, filename):
     with open(filename, 'wb') as output:
         try:
@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from Functions.ConfigSingleton import consts, load_settings
+from Functions.XML import encode_to_datamatrix_png
+
+"""
+
+Content addressed cache of encoded datamatrices. Each datamatrix is stored as the PNG image printed on the kardexes and
+dispensation lists, under the SHA-256 hash of the XML payload it encodes, so a medication payload which has not changed
+is never encoded again: not for another document, not when a document is regenerated, and not after the application is
+restarted.
+
+The most recently used images are held in memory, and the least recently used image is evicted once the cache is full.
+The payloads identify patients and their medications, so images are only written to disk if the datamatrixDiskCache
+setting is on. The on-disk tier (the DatamatrixCache directory next to the saved production) is shared by every process
+generating documents and survives restarts, but holds at most datamatrixDiskCacheMaxEntries images, the least recently
+used being removed first, and is emptied whenever a production is archived. An image on disk which cannot be read,
+or is not a PNG image, is encoded again and replaced.
+
+"""
+
+DATAMATRIX_CACHE_VERSION = 1
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_default_cache_lock = threading.Lock()
+_default_cache = None
+_default_cache_settings = None
+
+
+class DatamatrixCache:
+    """
+    Cache of the PNG images of encoded datamatrices, keyed by the hash of the payload each one encodes. The cache can be
+    used from several threads at once.
+    """
+    def __init__(self, max_entries: int = 1024, cache_directory: str = None,
+                 encoding_function: Callable[[str], bytes] = encode_to_datamatrix_png, max_disk_entries: int = 4096):
+        """
+        The constructor for the DatamatrixCache class.
+
+        :param max_entries: The number of images held in memory before the least recently used image is evicted
+        :param cache_directory: Directory the on-disk tier of the cache is kept in, or None to only cache images in
+        memory. It is created when the first image is written to it.
+        :param encoding_function: Function encoding a payload into the PNG image of its datamatrix
+        :param max_disk_entries: The number of images kept on disk before the least recently used images are removed
+        """
+        self.max_entries: int = max_entries
+        self.cache_directory: str = cache_directory
+        self.max_disk_entries: int = max_disk_entries
+        self._disk_entries = None
+        self.encoding_function: Callable[[str], bytes] = encoding_function
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self._images: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(payload: str):
+        """Returns the key an encoded payload is cached under. The version of the cache is part of the key, so images
+        encoded differently by an earlier version are never reused."""
+        return hashlib.sha256("{0}:{1}".format(DATAMATRIX_CACHE_VERSION, payload).encode("utf8")).hexdigest()
+
+    def _get_file_name(self, key: str):
+        return os.path.join(self.cache_directory, key[:2], key + ".png")
+
+    def _read_from_disk(self, key: str):
+        """Reads an image from disk, touching the file so that images still in use are the last to be pruned."""
+        if self.cache_directory is None:
+            return None
+        file_name: str = self._get_file_name(key)
+        try:
+            with open(file_name, 'rb') as image_file:
+                image: bytes = image_file.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning("Failed to read cached datamatrix {0}: {1}".format(key, e))
+            return None
+        if not image.startswith(_PNG_SIGNATURE):
+            logging.warning("Cached datamatrix {0} is not a PNG image. Encoding it again.".format(key))
+            return None
+        try:
+            os.utime(file_name)
+        except OSError as e:
+            logging.warning("Failed to touch cached datamatrix {0}: {1}".format(key, e))
+        return image
+
+    def _write_to_disk(self, key: str, image: bytes):
+        if self.cache_directory is None:
+            return
+        file_name: str = self._get_file_name(key)
+        temporary_file_name: str = "{0}.{1}.{2}.tmp".format(file_name, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            with open(temporary_file_name, 'wb') as image_file:
+                image_file.write(image)
+            replaced_image: bool = os.path.exists(file_name)
+            os.replace(temporary_file_name, file_name)
+        except OSError as e:
+            logging.warning("Failed to write cached datamatrix {0}: {1}".format(key, e))
+            return
+        with self._lock:
+            if self._disk_entries is None:
+                self._disk_entries = len(self._list_disk_entries())
+            elif not replaced_image:
+                self._disk_entries += 1
+            if self._disk_entries > self.max_disk_entries:
+                self._prune_disk()
+
+    def _list_disk_entries(self):
+        disk_entries: list = []
+        for directory_path, directory_names, file_names in os.walk(self.cache_directory):
+            for file_name in file_names:
+                if file_name.endswith(".png"):
+                    disk_entries.append(os.path.join(directory_path, file_name))
+        return disk_entries
+
+    def _prune_disk(self):
+        """Removes the least recently used images from disk, leaving room for a tenth of the on-disk tier to be
+        written before it is pruned again."""
+        disk_entries: list = []
+        for file_name in self._list_disk_entries():
+            try:
+                disk_entries.append((os.path.getmtime(file_name), file_name))
+            except OSError:
+                pass
+        disk_entries.sort()
+        entries_to_keep: int = self.max_disk_entries - self.max_disk_entries // 10
+        for modified_time, file_name in disk_entries[:max(0, len(disk_entries) - entries_to_keep)]:
+            try:
+                os.remove(file_name)
+            except OSError as e:
+                logging.warning("Failed to remove cached datamatrix {0}: {1}".format(file_name, e))
+        self._disk_entries = min(len(disk_entries), entries_to_keep)
+
+    def _remember(self, key: str, image: bytes):
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+
+    def get_png(self, payload: str):
+        """
+        Returns the PNG image of the datamatrix encoding a payload. The payload is only encoded if its image is neither
+        in memory nor on disk.
+
+        :param payload: The XML string encoded into the datamatrix
+        :return: The PNG image of the datamatrix, as bytes
+        """
+        key: str = self.get_key(payload)
+        with self._lock:
+            image: bytes = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.memory_hits += 1
+                return image
+        image = self._read_from_disk(key)
+        if image is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            image = self.encoding_function(payload)
+            with self._lock:
+                self.misses += 1
+            self._write_to_disk(key, image)
+        self._remember(key, image)
+        return image
+
+    def clear(self):
+        """Empties the in-memory tier of the cache. Images already written to disk are kept."""
+        with self._lock:
+            self._images.clear()
+
+    def clear_disk(self):
+        """Removes every image from the on-disk tier of the cache."""
+        if self.cache_directory is None:
+            return
+        with self._lock:
+            shutil.rmtree(self.cache_directory, ignore_errors=True)
+            self._disk_entries = 0
+
+    def __len__(self):
+        return len(self._images)
+
+
+def _get_disk_cache_settings():
+    """Returns whether images are written to disk, and how many are kept there, from the settings."""
+    try:
+        settings = load_settings() or {}
+    except Exception as e:
+        logging.warning("Could not read the datamatrix cache settings: {0}".format(e))
+        settings = {}
+    max_disk_entries: int = (settings.get(consts.DATAMATRIX_DISK_CACHE_MAX_ENTRIES_KEY)
+                             or consts.DEFAULT_DATAMATRIX_DISK_CACHE_MAX_ENTRIES)
+    return bool(settings.get(consts.DATAMATRIX_DISK_CACHE_KEY, False)), max_disk_entries
+
+
+def get_datamatrix_cache():
+    """Returns the cache used to encode the datamatrices of every document generated by this process. If the
+    datamatrixDiskCache setting is on, its on-disk tier is kept in consts.DATAMATRIX_CACHE_DIRECTORY, so it moves with
+    the saved production. The settings are read when the cache is first used."""
+    global _default_cache, _default_cache_settings
+    with _default_cache_lock:
+        if _default_cache_settings is None:
+            _default_cache_settings = _get_disk_cache_settings()
+        use_disk, max_disk_entries = _default_cache_settings
+        cache_directory = consts.DATAMATRIX_CACHE_DIRECTORY if use_disk else None
+        if _default_cache is None or _default_cache.cache_directory != cache_directory:
+            _default_cache = DatamatrixCache(consts.DATAMATRIX_CACHE_SIZE, cache_directory,
+                                             max_disk_entries=max_disk_entries)
+        return _default_cache
+
+
+def get_datamatrix_png(payload: str):
+    """Returns the PNG image of the datamatrix encoding a payload from the cache of this process."""
+    return get_datamatrix_cache().get_png(payload)
+
+
+def clear_datamatrix_cache():
+    """Empties the cache of this process and removes every image from consts.DATAMATRIX_CACHE_DIRECTORY, whether or not
+    the on-disk tier is in use, e.g. once the production the images were generated for has been archived."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is not None:
+            _default_cache.clear()
+            _default_cache = None
+    DatamatrixCache(cache_directory=consts.DATAMATRIX_CACHE_DIRECTORY).clear_disk()
+    logging.info("Cleared the datamatrix cache {0}".format(consts.DATAMATRIX_CACHE_DIRECTORY))
@@ -9,7 +9,8 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
 from docx.shared import Inches, Pt
 from docx.table import _Cell, Table
 
-from Functions.XML import encode_to_datamatrix, encode_medications_to_xml
+from Functions.DatamatrixCache import get_datamatrix_png
+from Functions.XML import encode_medications_to_xml
 from DataStructures.Models import Medication, PillpackPatient
 
 
@@ -186,9 +187,32 @@ def create_kardex_doc_file():
     return _create_doc_file_custom_page_format(False, 0.25, 0.25, 0.25, 0.25)
 
 
-def datamatrix_builder(document: Document, patient: PillpackPatient, document_name: str,
-                       medication_list: list, list_type: str,
-                       encoding_function: Callable[[PillpackPatient, list, str], list]):
+def _get_datamatrix_block(patient: PillpackPatient, document_name: str, medication_list: list, list_type: str,
+                          encoding_function: Callable[[PillpackPatient, list, str], list], heading: str = None):
+    """
+    Collects everything printed in one medication block of a dispensation list: the optional heading above it, the row
+    of the medication table for each medication, and the datamatrices the medications are encoded into.
+
+    :param patient: The PillpackPatient object the dispensation list is generated for
+    :param document_name: Path of the document, which the file names of the datamatrix images are based on
+    :param medication_list: List of the medications in the block
+    :param list_type: The type of medication in the block, e.g. "(Pillpack)" or "(PRN)"
+    :param encoding_function: Function encoding the medications into the XML strings held by each datamatrix
+    :param heading: The heading printed above the block, or None if the block has no heading
+    :return: Dictionary of the heading, the (drug name, dosage, doctor's directions) row of each medication and the
+    (file name, PNG bytes) of each datamatrix
+    """
+    medication_rows: list = [(medication.medication_name, str(medication.dosage), medication.doctors_orders)
+                             for medication in medication_list if isinstance(medication, Medication)]
+    meds_as_xml: list = encoding_function(patient, medication_list, list_type)
+    datamatrices: list = [(document_name + "_{0}_datamatrix_{1}.png".format(list_type, i),
+                           get_datamatrix_png(meds_as_xml[i])) for i in range(0, len(meds_as_xml))]
+    return {"Heading": heading, "Rows": medication_rows, "Datamatrices": datamatrices}
+
+
+def _add_datamatrix_block(document: Document, datamatrix_block: dict):
+    if datamatrix_block["Heading"] is not None:
+        document.add_heading(datamatrix_block["Heading"], 0)
     table = _create_table(document, 1, 4, 'Table Grid')
     table.columns[0].width = Inches(3.1)
     table.columns[1].width = Inches(1.0)
@@ -199,31 +223,28 @@ def datamatrix_builder(document: Document, patient: PillpackPatient, document_na
     _add_column_heading(header_cells[1], "Dosage", is_bold=True)
     _add_column_heading((header_cells[2]), "Doctor's Directions", is_bold=True)
     _add_column_heading(header_cells[3], "Dispensed?", is_bold=True)
-    for medication in medication_list:
-        if isinstance(medication, Medication):
-            row_cells = table.add_row().cells
-            _set_cell(row_cells[0], medication.medication_name, font_size=10,
-                      spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-            _set_cell(row_cells[1], str(medication.dosage), font_size=10,
-                      spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-            _set_cell(row_cells[2], medication.doctors_orders, font_size=10,
-                      spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-    meds_as_xml: list = encoding_function(patient, medication_list, list_type)
+    for medication_name, dosage, doctors_orders in datamatrix_block["Rows"]:
+        row_cells = table.add_row().cells
+        _set_cell(row_cells[0], medication_name, font_size=10,
+                  spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+        _set_cell(row_cells[1], dosage, font_size=10,
+                  spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+        _set_cell(row_cells[2], doctors_orders, font_size=10,
+                  spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
     datamatrix_table = _create_container_table(document, 1, 1)
     datamatrix_table_cells = datamatrix_table.rows[0].cells
     datamatrix_table_paragraph = datamatrix_table_cells[0].add_paragraph()
     datamatrix_table_run = datamatrix_table_paragraph.add_run()
-    for i in range(0, len(meds_as_xml)):
-        encoded_xml = meds_as_xml[i]
-        meds_as_datamatrix_pil = encode_to_datamatrix(encoded_xml)
-        meds_as_datamatrix_pil.save(document_name + "_{0}_datamatrix_{1}.png".format(list_type, i))
-        datamatrix = datamatrix_table_run.add_picture(document_name + "_{0}_datamatrix_{1}.png".format(list_type, i))
+    for datamatrix_file_name, datamatrix_png in datamatrix_block["Datamatrices"]:
+        with open(datamatrix_file_name, "wb") as datamatrix_file:
+            datamatrix_file.write(datamatrix_png)
+        datamatrix = datamatrix_table_run.add_picture(datamatrix_file_name)
         datamatrix.width = Inches(2)
         datamatrix.height = Inches(2)
-        os.remove(document_name + "_{0}_datamatrix_{1}.png".format(list_type, i))
+        os.remove(datamatrix_file_name)
     meds_datamatrix = document.add_paragraph()
     dm_text_run = meds_datamatrix.add_run()
-    if len(meds_as_xml) > 1:
+    if len(datamatrix_block["Datamatrices"]) > 1:
         dm_text_run.add_text("\n\n\nNOTE: The following datamatrices are to be used for dispensing ONLY."
                              " They are NOT a suitable substitute "
                              "for a medication prescription(s) issued by a qualified doctor.\n\n\n")
@@ -233,112 +254,205 @@ def datamatrix_builder(document: Document, patient: PillpackPatient, document_na
                              "for a medication prescription issued by a qualified doctor.\n\n\n")
 
 
-def generate_dispensation_list_doc_file(patient: PillpackPatient, production_group_name: str, doc_name: str):
+def datamatrix_builder(document: Document, patient: PillpackPatient, document_name: str,
+                       medication_list: list, list_type: str,
+                       encoding_function: Callable[[PillpackPatient, list, str], list]):
+    _add_datamatrix_block(document, _get_datamatrix_block(patient, document_name, medication_list, list_type,
+                                                          encoding_function))
+
+
+def _get_dispensation_list_details(patient: PillpackPatient, production_group_name: str):
+    return {
+        "Heading": "Pillpack Medications This Cycle ({0} {1})".format(patient.first_name, patient.last_name),
+        "PatientName": "Name: {0} {1}".format(patient.first_name, patient.last_name),
+        "DateOfBirth": "Date of Birth: {0}".format(patient.date_of_birth),
+        "ProductionGroup": "Production Group: {0}".format(production_group_name),
+        "Surgery": "Surgery: {0}".format(patient.surgery),
+        "Address": "Address: {0}".format(patient.address),
+        "ScriptDate": "Date on script: {0}".format(patient.script_date),
+        "GeneratedOn": "Dispensation list generated on {0}".format(datetime.date.today())
+    }
+
+
+def _get_dispensation_list_blocks(patient: PillpackPatient, doc_name: str):
+    if patient.manually_checked_flag:
+        pillpack_medications: list = list(patient.production_medications_dict.values())
+    else:
+        pillpack_medications: list = list(patient.matched_medications_dict.values())
+    datamatrix_blocks: list = [_get_datamatrix_block(patient, doc_name, pillpack_medications, "(Pillpack)",
+                                                     encode_medications_to_xml)]
+    if len(patient.prns_for_current_cycle) > 0:
+        datamatrix_blocks.append(_get_datamatrix_block(patient, doc_name, patient.prns_for_current_cycle, "(PRN)",
+                                                       encode_medications_to_xml,
+                                                       "PRNs This Cycle({0} {1})".format(patient.first_name,
+                                                                                        patient.last_name)))
+    return datamatrix_blocks
+
+
+def _populate_dispensation_list_doc(prn_doc: Document, details: dict, datamatrix_blocks: list):
+    prn_doc.add_heading(details["Heading"], 0)
+    container_table = _create_container_table(prn_doc, 1, 3)
+    container_table_cells = container_table.rows[0].cells
+    _create_single_column_table(prn_doc, container_table_cells[0], "Patient Details:",
+                                [details["PatientName"], details["DateOfBirth"]], 2.25)
+    _create_single_column_table(prn_doc, container_table_cells[1], details["ProductionGroup"],
+                                [details["Surgery"], details["Address"]], 2.25)
+    _create_single_column_table(prn_doc, container_table_cells[2], "Important Info/Special Instructions:",
+                                [details["ScriptDate"], details["GeneratedOn"]], 2.25, 'Table Grid')
+    for datamatrix_block in datamatrix_blocks:
+        _add_datamatrix_block(prn_doc, datamatrix_block)
+
+
+def generate_dispensation_list_doc_file(patient: PillpackPatient, production_group_name: str, doc_name: str,
+                                        strict: bool = False):
+    """
+    Generates the dispensation list of a patient. The document is rendered from the cached template of a dispensation
+    list, and is only built cell by cell with python-docx if it cannot be rendered from the template.
+
+    :param patient: The PillpackPatient object the dispensation list is generated for
+    :param production_group_name: Name of the production group printed on the dispensation list
+    :param doc_name: Path the dispensation list is saved to
+    :param strict: If True, an error encoding the datamatrices or rendering the template is raised instead of being
+    logged, and no document is saved
+    :return: None
+    """
+    details: dict = _get_dispensation_list_details(patient, production_group_name)
+    try:
+        datamatrix_blocks: list = _get_dispensation_list_blocks(patient, doc_name)
+    except Exception as e:
+        if strict:
+            raise
+        logging.exception(e)
+        datamatrix_blocks: list = []
+    try:
+        from Functions.DocxTemplates import render_dispensation_list_doc_file
+        render_dispensation_list_doc_file(doc_name, details, datamatrix_blocks)
+        return
+    except Exception as e:
+        if strict:
+            raise
+        logging.error("Failed to render {0} from the dispensation list template: {1}".format(doc_name, e))
     prn_doc: Document = create_prn_list_doc_file()
     try:
-        prn_doc.add_heading("Pillpack Medications This Cycle ({0} {1})".format(patient.first_name,
-                                                                               patient.last_name), 0)
-        container_table = _create_container_table(prn_doc, 1, 3)
-        container_table_cells = container_table.rows[0].cells
-        _create_single_column_table(prn_doc, container_table_cells[0], "Patient Details:",
-                                    ["Name: {0} {1}".format(patient.first_name, patient.last_name),
-                                     "Date of Birth: {0}".format(patient.date_of_birth)], 2.25)
-        _create_single_column_table(prn_doc, container_table_cells[1],
-                                    "Production Group: {0}".format(production_group_name),
-                                    ["Surgery: {0}".format(patient.surgery), "Address: {0}".format(patient.address)],
-                                    2.25)
-        _create_single_column_table(prn_doc, container_table_cells[2], "Important Info/Special Instructions:",
-                                    ["Date on script: {0}".format(patient.script_date),
-                                     "Dispensation list generated on {0}".format(datetime.date.today())], 2.25,
-                                    'Table Grid')
-        if patient.manually_checked_flag:
-            datamatrix_builder(prn_doc, patient, doc_name,
-                               list(patient.production_medications_dict.values()),
-                               "(Pillpack)", encode_medications_to_xml)
-        else:
-            datamatrix_builder(prn_doc, patient, doc_name,
-                               list(patient.matched_medications_dict.values()),
-                               "(Pillpack)", encode_medications_to_xml)
-        if len(patient.prns_for_current_cycle) > 0:
-            prn_doc.add_heading("PRNs This Cycle({0} {1})".format(patient.first_name,
-                                                                  patient.last_name), 0)
-            datamatrix_builder(prn_doc, patient, doc_name,
-                               patient.prns_for_current_cycle, "(PRN)",
-                               encode_medications_to_xml)
+        _populate_dispensation_list_doc(prn_doc, details, datamatrix_blocks)
     except Exception as e:
         logging.exception(e)
     finally:
         save_doc_file(prn_doc, doc_name)
 
 
-def generate_kardex_doc_file(patient: PillpackPatient, production_group_name: str, doc_name: str):
+def _get_kardex_details(patient: PillpackPatient, production_group_name: str):
+    return {
+        "PatientName": "Name: {0} {1}".format(patient.first_name, patient.last_name),
+        "DateOfBirth": "Date of Birth: {0}".format(patient.date_of_birth),
+        "ProductionGroup": "Production Group: {0}".format(production_group_name),
+        "Surgery": "Surgery: {0}".format(patient.surgery),
+        "Address": "Address: {0}".format(patient.address),
+        "GeneratedOn": "New kardex generated on {0}".format(datetime.date.today())
+    }
+
+
+def _get_kardex_medication_rows(patient: PillpackPatient):
+    """Returns the (drug name and strength, morning, afternoon, evening, night) row of each medication on the kardex.
+    The dosage of a time of day the medication is not taken at is None."""
+    medication_rows: list = []
+    for medication in patient.production_medications_dict.values():
+        if isinstance(medication, Medication):
+            medication_rows.append((medication.medication_name + " ({0})".format(medication.dosage),) + tuple(
+                str(dosage) if dosage is not None else None
+                for dosage in (medication.morning_dosage, medication.afternoon_dosage, medication.evening_dosage,
+                               medication.night_dosage)))
+    return medication_rows
+
+
+def _populate_kardex_doc(kardex_doc: Document, details: dict, medication_rows: list):
+    kardex_doc.add_heading("Pillpack Kardex", 0)
+    container_table = _create_container_table(kardex_doc, 1, 3)
+    container_table_cells = container_table.rows[0].cells
+    _create_single_column_table(kardex_doc, container_table_cells[0], "Patient Details:",
+                                [details["PatientName"], details["DateOfBirth"]], 3.55)
+    _create_single_column_table(kardex_doc, container_table_cells[1], details["ProductionGroup"],
+                                [details["Surgery"], details["Address"]], 3.55)
+    _create_single_column_table(kardex_doc, container_table_cells[2], "Important Info/Special Instructions:",
+                                ["", details["GeneratedOn"],
+                                 "Pharmacist Signature:",
+                                 ""], 3.55)
+    kardex_table = _create_table(kardex_doc, 1, 22, 'Table Grid')
+    kardex_table.columns[0].width = Inches(3.1)
+    kardex_table.columns[1].width = Inches(0.8)
+    header_cells = kardex_table.rows[0].cells
+    _add_column_heading(header_cells[0], "Drug name and Strength", is_bold=True)
+    _add_column_heading(header_cells[1], "Change? (Pharmacist signature)", is_bold=True, font_size=8)
+    _add_column_heading(header_cells[2], "M", is_bold=True)
+    _add_column_heading(header_cells[3], "L", is_bold=True)
+    _add_column_heading(header_cells[4], "T", is_bold=True)
+    _add_column_heading(header_cells[5], "N", is_bold=True)
+    _add_alternating_column_headings(header_cells, 6, 21, "Rx", "P", is_bold=True)
+    _format_table_in_range(kardex_table, 2, 6, col_width=0.5)
+    _format_table_in_range(kardex_table, 6, len(kardex_table.columns), col_width=0.3)
+    _format_cells_in_range(header_cells, 6, len(kardex_table.columns), font_size=10)
+    for medication_row in medication_rows:
+        row_cells = kardex_table.add_row().cells
+        _set_cell(row_cells[0], medication_row[0], font_size=11,
+                  spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+        for i in range(1, 5):
+            if medication_row[i] is not None:
+                _set_cell(row_cells[i + 1], medication_row[i], font_size=11,
+                          alignment=WD_ALIGN_PARAGRAPH.CENTER, spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+    for i in range(0, 5):
+        kardex_table.add_row()
+    script_date_cells = kardex_table.add_row().cells
+    _set_cell(script_date_cells[0], "Date of Rx:", is_bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER,
+              spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+    start_date_cells = kardex_table.add_row().cells
+    _set_cell(start_date_cells[0], "Start date:", is_bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER,
+              spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+    pre_prod_check_cells = kardex_table.add_row().cells
+    _set_cell(pre_prod_check_cells[0], "Pre-production Rx check by:", is_bold=True,
+              alignment=WD_ALIGN_PARAGRAPH.CENTER,
+              spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+    final_check_cells = kardex_table.add_row().cells
+    _set_cell(final_check_cells[0], "Final check by:", is_bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER,
+              spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+    script_checker_cells = kardex_table.add_row().cells
+    _set_cell(script_checker_cells[0], "Checked with Script Checker:", is_bold=True,
+              alignment=WD_ALIGN_PARAGRAPH.CENTER, spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
+    _merge_row_then_alternating_cells(kardex_table, len(kardex_table.rows) - 5, len(kardex_table.rows), 0, 5,
+                                      6, len(kardex_table.columns), 1)
+
+
+def generate_kardex_doc_file(patient: PillpackPatient, production_group_name: str, doc_name: str,
+                             strict: bool = False):
+    """
+    Generates the kardex of a patient. The document is rendered from the cached template of a kardex, and is only built
+    cell by cell with python-docx if it cannot be rendered from the template.
+
+    :param patient: The PillpackPatient object the kardex is generated for
+    :param production_group_name: Name of the production group printed on the kardex
+    :param doc_name: Path the kardex is saved to
+    :param strict: If True, an error reading the medications or rendering the template is raised instead of being
+    logged, and no document is saved
+    :return: None
+    """
+    details: dict = _get_kardex_details(patient, production_group_name)
+    try:
+        medication_rows: list = _get_kardex_medication_rows(patient)
+    except Exception as e:
+        if strict:
+            raise
+        logging.error(e)
+        medication_rows: list = []
+    try:
+        from Functions.DocxTemplates import render_kardex_doc_file
+        render_kardex_doc_file(doc_name, details, medication_rows)
+        return
+    except Exception as e:
+        if strict:
+            raise
+        logging.error("Failed to render {0} from the kardex template: {1}".format(doc_name, e))
     kardex_doc: Document = create_kardex_doc_file()
     try:
-        kardex_doc.add_heading("Pillpack Kardex", 0)
-        container_table = _create_container_table(kardex_doc, 1, 3)
-        container_table_cells = container_table.rows[0].cells
-        _create_single_column_table(kardex_doc, container_table_cells[0], "Patient Details:",
-                                    ["Name: {0} {1}".format(patient.first_name, patient.last_name),
-                                     "Date of Birth: {0}".format(patient.date_of_birth)], 3.55)
-        _create_single_column_table(kardex_doc, container_table_cells[1],
-                                    "Production Group: {0}".format(production_group_name),
-                                    ["Surgery: {0}".format(patient.surgery), "Address: {0}".format(patient.address)],
-                                    3.55)
-        _create_single_column_table(kardex_doc, container_table_cells[2], "Important Info/Special Instructions:",
-                                    ["", "New kardex generated on {0}".format(datetime.date.today()),
-                                     "Pharmacist Signature:",
-                                     ""], 3.55)
-        kardex_table = _create_table(kardex_doc, 1, 22, 'Table Grid')
-        kardex_table.columns[0].width = Inches(3.1)
-        kardex_table.columns[1].width = Inches(0.8)
-        header_cells = kardex_table.rows[0].cells
-        _add_column_heading(header_cells[0], "Drug name and Strength", is_bold=True)
-        _add_column_heading(header_cells[1], "Change? (Pharmacist signature)", is_bold=True, font_size=8)
-        _add_column_heading(header_cells[2], "M", is_bold=True)
-        _add_column_heading(header_cells[3], "L", is_bold=True)
-        _add_column_heading(header_cells[4], "T", is_bold=True)
-        _add_column_heading(header_cells[5], "N", is_bold=True)
-        _add_alternating_column_headings(header_cells, 6, 21, "Rx", "P", is_bold=True)
-        _format_table_in_range(kardex_table, 2, 6, col_width=0.5)
-        _format_table_in_range(kardex_table, 6, len(kardex_table.columns), col_width=0.3)
-        _format_cells_in_range(header_cells, 6, len(kardex_table.columns), font_size=10)
-        for medication in patient.production_medications_dict.values():
-            if isinstance(medication, Medication):
-                row_cells = kardex_table.add_row().cells
-                _set_cell(row_cells[0], medication.medication_name + " ({0})".format(medication.dosage), font_size=11,
-                          spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-                if medication.morning_dosage is not None:
-                    _set_cell(row_cells[2], str(medication.morning_dosage), font_size=11,
-                              alignment=WD_ALIGN_PARAGRAPH.CENTER, spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-                if medication.afternoon_dosage is not None:
-                    _set_cell(row_cells[3], str(medication.afternoon_dosage), font_size=11,
-                              alignment=WD_ALIGN_PARAGRAPH.CENTER, spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-                if medication.evening_dosage is not None:
-                    _set_cell(row_cells[4], str(medication.evening_dosage), font_size=11,
-                              alignment=WD_ALIGN_PARAGRAPH.CENTER, spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-                if medication.night_dosage is not None:
-                    _set_cell(row_cells[5], str(medication.night_dosage), font_size=11,
-                              alignment=WD_ALIGN_PARAGRAPH.CENTER, spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-        for i in range(0, 5):
-            kardex_table.add_row()
-        script_date_cells = kardex_table.add_row().cells
-        _set_cell(script_date_cells[0], "Date of Rx:", is_bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER,
-                  spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-        start_date_cells = kardex_table.add_row().cells
-        _set_cell(start_date_cells[0], "Start date:", is_bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER,
-                  spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-        pre_prod_check_cells = kardex_table.add_row().cells
-        _set_cell(pre_prod_check_cells[0], "Pre-production Rx check by:", is_bold=True,
-                  alignment=WD_ALIGN_PARAGRAPH.CENTER,
-                  spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-        final_check_cells = kardex_table.add_row().cells
-        _set_cell(final_check_cells[0], "Final check by:", is_bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER,
-                  spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-        script_checker_cells = kardex_table.add_row().cells
-        _set_cell(script_checker_cells[0], "Checked with Script Checker:", is_bold=True,
-                  alignment=WD_ALIGN_PARAGRAPH.CENTER, spacing=1, spacing_rule=WD_LINE_SPACING.SINGLE)
-        _merge_row_then_alternating_cells(kardex_table, len(kardex_table.rows) - 5, len(kardex_table.rows), 0, 5,
-                                          6, len(kardex_table.columns), 1)
+        _populate_kardex_doc(kardex_doc, details, medication_rows)
     except Exception as e:
         logging.error(e)
     finally:
@@ -0,0 +1,407 @@
+import hashlib
+import logging
+import os
+import re
+import struct
+import tempfile
+import zipfile
+import zlib
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml.ns import qn
+from lxml import etree
+
+from Functions import DocxGeneration
+
+"""
+
+Template engine rendering kardexes and dispensation lists without building them cell by cell with python-docx.
+
+The first time a document type is rendered, its layout is built once with the same python-docx code as before, with
+tokens in place of the text of each patient, and is serialized to raw OOXML. Comments marking the parts of the layout
+which repeat (the row of each medication, each datamatrix picture, each medication block) are inserted before it is
+serialized, so the skeleton can be split into fragments. Each document is then rendered by substituting the text of the
+patient into the fragments and joining them, and is written straight into a copy of the docx package.
+
+Text is substituted the same way python-docx sets the text of a run, so a rendered document is equivalent to the one
+python-docx builds for the same patient.
+
+"""
+
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELATIONSHIPS_PART = "word/_rels/document.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+_TOKEN = "@@{0}@@"
+_BEGIN_MARKER = "@@BEGIN {0}@@"
+_END_MARKER = "@@END {0}@@"
+_SLOT_PATTERN = re.compile(r'<w:r><w:t(?: xml:space="preserve")?>@@(?P<run>\w+)@@</w:t></w:r>'
+                           r'|<w:t(?: xml:space="preserve")?>@@(?P<text>\w+)@@</w:t>'
+                           r'|@@(?P<raw>\w+)@@')
+_RUN_CONTENT_SEPARATORS = re.compile(r"([\t\r\n])")
+_INVALID_XML_CHARACTERS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_IMAGE_RELATIONSHIP = '<Relationship Id="{0}" Type="{1}" Target="media/image{2}.png"/>'
+_RUN_SLOT = "run"
+_TEXT_SLOT = "text"
+_RAW_SLOT = "raw"
+
+
+class _Tokens(dict):
+    """Details of a document which hold the token of each detail, so the layout of a document can be captured with
+    tokens in place of the details of a patient."""
+    def __missing__(self, key):
+        return _TOKEN.format(key)
+
+
+def _mark(first_element, name: str, last_element=None):
+    if last_element is None:
+        last_element = first_element
+    first_element.addprevious(etree.Comment(_BEGIN_MARKER.format(name)))
+    last_element.addnext(etree.Comment(_END_MARKER.format(name)))
+
+
+def _serialize_document(document):
+    return etree.tostring(document.element, encoding="UTF-8", standalone=True).decode("utf-8")
+
+
+def _extract_regions(xml: str, names: list):
+    """
+    Cuts the regions marked with each name out of serialized OOXML. Each region is replaced by a slot with the same
+    name, which the rendered region is substituted into.
+
+    :param xml: Serialized OOXML holding the marked regions
+    :param names: The names of the regions to extract
+    :return: The OOXML with the regions replaced by slots, and a dictionary of the OOXML of each region
+    """
+    regions: dict = {}
+    for name in names:
+        region_pattern = re.compile("<!--{0}-->(.*?)<!--{1}-->".format(re.escape(_BEGIN_MARKER.format(name)),
+                                                                        re.escape(_END_MARKER.format(name))),
+                                    re.DOTALL)
+        region_match = region_pattern.search(xml)
+        if region_match is None:
+            raise ValueError("The template has no region named {0}".format(name))
+        regions[name] = region_match.group(1)
+        xml = xml[:region_match.start()] + _TOKEN.format(name) + xml[region_match.end():]
+    return xml, regions
+
+
+def _compile_template(xml: str):
+    """
+    Splits a fragment of OOXML into the literal OOXML between its slots and the slots themselves. The text of a run
+    holding only a token becomes a text slot, and every other token is a raw slot which OOXML is substituted into.
+
+    :param xml: Fragment of OOXML holding tokens
+    :return: Tuple of the literal strings and the (slot type, name) tuples of the template, in order
+    """
+    template: list = []
+    literal_start = 0
+    for slot_match in _SLOT_PATTERN.finditer(xml):
+        template.append(xml[literal_start:slot_match.start()])
+        slot_type = slot_match.lastgroup
+        template.append((slot_type, slot_match.group(slot_type)))
+        literal_start = slot_match.end()
+    template.append(xml[literal_start:])
+    return tuple(part for part in template if part != "")
+
+
+def _get_run_content_xml(text: str):
+    """Returns the OOXML python-docx sets as the content of a run holding the text. Tabs and line breaks become
+    w:tab and w:br elements, and the text between them w:t elements."""
+    if _INVALID_XML_CHARACTERS.search(text) is not None:
+        raise ValueError("All strings must be XML compatible: {0!r}".format(text))
+    run_content: list = []
+    for text_piece in _RUN_CONTENT_SEPARATORS.split(text):
+        if text_piece == "\t":
+            run_content.append("<w:tab/>")
+        elif text_piece in ("\r", "\n"):
+            run_content.append("<w:br/>")
+        elif text_piece != "":
+            if len(text_piece.strip()) < len(text_piece):
+                run_content.append('<w:t xml:space="preserve">{0}</w:t>'.format(escape(text_piece)))
+            else:
+                run_content.append("<w:t>{0}</w:t>".format(escape(text_piece)))
+    return "".join(run_content)
+
+
+def _escape_attribute(value: str):
+    return escape(value, {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"})
+
+
+def _render(template: tuple, values: dict):
+    rendered: list = []
+    for part in template:
+        if isinstance(part, str):
+            rendered.append(part)
+            continue
+        slot_type, name = part
+        value = values[name]
+        if slot_type == _RAW_SLOT:
+            rendered.append(value)
+            continue
+        run_content: str = _get_run_content_xml("" if value is None else value)
+        if slot_type == _RUN_SLOT:
+            rendered.append("<w:r>{0}</w:r>".format(run_content) if run_content != "" else "<w:r/>")
+        else:
+            rendered.append(run_content)
+    return "".join(rendered)
+
+
+def _get_package_parts(document):
+    package_stream = BytesIO()
+    document.save(package_stream)
+    with zipfile.ZipFile(package_stream) as package:
+        return tuple((part_name, package.read(part_name)) for part_name in package.namelist())
+
+
+def _get_static_package(package_parts: tuple):
+    """Compresses the parts of a captured docx package which are the same in every document (the styles, theme,
+    settings...) once, so they are not compressed again for every document rendered."""
+    package_stream = BytesIO()
+    with zipfile.ZipFile(package_stream, "w", compression=zipfile.ZIP_DEFLATED) as package:
+        for part_name, part_contents in package_parts:
+            if part_name not in (CONTENT_TYPES_PART, DOCUMENT_PART, DOCUMENT_RELATIONSHIPS_PART):
+                package.writestr(part_name, part_contents)
+    return package_stream.getvalue()
+
+
+def _save_package(file_name, static_package: bytes, rendered_parts: list):
+    """
+    Writes a rendered document into a copy of the static parts of the docx package it was captured from.
+
+    :param file_name: Path (or file object) the document is saved to
+    :param static_package: The compressed static parts of the package, as returned by _get_static_package
+    :param rendered_parts: List of the (name, contents) of the rendered parts of the document: its content types,
+    document and document relationships, and the images it holds
+    :return: None
+    """
+    package_stream = BytesIO(static_package)
+    with zipfile.ZipFile(package_stream, "a", compression=zipfile.ZIP_DEFLATED) as package:
+        for part_name, part_contents in rendered_parts:
+            package.writestr(part_name, part_contents)
+    if isinstance(file_name, (str, os.PathLike)):
+        with open(file_name, "wb") as doc_file:
+            doc_file.write(package_stream.getvalue())
+    else:
+        file_name.write(package_stream.getvalue())
+    logging.info("Saved Generated Kardex Docx File {0}".format(file_name))
+
+
+@lru_cache(maxsize=None)
+def _get_kardex_template():
+    """
+    Captures the skeleton of a kardex. The kardex is laid out with two medications: one taken at every time of day,
+    which the row of each medication is rendered from, and one which is not, which the empty dosage cells are taken
+    from.
+
+    :return: Dictionary of the compiled document, medication row and dosage cell templates, and the package parts
+    """
+    kardex_doc = DocxGeneration.create_kardex_doc_file()
+    package_parts: tuple = _get_package_parts(kardex_doc)
+    dosage_tokens: tuple = tuple(_TOKEN.format("Dosage") for i in range(0, 4))
+    DocxGeneration._populate_kardex_doc(kardex_doc, _Tokens(),
+                                        [(_TOKEN.format("MedicationName"),) + dosage_tokens,
+                                         (_TOKEN.format("MedicationName"), None, None, None, None)])
+    medication_row, empty_medication_row = kardex_doc.tables[-1]._tbl.tr_lst[1:3]
+    _mark(medication_row, "MedicationRows", empty_medication_row)
+    _mark(medication_row, "MedicationRow")
+    _mark(empty_medication_row, "EmptyMedicationRow")
+    for i in range(2, 6):
+        _mark(medication_row.tc_lst[i], "DosageCell{0}".format(i))
+        _mark(empty_medication_row.tc_lst[i], "EmptyDosageCell{0}".format(i))
+    document_xml, document_regions = _extract_regions(_serialize_document(kardex_doc), ["MedicationRows"])
+    _, medication_rows = _extract_regions(document_regions["MedicationRows"],
+                                          ["MedicationRow", "EmptyMedicationRow"])
+    medication_row_xml, dosage_cells = _extract_regions(medication_rows["MedicationRow"],
+                                                        ["DosageCell{0}".format(i) for i in range(2, 6)])
+    _, empty_dosage_cells = _extract_regions(medication_rows["EmptyMedicationRow"],
+                                             ["EmptyDosageCell{0}".format(i) for i in range(2, 6)])
+    return {
+        "Document": _compile_template(document_xml),
+        "MedicationRow": _compile_template(medication_row_xml),
+        "DosageCells": tuple(_compile_template(dosage_cells["DosageCell{0}".format(i)]) for i in range(2, 6)),
+        "EmptyDosageCells": tuple(empty_dosage_cells["EmptyDosageCell{0}".format(i)] for i in range(2, 6)),
+        "StaticPackage": _get_static_package(package_parts),
+        "ContentTypes": dict(package_parts)[CONTENT_TYPES_PART],
+        "DocumentRelationships": dict(package_parts)[DOCUMENT_RELATIONSHIPS_PART]
+    }
+
+
+def render_kardex_doc_file(doc_name, details: dict, medication_rows: list):
+    """
+    Renders a kardex from the cached kardex template and saves it.
+
+    :param doc_name: Path (or file object) the kardex is saved to
+    :param details: Dictionary of the patient details printed on the kardex, as returned by
+    DocxGeneration._get_kardex_details
+    :param medication_rows: List of the (drug name and strength, morning, afternoon, evening, night) row of each
+    medication, with None for each time of day the medication is not taken at
+    :return: None
+    """
+    kardex_template: dict = _get_kardex_template()
+    rendered_rows: list = []
+    for medication_row in medication_rows:
+        row_values: dict = {"MedicationName": medication_row[0]}
+        for i in range(1, 5):
+            if medication_row[i] is None:
+                row_values["DosageCell{0}".format(i + 1)] = kardex_template["EmptyDosageCells"][i - 1]
+            else:
+                row_values["DosageCell{0}".format(i + 1)] = _render(kardex_template["DosageCells"][i - 1],
+                                                                    {"Dosage": medication_row[i]})
+        rendered_rows.append(_render(kardex_template["MedicationRow"], row_values))
+    document_xml: str = _render(kardex_template["Document"], dict(details, MedicationRows="".join(rendered_rows)))
+    _save_package(doc_name, kardex_template["StaticPackage"],
+                  [(CONTENT_TYPES_PART, kardex_template["ContentTypes"]), (DOCUMENT_PART, document_xml.encode("utf-8")),
+                   (DOCUMENT_RELATIONSHIPS_PART, kardex_template["DocumentRelationships"])])
+
+
+def _get_placeholder_png(size: int = 1):
+    """Returns a blank greyscale PNG image of the given size, which stands in for the datamatrices of a captured
+    dispensation list."""
+    def png_chunk(chunk_type: bytes, chunk_data: bytes):
+        return (struct.pack(">I", len(chunk_data)) + chunk_type + chunk_data
+                + struct.pack(">I", zlib.crc32(chunk_type + chunk_data)))
+    return (b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0))
+            + png_chunk(b"IDAT", zlib.compress(b"\x00" * (size + 1) * size)) + png_chunk(b"IEND", b""))
+
+
+@lru_cache(maxsize=None)
+def _get_dispensation_list_template():
+    """
+    Captures the skeleton of a dispensation list. The dispensation list is laid out with two medication blocks: one
+    without a heading holding a medication and two datamatrices, and one with a heading holding neither, so every
+    variant of a block is captured.
+
+    :return: Dictionary of the compiled document, block and picture templates, and the package parts
+    """
+    prn_doc = DocxGeneration.create_prn_list_doc_file()
+    package_parts: tuple = _get_package_parts(prn_doc)
+    with tempfile.TemporaryDirectory() as picture_directory:
+        DocxGeneration._populate_dispensation_list_doc(prn_doc, _Tokens(), [
+            {"Heading": None,
+             "Rows": [(_TOKEN.format("MedicationName"), _TOKEN.format("Dosage"), _TOKEN.format("DoctorsOrders"))],
+             "Datamatrices": [(os.path.join(picture_directory, "datamatrix_{0}.png".format(i)),
+                               _get_placeholder_png()) for i in range(0, 2)]},
+            {"Heading": _TOKEN.format("BlockHeading"), "Rows": [], "Datamatrices": []}
+        ])
+    picture_content_types: bytes = dict(_get_package_parts(prn_doc))[CONTENT_TYPES_PART]
+    body_elements: list = list(prn_doc.element.body)
+    medication_table, datamatrix_table, plural_note, heading_paragraph, _, empty_datamatrix_table, singular_note = \
+        body_elements[2:9]
+    datamatrix, second_datamatrix = datamatrix_table.iter(qn("w:drawing"))
+    second_datamatrix.getparent().remove(second_datamatrix)
+    for picture_properties in datamatrix.iter(qn("wp:docPr")):
+        picture_properties.set("id", _TOKEN.format("PictureId"))
+        picture_properties.set("name", "Picture " + _TOKEN.format("PictureId"))
+    for picture_properties in datamatrix.iter(qn("pic:cNvPr")):
+        picture_properties.set("name", _TOKEN.format("PictureName"))
+    for picture_blip in datamatrix.iter(qn("a:blip")):
+        picture_blip.set(qn("r:embed"), _TOKEN.format("PictureRelationshipId"))
+    _mark(medication_table, "DatamatrixBlocks", singular_note)
+    _mark(medication_table, "MedicationTable")
+    _mark(medication_table.tr_lst[1], "MedicationRows")
+    _mark(datamatrix_table, "DatamatrixTable")
+    _mark(datamatrix, "Datamatrices")
+    _mark(plural_note, "PluralNote")
+    _mark(heading_paragraph, "HeadingParagraph")
+    _mark(empty_datamatrix_table, "EmptyDatamatrixTable")
+    _mark(singular_note, "SingularNote")
+    document_xml, document_regions = _extract_regions(_serialize_document(prn_doc), ["DatamatrixBlocks"])
+    _, block_regions = _extract_regions(document_regions["DatamatrixBlocks"],
+                                        ["MedicationTable", "DatamatrixTable", "PluralNote", "HeadingParagraph",
+                                         "EmptyDatamatrixTable", "SingularNote"])
+    medication_table_xml, medication_rows = _extract_regions(block_regions["MedicationTable"], ["MedicationRows"])
+    datamatrix_table_xml, datamatrices = _extract_regions(block_regions["DatamatrixTable"], ["Datamatrices"])
+    package_contents: dict = dict(package_parts)
+    return {
+        "Document": _compile_template(document_xml),
+        "HeadingParagraph": _compile_template(block_regions["HeadingParagraph"]),
+        "MedicationTable": _compile_template(medication_table_xml),
+        "MedicationRow": _compile_template(medication_rows["MedicationRows"]),
+        "DatamatrixTable": _compile_template(datamatrix_table_xml),
+        "Datamatrix": _compile_template(datamatrices["Datamatrices"]),
+        "EmptyDatamatrixTable": block_regions["EmptyDatamatrixTable"],
+        "PluralNote": block_regions["PluralNote"],
+        "SingularNote": block_regions["SingularNote"],
+        "StaticPackage": _get_static_package(package_parts),
+        "ContentTypes": package_contents[CONTENT_TYPES_PART],
+        "PictureContentTypes": picture_content_types,
+        "DocumentRelationships": package_contents[DOCUMENT_RELATIONSHIPS_PART].decode("utf-8")
+    }
+
+
+def _get_next_relationship_id(used_relationship_ids: set):
+    """Returns the first rId not used by the document, the same way python-docx numbers a new relationship."""
+    relationship_number = 1
+    while "rId{0}".format(relationship_number) in used_relationship_ids:
+        relationship_number += 1
+    used_relationship_ids.add("rId{0}".format(relationship_number))
+    return "rId{0}".format(relationship_number)
+
+
+def render_dispensation_list_doc_file(doc_name, details: dict, datamatrix_blocks: list):
+    """
+    Renders a dispensation list from the cached dispensation list template and saves it. Datamatrices with the same
+    image are stored in the document once and named after the first of them, as python-docx stores them.
+
+    :param doc_name: Path (or file object) the dispensation list is saved to
+    :param details: Dictionary of the patient details printed on the dispensation list, as returned by
+    DocxGeneration._get_dispensation_list_details
+    :param datamatrix_blocks: List of the medication blocks of the dispensation list, as returned by
+    DocxGeneration._get_datamatrix_block
+    :return: None
+    """
+    dispensation_list_template: dict = _get_dispensation_list_template()
+    used_relationship_ids: set = set(re.findall(r' Id="([^"]+)"', dispensation_list_template["DocumentRelationships"]))
+    document_images: dict = {}
+    image_relationships: list = []
+    media_parts: list = []
+    picture_id = 0
+    rendered_blocks: list = []
+    for datamatrix_block in datamatrix_blocks:
+        if datamatrix_block["Heading"] is not None:
+            rendered_blocks.append(_render(dispensation_list_template["HeadingParagraph"],
+                                           {"BlockHeading": datamatrix_block["Heading"]}))
+        rendered_rows: str = "".join(
+            _render(dispensation_list_template["MedicationRow"],
+                    {"MedicationName": medication_name, "Dosage": dosage, "DoctorsOrders": doctors_orders})
+            for medication_name, dosage, doctors_orders in datamatrix_block["Rows"])
+        rendered_blocks.append(_render(dispensation_list_template["MedicationTable"],
+                                       {"MedicationRows": rendered_rows}))
+        if len(datamatrix_block["Datamatrices"]) == 0:
+            rendered_blocks.append(dispensation_list_template["EmptyDatamatrixTable"])
+        else:
+            rendered_datamatrices: list = []
+            for datamatrix_file_name, datamatrix_png in datamatrix_block["Datamatrices"]:
+                image_hash: str = hashlib.sha1(datamatrix_png).hexdigest()
+                if image_hash not in document_images:
+                    document_images[image_hash] = (_get_next_relationship_id(used_relationship_ids),
+                                                   _escape_attribute(os.path.basename(datamatrix_file_name)))
+                    media_parts.append(("word/media/image{0}.png".format(len(media_parts) + 1), datamatrix_png))
+                    image_relationships.append(_IMAGE_RELATIONSHIP.format(document_images[image_hash][0],
+                                                                          RELATIONSHIP_TYPE.IMAGE, len(media_parts)))
+                picture_id += 1
+                rendered_datamatrices.append(_render(dispensation_list_template["Datamatrix"], {
+                    "PictureId": str(picture_id),
+                    "PictureName": document_images[image_hash][1],
+                    "PictureRelationshipId": document_images[image_hash][0]
+                }))
+            rendered_blocks.append(_render(dispensation_list_template["DatamatrixTable"],
+                                           {"Datamatrices": "".join(rendered_datamatrices)}))
+        if len(datamatrix_block["Datamatrices"]) > 1:
+            rendered_blocks.append(dispensation_list_template["PluralNote"])
+        else:
+            rendered_blocks.append(dispensation_list_template["SingularNote"])
+    document_xml: str = _render(dispensation_list_template["Document"],
+                                dict(details, DatamatrixBlocks="".join(rendered_blocks)))
+    document_relationships: str = dispensation_list_template["DocumentRelationships"]
+    content_types: bytes = dispensation_list_template["ContentTypes"]
+    if len(media_parts) > 0:
+        document_relationships = document_relationships.replace(
+            "</Relationships>", "".join(image_relationships) + "</Relationships>")
+        content_types = dispensation_list_template["PictureContentTypes"]
+    _save_package(doc_name, dispensation_list_template["StaticPackage"],
+                  [(CONTENT_TYPES_PART, content_types), (DOCUMENT_PART, document_xml.encode("utf-8")),
+                   (DOCUMENT_RELATIONSHIPS_PART, document_relationships.encode("utf-8"))] + media_parts)
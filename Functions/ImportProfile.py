@@ -0,0 +1,130 @@
+import argparse
+import os
+import subprocess
+import sys
+
+"""
+
+Import-time profile of the application's startup, used to catch modules which slow down startup being imported again.
+The module being profiled is imported in a fresh interpreter with python -X importtime, and the time taken to import
+each module is reported, slowest first.
+
+The heavy modules which are only needed to generate a kardex or to load a new production (python-docx, pylibdmtx, PIL
+and tkcalendar) are deferred until they are used. If any of them is imported at startup, it is reported as a deferred
+import and the profile fails.
+
+Usage: python -m Functions.ImportProfile [module] [--top N] [--budget-ms MS] [--deferred MODULE ...]
+The module defaults to App, which is imported the same way as when the application is started.
+
+"""
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPLICATION_PATH = os.path.join(PACKAGE_PATH, "Application")
+STARTUP_MODULE = "App"
+DEFERRED_MODULES = ("docx", "pylibdmtx", "PIL", "tkcalendar", "Functions.DocxGeneration", "Functions.DocxTemplates")
+
+
+def parse_import_times(import_time_output: str):
+    """
+    Parses the output of python -X importtime.
+
+    :param import_time_output: The standard error of an interpreter run with -X importtime
+    :return: List of dictionaries holding the name of each imported module, its depth in the import tree, and the time
+    taken to import it alone and together with the modules it imported, in milliseconds, in the order they finished
+    importing
+    """
+    import_times: list = []
+    for line in import_time_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields: list = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        module_name: str = fields[2].rstrip()
+        import_times.append({
+            "Module": module_name.strip(),
+            "Depth": (len(module_name) - len(module_name.lstrip()) - 1) // 2,
+            "SelfMs": int(fields[0]) / 1000,
+            "CumulativeMs": int(fields[1]) / 1000
+        })
+    return import_times
+
+
+def profile_imports(module_name: str = STARTUP_MODULE):
+    """
+    Imports a module in a fresh interpreter with python -X importtime, with the package and the Application directory
+    on the module search path, as they are when the application is started.
+
+    :param module_name: The module to profile
+    :return: List of dictionaries of the time taken to import each module, as returned by parse_import_times
+    """
+    search_path: list = [PACKAGE_PATH, APPLICATION_PATH] + [path for path in sys.path if path]
+    completed_process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module_name],
+                                       cwd=PACKAGE_PATH, capture_output=True, text=True,
+                                       env=dict(os.environ, PYTHONPATH=os.pathsep.join(search_path)))
+    if completed_process.returncode != 0:
+        raise ImportError("Failed to import {0}: {1}".format(module_name, completed_process.stderr.splitlines()[-1]))
+    return parse_import_times(completed_process.stderr)
+
+
+def find_deferred_imports(import_times: list, deferred_modules: tuple = DEFERRED_MODULES):
+    """
+    Finds the modules in an import profile which should have been deferred until they are used.
+
+    :param import_times: List of dictionaries of the time taken to import each module
+    :param deferred_modules: The names of the modules (and packages) which should not be imported
+    :return: List of the names of the deferred modules and submodules which were imported
+    """
+    return [import_time["Module"] for import_time in import_times
+            if any(import_time["Module"] == deferred_module or import_time["Module"].startswith(deferred_module + ".")
+                   for deferred_module in deferred_modules)]
+
+
+def get_total_import_time(import_times: list, module_name: str):
+    """Returns the total time in milliseconds taken to import a module, including every module it imported, or 0 if it
+    is not in the import profile."""
+    for import_time in import_times:
+        if import_time["Module"] == module_name and import_time["Depth"] == 0:
+            return import_time["CumulativeMs"]
+    return 0.0
+
+
+def format_import_profile(module_name: str, import_times: list, top: int = 20,
+                          deferred_modules: tuple = DEFERRED_MODULES):
+    slowest_imports: list = sorted(import_times, key=lambda import_time: import_time["CumulativeMs"],
+                                   reverse=True)[:top]
+    lines: list = ["Import profile of {0}: {1} module(s) imported, {2:.1f}ms to import {0}".format(
+        module_name, len(import_times), get_total_import_time(import_times, module_name)),
+        "{0:>12} {1:>12}  {2}".format("Self (ms)", "Total (ms)", "Module")]
+    for import_time in slowest_imports:
+        lines.append("{0:>12.1f} {1:>12.1f}  {2}".format(import_time["SelfMs"], import_time["CumulativeMs"],
+                                                         import_time["Module"]))
+    deferred_imports: list = find_deferred_imports(import_times, deferred_modules)
+    if len(deferred_imports) > 0:
+        lines.append("Modules which should be deferred were imported: {0}".format(", ".join(deferred_imports)))
+    return "\n".join(lines)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Report the time taken to import each module at startup.")
+    parser.add_argument("module", nargs="?", default=STARTUP_MODULE, help="Module to profile. Defaults to App.")
+    parser.add_argument("--top", type=int, default=20, help="Number of the slowest imports to list.")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Fail if importing the module takes longer than this many milliseconds.")
+    parser.add_argument("--deferred", nargs="*", default=list(DEFERRED_MODULES),
+                        help="Modules which must not be imported. Defaults to the modules deferred until they are "
+                             "used.")
+    arguments = parser.parse_args(argv)
+    import_times: list = profile_imports(arguments.module)
+    print(format_import_profile(arguments.module, import_times, arguments.top, tuple(arguments.deferred)))
+    exit_code: int = 0
+    if len(find_deferred_imports(import_times, tuple(arguments.deferred))) > 0:
+        exit_code = 1
+    if arguments.budget_ms is not None and get_total_import_time(import_times, arguments.module) > arguments.budget_ms:
+        print("Import time budget of {0:.1f}ms exceeded".format(arguments.budget_ms))
+        exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,30 +1,28 @@
-import datetime
 from tkinter import filedialog
 
-from Functions.DocxGeneration import generate_kardex_doc_file, generate_dispensation_list_doc_file
 from DataStructures.Models import PillpackPatient
+from Functions.BatchDocumentGeneration import get_default_document_name, KARDEX_DOCUMENT, DISPENSATION_LIST_DOCUMENT
+
+"""
+Functions which ask the user where to save a patient's kardex or dispensation list and then generate it. The docx
+generation module (and with it python-docx, pylibdmtx and PIL) is only imported the first time a document is generated,
+so none of them are imported when the application starts.
+"""
 
 
 def generate_patient_kardex(patient: PillpackPatient, production_name: str):
-    default_file_name = "{0} {1} {2} {3} generated kardex".format(patient.first_name,
-                                                                  patient.last_name,
-                                                                  production_name,
-                                                                  datetime.date.today()
-                                                                  )
+    default_file_name = get_default_document_name(patient, production_name, KARDEX_DOCUMENT)
     kardex_file = filedialog.asksaveasfile(initialfile=default_file_name, defaultextension=".docx",
                                            filetypes=[("docx files", ".docx"), ("All files", ".*")])
     if kardex_file:
+        from Functions.DocxGeneration import generate_kardex_doc_file
         generate_kardex_doc_file(patient, production_name, kardex_file.name)
 
 
 def generate_dispensation_list_for_current_cycle(patient: PillpackPatient, production_name: str):
-    default_file_name = "{0} {1} {2} {3} generated Dispensation list".format(
-        patient.first_name,
-        patient.last_name,
-        production_name,
-        datetime.date.today()
-    )
+    default_file_name = get_default_document_name(patient, production_name, DISPENSATION_LIST_DOCUMENT)
     prn_file = filedialog.asksaveasfile(initialfile=default_file_name, defaultextension=".docx",
                                         filetypes=[("docx files", ".docx"), ("All files", ".*")])
     if prn_file:
+        from Functions.DocxGeneration import generate_dispensation_list_doc_file
         generate_dispensation_list_doc_file(patient, production_name, prn_file.name)
@@ -0,0 +1,94 @@
+from DataStructures.Models import Medication, PillpackPatient
+
+"""
+
+Comparison of the production medications of a patient in two productions, e.g. the same patient in last month's
+archived production and in the current production. Medications are compared by name: a medication is added or removed if
+its name is only in one of the productions, and re-dosed if its dose at any time of day has changed. The total dosage of
+an order depends on how many days it supplies, so a medication supplied for a different number of days at the same daily
+doses is not re-dosed; the total dosage is only kept to be displayed.
+
+Patients are compared through a summary of their production medications (name to dosages), so productions which are not
+loaded can be compared from summaries stored elsewhere.
+
+"""
+
+
+def get_medication_summary(patient: PillpackPatient):
+    """
+    Summarises the production medications of a patient.
+
+    :param patient: The PillpackPatient object to summarise, or None
+    :return: Dictionary of the name of each production medication to its (total dosage, morning, afternoon, evening,
+    night) dosages. The dosage of a time of day the medication is not taken at is None.
+    """
+    medication_summary: dict = {}
+    if isinstance(patient, PillpackPatient):
+        for medication in patient.production_medications_dict.values():
+            if isinstance(medication, Medication):
+                medication_summary[medication.medication_name] = (medication.dosage, medication.morning_dosage,
+                                                                  medication.afternoon_dosage,
+                                                                  medication.evening_dosage, medication.night_dosage)
+    return medication_summary
+
+
+def get_daily_dosages(dosages: tuple):
+    """Returns the (morning, afternoon, evening, night) doses of the dosages of a medication summary, which make up the
+    dose taken each day whatever the length of the supply."""
+    return tuple(dosages[1:])
+
+
+def diff_medication_summaries(previous_summary: dict, current_summary: dict):
+    """
+    Compares two medication summaries.
+
+    :param previous_summary: The medication summary of the earlier production
+    :param current_summary: The medication summary of the later production
+    :return: Dictionary of the (name, dosages) of the medications added and removed, and the (name, previous dosages,
+    current dosages) of the medications whose daily doses have changed, each in order of name
+    """
+    return {
+        "Added": [(medication_name, current_summary[medication_name])
+                  for medication_name in sorted(current_summary.keys() - previous_summary.keys())],
+        "Removed": [(medication_name, previous_summary[medication_name])
+                    for medication_name in sorted(previous_summary.keys() - current_summary.keys())],
+        "Changed": [(medication_name, previous_summary[medication_name], current_summary[medication_name])
+                    for medication_name in sorted(previous_summary.keys() & current_summary.keys())
+                    if get_daily_dosages(previous_summary[medication_name])
+                    != get_daily_dosages(current_summary[medication_name])]
+    }
+
+
+def diff_patient_medications(previous_patient: PillpackPatient, current_patient: PillpackPatient):
+    return diff_medication_summaries(get_medication_summary(previous_patient), get_medication_summary(current_patient))
+
+
+def has_changes(medication_diff: dict):
+    return any(len(medication_diff[change_type]) > 0 for change_type in ("Added", "Removed", "Changed"))
+
+
+def _format_dosage(dosage):
+    if dosage is None:
+        return "-"
+    if isinstance(dosage, float):
+        return "{0:g}".format(dosage)
+    return str(dosage)
+
+
+def format_dosages(dosages: tuple):
+    return "{0} (M/L/T/N {1})".format(_format_dosage(dosages[0]),
+                                      "/".join(_format_dosage(dosage) for dosage in dosages[1:]))
+
+
+def format_medication_diff(medication_diff: dict):
+    lines: list = []
+    for medication_name, dosages in medication_diff["Added"]:
+        lines.append("Added: {0} {1}".format(medication_name, format_dosages(dosages)))
+    for medication_name, dosages in medication_diff["Removed"]:
+        lines.append("Removed: {0} {1}".format(medication_name, format_dosages(dosages)))
+    for medication_name, previous_dosages, current_dosages in medication_diff["Changed"]:
+        lines.append("Re-dosed: {0} {1} -> {2}".format(medication_name, format_dosages(previous_dosages),
+                                                        format_dosages(current_dosages)))
+    if len(lines) == 0:
+        lines.append("No changes to the production medications")
+    return "\n".join(lines)
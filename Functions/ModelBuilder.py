@@ -1,14 +1,20 @@
 import datetime
 import logging
+from functools import lru_cache
 from xml.dom import minidom
 
-from DataStructures.Models import PillpackPatient, Medication
+from DataStructures.Models import PillpackPatient, Medication, PillpackOrder, PillpackOrderMedication
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso_date(date_string: str):
+    return datetime.date.fromisoformat(date_string)
 
 
 def _create_datetime(date_string: str):
     date = datetime.date.today()
     try:
-        date = datetime.date.fromisoformat(date_string)
+        date = _parse_iso_date(date_string)
     except ValueError as e:
         logging.error("Datetime could not be obtained from the given string: {0}".format(e))
     finally:
@@ -67,40 +73,99 @@ def get_specified_medication_take_times(time_of_day: str, no_of_meds_to_take: fl
         logging.error(e)
 
 
+def _get_first_tag_text(element: minidom.Element, tag_name: str):
+    tags = element.getElementsByTagName(tag_name)
+    if tags.length == 0:
+        return None
+    return tags[0].firstChild.nodeValue if tags[0].hasChildNodes() else ""
+
+
+def _create_order_medication_from_element(medication_element: minidom.Element):
+    """Only requires the first instance of a medicine name tag"""
+    medication_name = _get_first_tag_text(medication_element, "MedNm")
+
+    """Since pillpack states each individual day that a medicine is to be taken, it is enough to just count the total
+    number of MedItemDose tags and obtain the number of days this way"""
+    list_of_dosages = medication_element.getElementsByTagName("MedItemDose")
+    order_medication = PillpackOrderMedication(medication_name if medication_name is not None else "",
+                                               list_of_dosages.length)
+    if list_of_dosages.length > 0:
+        order_medication.start_date = _get_first_tag_text(list_of_dosages[0], "TakeDt")
+        order_medication.dose_list = _get_first_tag_text(list_of_dosages[0], "DoseList")
+    return order_medication
+
+
+def _create_order_from_element(order_element: minidom.Element):
+    order = PillpackOrder(_get_first_tag_text(order_element, "PtntNm"),
+                          _get_first_tag_text(order_element, "Birthday"))
+    for medication_element in order_element.getElementsByTagName("MedItem"):
+        order.medications.append(_create_order_medication_from_element(medication_element))
+    return order
+
+
+@lru_cache(maxsize=4096)
+def _parse_dose_list(dose_list: str):
+    """DoseList represents each moment in the day a medicine has to be taken; this is represented in the following
+    format: Time_of_day:Dose - if there are multiple times in the day a medicine needs to be taken, then these
+    will be separated by a semicolon, like this: ToD:Dose;AnotherToD:AnotherDose
+
+    The same few dose lists are repeated for most medications of a production, so each one is only split, summed and
+    sorted into times of day once. Returns the daily dosage and the morning, afternoon, evening and night dosages."""
+    split_dosage_list = [e.split(":") for e in dose_list.split(";") if e != ""]
+    try:
+        daily_dosage = sum([float(e[1]) for e in split_dosage_list])
+    except ValueError as e:
+        logging.error("ValueError: {0}".format(e))
+        raise
+    take_times = Medication("", daily_dosage, None)
+    for e in split_dosage_list:
+        get_medication_take_times(e[0], float(e[1]), take_times)
+    return daily_dosage, (take_times.morning_dosage, take_times.afternoon_dosage,
+                          take_times.evening_dosage, take_times.night_dosage)
+
+
+def generate_medication_from_order_medication(order_medication: PillpackOrderMedication):
+    if order_medication.start_date is None or order_medication.dose_list is None:
+        logging.error("Medication {0} has no dosage information in its order and cannot be created."
+                      .format(order_medication.medication_name))
+        return
+    """Only require the first instance of a medication start date"""
+    start_date_final = _create_datetime(order_medication.start_date)
+    daily_dosage, take_times = _parse_dose_list(order_medication.dose_list)
+    total_dosage = order_medication.number_of_doses * daily_dosage
+    medication_object: Medication = Medication(order_medication.medication_name, total_dosage, start_date_final)
+    (medication_object.morning_dosage, medication_object.afternoon_dosage,
+     medication_object.evening_dosage, medication_object.night_dosage) = take_times
+    return medication_object
+
+
+def generate_medications_from_order(order: PillpackOrder):
+    """
+    Builds every production medication of an order in a single pass. Medications which appear more than once in the
+    order are merged as they are built, exactly as update_medication_dosage would merge them into a patient's
+    production medications, so that each medication is only added to the patient once.
+
+    :param order: The PillpackOrder to build the medications of
+    :return: Dictionary of the merged Medication objects by medication name, in order of first appearance, and a list
+    of the start date of every medication in the order
+    """
+    medications: dict = {}
+    start_dates: list = []
+    for order_medication in order.medications:
+        medication_object: Medication = generate_medication_from_order_medication(order_medication)
+        if isinstance(medication_object, Medication):
+            start_dates.append(medication_object.start_date)
+            medication_to_update = medications.get(medication_object.medication_name)
+            if medication_to_update is None:
+                medications[medication_object.medication_name] = medication_object
+            else:
+                merge_medication_dosage(medication_to_update, medication_object)
+    return medications, start_dates
+
+
 def generate_medication_dict(medication_element):
     if isinstance(medication_element, minidom.Element):
-        """Only requires the first instance of a medicine name tag"""
-        medications = medication_element.getElementsByTagName("MedNm")[0]
-        medication_name = medications.firstChild.nodeValue if medications.hasChildNodes() else ""
-
-        """Since pillpack states each individual day that a medicine is to be taken, it is enough to just count the total
-        number of MedItemDose tags and obtain the number of days this way"""
-        list_of_dosages = medication_element.getElementsByTagName("MedItemDose")
-        number_of_days_to_take = list_of_dosages.length
-
-        """Only require the first instance of a medication start date"""
-        start_date = list_of_dosages[0].getElementsByTagName("TakeDt")[0]
-        start_date_value = start_date.firstChild.nodeValue if start_date.hasChildNodes() else ""
-        start_date_final = _create_datetime(start_date_value)
-
-        """DoseList represents each moment in the day a medicine has to be taken; this is represented in the following
-        format: Time_of_day:Dose - if there are multiple times in the day a medicine needs to be taken, then these
-        will be separated by a semicolon, like this: ToD:Dose;AnotherToD:AnotherDose"""
-        dosage_list = list_of_dosages[0].getElementsByTagName("DoseList")[0]
-        dosage_list_value = dosage_list.firstChild.nodeValue if dosage_list.hasChildNodes() else ""
-
-        """Because of this, we need to split each dosage entry by semicolons"""
-        trimmed_dosage_list = list(filter(lambda entity: entity != "", dosage_list_value.split(";")))
-        final_dosage: float = -1
-        try:
-            final_dosage = sum([float(e.split(":")[1]) for e in trimmed_dosage_list])
-        except ValueError as e:
-            logging.error("ValueError: {0}".format(e))
-        total_dosage = number_of_days_to_take * final_dosage
-        medication_object: Medication = Medication(medication_name, total_dosage, start_date_final)
-        for e in trimmed_dosage_list:
-            get_medication_take_times(e.split(":")[0], float(e.split(":")[1]), medication_object)
-        return medication_object
+        return generate_medication_from_order_medication(_create_order_medication_from_element(medication_element))
     else:
         logging.error("The medication parameter: {0} is not a valid XML element.".format(medication_element))
         return
@@ -109,27 +174,37 @@ def generate_medication_dict(medication_element):
 def update_medication_dosage(patient_object: PillpackPatient, medication_object: Medication):
     if patient_object.production_medications_dict.__contains__(medication_object.medication_name):
         medication_to_update: Medication = patient_object.production_medications_dict[medication_object.medication_name]
-        medication_to_update.dosage = medication_to_update.dosage + medication_object.dosage
-        if medication_to_update.morning_dosage is None:
-            medication_to_update.morning_dosage = medication_object.morning_dosage
-        if medication_to_update.afternoon_dosage is None:
-            medication_to_update.afternoon_dosage = medication_object.afternoon_dosage
-        if medication_to_update.evening_dosage is None:
-            medication_to_update.evening_dosage = medication_object.evening_dosage
-        if medication_to_update.night_dosage is None:
-            medication_to_update.night_dosage = medication_object.night_dosage
-        patient_object.production_medications_dict[medication_object.medication_name] = medication_to_update
-        logging.info("Updated medication {0} dosage to {1}"
-                     .format(medication_to_update.medication_name, medication_to_update.dosage))
-
-
-def create_medication_object_from_script(medicine_element: minidom.Element):
-    medicine_name_on_script = medicine_element.getAttribute("d")
-    medicine_dosage_on_script = medicine_element.getAttribute("q")
-    medicine_code = medicine_element.getAttribute("c")
-    medication_doctors_orders = medicine_element.getAttribute("do")
-    medication_dispense_code = medicine_element.getAttribute("dm")
-    medication_type = medicine_element.getAttribute("u")
+        merge_medication_dosage(medication_to_update, medication_object)
+
+
+def merge_medication_dosage(medication_to_update: Medication, medication_object: Medication):
+    medication_to_update.dosage = medication_to_update.dosage + medication_object.dosage
+    if medication_to_update.morning_dosage is None:
+        medication_to_update.morning_dosage = medication_object.morning_dosage
+    if medication_to_update.afternoon_dosage is None:
+        medication_to_update.afternoon_dosage = medication_object.afternoon_dosage
+    if medication_to_update.evening_dosage is None:
+        medication_to_update.evening_dosage = medication_object.evening_dosage
+    if medication_to_update.night_dosage is None:
+        medication_to_update.night_dosage = medication_object.night_dosage
+    logging.info("Updated medication {0} dosage to {1}"
+                 .format(medication_to_update.medication_name, medication_to_update.dosage))
+
+
+def _get_script_attributes(script_element):
+    if isinstance(script_element, minidom.Element):
+        return dict(script_element.attributes.items())
+    return script_element
+
+
+def create_medication_object_from_script(medicine_element):
+    medicine_attributes: dict = _get_script_attributes(medicine_element)
+    medicine_name_on_script = medicine_attributes.get("d", "")
+    medicine_dosage_on_script = medicine_attributes.get("q", "")
+    medicine_code = medicine_attributes.get("c", "")
+    medication_doctors_orders = medicine_attributes.get("do", "")
+    medication_dispense_code = medicine_attributes.get("dm", "")
+    medication_type = medicine_attributes.get("u", "")
     medication: Medication = Medication(medicine_name_on_script, float(medicine_dosage_on_script),
                                         datetime.date.today(),
                                         code=medicine_code,
@@ -143,35 +218,52 @@ def create_medication_object_from_script(medicine_element: minidom.Element):
 
 def create_patient_object_from_script(script_xml):
     if isinstance(script_xml, minidom.Document) and script_xml.hasChildNodes():
-        script_details = script_xml.getElementsByTagName("sc")[0]
-        patient_details = script_xml.getElementsByTagName("pa")[0]
-        surgery_details = script_xml.getElementsByTagName("pb")[0]
+        return create_patient_object_from_decoded_script(
+            {tag: script_xml.getElementsByTagName(tag) for tag in ("sc", "pa", "pb", "dd")}
+        )
+    else:
+        return None
+
+
+def create_patient_object_from_decoded_script(script_elements: dict):
+    """
+    Builds the patient and medications of a scanned script from the elements of its script (sc), patient (pa),
+    surgery (pb) and medication (dd) tags, which are either minidom elements or dictionaries of their attributes
+    (see XML.decode_script).
+
+    :param script_elements: Dictionary of the list of elements for each tag name
+    :return: The PillpackPatient object of the script, or None if there is no script
+    """
+    if script_elements is not None:
+        script_details: dict = _get_script_attributes(script_elements["sc"][0])
+        patient_details: dict = _get_script_attributes(script_elements["pa"][0])
+        surgery_details: dict = _get_script_attributes(script_elements["pb"][0])
 
         """ obtains all script details"""
-        script_id_no = script_details.getAttribute("id")
-        script_issuer = script_details.getAttribute("ft")
-        script_date = script_details.getAttribute("t")
+        script_id_no = script_details.get("id", "")
+        script_issuer = script_details.get("ft", "")
+        script_date = script_details.get("t", "")
 
         """obtains all patient details"""
-        patient_last_name = patient_details.getAttribute("l")
-        patient_middle_name = patient_details.getAttribute("m")
-        patient_first_name = patient_details.getAttribute("f")
-        patient_healthcare_no = patient_details.getAttribute("h")
-        patient_title = patient_details.getAttribute("s")
-        script_no = patient_details.getAttribute("x")
-        patient_address = patient_details.getAttribute("a")
-        patient_postcode = patient_details.getAttribute("pc")
-        patient_dob = datetime.date.fromisoformat(patient_details.getAttribute("b"))
+        patient_last_name = patient_details.get("l", "")
+        patient_middle_name = patient_details.get("m", "")
+        patient_first_name = patient_details.get("f", "")
+        patient_healthcare_no = patient_details.get("h", "")
+        patient_title = patient_details.get("s", "")
+        script_no = patient_details.get("x", "")
+        patient_address = patient_details.get("a", "")
+        patient_postcode = patient_details.get("pc", "")
+        patient_dob = datetime.date.fromisoformat(patient_details.get("b", ""))
 
         """obtains all surgery details"""
-        doctor_id_no = surgery_details.getAttribute("i")
-        doctor = surgery_details.getAttribute("d")
-        surgery_id_no = surgery_details.getAttribute("pi")
-        surgery = surgery_details.getAttribute("n")
-        surgery_address = surgery_details.getAttribute("a")
-        surgery_postcode = surgery_details.getAttribute("pc")
-
-        medicines_on_script = script_xml.getElementsByTagName("dd")
+        doctor_id_no = surgery_details.get("i", "")
+        doctor = surgery_details.get("d", "")
+        surgery_id_no = surgery_details.get("pi", "")
+        surgery = surgery_details.get("n", "")
+        surgery_address = surgery_details.get("a", "")
+        surgery_postcode = surgery_details.get("pc", "")
+
+        medicines_on_script = script_elements["dd"]
         patient_object = PillpackPatient(patient_first_name, patient_last_name, patient_dob,
                                          script_id=script_id_no,
                                          script_issuer=script_issuer,
@@ -198,38 +290,36 @@ def create_patient_object_from_script(script_xml):
         return None
 
 
+def create_patient_object_from_pillpack_order(order: PillpackOrder):
+    patient_full_name: list = order.patient_name.split(",") if order.patient_name else []
+    patient_first_name: str = patient_full_name[1].strip() if len(patient_full_name) > 0 else ""
+    patient_last_name: str = patient_full_name[0].strip() if len(patient_full_name) > 0 else ""
+    patient_dob_string: str = order.birthday if order.birthday is not None else ""
+
+    """There are no separators for day, month and year in the pillpack XML file, so these need to be added in
+    manually"""
+    patient_dob_string = patient_dob_string[:4] + "-" + patient_dob_string[4:] if patient_dob_string != "" else ""
+    patient_dob_string = patient_dob_string[:7] + "-" + patient_dob_string[7:] if patient_dob_string != "" else ""
+    patient_dob = _create_datetime(patient_dob_string)
+
+    patient_object = PillpackPatient(patient_first_name, patient_last_name, patient_dob)
+    medications, start_date_list = generate_medications_from_order(order)
+    for medication_object in medications.values():
+        patient_object.add_medication_to_production_dict(medication_object)
+
+    """Sets the start date for the patient's medication cycle as the earliest date relative to now."""
+    if len(start_date_list) > 0:
+        patient_object.set_start_date(min(start_date_list))
+        return patient_object
+    else:
+        return None
+
+
 def create_patient_object_from_pillpack_data(order_element):
-    if isinstance(order_element, minidom.Element):
-        patient_name_element = order_element.getElementsByTagName("PtntNm")[0]
-        patient_dob_element = order_element.getElementsByTagName("Birthday")[0]
-        patient_full_name: list = patient_name_element.firstChild.nodeValue.split(
-            ",") if patient_name_element.hasChildNodes() else []
-        patient_first_name: str = patient_full_name[1].strip() if len(patient_full_name) > 0 else ""
-        patient_last_name: str = patient_full_name[0].strip() if len(patient_full_name) > 0 else ""
-        patient_dob_string: str = patient_dob_element.firstChild.nodeValue if patient_dob_element.hasChildNodes() else ""
-
-        """There are no separators for day, month and year in the pillpack XML file, so these need to be added in
-        manually"""
-        patient_dob_string = patient_dob_string[:4] + "-" + patient_dob_string[4:] if patient_dob_string != "" else ""
-        patient_dob_string = patient_dob_string[:7] + "-" + patient_dob_string[7:] if patient_dob_string != "" else ""
-        patient_dob = _create_datetime(patient_dob_string)
-
-        patient_object = PillpackPatient(patient_first_name, patient_last_name, patient_dob)
-        medication_items: list = order_element.getElementsByTagName("MedItem")
-        start_date_list: list = []
-        for medication in medication_items:
-            medication_object: Medication = generate_medication_dict(medication)
-            start_date_list.append(medication_object.start_date)
-            if isinstance(medication_object, Medication):
-                update_medication_dosage(patient_object, medication_object)
-                patient_object.add_medication_to_production_dict(medication_object)
-
-        """Sets the start date for the patient's medication cycle as the earliest date relative to now."""
-        if len(start_date_list) > 0:
-            patient_object.set_start_date(min(start_date_list))
-            return patient_object
-        else:
-            return None
+    if isinstance(order_element, PillpackOrder):
+        return create_patient_object_from_pillpack_order(order_element)
+    elif isinstance(order_element, minidom.Element):
+        return create_patient_object_from_pillpack_order(_create_order_from_element(order_element))
     else:
         logging.error("The order parameter: {0} is not a valid XML element. Actual type is {1}"
                       .format(order_element, type(order_element)))
@@ -1,6 +1,10 @@
 import datetime
-from functools import reduce
-from Functions.XML import sanitise_and_encode_text_from_file, parse_xml_ppc, parse_xml_fd
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from Functions.XML import stream_orders, stream_orders_from_file, stream_orders_from_file_range, read_declared_encoding
+from Functions.ConfigSingleton import consts
 from Functions.DAOFunctions import scan_pillpack_folder, retrieve_prns_and_linked_medications
 from Functions.ModelBuilder import create_patient_object_from_pillpack_data
 from DataStructures.Models import PillpackPatient
@@ -24,9 +28,7 @@ def get_patient_medicine_data_ppc(prns_and_linked_medications: dict, separating_
         ppc_processed_files = scan_pillpack_folder(config["pillpackDataLocation"])
         dict_of_patients: dict = {}
         for ppc_file in ppc_processed_files:
-            list_of_orders_raw_text = sanitise_and_encode_text_from_file(ppc_file.name, separating_tag, config)
-            list_of_orders: list = reduce(list.__add__, parse_xml_ppc(list_of_orders_raw_text))
-            for order in list_of_orders:
+            for order in stream_orders_from_file(ppc_file.name, separating_tag, config):
                 patient_object = create_patient_object_from_pillpack_data(order)
                 if patient_object is not None:
                     patient_object = retrieve_prns_and_linked_medications(patient_object, prns_and_linked_medications)
@@ -39,25 +41,97 @@ def get_patient_medicine_data_ppc(prns_and_linked_medications: dict, separating_
         return dict_of_patients
 
 
-def get_patient_medicine_data_xml(prns_and_linked_medications: dict, raw_xml):
+def merge_patient_dicts(dict_to_merge: dict, dict_of_patients: dict):
+    for list_of_patients in dict_to_merge.values():
+        for patient_object in list_of_patients:
+            add_patient_to_dict(patient_object, dict_of_patients)
+
+
+def _split_files_into_ranges(ppc_processed_files: list, separating_tag: str, config, earliest_start_date,
+                             split_size: int):
+    """Files larger than the split size are divided into several byte ranges, each of which can be read by a
+    separate worker. The ranges only decide which worker owns an order, so they do not need to line up with the
+    OrderInfo tags in the file."""
+    file_ranges: list = []
+    for ppc_file in ppc_processed_files:
+        file_size = ppc_file.stat().st_size
+        encoding = read_declared_encoding(ppc_file.name, config)
+        range_start = 0
+        while True:
+            range_end = range_start + split_size if file_size - range_start > split_size else file_size + 1
+            file_ranges.append((ppc_file.name, range_start, range_end, encoding, separating_tag, config,
+                                earliest_start_date))
+            if range_end > file_size:
+                break
+            range_start = range_end
+    return file_ranges
+
+
+def _get_patient_dict_from_file_range(file_range: tuple):
+    file_name, range_start, range_end, encoding, separating_tag, config, earliest_start_date = file_range
+    dict_of_patients: dict = {}
+    for order in stream_orders_from_file_range(file_name, separating_tag, config, range_start, range_end, encoding):
+        patient_object = create_patient_object_from_pillpack_data(order)
+        if patient_object is not None:
+            if earliest_start_date is None or patient_object.start_date >= earliest_start_date:
+                add_patient_to_dict(patient_object, dict_of_patients)
+    return dict_of_patients
+
+
+def get_patient_medicine_data_ppc_parallel(prns_and_linked_medications: dict, separating_tag: str, config,
+                                           earliest_start_date: datetime.date = None,
+                                           number_of_processes: int = None,
+                                           split_size: int = consts.PARALLEL_LOAD_SPLIT_SIZE):
+    """
+    Parallel version of get_patient_medicine_data_ppc. Every production file (or byte range of a large production
+    file) is parsed in a separate worker process, and the patient dictionaries returned by the workers are merged in
+    file order so the result is the same as a sequential load.
+
+    The number of worker processes is taken from the productionLoadProcesses setting if it is not given, and defaults
+    to the number of CPUs. A single process falls back to the sequential load.
+    """
+    if config is not None:
+        if number_of_processes is None:
+            number_of_processes = config.get(consts.PRODUCTION_LOAD_PROCESSES_KEY) or os.cpu_count() or 1
+        if number_of_processes <= 1:
+            return get_patient_medicine_data_ppc(prns_and_linked_medications, separating_tag, config,
+                                                 earliest_start_date=earliest_start_date)
+        ppc_processed_files = scan_pillpack_folder(config["pillpackDataLocation"])
+        file_ranges: list = _split_files_into_ranges(ppc_processed_files, separating_tag, config, earliest_start_date,
+                                                     split_size)
+        dict_of_patients: dict = {}
+        if len(file_ranges) > 0:
+            logging.info("Loading {0} production file range(s) across {1} worker process(es)"
+                         .format(len(file_ranges), min(number_of_processes, len(file_ranges))))
+            with ProcessPoolExecutor(max_workers=min(number_of_processes, len(file_ranges))) as executor:
+                for worker_dict_of_patients in executor.map(_get_patient_dict_from_file_range, file_ranges):
+                    merge_patient_dicts(worker_dict_of_patients, dict_of_patients)
+        for list_of_patients in dict_of_patients.values():
+            for patient_object in list_of_patients:
+                retrieve_prns_and_linked_medications(patient_object, prns_and_linked_medications)
+        return dict_of_patients
+
+
+def get_patient_medicine_data_xml(prns_and_linked_medications: dict, raw_xml,
+                                  separating_tag: str = consts.PPC_SEPARATING_TAG):
     list_of_patients: list = []
-    list_of_orders: list = reduce(list.__add__, parse_xml_fd(raw_xml))
-    for order in list_of_orders:
+    if isinstance(raw_xml, str):
+        raw_xml = raw_xml.encode("utf8")
+    binary_stream = io.BytesIO(raw_xml) if isinstance(raw_xml, (bytes, bytearray)) else raw_xml
+    for order in stream_orders(binary_stream, separating_tag):
         patient_object = create_patient_object_from_pillpack_data(order)
-        patient_object = retrieve_prns_and_linked_medications(patient_object, prns_and_linked_medications)
         if isinstance(patient_object, PillpackPatient):
+            patient_object = retrieve_prns_and_linked_medications(patient_object, prns_and_linked_medications)
             list_of_patients.append(patient_object)
     return list_of_patients
 
 
 def get_patient_data_from_specific_file(prns_and_linked_medications: dict, specified_file_name: str,
                                         separating_tag: str, config):
-    list_of_orders_raw_text = sanitise_and_encode_text_from_file(specified_file_name, separating_tag, config)
-    list_of_orders: list = reduce(list.__add__, parse_xml_ppc(list_of_orders_raw_text))
     list_of_patients: list = []
-    for order in list_of_orders:
+    for order in stream_orders_from_file(specified_file_name, separating_tag, config):
         patient_object = create_patient_object_from_pillpack_data(order)
-        patient_object = retrieve_prns_and_linked_medications(patient_object, prns_and_linked_medications)
         if isinstance(patient_object, PillpackPatient):
+            patient_object = retrieve_prns_and_linked_medications(patient_object, prns_and_linked_medications)
             list_of_patients.append(patient_object)
     return list_of_patients
@@ -1,12 +1,14 @@
 import datetime
 import logging
-import re
+from collections.abc import Mapping
 
+from DataStructures.MedicationIndex import MedicationNameIndex
 from DataStructures.Models import PillpackPatient, Medication
+from DataStructures.PatientIdentityIndex import PatientIdentityIndex, normalise_name
 from DataStructures.Repositories import CollectedPatients
 from Functions.ConfigSingleton import consts
-from Functions.XML import scan_script
-from Functions.ModelBuilder import create_patient_object_from_script
+from Functions.XML import decode_script
+from Functions.ModelBuilder import create_patient_object_from_decoded_script
 from Functions.DAOFunctions import save_collected_patients
 
 
@@ -15,8 +17,7 @@ def compare_patient_details(pillpack_patient: PillpackPatient, script_patient: P
         "Patient": PillpackPatient("", "", datetime.date.today()),
         "PerfectMatch": False
     }
-    match_patient_first_name = re.match(pillpack_patient.first_name.lower(), script_patient.first_name.lower())
-    if match_patient_first_name is not None:
+    if normalise_name(pillpack_patient.first_name) == normalise_name(script_patient.first_name):
         matches["Patient"] = pillpack_patient
         logging.info("Patient {0} {1} in production matches patient {2} {3} on the script."
                      .format(pillpack_patient.first_name, pillpack_patient.last_name,
@@ -35,34 +36,29 @@ def compare_patient_details(pillpack_patient: PillpackPatient, script_patient: P
     return matches
 
 
-def query_pillpack_patient_list(pillpack_patient_dict, script_patient: PillpackPatient):
-    patient_matches_list: list = []
-    if pillpack_patient_dict.__contains__(script_patient.last_name.lower()):
-        patients_with_last_name = pillpack_patient_dict.get(script_patient.last_name.lower())
-        for patient in patients_with_last_name:
-            if isinstance(patient, PillpackPatient):
-                pillpack_patient_matches: dict = compare_patient_details(patient, script_patient)
-                if pillpack_patient_matches["Patient"] == patient and pillpack_patient_matches["PerfectMatch"] is True:
-                    logging.info("Patient on script ({0} {1}) perfectly matches a patient in current pillpack "
-                                 "production".format(script_patient.first_name, script_patient.last_name))
-                    return patient
-                elif pillpack_patient_matches["Patient"] == patient:
-                    patient_matches_list.append(patient)
-                    logging.warning("Patient on script ({0} {1}) matches a patient in current pillpack production, "
-                                    "but the DoB is inconsistent. It is likely the DoB in pillpack care is incorrect."
-                                    .format(script_patient.first_name, script_patient.last_name))
-        return patient_matches_list
+def query_pillpack_patient_list(collected_patients: CollectedPatients, script_patient: PillpackPatient):
+    patient_identity_index: PatientIdentityIndex = collected_patients.get_patient_identity_index()
+    perfect_matches: list = patient_identity_index.find(script_patient)
+    if len(perfect_matches) > 0:
+        logging.info("Patient on script ({0} {1}) perfectly matches a patient in current pillpack "
+                     "production".format(script_patient.first_name, script_patient.last_name))
+        return perfect_matches[0]
+    patient_matches_list: list = patient_identity_index.find_by_name(script_patient)
+    if len(patient_matches_list) > 0:
+        logging.warning("Patient on script ({0} {1}) matches {2} patient(s) in current pillpack production, "
+                        "but the DoB is inconsistent. It is likely the DoB in pillpack care is incorrect."
+                        .format(script_patient.first_name, script_patient.last_name, len(patient_matches_list)))
     else:
         logging.warning("No patient in pillpack production matches the given patient {0} {1}"
                         .format(script_patient.first_name, script_patient.last_name))
-        return patient_matches_list
+    return patient_matches_list
 
 
 def check_if_patient_is_in_pillpack_production(pillpack_patient_dict: dict,
                                                script_patient: PillpackPatient,
                                                collected_patients: CollectedPatients):
-    if isinstance(pillpack_patient_dict, dict) and isinstance(script_patient, PillpackPatient):
-        matched_patient = query_pillpack_patient_list(pillpack_patient_dict, script_patient)
+    if isinstance(pillpack_patient_dict, Mapping) and isinstance(script_patient, PillpackPatient):
+        matched_patient = query_pillpack_patient_list(collected_patients, script_patient)
         if isinstance(matched_patient, PillpackPatient):
             if compare_patient_details(matched_patient, script_patient):
                 matched_patient.update_fields(script_patient)
@@ -81,7 +77,7 @@ def check_if_patient_is_in_pillpack_production(pillpack_patient_dict: dict,
             script_patient.ready_to_produce_code = 3
             for medication in list(script_patient.production_medications_dict.values()):
                 script_patient.add_medication_to_unknown_dict(medication)
-            script_patient.production_medications_dict.clear()
+            script_patient.production_medications_dict = {}
             collected_patients.add_severely_mismatched_patient(script_patient)
 
 
@@ -90,12 +86,21 @@ def check_script_medications_against_pillpack(patient_from_production: PillpackP
                                               collected_patients: CollectedPatients):
     full_medication_dict: dict = patient_from_production.production_medications_dict
     script_medication_dict: dict = patient_from_script.production_medications_dict
+    production_medications_index: MedicationNameIndex = patient_from_production.get_production_medications_index()
+    """Each script medication name is run through the production medication index once. For every production
+    medication this records the first script medication whose name contains it, and for every script medication the
+    production medications whose names it contains."""
+    first_script_key_containing: dict = {}
+    production_keys_within: dict = {}
+    for script_key in script_medication_dict.keys():
+        production_keys_within[script_key] = production_medications_index.find_all(script_key)
+        for production_key in production_keys_within[script_key]:
+            first_script_key_containing.setdefault(production_key, script_key)
     for medication in full_medication_dict.keys():
-        substring_results = [key for key in script_medication_dict.keys() if medication in key]
-        if (len(substring_results) > 0
+        if (first_script_key_containing.__contains__(medication)
                 and not patient_from_production.matched_medications_dict.__contains__(medication)):
             pillpack_medication: Medication = full_medication_dict[medication]
-            script_medication: Medication = script_medication_dict[substring_results[0]]
+            script_medication: Medication = script_medication_dict[first_script_key_containing[medication]]
             logging.info("Comparing pillpack medication ({0}) with matched medication on scanned script ({1})"
                          .format(pillpack_medication.medication_name, script_medication.medication_name))
             if pillpack_medication.dosage_equals(script_medication):
@@ -109,9 +114,10 @@ def check_script_medications_against_pillpack(patient_from_production: PillpackP
                 logging.info("Medications match, but dosages are inconsistent. Adding medication {0} to "
                              "incorrect dosages dictionary.".format(script_medication.medication_name))
     for medication in script_medication_dict.keys():
-        substring_results = [key for key in full_medication_dict.keys() if key in medication]
-        if len(substring_results) > 0:
-            pillpack_medication: Medication = full_medication_dict[substring_results[0]]
+        if len(production_keys_within[medication]) > 0:
+            pillpack_medication: Medication = full_medication_dict[
+                production_medications_index.earliest_of(production_keys_within[medication])
+            ]
             if patient_from_production.matched_medications_dict.__contains__(pillpack_medication):
                 clear_medication_warning_dicts(patient_from_production, pillpack_medication)
                 logging.info("Medication {0} is in matched dictionary. Clearing all other dictionaries."
@@ -141,9 +147,7 @@ def check_script_medications_against_pillpack(patient_from_production: PillpackP
 
 
 def clear_medication_warning_dicts(patient: PillpackPatient, medication: Medication):
-    patient.remove_medication_from_missing_dict(medication)
-    patient.remove_medication_from_incorrect_dosage_dict(medication)
-    patient.remove_medication_from_unknown_dict(medication)
+    patient.clear_medication_warnings(medication)
 
 
 def check_for_linked_medications(medication_to_check: Medication, linked_medication_dict: dict):
@@ -234,13 +238,28 @@ def extend_existing_patient_medication_dict(patient_object: PillpackPatient, col
     return exists
 
 
+def read_patient_from_script(scanned_input: str):
+    return create_patient_object_from_decoded_script(decode_script(scanned_input))
+
+
+def check_scanned_patient_medications(collected_patients: CollectedPatients, script_patient_object: PillpackPatient):
+    if not extend_existing_patient_medication_dict(script_patient_object, collected_patients):
+        check_if_patient_is_in_pillpack_production(collected_patients.pillpack_patient_dict, script_patient_object,
+                                                   collected_patients)
+
+
+def check_scanned_patients_and_save(collected_patients: CollectedPatients, script_patients: list):
+    """Matches several scanned patients in the order they were scanned, and saves the changes to all of them at once."""
+    for script_patient_object in script_patients:
+        check_scanned_patient_medications(collected_patients, script_patient_object)
+    if len(script_patients) > 0:
+        save_collected_patients(collected_patients, script_patients)
+
+
 def scan_script_and_check_medications(collected_patients: CollectedPatients, scanned_input: str):
-    script_as_xml = scan_script(scanned_input)
-    script_patient_object: PillpackPatient = create_patient_object_from_script(script_as_xml)
+    script_patient_object: PillpackPatient = read_patient_from_script(scanned_input)
     if isinstance(script_patient_object, PillpackPatient):
-        if not extend_existing_patient_medication_dict(script_patient_object, collected_patients):
-            check_if_patient_is_in_pillpack_production(collected_patients.pillpack_patient_dict, script_patient_object, collected_patients)
-        save_collected_patients(collected_patients)
+        check_scanned_patients_and_save(collected_patients, [script_patient_object])
         return True
     else:
         return False
@@ -0,0 +1,332 @@
+import datetime
+import logging
+import sqlite3
+import threading
+
+from DataStructures.PatientIdentityIndex import get_identity_key, normalise_name
+from Functions.ConfigSingleton import consts
+from Functions.MedicationDiff import get_medication_summary, diff_medication_summaries, has_changes
+
+"""
+
+Persistent history of the production medications of every patient, across productions. Each production is recorded as
+a cycle when it is loaded, and recorded again when it is archived, so the history holds the production medications and
+dosages each patient was produced with in every cycle. Patients are indexed by their normalised (last name, first
+name, date of birth), so the history of one patient is read without reading any other cycle or patient.
+
+The production which has been loaded but not yet archived is the open cycle. Loading a production again, or archiving
+it, replaces the open cycle rather than recording another one, so "the last cycle" is always the most recently archived
+production. What changed for every patient since the last cycle is worked out in one pass when a production is loaded,
+and can be worked out again from the history alone, without loading the production's patients.
+
+"""
+
+_SUMMARY_COLUMNS = ("dosage", "morning_dosage", "afternoon_dosage", "evening_dosage", "night_dosage")
+
+
+def _get_date_key(date_of_birth):
+    return None if date_of_birth is None else date_of_birth.isoformat()
+
+
+def _get_date(date_key):
+    return None if date_key is None else datetime.date.fromisoformat(date_key)
+
+
+def get_production_summaries(collected_patients):
+    """
+    Summarises the production medications of every patient in a production.
+
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object holding the production
+    :return: Dictionary of the identity key of each production patient to their medication summary
+    """
+    production_summaries: dict = {}
+    for patients_with_last_name in collected_patients.pillpack_patient_dict.values():
+        for patient in patients_with_last_name:
+            production_summaries[get_identity_key(patient)] = get_medication_summary(patient)
+    return production_summaries
+
+
+def diff_productions(previous_summaries: dict, current_summaries: dict, previous_cycle: dict = None):
+    """
+    Works out what changed for every patient between two productions, in a single pass over the current production.
+
+    :param previous_summaries: Dictionary of the identity key of each patient in the earlier production to their
+    medication summary
+    :param current_summaries: Dictionary of the identity key of each patient in the later production to their medication
+    summary
+    :param previous_cycle: The cycle the earlier production was recorded as, if any
+    :return: Dictionary of the previous cycle, the medication diff of every patient in both productions whose production
+    medications changed (by identity key), the identity keys of the patients only in the later production, and the
+    identity keys of the patients only in the earlier production
+    """
+    production_changes: dict = {
+        "PreviousCycle": previous_cycle,
+        "Changes": {},
+        "NewPatients": [],
+        "RemovedPatients": sorted(previous_summaries.keys() - current_summaries.keys(),
+                                  key=lambda identity_key: identity_key[:2])
+    }
+    if previous_cycle is None:
+        return production_changes
+    for identity_key, current_summary in current_summaries.items():
+        previous_summary = previous_summaries.get(identity_key)
+        if previous_summary is None:
+            production_changes["NewPatients"].append(identity_key)
+            continue
+        medication_diff: dict = diff_medication_summaries(previous_summary, current_summary)
+        if has_changes(medication_diff):
+            production_changes["Changes"][identity_key] = medication_diff
+    return production_changes
+
+
+def format_production_changes(production_changes: dict):
+    previous_cycle = production_changes["PreviousCycle"]
+    if previous_cycle is None:
+        return "No previous cycle has been archived"
+    return ("Since {0} ({1:%Y-%m-%d}): {2} patient(s) with changed medications, {3} new patient(s), {4} patient(s) no "
+            "longer in production".format(previous_cycle["ProductionGroupName"], previous_cycle["RecordedOn"],
+                                          len(production_changes["Changes"]), len(production_changes["NewPatients"]),
+                                          len(production_changes["RemovedPatients"])))
+
+
+class PatientHistoryStore:
+    """
+    SQLite store of the production medications and dosages of every patient in every recorded cycle. Each cycle is a
+    row, each patient in it is an indexed row, and each of their production medications is a row keyed on the patient,
+    so recording a cycle is a handful of bulk inserts and reading one patient's history is an index lookup.
+    """
+    def __init__(self, database_file: str = ":memory:"):
+        """
+        The constructor for the PatientHistoryStore class. The database file, its tables and its indexes are created if
+        they do not already exist.
+
+        :param database_file: Path to the SQLite database file. Defaults to a database held in memory.
+        """
+        self.database_file = database_file
+        self.__lock = threading.RLock()
+        self.__connection = sqlite3.connect(database_file, check_same_thread=False)
+        with self.__connection:
+            self.__connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS cycles (
+                    cycle_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    production_group_name TEXT,
+                    recorded_on TEXT NOT NULL,
+                    archived INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS cycle_patients (
+                    cycle_patient_id INTEGER PRIMARY KEY,
+                    cycle_id INTEGER NOT NULL,
+                    last_name_key TEXT NOT NULL,
+                    first_name_key TEXT NOT NULL,
+                    date_of_birth TEXT
+                );
+                CREATE INDEX IF NOT EXISTS cycle_patient_identity_index
+                    ON cycle_patients (last_name_key, first_name_key, date_of_birth, cycle_id);
+                CREATE INDEX IF NOT EXISTS cycle_patient_cycle_index ON cycle_patients (cycle_id);
+                CREATE TABLE IF NOT EXISTS cycle_medications (
+                    cycle_patient_id INTEGER NOT NULL,
+                    medication_name TEXT NOT NULL,
+                    dosage REAL,
+                    morning_dosage REAL,
+                    afternoon_dosage REAL,
+                    evening_dosage REAL,
+                    night_dosage REAL,
+                    PRIMARY KEY (cycle_patient_id, medication_name)
+                );
+                """
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+    @staticmethod
+    def __get_cycle(row):
+        return None if row is None else {
+            "CycleId": row[0],
+            "ProductionGroupName": row[1],
+            "RecordedOn": datetime.datetime.fromisoformat(row[2]),
+            "Archived": bool(row[3])
+        }
+
+    def __delete_cycle(self, cycle_id: int):
+        self.__connection.execute("DELETE FROM cycle_medications WHERE cycle_patient_id IN "
+                                  "(SELECT cycle_patient_id FROM cycle_patients WHERE cycle_id = ?)", (cycle_id,))
+        self.__connection.execute("DELETE FROM cycle_patients WHERE cycle_id = ?", (cycle_id,))
+        self.__connection.execute("DELETE FROM cycles WHERE cycle_id = ?", (cycle_id,))
+
+    def get_open_cycle(self):
+        """Returns the cycle of the production which has been loaded but not yet archived, or None."""
+        with self.__lock:
+            return self.__get_cycle(self.__connection.execute(
+                "SELECT cycle_id, production_group_name, recorded_on, archived FROM cycles WHERE archived = 0 "
+                "ORDER BY cycle_id DESC LIMIT 1").fetchone())
+
+    def get_last_archived_cycle(self):
+        """Returns the cycle of the most recently archived production, or None if no production has been archived."""
+        with self.__lock:
+            return self.__get_cycle(self.__connection.execute(
+                "SELECT cycle_id, production_group_name, recorded_on, archived FROM cycles WHERE archived = 1 "
+                "ORDER BY cycle_id DESC LIMIT 1").fetchone())
+
+    def get_cycles(self):
+        with self.__lock:
+            return [self.__get_cycle(row) for row in self.__connection.execute(
+                "SELECT cycle_id, production_group_name, recorded_on, archived FROM cycles ORDER BY cycle_id")]
+
+    def record_cycle(self, production_group_name: str, production_summaries: dict, archived: bool = False):
+        """
+        Records the production medications of every patient in a production as a cycle, replacing the open cycle.
+
+        :param production_group_name: The name of the production group
+        :param production_summaries: Dictionary of the identity key of each production patient to their medication
+        summary
+        :param archived: Whether the production is being archived. An archived cycle is never replaced.
+        :return: The recorded cycle
+        """
+        recorded_on: datetime.datetime = datetime.datetime.now()
+        with self.__lock, self.__connection:
+            for open_cycle_row in self.__connection.execute("SELECT cycle_id FROM cycles WHERE archived = 0") \
+                    .fetchall():
+                self.__delete_cycle(open_cycle_row[0])
+            cycle_id: int = self.__connection.execute(
+                "INSERT INTO cycles (production_group_name, recorded_on, archived) VALUES (?, ?, ?)",
+                (production_group_name, recorded_on.isoformat(), int(archived))).lastrowid
+            medication_rows: list = []
+            for identity_key, medication_summary in production_summaries.items():
+                cycle_patient_id: int = self.__connection.execute(
+                    "INSERT INTO cycle_patients (cycle_id, last_name_key, first_name_key, date_of_birth) "
+                    "VALUES (?, ?, ?, ?)",
+                    (cycle_id, identity_key[0], identity_key[1], _get_date_key(identity_key[2]))).lastrowid
+                for medication_name, dosages in medication_summary.items():
+                    medication_rows.append((cycle_patient_id, medication_name) + tuple(dosages))
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO cycle_medications (cycle_patient_id, medication_name, {0}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)".format(", ".join(_SUMMARY_COLUMNS)), medication_rows)
+        logging.info("Recorded {0} patient(s) of production {1} in the patient history"
+                     .format(len(production_summaries), production_group_name))
+        return {"CycleId": cycle_id, "ProductionGroupName": production_group_name, "RecordedOn": recorded_on,
+                "Archived": archived}
+
+    def read_cycle_summaries(self, cycle_id: int):
+        """
+        Reads the medication summary of every patient in a cycle with a single query.
+
+        :param cycle_id: The cycle to read
+        :return: Dictionary of the identity key of each patient in the cycle to their medication summary
+        """
+        cycle_summaries: dict = {}
+        with self.__lock:
+            rows: list = self.__connection.execute(
+                "SELECT cycle_patients.last_name_key, cycle_patients.first_name_key, cycle_patients.date_of_birth, "
+                "cycle_medications.medication_name, {0} FROM cycle_patients LEFT JOIN cycle_medications "
+                "ON cycle_medications.cycle_patient_id = cycle_patients.cycle_patient_id "
+                "WHERE cycle_patients.cycle_id = ?".format(", ".join("cycle_medications." + column
+                                                                     for column in _SUMMARY_COLUMNS)),
+                (cycle_id,)).fetchall()
+        for row in rows:
+            medication_summary: dict = cycle_summaries.setdefault((row[0], row[1], _get_date(row[2])), {})
+            if row[3] is not None:
+                medication_summary[row[3]] = tuple(row[4:])
+        return cycle_summaries
+
+    def get_patient_history(self, first_name: str, last_name: str, date_of_birth=None):
+        """
+        Reads the production medications of a patient in every recorded cycle, using the patient identity index.
+
+        :param first_name: First name of the patient. Case and spacing are ignored.
+        :param last_name: Last name of the patient. Case and spacing are ignored.
+        :param date_of_birth: Date of birth of the patient, or None to read every patient with the name
+        :return: List of dictionaries of the cycle, the identity key of the patient and their medication summary,
+        oldest cycle first
+        """
+        query: str = ("SELECT cycles.cycle_id, cycles.production_group_name, cycles.recorded_on, cycles.archived, "
+                      "cycle_patients.cycle_patient_id, cycle_patients.date_of_birth FROM cycle_patients "
+                      "JOIN cycles ON cycles.cycle_id = cycle_patients.cycle_id "
+                      "WHERE cycle_patients.last_name_key = ? AND cycle_patients.first_name_key = ?")
+        parameters: tuple = (normalise_name(last_name), normalise_name(first_name))
+        if date_of_birth is not None:
+            query += " AND cycle_patients.date_of_birth = ?"
+            parameters += (_get_date_key(date_of_birth),)
+        patient_history: list = []
+        with self.__lock:
+            for row in self.__connection.execute(query + " ORDER BY cycles.cycle_id", parameters).fetchall():
+                medication_summary: dict = {}
+                for medication_row in self.__connection.execute(
+                        "SELECT medication_name, {0} FROM cycle_medications WHERE cycle_patient_id = ?"
+                        .format(", ".join(_SUMMARY_COLUMNS)), (row[4],)):
+                    medication_summary[medication_row[0]] = tuple(medication_row[1:])
+                patient_history.append({
+                    "Cycle": self.__get_cycle(row[:4]),
+                    "IdentityKey": (parameters[0], parameters[1], _get_date(row[5])),
+                    "Summary": medication_summary
+                })
+        return patient_history
+
+    def get_production_changes(self, production_summaries: dict = None):
+        """
+        Works out what changed for every patient in the open cycle since the last archived cycle.
+
+        :param production_summaries: The medication summaries of the current production. If not given, the summaries
+        recorded for the open cycle are used, so the production's patients do not need to be loaded.
+        :return: The production changes, as returned by diff_productions
+        """
+        previous_cycle = self.get_last_archived_cycle()
+        if production_summaries is None:
+            open_cycle = self.get_open_cycle()
+            production_summaries = {} if open_cycle is None else self.read_cycle_summaries(open_cycle["CycleId"])
+        previous_summaries: dict = {}
+        if previous_cycle is not None:
+            previous_summaries = self.read_cycle_summaries(previous_cycle["CycleId"])
+        return diff_productions(previous_summaries, production_summaries, previous_cycle)
+
+
+def record_loaded_production(collected_patients):
+    """
+    Records a newly loaded production in the patient history as the open cycle, and works out what changed for every
+    patient since the last archived cycle.
+
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object holding the production
+    :return: The production changes, as returned by diff_productions, or None if the patient history could not be
+    updated
+    """
+    try:
+        production_summaries: dict = get_production_summaries(collected_patients)
+        with PatientHistoryStore(consts.PATIENT_HISTORY_DATABASE) as patient_history_store:
+            production_changes: dict = patient_history_store.get_production_changes(production_summaries)
+            patient_history_store.record_cycle(collected_patients.production_group_name, production_summaries)
+        return production_changes
+    except Exception as e:
+        logging.error("Failed to record the production in the patient history... {0}".format(e))
+        return None
+
+
+def record_archived_production(collected_patients):
+    """Records a production in the patient history as it is archived, so it becomes the last cycle the next production
+    is compared with."""
+    try:
+        with PatientHistoryStore(consts.PATIENT_HISTORY_DATABASE) as patient_history_store:
+            return patient_history_store.record_cycle(collected_patients.production_group_name,
+                                                      get_production_summaries(collected_patients), archived=True)
+    except Exception as e:
+        logging.error("Failed to record the archived production in the patient history... {0}".format(e))
+        return None
+
+
+def load_production_changes():
+    """Works out what changed for every patient in the open cycle since the last archived cycle from the patient
+    history alone, e.g. for the saved production when the application starts. Returns None if the patient history
+    could not be read."""
+    try:
+        with PatientHistoryStore(consts.PATIENT_HISTORY_DATABASE) as patient_history_store:
+            return patient_history_store.get_production_changes()
+    except Exception as e:
+        logging.error("Failed to read the production changes from the patient history... {0}".format(e))
+        return None
@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import pickle
+import struct
+import threading
+import weakref
+import zlib
+
+from DataStructures.Models import PillpackPatient
+from DataStructures.Repositories import CollectedPatients
+
+"""
+
+Journaled persistence for CollectedPatients. A full snapshot of the CollectedPatients object is pickled to the snapshot
+file exactly as before, and every incremental save afterwards appends a small record to a journal file next to it. A
+record holds the patient lists stored under each changed last name in every patient dictionary, so the cost of a save
+is proportional to the patients which changed rather than to the size of the production. Every patient is only ever
+stored under their own last name, so replacing those lists when a record is replayed restores the same patient objects
+in every dictionary.
+
+Each journal starts with a header containing a digest of the snapshot it applies to, so a journal left behind by an
+older snapshot is never replayed. Records are framed with their length and a CRC, which means a record only partially
+written when the application crashed is discarded on load rather than corrupting the patients loaded before it.
+
+"""
+
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_MAGIC = b"SCJ1"
+JOURNAL_MINIMUM_COMPACTION_SIZE = 1024 * 1024
+PATIENT_DICT_NAMES = ("pillpack_patient_dict", "all_patients", "matched_patients", "minor_mismatch_patients",
+                      "severe_mismatch_patients")
+_RECORD_HEADER = struct.Struct(">II")
+
+_journal_lock = threading.Lock()
+_journal_states: dict = {}
+
+
+def get_journal_file_name(snapshot_file_name: str):
+    return snapshot_file_name + JOURNAL_SUFFIX
+
+
+def _get_journal_state(snapshot_file_name: str):
+    if not _journal_states.__contains__(snapshot_file_name):
+        _journal_states[snapshot_file_name] = {
+            "CollectedPatients": None,
+            "SnapshotSize": 0,
+            "JournalSize": 0
+        }
+    return _journal_states[snapshot_file_name]
+
+
+def _journal_belongs_to(journal_state: dict, collected_patients: CollectedPatients):
+    """The journal state holds a weak reference to the CollectedPatients object the journal was last written for, so a
+    new object is never mistaken for it, even if it reuses the memory of an object which has been garbage collected."""
+    owner_reference = journal_state["CollectedPatients"]
+    return owner_reference is not None and owner_reference() is collected_patients
+
+
+def _write_file_atomically(file_name: str, data: bytes):
+    temporary_file_name = file_name + ".tmp"
+    with open(temporary_file_name, 'wb') as output:
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temporary_file_name, file_name)
+
+
+def _frame_record(record: bytes):
+    return _RECORD_HEADER.pack(len(record), zlib.crc32(record)) + record
+
+
+def _read_records(journal_data: bytes, position: int):
+    """Yields each complete record in the journal, stopping at the first record which is truncated or corrupt."""
+    while position + _RECORD_HEADER.size <= len(journal_data):
+        record_length, record_crc = _RECORD_HEADER.unpack_from(journal_data, position)
+        record_start = position + _RECORD_HEADER.size
+        record = journal_data[record_start:record_start + record_length]
+        if len(record) != record_length or zlib.crc32(record) != record_crc:
+            logging.warning("Discarding incomplete journal record at offset {0}".format(position))
+            return
+        yield record
+        position = record_start + record_length
+
+
+def write_collected_patients_snapshot(collected_patients: CollectedPatients, snapshot_file_name: str):
+    """Pickles the whole CollectedPatients object to the snapshot file and starts a new, empty journal for it."""
+    with _journal_lock:
+        try:
+            snapshot: bytes = pickle.dumps(collected_patients, pickle.HIGHEST_PROTOCOL)
+            _write_file_atomically(snapshot_file_name, snapshot)
+            journal_header: bytes = JOURNAL_MAGIC + hashlib.blake2b(snapshot, digest_size=16).digest()
+            _write_file_atomically(get_journal_file_name(snapshot_file_name), journal_header)
+            journal_state: dict = _get_journal_state(snapshot_file_name)
+            journal_state["CollectedPatients"] = weakref.ref(collected_patients)
+            journal_state["SnapshotSize"] = len(snapshot)
+            journal_state["JournalSize"] = len(journal_header)
+            logging.info("Saved snapshot of object {0} to pickle file {1} successfully."
+                         .format(collected_patients, snapshot_file_name))
+        except Exception as e:
+            logging.error("Failed to save snapshot of object {0} to pickle file {1} due to exception {2}"
+                          .format(collected_patients, snapshot_file_name, e))
+
+
+def append_collected_patients_changes(collected_patients: CollectedPatients, snapshot_file_name: str,
+                                      changed_patients: list):
+    """
+    Appends a record of the changed patients to the journal. If the journal does not belong to this CollectedPatients
+    object (e.g. a new production has been loaded since the last snapshot), or the journal has grown larger than the
+    snapshot, then a new compacted snapshot is written instead.
+    """
+    journal_state: dict = _get_journal_state(snapshot_file_name)
+    if (not _journal_belongs_to(journal_state, collected_patients)
+            or not os.path.exists(get_journal_file_name(snapshot_file_name))
+            or journal_state["JournalSize"] > max(journal_state["SnapshotSize"], JOURNAL_MINIMUM_COMPACTION_SIZE)):
+        write_collected_patients_snapshot(collected_patients, snapshot_file_name)
+        return
+    changed_last_names: set = set()
+    for patient in changed_patients:
+        if isinstance(patient, PillpackPatient):
+            changed_last_names.add(patient.last_name.lower())
+    changed_groups: dict = {}
+    for last_name in changed_last_names:
+        changed_groups[last_name] = {
+            dict_name: getattr(collected_patients, dict_name).get(last_name) for dict_name in PATIENT_DICT_NAMES
+        }
+    journal_record: dict = {
+        "ProductionGroupName": collected_patients.production_group_name,
+        "ReadyToProduceCode": collected_patients.ready_to_produce_code,
+        "ChangedGroups": changed_groups
+    }
+    with _journal_lock:
+        try:
+            framed_record: bytes = _frame_record(pickle.dumps(journal_record, pickle.HIGHEST_PROTOCOL))
+            with open(get_journal_file_name(snapshot_file_name), 'ab') as journal:
+                journal.write(framed_record)
+                journal.flush()
+                os.fsync(journal.fileno())
+            journal_state["JournalSize"] += len(framed_record)
+            logging.info("Appended changes to patient(s) with last name(s) {0} to journal {1}"
+                         .format(", ".join(sorted(changed_last_names)), get_journal_file_name(snapshot_file_name)))
+        except Exception as e:
+            logging.error("Failed to append changes to journal {0} due to exception {1}"
+                          .format(get_journal_file_name(snapshot_file_name), e))
+
+
+def _apply_journal_record(collected_patients: CollectedPatients, journal_record: dict):
+    collected_patients.production_group_name = journal_record["ProductionGroupName"]
+    collected_patients.ready_to_produce_code = journal_record["ReadyToProduceCode"]
+    for last_name, changed_group in journal_record["ChangedGroups"].items():
+        for dict_name, patients_with_last_name in changed_group.items():
+            patient_dict: dict = getattr(collected_patients, dict_name)
+            if patients_with_last_name is None:
+                patient_dict.pop(last_name, None)
+            else:
+                patient_dict[last_name] = patients_with_last_name
+
+
+def load_collected_patients_with_journal(snapshot_file_name: str):
+    """
+    Loads the CollectedPatients snapshot and replays every record of its journal on top of it. Returns None if there is
+    no snapshot to load.
+    """
+    with _journal_lock:
+        try:
+            with open(snapshot_file_name, 'rb') as snapshot_file:
+                snapshot: bytes = snapshot_file.read()
+        except FileNotFoundError:
+            logging.error("No such file {0} detected. Could not load into memory".format(snapshot_file_name))
+            return None
+        collected_patients: CollectedPatients = pickle.loads(snapshot)
+        logging.info("Loaded file {0} into memory".format(snapshot_file_name))
+        journal_state: dict = _get_journal_state(snapshot_file_name)
+        journal_state["CollectedPatients"] = None
+        journal_state["SnapshotSize"] = len(snapshot)
+        try:
+            with open(get_journal_file_name(snapshot_file_name), 'rb') as journal_file:
+                journal_data: bytes = journal_file.read()
+        except FileNotFoundError:
+            return collected_patients
+        journal_header: bytes = JOURNAL_MAGIC + hashlib.blake2b(snapshot, digest_size=16).digest()
+        if not journal_data.startswith(journal_header):
+            logging.warning("Journal {0} does not belong to snapshot {1}. Ignoring journal."
+                            .format(get_journal_file_name(snapshot_file_name), snapshot_file_name))
+            return collected_patients
+        number_of_records: int = 0
+        replayed_size: int = len(journal_header)
+        for record in _read_records(journal_data, len(journal_header)):
+            try:
+                _apply_journal_record(collected_patients, pickle.loads(record))
+            except Exception as e:
+                logging.error("Failed to replay journal record due to exception {0}".format(e))
+                break
+            number_of_records += 1
+            replayed_size += _RECORD_HEADER.size + len(record)
+        logging.info("Replayed {0} record(s) from journal {1}"
+                     .format(number_of_records, get_journal_file_name(snapshot_file_name)))
+        if replayed_size == len(journal_data):
+            journal_state["CollectedPatients"] = weakref.ref(collected_patients)
+            journal_state["JournalSize"] = replayed_size
+    if journal_state["CollectedPatients"] is None:
+        """The journal had a damaged tail, so it is compacted into a fresh snapshot before anything is appended."""
+        write_collected_patients_snapshot(collected_patients, snapshot_file_name)
+    return collected_patients
+
+
+def remove_collected_patients_files(snapshot_file_name: str):
+    with _journal_lock:
+        for file_name in (snapshot_file_name, get_journal_file_name(snapshot_file_name)):
+            if os.path.exists(file_name):
+                os.remove(file_name)
+        _journal_states.pop(snapshot_file_name, None)
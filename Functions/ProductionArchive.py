@@ -0,0 +1,397 @@
+import datetime
+import logging
+import os
+import pickle
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from io import BytesIO
+from zipfile import ZipFile, ZipInfo, ZIP_STORED
+
+from DataStructures.PatientIdentityIndex import get_identity_key, normalise_name
+from DataStructures.Repositories import CollectedPatients
+from Functions.MedicationDiff import diff_patient_medications
+from Functions.PatientJournal import PATIENT_DICT_NAMES
+
+"""
+
+Indexed production archives. Rather than pickling the whole production into a zip file, an archived production is
+streamed into the zip file one record at a time: each record holds the patients stored under one last name in every
+patient dictionary, pickled and compressed on its own. An index of the records, and of the patients each record holds
+by their normalised (last name, first name) and then by their date of birth, is written after the last record,
+followed by a footer giving its position.
+
+The archive is stored uncompressed in the zip file, so a patient can be looked up by reading the footer, the index and
+only the record holding the patient, without loading the rest of the production. Productions archived by older
+versions, which pickled the whole production, can still be opened, but are loaded in full the first time they are
+queried.
+
+An archive is laid out as:
+    header: magic (4 bytes), version (2 bytes)
+    records: length (4 bytes), CRC-32 (4 bytes), compressed pickle of (last name, {patient dictionary: patients})
+    index: length (4 bytes), CRC-32 (4 bytes), compressed pickle of the index dictionary
+    footer: offset of the index (8 bytes), magic (4 bytes)
+
+"""
+
+ARCHIVE_MEMBER_PREFIX = "archived_production_"
+ARCHIVE_MEMBER_SUFFIX = ".pkx"
+LEGACY_ARCHIVE_MEMBER_SUFFIX = ".pk1"
+ARCHIVE_VERSION = 1
+_ARCHIVE_MAGIC = b"SCPA"
+_ARCHIVE_HEADER = struct.Struct(">4sH")
+_RECORD_HEADER = struct.Struct(">II")
+_ARCHIVE_FOOTER = struct.Struct(">Q4s")
+_ZIP_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+def _iterate_patient_groups(collected_patients):
+    """Yields the lowercase last name and the patients stored under it in every patient dictionary of a production, one
+    last name at a time. Patients are read from the SQLite repository as each last name is reached."""
+    archived_last_names: set = set()
+    for name_of_dict in PATIENT_DICT_NAMES:
+        for last_name in list(getattr(collected_patients, name_of_dict).keys()):
+            if last_name in archived_last_names:
+                continue
+            archived_last_names.add(last_name)
+            patient_groups: dict = {}
+            for name_of_group_dict in PATIENT_DICT_NAMES:
+                patient_dict = getattr(collected_patients, name_of_group_dict)
+                if last_name in patient_dict:
+                    patient_groups[name_of_group_dict] = list(patient_dict[last_name])
+            yield last_name, patient_groups
+
+
+def _get_patient(entry):
+    """The all_patients dictionary holds a dictionary of the status of each patient and the patient itself, and every
+    other patient dictionary holds the patients alone."""
+    if isinstance(entry, dict):
+        return entry["PatientObject"]
+    return entry
+
+
+def _add_to_index(patients_index: dict, record_number: int, patient_groups: dict):
+    """Indexes the patients of a record by their normalised (last name, first name), then by their date of birth, so
+    the records holding a patient are found with a dictionary lookup whether or not the date of birth is known."""
+    for patients_with_last_name in patient_groups.values():
+        for entry in patients_with_last_name:
+            last_name, first_name, date_of_birth = get_identity_key(_get_patient(entry))
+            record_numbers: list = patients_index.setdefault((last_name, first_name), {}).setdefault(date_of_birth, [])
+            if record_number not in record_numbers:
+                record_numbers.append(record_number)
+
+
+def _frame(data: bytes):
+    return _RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def write_production_archive(output, collected_patients):
+    """
+    Streams a production into an indexed archive. Only the patients stored under one last name are held in memory at
+    a time, so archiving does not need a second copy of the whole production.
+
+    :param output: Binary file object the archive is written to, e.g. a member of a zip file opened for writing
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object holding the production
+    :return: The index of the archive
+    """
+    position: int = output.write(_ARCHIVE_HEADER.pack(_ARCHIVE_MAGIC, ARCHIVE_VERSION))
+    records: list = []
+    patients_index: dict = {}
+    for last_name, patient_groups in _iterate_patient_groups(collected_patients):
+        record: bytes = _frame(zlib.compress(pickle.dumps((last_name, patient_groups), pickle.HIGHEST_PROTOCOL)))
+        _add_to_index(patients_index, len(records), patient_groups)
+        records.append((position, len(record)))
+        position += output.write(record)
+    archive_index: dict = {
+        "ProductionGroupName": collected_patients.production_group_name,
+        "ReadyToProduceCode": collected_patients.ready_to_produce_code,
+        "ArchivedOn": datetime.datetime.now(),
+        "Records": records,
+        "Patients": patients_index
+    }
+    index_position: int = position
+    output.write(_frame(zlib.compress(pickle.dumps(archive_index, pickle.HIGHEST_PROTOCOL))))
+    output.write(_ARCHIVE_FOOTER.pack(index_position, _ARCHIVE_MAGIC))
+    return archive_index
+
+
+def add_production_to_archive(archive_file, collected_patients):
+    """
+    Streams a production into a new member of a zip file, which is created if it does not exist.
+
+    :param archive_file: Path of the zip file, or a file object opened on it
+    :param collected_patients: The CollectedPatients (or SQLiteCollectedPatients) object holding the production
+    :return: The name of the member the production was archived to
+    """
+    archived_on: datetime.datetime = datetime.datetime.now()
+    member_name: str = "{0}{1:%Y-%m-%d_%H%M%S}{2}".format(ARCHIVE_MEMBER_PREFIX, archived_on, ARCHIVE_MEMBER_SUFFIX)
+    member_info = ZipInfo(member_name, date_time=archived_on.timetuple()[:6])
+    member_info.compress_type = ZIP_STORED
+    with ZipFile(archive_file, 'a') as archived_production_data:
+        with archived_production_data.open(member_info, 'w', force_zip64=True) as member:
+            write_production_archive(member, collected_patients)
+    return member_name
+
+
+def _read_member_for_random_access(archive_file_name: str, zip_file: ZipFile, member_info: ZipInfo):
+    """Returns a file object the member can be read from at any offset, and the offset the member starts at. A member
+    which is stored uncompressed is read straight from the zip file, and any other member is read into memory."""
+    if member_info.compress_type == ZIP_STORED and archive_file_name is not None:
+        archive = open(archive_file_name, 'rb')
+        archive.seek(member_info.header_offset)
+        local_header = _ZIP_LOCAL_HEADER.unpack(archive.read(_ZIP_LOCAL_HEADER.size))
+        return archive, member_info.header_offset + _ZIP_LOCAL_HEADER.size + local_header[-2] + local_header[-1]
+    return BytesIO(zip_file.read(member_info)), 0
+
+
+class ProductionArchive(ABC):
+    """
+    A production archived in a zip file, which patients can be looked up in without loading the whole production.
+    Archives hold open the zip file they are read from until they are closed. Subclasses read the records of the
+    archive, each holding the patients stored under one last name.
+    """
+    def __init__(self, archive_file_name: str, member_name: str, production_group_name: str,
+                 archived_on: datetime.datetime, patients_index: dict):
+        """
+        The constructor for the ProductionArchive class. Archives are opened with open_production_archives.
+
+        :param archive_file_name: Path of the zip file the production is archived in
+        :param member_name: Name of the member of the zip file the production is archived to
+        :param production_group_name: Name of the archived production group
+        :param archived_on: When the production was archived
+        :param patients_index: Dictionary of the normalised (last name, first name) of each archived patient to a
+        dictionary of their date of birth to the records holding them
+        """
+        self.archive_file_name: str = archive_file_name
+        self.member_name: str = member_name
+        self.production_group_name: str = production_group_name
+        self.archived_on: datetime.datetime = archived_on
+        self.patients_index: dict = patients_index
+        self.ready_to_produce_code: int = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return sum(len(records_by_date_of_birth) for records_by_date_of_birth in self.patients_index.values())
+
+    def __repr__(self):
+        return "{0}({1}, {2})".format(type(self).__name__, self.archive_file_name, self.member_name)
+
+    @abstractmethod
+    def read_record(self, record_number: int):
+        """Reads the record of the patients stored under one last name: a tuple of the last name and a dictionary of
+        the patients stored under it in each patient dictionary."""
+
+    @abstractmethod
+    def count_records(self):
+        """Returns the number of records in the archive."""
+
+    def find_patients(self, first_name: str, last_name: str, date_of_birth=None,
+                      name_of_dict: str = "pillpack_patient_dict"):
+        """
+        Looks up a patient in the archived production. Only the records holding patients with the same name are read.
+
+        :param first_name: First name of the patient. Case and spacing are ignored.
+        :param last_name: Last name of the patient. Case and spacing are ignored.
+        :param date_of_birth: Date of birth of the patient, or None to find every patient with the name
+        :param name_of_dict: The patient dictionary the patient is looked up in, e.g. "pillpack_patient_dict" for the
+        production patients or "all_patients" for the patients of the scanned scripts
+        :return: List of the matching PillpackPatient objects, or of the status dictionaries of the matching patients if
+        they are looked up in "all_patients"
+        """
+        name_key: tuple = (normalise_name(last_name), normalise_name(first_name))
+        records_by_date_of_birth: dict = self.patients_index.get(name_key, {})
+        if date_of_birth is None:
+            record_numbers: set = {record_number for identity_record_numbers in records_by_date_of_birth.values()
+                                   for record_number in identity_record_numbers}
+        else:
+            record_numbers: set = set(records_by_date_of_birth.get(date_of_birth, []))
+        found_patients: list = []
+        for record_number in sorted(record_numbers):
+            _, patient_groups = self.read_record(record_number)
+            for entry in patient_groups.get(name_of_dict, []):
+                identity_key: tuple = get_identity_key(_get_patient(entry))
+                if (identity_key[:2] == name_key and (date_of_birth is None or identity_key[2] == date_of_birth)
+                        and entry not in found_patients):
+                    found_patients.append(entry)
+        return found_patients
+
+    def load_collected_patients(self):
+        """Loads the whole archived production into a CollectedPatients object, reading every record in turn."""
+        collected_patients = CollectedPatients()
+        collected_patients.production_group_name = self.production_group_name
+        collected_patients.ready_to_produce_code = self.ready_to_produce_code
+        for record_number in range(0, self.count_records()):
+            last_name, patient_groups = self.read_record(record_number)
+            for name_of_dict, patients_with_last_name in patient_groups.items():
+                getattr(collected_patients, name_of_dict)[last_name] = patients_with_last_name
+        collected_patients.changed_last_names = None
+        return collected_patients
+
+
+class IndexedProductionArchive(ProductionArchive):
+    """
+    A production archived as an indexed archive. Opening the archive only reads its footer and its index, and each
+    record is read from the zip file when it is needed.
+    """
+    def __init__(self, archive_file_name: str, zip_file: ZipFile, member_info: ZipInfo):
+        self.__archive, self.__member_offset = _read_member_for_random_access(archive_file_name, zip_file,
+                                                                              member_info)
+        try:
+            self.__archive.seek(self.__member_offset)
+            magic, version = _ARCHIVE_HEADER.unpack(self.__archive.read(_ARCHIVE_HEADER.size))
+            self.__archive.seek(self.__member_offset + member_info.file_size - _ARCHIVE_FOOTER.size)
+            index_position, footer_magic = _ARCHIVE_FOOTER.unpack(self.__archive.read(_ARCHIVE_FOOTER.size))
+            if magic != _ARCHIVE_MAGIC or footer_magic != _ARCHIVE_MAGIC or version > ARCHIVE_VERSION:
+                raise ValueError("{0} in {1} is not a production archive this version can read"
+                                 .format(member_info.filename, archive_file_name))
+            archive_index: dict = pickle.loads(zlib.decompress(self.__read_frame(index_position)))
+        except Exception:
+            self.__archive.close()
+            raise
+        self.__records: list = archive_index["Records"]
+        ProductionArchive.__init__(self, archive_file_name, member_info.filename,
+                                   archive_index["ProductionGroupName"], archive_index["ArchivedOn"],
+                                   archive_index["Patients"])
+        self.ready_to_produce_code = archive_index["ReadyToProduceCode"]
+
+    def __read_frame(self, position: int):
+        self.__archive.seek(self.__member_offset + position)
+        data_length, data_crc = _RECORD_HEADER.unpack(self.__archive.read(_RECORD_HEADER.size))
+        data: bytes = self.__archive.read(data_length)
+        if len(data) != data_length or zlib.crc32(data) != data_crc:
+            raise ValueError("Corrupt record at offset {0} of {1} in {2}"
+                             .format(position, self.member_name, self.archive_file_name))
+        return data
+
+    def read_record(self, record_number: int):
+        return pickle.loads(zlib.decompress(self.__read_frame(self.__records[record_number][0])))
+
+    def count_records(self):
+        return len(self.__records)
+
+    def close(self):
+        self.__archive.close()
+
+
+class LegacyProductionArchive(ProductionArchive):
+    """
+    A production archived by an older version, which pickled the whole production. The production is loaded in full
+    the first time it is queried, and is grouped into records the same way as an indexed archive.
+    """
+    def __init__(self, archive_file_name: str, zip_file: ZipFile, member_info: ZipInfo):
+        self.__zip_file_name: str = archive_file_name
+        self.__member_info: ZipInfo = member_info
+        self.__patient_groups = None
+        ProductionArchive.__init__(self, archive_file_name, member_info.filename, None,
+                                   datetime.datetime(*member_info.date_time), None)
+
+    def __load(self):
+        if self.__patient_groups is None:
+            with ZipFile(self.__zip_file_name, 'r') as zip_file:
+                collected_patients: CollectedPatients = pickle.loads(zip_file.read(self.__member_info))
+            logging.info("Loaded legacy archive {0} from {1} into memory"
+                         .format(self.member_name, self.archive_file_name))
+            self.__patient_groups = list(_iterate_patient_groups(collected_patients))
+            self.production_group_name = collected_patients.production_group_name
+            self.ready_to_produce_code = collected_patients.ready_to_produce_code
+            self.patients_index = {}
+            for record_number in range(0, len(self.__patient_groups)):
+                _add_to_index(self.patients_index, record_number, self.__patient_groups[record_number][1])
+        return self.__patient_groups
+
+    def __len__(self):
+        self.__load()
+        return ProductionArchive.__len__(self)
+
+    def find_patients(self, first_name: str, last_name: str, date_of_birth=None,
+                      name_of_dict: str = "pillpack_patient_dict"):
+        self.__load()
+        return ProductionArchive.find_patients(self, first_name, last_name, date_of_birth, name_of_dict)
+
+    def read_record(self, record_number: int):
+        return self.__load()[record_number]
+
+    def load_collected_patients(self):
+        self.__load()
+        return ProductionArchive.load_collected_patients(self)
+
+    def count_records(self):
+        return len(self.__load())
+
+
+def open_production_archives(archive_file_name: str):
+    """
+    Opens every production archived in a zip file, oldest first. Indexed archives only have their index read, and
+    legacy archives are not read until they are queried.
+
+    :param archive_file_name: Path of the zip file
+    :return: List of ProductionArchive objects, which should be closed once they are no longer needed
+    """
+    production_archives: list = []
+    with ZipFile(archive_file_name, 'r') as zip_file:
+        for member_info in zip_file.infolist():
+            try:
+                if member_info.filename.endswith(ARCHIVE_MEMBER_SUFFIX):
+                    production_archives.append(IndexedProductionArchive(archive_file_name, zip_file, member_info))
+                elif member_info.filename.endswith(LEGACY_ARCHIVE_MEMBER_SUFFIX):
+                    production_archives.append(LegacyProductionArchive(archive_file_name, zip_file, member_info))
+            except Exception as e:
+                logging.error("Failed to open archived production {0} in {1}: {2}"
+                              .format(member_info.filename, archive_file_name, e))
+    production_archives.sort(key=lambda production_archive: production_archive.archived_on)
+    return production_archives
+
+
+def find_patient_in_archives(archive_file_names: list, first_name: str, last_name: str, date_of_birth=None):
+    """
+    Looks up a patient in every production archived in a list of zip files. Only the records holding the patient are
+    read from each indexed archive.
+
+    :param archive_file_names: List of the paths of the zip files
+    :param first_name: First name of the patient
+    :param last_name: Last name of the patient
+    :param date_of_birth: Date of birth of the patient, or None to find every patient with the name
+    :return: List of dictionaries of the archive file, archived member, production group name and archive date of each
+    production the patient was found in, and the patient found, oldest production first
+    """
+    archived_patients: list = []
+    for archive_file_name in archive_file_names:
+        for production_archive in open_production_archives(archive_file_name):
+            with production_archive:
+                for patient in production_archive.find_patients(first_name, last_name, date_of_birth):
+                    archived_patients.append({
+                        "ArchiveFile": os.path.basename(archive_file_name),
+                        "Member": production_archive.member_name,
+                        "ProductionGroupName": production_archive.production_group_name,
+                        "ArchivedOn": production_archive.archived_on,
+                        "Patient": patient
+                    })
+    archived_patients.sort(key=lambda archived_patient: archived_patient["ArchivedOn"])
+    return archived_patients
+
+
+def diff_archived_patients(archived_patients: list):
+    """
+    Compares the production medications of each archived patient found by find_patient_in_archives with the same
+    patient (by name and date of birth) in the production archived before it.
+
+    :param archived_patients: List of the archived patients, oldest production first
+    :return: The same list, with the medication diff of each archived patient added under "Diff". The diff of a
+    patient's earliest production is None.
+    """
+    previous_patients: dict = {}
+    for archived_patient in archived_patients:
+        identity_key: tuple = get_identity_key(archived_patient["Patient"])
+        previous_patient = previous_patients.get(identity_key)
+        archived_patient["Diff"] = None if previous_patient is None \
+            else diff_patient_medications(previous_patient, archived_patient["Patient"])
+        previous_patients[identity_key] = archived_patient["Patient"]
+    return archived_patients
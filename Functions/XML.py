@@ -1,11 +1,23 @@
 import logging
+import os
 import re
 import xml
+from io import BytesIO
 from xml.dom import minidom
+from xml.parsers import expat
 from html import unescape
-from DataStructures.Models import PillpackPatient, Medication
-from pylibdmtx.pylibdmtx import encode
-from PIL import Image
+from DataStructures.Models import PillpackPatient, Medication, PillpackOrder, PillpackOrderMedication
+
+STREAM_CHUNK_SIZE = 64 * 1024
+_DECLARED_ENCODING = re.compile(rb"<\?xml[^>]*?encoding=[\"']([A-Za-z0-9._-]+)[\"']")
+"""Scanners swap these characters when reading the 2D barcode on a script, so they are swapped back before parsing"""
+_SCRIPT_CHARACTER_SWAPS = str.maketrans({'"': '@', '@': '"', '£': '#', '#': '£', '¬': '~'})
+SCRIPT_TAGS = ("sc", "pa", "pb", "dd")
+_SCRIPT_DOCUMENT = re.compile(r'[ \t\r\n]*<xml>(.*)</xml>[ \t\r\n]*', re.DOTALL)
+_SCRIPT_ELEMENT = re.compile(r'[ \t\r\n]*<(sc|pa|pb|dd)((?:[ \t\r\n]+[A-Za-z_][A-Za-z0-9_.-]*[ \t\r\n]*=[ \t\r\n]*'
+                             r'"[^"<&\x00-\x1f]*")*)[ \t\r\n]*/>')
+_SCRIPT_ATTRIBUTE = re.compile(r'([A-Za-z_][A-Za-z0-9_.-]*)[ \t\r\n]*=[ \t\r\n]*"([^"]*)"')
+_SCRIPT_WHITESPACE = re.compile(r'[ \t\r\n]*')
 
 
 def remove_whitespace(node):
@@ -101,25 +113,227 @@ def sanitise_and_encode_text_from_file(filename: str, separating_tag: str, confi
         return list_of_strings
 
 
+class _PillpackOrderHandler:
+    """
+    Expat handler which reads a single OrderInfo fragment into a PillpackOrder record. Only the text of the tags
+    required by the model builder is kept; every other tag is skipped as it is read.
+    """
+    def __init__(self):
+        self.order: PillpackOrder = PillpackOrder()
+        self.current_medication = None
+        self.medication_name_found: bool = False
+        self.in_first_dose: bool = False
+        self.depth: int = 0
+        self.text_field = None
+        self.text_owner = None
+        self.text_depth: int = 0
+        self.text: list = []
+
+    def _capture_text(self, owner, field: str):
+        self.text_owner = owner
+        self.text_field = field
+        self.text_depth = self.depth
+        self.text = []
+
+    def start_element(self, name: str, attributes: dict):
+        self.depth += 1
+        if self.text_field is not None:
+            return
+        medication = self.current_medication
+        match name:
+            case "PtntNm":
+                if self.order.patient_name is None:
+                    self._capture_text(self.order, "patient_name")
+            case "Birthday":
+                if self.order.birthday is None:
+                    self._capture_text(self.order, "birthday")
+            case "MedItem":
+                self.current_medication = PillpackOrderMedication()
+                self.medication_name_found = False
+                self.in_first_dose = False
+            case "MedNm":
+                if medication is not None and not self.medication_name_found:
+                    self.medication_name_found = True
+                    self._capture_text(medication, "medication_name")
+            case "MedItemDose":
+                if medication is not None:
+                    medication.number_of_doses += 1
+                    self.in_first_dose = medication.number_of_doses == 1
+            case "TakeDt":
+                if self.in_first_dose and medication.start_date is None:
+                    self._capture_text(medication, "start_date")
+            case "DoseList":
+                if self.in_first_dose and medication.dose_list is None:
+                    self._capture_text(medication, "dose_list")
+
+    def end_element(self, name: str):
+        if self.text_field is not None and self.depth == self.text_depth:
+            """Whitespace-only text is treated as an empty tag, the same as remove_whitespace does for minidom"""
+            text = "".join(self.text)
+            setattr(self.text_owner, self.text_field, text if text.strip() != "" else "")
+            self.text_field = None
+            self.text_owner = None
+        elif name == "MedItemDose":
+            self.in_first_dose = False
+        elif name == "MedItem" and self.current_medication is not None:
+            self.order.medications.append(self.current_medication)
+            self.current_medication = None
+        self.depth -= 1
+
+    def character_data(self, data: str):
+        if self.text_field is not None and self.depth == self.text_depth:
+            self.text.append(data)
+
+
+def _parse_order_fragment(order_fragment: bytes, encoding: str):
+    handler = _PillpackOrderHandler()
+    parser = expat.ParserCreate(encoding)
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start_element
+    parser.EndElementHandler = handler.end_element
+    parser.CharacterDataHandler = handler.character_data
+    parser.Parse(order_fragment, True)
+    return handler.order
+
+
+def _split_orders(binary_stream, separating_tag: str, chunk_size: int, stream_offset: int = 0,
+                  encoding: str = "utf-8"):
+    """
+    Reads a binary stream chunk by chunk and yields each separating_tag element as raw bytes, along with the encoding
+    given by the most recent XML declaration and the offset of the element's opening tag. Any text outside of the
+    separating tags (including the garbage pillpack writes before the XML declaration) is discarded, so only a single
+    order is ever held in memory.
+    """
+    opening_tag = re.compile(b"<" + separating_tag.encode("ascii") + rb"[\s>]")
+    closing_tag = re.compile(b"</" + separating_tag.encode("ascii") + rb"\s*>")
+    tail_length = len(separating_tag) + 16
+    buffer = bytearray()
+    buffer_offset = stream_offset
+    order_start = -1
+    search_from = 0
+    end_of_stream = False
+    while not end_of_stream:
+        chunk = binary_stream.read(chunk_size)
+        end_of_stream = len(chunk) == 0
+        buffer += chunk
+        while True:
+            if order_start < 0:
+                opening_match = opening_tag.search(buffer, search_from)
+                preamble_end = opening_match.start() if opening_match is not None else len(buffer)
+                for declaration in _DECLARED_ENCODING.finditer(buffer, 0, preamble_end):
+                    encoding = declaration.group(1).decode("ascii")
+                if opening_match is None:
+                    discarded = max(len(buffer) - tail_length, 0)
+                    del buffer[:discarded]
+                    buffer_offset += discarded
+                    search_from = 0
+                    break
+                order_start = opening_match.start()
+                search_from = opening_match.end()
+            closing_match = closing_tag.search(buffer, search_from)
+            if closing_match is None:
+                search_from = max(order_start, len(buffer) - tail_length)
+                break
+            yield bytes(buffer[order_start:closing_match.end()]), encoding, buffer_offset + order_start
+            del buffer[:closing_match.end()]
+            buffer_offset += closing_match.end()
+            order_start = -1
+            search_from = 0
+    if order_start >= 0:
+        logging.error("Stream ended before the closing {0} tag of the final order was found".format(separating_tag))
+
+
+def _parse_order_fragment_or_log(order_fragment: bytes, encoding: str):
+    try:
+        return _parse_order_fragment(order_fragment, encoding)
+    except expat.ExpatError:
+        """Older pillpack files are not always valid in their declared encoding, so fall back to latin-1 which
+        will decode any byte sequence"""
+        try:
+            return _parse_order_fragment(order_fragment, "iso-8859-1")
+        except expat.ExpatError as e:
+            logging.error("Could not parse order from XML stream: {0}".format(e))
+    except LookupError as e:
+        logging.error("Could not parse order from XML stream: {0}".format(e))
+    return None
+
+
+def stream_orders(binary_stream, separating_tag: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Generator which incrementally parses pillpack orders from a binary stream, yielding a PillpackOrder record for each
+    order as soon as its closing tag has been read. Orders which cannot be parsed are logged and skipped.
+    """
+    for order_fragment, encoding, _ in _split_orders(binary_stream, separating_tag, chunk_size):
+        order = _parse_order_fragment_or_log(order_fragment, encoding)
+        if order is not None:
+            logging.info("Parsed order from XML stream")
+            yield order
+
+
+def stream_orders_from_file(filename: str, separating_tag: str, config, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Generator which streams every order in a pillpack production file in the configured pillpack data location.
+    """
+    if config is not None:
+        try:
+            with open(os.path.join(config["pillpackDataLocation"], filename), "rb") as raw_file:
+                yield from stream_orders(raw_file, separating_tag, chunk_size)
+        except FileNotFoundError as e:
+            logging.error("File not found: {0}".format(e))
+
+
+def stream_orders_from_file_range(filename: str, separating_tag: str, config, range_start: int, range_end: int,
+                                  encoding: str = "utf-8", chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Generator which streams only the orders whose opening tag begins within the byte range [range_start, range_end)
+    of a pillpack production file. Splitting a file into consecutive ranges therefore yields every order exactly once,
+    which allows large files to be shared between several worker processes.
+
+    The XML declaration is not read when a range starts part way through a file, so the file's encoding should be
+    obtained beforehand with read_declared_encoding.
+    """
+    if config is not None:
+        try:
+            with open(os.path.join(config["pillpackDataLocation"], filename), "rb") as raw_file:
+                raw_file.seek(range_start)
+                for order_fragment, fragment_encoding, order_offset in _split_orders(raw_file, separating_tag,
+                                                                                     chunk_size, range_start,
+                                                                                     encoding):
+                    if order_offset >= range_end:
+                        break
+                    order = _parse_order_fragment_or_log(order_fragment, fragment_encoding)
+                    if order is not None:
+                        logging.info("Parsed order from XML stream")
+                        yield order
+        except FileNotFoundError as e:
+            logging.error("File not found: {0}".format(e))
+
+
+def read_declared_encoding(filename: str, config, default: str = "utf-8"):
+    """
+    Reads the encoding from the XML declaration at the start of a pillpack production file, or returns the default if
+    the file has no declaration.
+    """
+    if config is not None:
+        try:
+            with open(os.path.join(config["pillpackDataLocation"], filename), "rb") as raw_file:
+                declaration = _DECLARED_ENCODING.search(raw_file.read(STREAM_CHUNK_SIZE))
+                if declaration is not None:
+                    return declaration.group(1).decode("ascii")
+        except FileNotFoundError as e:
+            logging.error("File not found: {0}".format(e))
+    return default
+
+
+def _sanitise_script_text(raw_xml_text: str):
+    sanitised_xml_text = str.translate(raw_xml_text, _SCRIPT_CHARACTER_SWAPS)
+    sanitised_xml_text = unescape(sanitised_xml_text)
+    return sanitised_xml_text.replace("&", "and")
+
+
 def scan_script(raw_xml_text: str):
     try:
-        sanitised_xml_text = ""
-        for character in raw_xml_text:
-            match character:
-                case '"':
-                    character = '@'
-                case '@':
-                    character = '"'
-                case '£':
-                    character = '#'
-                case '#':
-                    character = '£'
-                case '¬':
-                    character = '~'
-            sanitised_xml_text += character
-        sanitised_xml_text = unescape(sanitised_xml_text)
-        sanitised_xml_text = sanitised_xml_text.replace("&", "and")
-        sanitised_xml_text = sanitised_xml_text.encode("iso-8859-1")
+        sanitised_xml_text = _sanitise_script_text(raw_xml_text).encode("iso-8859-1")
         document = minidom.parseString(sanitised_xml_text)
         logging.info("Successfully scanned and encoded XML from script.")
         return document
@@ -131,6 +345,56 @@ def scan_script(raw_xml_text: str):
         return
 
 
+def _parse_script_elements(sanitised_xml_text: str):
+    """Reads the attributes of the sc, pa, pb and dd tags of a script directly, provided the script consists of nothing
+    but those self-closing tags with plain double-quoted attribute values inside an xml tag. Returns None for anything
+    else, which is left to the full XML parser. Scripts with non-ASCII characters are also left to the full XML parser,
+    since it reads them as UTF-8."""
+    if not sanitised_xml_text.isascii():
+        return None
+    document_match = _SCRIPT_DOCUMENT.fullmatch(sanitised_xml_text)
+    if document_match is None:
+        return None
+    body: str = document_match.group(1)
+    script_elements: dict = {tag: [] for tag in SCRIPT_TAGS}
+    position: int = 0
+    while position < len(body):
+        element_match = _SCRIPT_ELEMENT.match(body, position)
+        if element_match is None:
+            return script_elements if _SCRIPT_WHITESPACE.fullmatch(body, position) is not None else None
+        attributes: list = _SCRIPT_ATTRIBUTE.findall(element_match.group(2))
+        attributes_by_name: dict = dict(attributes)
+        if len(attributes_by_name) != len(attributes):
+            return None
+        script_elements[element_match.group(1)].append(attributes_by_name)
+        position = element_match.end()
+    return script_elements
+
+
+def decode_script(raw_xml_text: str):
+    """
+    Decodes the text read from the 2D barcode on a script into the attributes of its script (sc), patient (pa), surgery
+    (pb) and medication (dd) tags. The scanner's swapped characters are swapped back with a translation table, and the
+    tags are read directly from the text without building an XML document. Scripts which do not consist solely of those
+    tags are parsed with scan_script instead, so the attributes are always identical to those of the parsed document.
+
+    :param raw_xml_text: The text read from the barcode
+    :return: Dictionary of a list of attribute dictionaries for each tag name, or None if the script cannot be read
+    """
+    script_elements = None
+    if isinstance(raw_xml_text, str):
+        script_elements = _parse_script_elements(_sanitise_script_text(raw_xml_text))
+    if script_elements is None:
+        document = scan_script(raw_xml_text)
+        if document is None:
+            return
+        script_elements = {tag: [dict(element.attributes.items()) for element in document.getElementsByTagName(tag)]
+                           for tag in SCRIPT_TAGS}
+    else:
+        logging.info("Successfully scanned and decoded script.")
+    return script_elements
+
+
 def generate_patient_script_template(patient: PillpackPatient):
     script_template = ('<xml>'
                        '<sc id="{0}" ft="{1}" t="{2}"/>'
@@ -183,11 +447,22 @@ def encode_medications_to_xml(patient: PillpackPatient, dict_values_as_list: lis
 
 
 def encode_to_datamatrix(data_to_encode: str):
+    """pylibdmtx and PIL are only imported when the first datamatrix is encoded, as they are only needed to generate a
+    kardex and are slow to import at startup."""
+    from pylibdmtx.pylibdmtx import encode
+    from PIL import Image
     encoded_datamatrix = encode(data_to_encode.encode("utf8"))
     img = Image.frombytes('RGB', (encoded_datamatrix.width, encoded_datamatrix.height), encoded_datamatrix.pixels)
     return img
 
 
+def encode_to_datamatrix_png(data_to_encode: str):
+    """Encodes the data into a datamatrix and returns it as the bytes of a PNG image."""
+    datamatrix_stream = BytesIO()
+    encode_to_datamatrix(data_to_encode).save(datamatrix_stream, "PNG")
+    return datamatrix_stream.getvalue()
+
+
 def encode_medication_to_xml(med_to_encode: Medication, label_note: str):
     encoded_medication: str = ""
     medication_xml = '<dd d="{0}" do="{1} {2}" c="{3}" q="{4}" dm="{5}" sq="{6}" u="{7}"/>'.format(
@@ -0,0 +1,86 @@
+import datetime
+import os
+import tempfile
+import threading
+import unittest
+from functools import reduce
+
+from DataStructures import Models, Repositories
+from Functions.BatchDocumentGeneration import (generate_documents, plan_documents, select_patients,
+                                               KARDEX_DOCUMENT, DISPENSATION_LIST_DOCUMENT)
+from Functions.ConfigSingleton import consts as app_consts
+from Functions.ModelBuilder import create_patient_object_from_pillpack_data
+from Functions.XML import sanitise_and_encode_text_from_file, parse_xml_ppc
+from TestConsts import populate_test_settings, load_test_settings, consts
+
+
+class BatchDocumentGenerationTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        populate_test_settings()
+        config = load_test_settings()
+        list_of_orders: list = reduce(list.__add__, parse_xml_ppc(
+            sanitise_and_encode_text_from_file(consts.MOCK_PATIENT_XML_2,
+                                               consts.PPC_SEPARATING_TAG, config)
+        ))
+        cls.mock_patient = create_patient_object_from_pillpack_data(list_of_orders[0])
+        cls.mock_patient2 = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        medication = Models.Medication("It's a medication!", 28, datetime.date.today())
+        cls.mock_patient2.add_medication_to_production_dict(medication)
+        cls.mock_patient2.add_medication_to_missing_dict(medication)
+
+    def test_select_and_plan_documents(self):
+        mock_collected_patients = Repositories.CollectedPatients()
+        mock_collected_patients.add_pillpack_patient(self.mock_patient)
+        mock_collected_patients.add_pillpack_patient(self.mock_patient2)
+        self.assertEqual(2, len(select_patients(mock_collected_patients)))
+        self.assertEqual([self.mock_patient2],
+                         select_patients(mock_collected_patients, app_consts.MISSING_MEDICATIONS_CODE))
+        planned_documents: list = plan_documents([self.mock_patient2, self.mock_patient2], "Test/Production",
+                                                 "output", (KARDEX_DOCUMENT, DISPENSATION_LIST_DOCUMENT))
+        file_names: list = [os.path.basename(file_path) for patient, document_type, file_path in planned_documents]
+        self.assertEqual(4, len(set(file_names)))
+        self.assertTrue(file_names[2].endswith("generated kardex (2).docx"))
+        self.assertTrue(all("/" not in file_name for file_name in file_names))
+
+    def test_generate_documents(self):
+        for number_of_processes in (1, 2):
+            with tempfile.TemporaryDirectory() as output_directory:
+                progress: list = []
+                document_report: dict = generate_documents(
+                    [self.mock_patient, self.mock_patient2], "Test Production", output_directory,
+                    (KARDEX_DOCUMENT,), number_of_processes,
+                    lambda finished, total: progress.append((finished, total)))
+                self.assertEqual(2, len(document_report["Generated"]))
+                self.assertFalse(document_report["Cancelled"])
+                self.assertEqual([(1, 2), (2, 2)], progress)
+                for file_path in document_report["Generated"]:
+                    self.assertTrue(os.path.isfile(file_path))
+
+    def test_document_which_cannot_be_rendered_fails(self):
+        broken_patient = Models.PillpackPatient("Broken", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        broken_medication = Models.Medication("Broken medication", 28, datetime.date.today())
+        broken_patient.add_medication_to_production_dict(broken_medication)
+        broken_medication.medication_name = None
+        with tempfile.TemporaryDirectory() as output_directory:
+            document_report: dict = generate_documents([broken_patient, self.mock_patient2], "Test Production",
+                                                       output_directory, number_of_processes=1)
+            self.assertEqual(1, len(document_report["Generated"]))
+            self.assertEqual(1, len(document_report["Failed"]))
+            failed_file_path, error = document_report["Failed"][0]
+            self.assertFalse(os.path.exists(failed_file_path))
+
+    def test_cancelled_documents_are_not_generated(self):
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with tempfile.TemporaryDirectory() as output_directory:
+            document_report: dict = generate_documents([self.mock_patient, self.mock_patient2], "Test Production",
+                                                       output_directory, number_of_processes=1,
+                                                       cancel_event=cancel_event)
+            self.assertTrue(document_report["Cancelled"])
+            self.assertEqual([], document_report["Generated"])
+            self.assertEqual([], os.listdir(output_directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
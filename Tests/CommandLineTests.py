@@ -0,0 +1,75 @@
+import contextlib
+import datetime
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from DataStructures import Models, Repositories
+from Functions.CommandLine import main, get_report_rows, write_report
+from Functions.ConfigSingleton import consts as app_consts, set_objects_path
+from Functions.DAOFunctions import save_collected_patients
+from TestConsts import consts, populate_test_settings
+
+
+class CommandLineTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        populate_test_settings()
+
+    def setUp(self):
+        self.mock_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        self.mock_patient2 = Models.PillpackPatient("Totally", "Real", datetime.date.fromisoformat("1980-01-01"))
+        medication = Models.Medication("It's a medication!", 28, datetime.date.today())
+        self.mock_patient2.add_medication_to_production_dict(medication)
+        self.mock_patient2.add_medication_to_missing_dict(medication)
+        self.mock_collected_patients = Repositories.CollectedPatients()
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient)
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient2)
+
+    def test_report_rows(self):
+        report_rows: list = get_report_rows(self.mock_collected_patients)
+        self.assertEqual(["Patient", "Real"], [row["Last Name"] for row in report_rows])
+        missing_rows: list = get_report_rows(self.mock_collected_patients, "missing MEDICATIONS")
+        self.assertEqual(1, len(missing_rows))
+        self.assertEqual("Totally", missing_rows[0]["First Name"])
+        output = io.StringIO()
+        write_report(report_rows, "csv", output)
+        self.assertEqual(3, len(output.getvalue().splitlines()))
+        output = io.StringIO()
+        write_report(report_rows, "text", output)
+        self.assertIn("2 patient(s)", output.getvalue())
+        self.assertIn("Missing medications: 1", output.getvalue())
+
+    def test_report_command_reads_saved_production(self):
+        original_objects_path = app_consts.OBJECTS_PATH
+        with tempfile.TemporaryDirectory() as objects_path:
+            try:
+                set_objects_path(objects_path)
+                save_collected_patients(self.mock_collected_patients)
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    main(["--settings", consts.TEST_SETTINGS, "--objects-path", objects_path,
+                          "report", "--format", "json"])
+                report_rows: list = json.loads(output.getvalue())
+                self.assertEqual(["Real", "Totally"], [row["First Name"] for row in report_rows])
+            finally:
+                set_objects_path(original_objects_path)
+
+    def test_command_line_does_not_import_tkinter(self):
+        package_path = os.path.dirname(consts.SCRIPT_DIR)
+        import_check = ("import sys; import Functions.CommandLine, Functions.DAOFunctions, Functions.ModelFactory, "
+                        "Functions.BatchScriptImport, DataStructures.PatientRowModel; "
+                        "print('tkinter' in sys.modules or any(module.startswith('Application') "
+                        "for module in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", import_check], cwd=package_path,
+                                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+                                capture_output=True, text=True)
+        self.assertEqual("False", result.stdout.strip(), result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
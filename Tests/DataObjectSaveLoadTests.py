@@ -1,9 +1,35 @@
+import copyreg
+import datetime
+import gc
+import logging
+import os
+import pickle
+import tempfile
+import tracemalloc
+import types
 import unittest
 
+from DataStructures.MedicationStatusTable import MedicationStatus
+from DataStructures.Models import PillpackPatient, Medication
+from DataStructures.Repositories import CollectedPatients
+from Functions.ConfigSingleton import consts as app_consts
 from Functions.DAOFunctions import save_to_file, load_object
+from Functions.PatientJournal import (write_collected_patients_snapshot, append_collected_patients_changes,
+                                      load_collected_patients_with_journal, remove_collected_patients_files,
+                                      get_journal_file_name)
 from TestConsts import consts, populate_test_settings
 
 
+class LegacyPickledPatient:
+    """Pickles as a PillpackPatient whose state is its instance dictionary, as patients were pickled before
+    PillpackPatient was slotted."""
+    def __init__(self, legacy_state: dict):
+        self.legacy_state = legacy_state
+
+    def __reduce_ex__(self, protocol):
+        return copyreg._reconstructor, (PillpackPatient, object, None), self.legacy_state
+
+
 class DataObjectSaveLoadTests(unittest.TestCase):
 
     @classmethod
@@ -25,6 +51,119 @@ class DataObjectSaveLoadTests(unittest.TestCase):
         loaded_object: dict = load_object("Total rubbish.txt")
         self.assertEqual(loaded_object, None)
 
+    def test_journaled_collected_patients(self):
+        snapshot_file_name = consts.MOCK_DATA_DIRECTORY + "\\" + consts.MOCK_JOURNALED_OBJECT_FILE
+        first_patient = PillpackPatient("First", "Patient", datetime.date(1990, 1, 1))
+        second_patient = PillpackPatient("Second", "Person", datetime.date(1980, 1, 1))
+        collected_patients = CollectedPatients()
+        collected_patients.add_pillpack_patient(first_patient)
+        collected_patients.add_pillpack_patient(second_patient)
+        write_collected_patients_snapshot(collected_patients, snapshot_file_name)
+        first_patient.add_medication_to_matched_dict(Medication("First medication", 28, datetime.date.today()))
+        collected_patients.add_patient(first_patient, app_consts.PERFECT_MATCH)
+        collected_patients.add_matched_patient(first_patient)
+        append_collected_patients_changes(collected_patients, snapshot_file_name, [first_patient])
+        collected_patients.remove_pillpack_patient(second_patient)
+        append_collected_patients_changes(collected_patients, snapshot_file_name, [second_patient])
+        with open(get_journal_file_name(snapshot_file_name), 'ab') as journal:
+            journal.write(b"\x00\x00\x01\x00 torn record")
+
+        loaded_patients: CollectedPatients = load_collected_patients_with_journal(snapshot_file_name)
+        remove_collected_patients_files(snapshot_file_name)
+        self.assertIsNone(loaded_patients.pillpack_patient_dict.get("person"))
+        loaded_patient: PillpackPatient = loaded_patients.pillpack_patient_dict.get("patient")[0]
+        self.assertEqual(first_patient, loaded_patient)
+        self.assertEqual(1, len(loaded_patient.matched_medications_dict))
+        self.assertIs(loaded_patient, loaded_patients.matched_patients.get("patient")[0])
+        self.assertIs(loaded_patient, loaded_patients.all_patients.get("patient")[0]["PatientObject"])
+
+    def test_journal_of_collected_patients_garbage_collected_not_reused(self):
+        with tempfile.TemporaryDirectory() as snapshot_directory:
+            snapshot_file_name = os.path.join(snapshot_directory, "collected_patients.pk1")
+            collected_patients = CollectedPatients()
+            collected_patients.add_pillpack_patient(PillpackPatient("First", "Patient", datetime.date(1990, 1, 1)))
+            write_collected_patients_snapshot(collected_patients, snapshot_file_name)
+            del collected_patients
+            gc.collect()
+            new_patient = PillpackPatient("Second", "Person", datetime.date(1980, 1, 1))
+            new_collected_patients = CollectedPatients()
+            new_collected_patients.add_pillpack_patient(new_patient)
+            append_collected_patients_changes(new_collected_patients, snapshot_file_name, [new_patient])
+            loaded_patients: CollectedPatients = load_collected_patients_with_journal(snapshot_file_name)
+            remove_collected_patients_files(snapshot_file_name)
+        self.assertEqual(["person"], list(loaded_patients.pillpack_patient_dict.keys()))
+
+    @staticmethod
+    def get_legacy_patient_state(patient: PillpackPatient):
+        """Builds the instance dictionary a patient had before PillpackPatient was slotted, in which every status
+        container was allocated."""
+        legacy_state: dict = {field_name: getattr(patient, field_name) for field_name in PillpackPatient.PATIENT_FIELDS}
+        for container_name in PillpackPatient.STATUS_DICTS.keys():
+            legacy_state[container_name] = dict(getattr(patient, container_name))
+        legacy_state["prns_for_current_cycle"] = list(patient.prns_for_current_cycle)
+        return legacy_state
+
+    @staticmethod
+    def create_patient_with_medications(first_name: str, last_name: str):
+        patient = PillpackPatient(first_name, last_name, datetime.date(1970, 1, 1))
+        for i in range(6):
+            medication = Medication("Medication {0} 10mg tablets".format(i), 28, datetime.date.today())
+            patient.add_medication_to_production_dict(medication)
+            if i > 0:
+                patient.add_medication_to_matched_dict(medication)
+        patient.add_all_missing_medications()
+        return patient
+
+    def test_patients_pickled_before_slotting_are_migrated(self):
+        patient: PillpackPatient = self.create_patient_with_medications("Legacy", "Patient")
+        legacy_state: dict = self.get_legacy_patient_state(patient)
+        legacy_state["production_medications_index"] = None
+        loaded_patient: PillpackPatient = pickle.loads(pickle.dumps(LegacyPickledPatient(legacy_state),
+                                                                    pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(patient, loaded_patient)
+        self.assertEqual("000000", loaded_patient.doctor_id_no)
+        self.assertEqual(6, len(loaded_patient.production_medications_dict))
+        self.assertEqual(["Medication 0 10mg tablets"], list(loaded_patient.missing_medications_dict.keys()))
+        self.assertEqual(0, len(loaded_patient.unknown_medications_dict))
+        self.assertEqual(0, loaded_patient.get_medication_count(MedicationStatus.UNKNOWN))
+        self.assertEqual((), loaded_patient.prns_for_current_cycle)
+        self.assertIs(loaded_patient.production_medications_dict["Medication 1 10mg tablets"],
+                      loaded_patient.matched_medications_dict["Medication 1 10mg tablets"])
+        self.assertIs(loaded_patient.production_medications_dict["Medication 1 10mg tablets"].medication_name,
+                      patient.production_medications_dict["Medication 1 10mg tablets"].medication_name)
+        loaded_patient.add_medication_to_unknown_dict(Medication("Unknown medication", 14, datetime.date.today()))
+        self.assertEqual(1, len(loaded_patient.unknown_medications_dict))
+        self.assertEqual({"Medication 0 10mg tablets"},
+                         loaded_patient.get_production_medications_index().find_all("Medication 0 10mg tablets"))
+
+    def test_slotted_patient_footprint(self):
+        number_of_patients: int = 500
+        patients: list = [self.create_patient_with_medications("First", "Patient {0}".format(i))
+                          for i in range(number_of_patients)]
+        pickled_patients: bytes = pickle.dumps(patients, pickle.HIGHEST_PROTOCOL)
+
+        def measure_loaded_patients(load):
+            gc.collect()
+            tracemalloc.start()
+            loaded_patients = load()
+            gc.collect()
+            footprint: int = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del loaded_patients
+            return footprint / number_of_patients
+
+        def load_legacy_patients():
+            legacy_patients: list = [types.SimpleNamespace(**self.get_legacy_patient_state(patient))
+                                     for patient in pickle.loads(pickled_patients)]
+            gc.collect()
+            return legacy_patients
+
+        legacy_footprint: float = measure_loaded_patients(load_legacy_patients)
+        slotted_footprint: float = measure_loaded_patients(lambda: pickle.loads(pickled_patients))
+        logging.info("Loaded patient footprint: {0:.0f} bytes before slotting, {1:.0f} bytes after slotting."
+                     .format(legacy_footprint, slotted_footprint))
+        self.assertLess(slotted_footprint, legacy_footprint * 0.75)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+
+from Functions.ConfigSingleton import consts, set_objects_path
+from Functions.DatamatrixCache import DatamatrixCache, clear_datamatrix_cache
+
+
+class DatamatrixCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.encoded_payloads: list = []
+
+    def mock_encode(self, payload: str):
+        self.encoded_payloads.append(payload)
+        return b"\x89PNG\r\n\x1a\n" + payload.encode("utf8")
+
+    def test_payload_only_encoded_once(self):
+        datamatrix_cache = DatamatrixCache(encoding_function=self.mock_encode)
+        first_image: bytes = datamatrix_cache.get_png('<dd d="Paracetamol 500mg"/>')
+        second_image: bytes = datamatrix_cache.get_png('<dd d="Paracetamol 500mg"/>')
+        self.assertEqual(first_image, second_image)
+        self.assertEqual(['<dd d="Paracetamol 500mg"/>'], self.encoded_payloads)
+        self.assertEqual((1, 1), (datamatrix_cache.memory_hits, datamatrix_cache.misses))
+
+    def test_least_recently_used_image_evicted(self):
+        datamatrix_cache = DatamatrixCache(max_entries=2, encoding_function=self.mock_encode)
+        datamatrix_cache.get_png("first")
+        datamatrix_cache.get_png("second")
+        datamatrix_cache.get_png("first")
+        datamatrix_cache.get_png("third")
+        self.assertEqual(2, len(datamatrix_cache))
+        datamatrix_cache.get_png("first")
+        datamatrix_cache.get_png("second")
+        self.assertEqual(["first", "second", "third", "second"], self.encoded_payloads)
+
+    def test_images_reused_from_disk_after_restart(self):
+        with tempfile.TemporaryDirectory() as cache_directory:
+            DatamatrixCache(cache_directory=cache_directory, encoding_function=self.mock_encode).get_png("payload")
+            restarted_cache = DatamatrixCache(cache_directory=cache_directory, encoding_function=self.mock_encode)
+            self.assertEqual(self.mock_encode("payload"), restarted_cache.get_png("payload"))
+            self.assertEqual(1, restarted_cache.disk_hits)
+            self.assertEqual(["payload", "payload"], self.encoded_payloads)
+
+    def test_corrupt_image_on_disk_encoded_again(self):
+        with tempfile.TemporaryDirectory() as cache_directory:
+            datamatrix_cache = DatamatrixCache(cache_directory=cache_directory, encoding_function=self.mock_encode)
+            key: str = datamatrix_cache.get_key("payload")
+            os.makedirs(os.path.join(cache_directory, key[:2]))
+            with open(os.path.join(cache_directory, key[:2], key + ".png"), 'wb') as image_file:
+                image_file.write(b"not a png")
+            self.assertEqual(self.mock_encode("payload"), datamatrix_cache.get_png("payload"))
+            self.assertEqual(1, datamatrix_cache.misses)
+            self.assertEqual(DatamatrixCache(cache_directory=cache_directory).get_png("payload"),
+                             self.mock_encode("payload"))
+
+    def test_least_recently_used_images_removed_from_disk(self):
+        with tempfile.TemporaryDirectory() as cache_directory:
+            datamatrix_cache = DatamatrixCache(cache_directory=cache_directory, encoding_function=self.mock_encode,
+                                               max_disk_entries=10)
+            for payload_number in range(11):
+                datamatrix_cache.get_png("payload {0}".format(payload_number))
+                key: str = datamatrix_cache.get_key("payload {0}".format(payload_number))
+                image_file_name: str = os.path.join(cache_directory, key[:2], key + ".png")
+                if os.path.exists(image_file_name):
+                    os.utime(image_file_name, (payload_number, payload_number))
+            images_on_disk: list = [file_name for directory_path, directory_names, file_names
+                                    in os.walk(cache_directory) for file_name in file_names]
+            self.assertEqual(9, len(images_on_disk))
+            self.assertNotIn(datamatrix_cache.get_key("payload 0") + ".png", images_on_disk)
+            self.assertIn(datamatrix_cache.get_key("payload 10") + ".png", images_on_disk)
+
+    def test_images_read_from_disk_kept_when_pruned(self):
+        with tempfile.TemporaryDirectory() as cache_directory:
+            datamatrix_cache = DatamatrixCache(cache_directory=cache_directory, encoding_function=self.mock_encode,
+                                               max_disk_entries=10)
+            for payload_number in range(10):
+                datamatrix_cache.get_png("payload {0}".format(payload_number))
+                key: str = datamatrix_cache.get_key("payload {0}".format(payload_number))
+                os.utime(os.path.join(cache_directory, key[:2], key + ".png"), (payload_number, payload_number))
+            restarted_cache = DatamatrixCache(cache_directory=cache_directory, encoding_function=self.mock_encode,
+                                              max_disk_entries=10)
+            restarted_cache.get_png("payload 0")
+            restarted_cache.get_png("payload 10")
+            images_on_disk: list = [file_name for directory_path, directory_names, file_names
+                                    in os.walk(cache_directory) for file_name in file_names]
+            self.assertEqual(9, len(images_on_disk))
+            self.assertIn(datamatrix_cache.get_key("payload 0") + ".png", images_on_disk)
+            self.assertNotIn(datamatrix_cache.get_key("payload 1") + ".png", images_on_disk)
+
+    def test_disk_cleared_when_production_archived(self):
+        objects_path: str = consts.OBJECTS_PATH
+        with tempfile.TemporaryDirectory() as objects_directory:
+            set_objects_path(objects_directory)
+            try:
+                DatamatrixCache(cache_directory=consts.DATAMATRIX_CACHE_DIRECTORY,
+                                encoding_function=self.mock_encode).get_png("payload")
+                self.assertTrue(os.path.isdir(consts.DATAMATRIX_CACHE_DIRECTORY))
+                clear_datamatrix_cache()
+                self.assertFalse(os.path.exists(consts.DATAMATRIX_CACHE_DIRECTORY))
+            finally:
+                set_objects_path(objects_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
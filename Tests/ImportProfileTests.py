@@ -0,0 +1,29 @@
+import unittest
+
+from Functions.ImportProfile import (parse_import_times, profile_imports, find_deferred_imports,
+                                     get_total_import_time)
+
+
+class ImportProfileTests(unittest.TestCase):
+    def test_parse_import_times(self):
+        import_time_output = ("import time: self [us] | cumulative | imported package\n"
+                              "import time:       120 |        120 |     yaml.error\n"
+                              "import time:      1500 |       1620 |   yaml\n"
+                              "import time:       300 |       1920 | Functions.ConfigSingleton\n")
+        import_times: list = parse_import_times(import_time_output)
+        self.assertEqual(["yaml.error", "yaml", "Functions.ConfigSingleton"],
+                         [import_time["Module"] for import_time in import_times])
+        self.assertEqual([2, 1, 0], [import_time["Depth"] for import_time in import_times])
+        self.assertEqual(1.92, get_total_import_time(import_times, "Functions.ConfigSingleton"))
+        self.assertEqual(["yaml.error"], find_deferred_imports(import_times, ("yaml.error", "ya")))
+
+    def test_document_generation_modules_are_deferred(self):
+        for module_name in ("Functions.Mutations", "Functions.ModelFactory", "Functions.KardexAndPRNGeneration",
+                            "Functions.CommandLine"):
+            import_times: list = profile_imports(module_name)
+            self.assertGreater(get_total_import_time(import_times, module_name), 0)
+            self.assertEqual([], find_deferred_imports(import_times), module_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import queue
+import threading
+import unittest
+
+from watchdog.events import FileCreatedEvent, FileMovedEvent
+
+from Application.IngestionWorker import IngestionWorker
+from DataStructures.Models import PillpackPatient
+
+
+class MockApplication:
+    """Holds the queues and events used by the ingestion worker, and records the virtual events it generates, in place
+    of the tkinter App."""
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue()
+        self.patient_changes: queue.Queue = queue.Queue()
+        self.production_loaded = threading.Event()
+        self.generated_events: list = []
+        self.event_generated = threading.Condition()
+
+    def event_generate(self, sequence: str, when: str = None):
+        with self.event_generated:
+            self.generated_events.append(sequence)
+            self.event_generated.notify_all()
+
+    def wait_for_events(self, number_of_events: int, timeout: float = 5.0):
+        with self.event_generated:
+            return self.event_generated.wait_for(lambda: len(self.generated_events) >= number_of_events, timeout)
+
+
+class MockEventHandler:
+    """Returns a patient for every readable file, in place of the WatchdogEventHandler, and records the files read."""
+    def __init__(self):
+        self.files_read: list = []
+
+    def read_patient_data_from_ppc_xml(self, file_name: str):
+        self.files_read.append(file_name)
+        if file_name.startswith("unreadable"):
+            raise ValueError("Could not parse {0}".format(file_name))
+        return [PillpackPatient("John", "Smith", "1970-01-01")]
+
+    def read_patient_data_from_fd_file(self, full_path: str):
+        self.files_read.append(full_path)
+        return []
+
+
+class IngestionWorkerTests(unittest.TestCase):
+    def setUp(self):
+        self.mock_application = MockApplication()
+        self.ingestion_worker = IngestionWorker(self.mock_application)
+        self.mock_handler = MockEventHandler()
+        self.ingestion_worker.handler = self.mock_handler
+        self.ingestion_worker.start()
+
+    def tearDown(self):
+        self.mock_application.production_loaded.set()
+        self.ingestion_worker.stop()
+        self.ingestion_worker.join(5.0)
+
+    def test_events_wait_for_production_to_load(self):
+        self.mock_application.queue.put(FileCreatedEvent("order.ppc_processed"))
+        self.assertFalse(self.mock_application.wait_for_events(1, 0.2))
+        self.assertEqual([], self.mock_handler.files_read)
+        self.assertEqual([], IngestionWorker.take_patient_changes(self.mock_application.patient_changes))
+        self.mock_application.production_loaded.set()
+        self.assertTrue(self.mock_application.wait_for_events(1))
+        self.assertEqual(["order.ppc_processed"], self.mock_handler.files_read)
+
+    def test_patient_changes_handed_to_main_thread(self):
+        self.mock_application.production_loaded.set()
+        self.mock_application.queue.put(FileCreatedEvent("first order.ppc_processed"))
+        self.mock_application.queue.put(FileMovedEvent("temp", "second order.ppc_processed"))
+        self.assertTrue(self.mock_application.wait_for_events(2))
+        self.assertEqual(["<<WatchdogEvent>>"] * 2, self.mock_application.generated_events)
+        patient_changes: list = IngestionWorker.take_patient_changes(self.mock_application.patient_changes)
+        self.assertEqual(["first order.ppc_processed", "second order.ppc_processed"],
+                         [patient_change["FileName"] for patient_change in patient_changes])
+        for patient_change in patient_changes:
+            self.assertEqual(1, len(patient_change["Patients"]))
+            self.assertIsInstance(patient_change["Patients"][0], PillpackPatient)
+
+    def test_files_without_patients_not_handed_over(self):
+        self.mock_application.production_loaded.set()
+        self.mock_application.queue.put(FileCreatedEvent("farmadosis.fd"))
+        self.mock_application.queue.put(FileCreatedEvent("notes.txt"))
+        self.mock_application.queue.put(FileCreatedEvent("order.ppc_processed"))
+        self.assertTrue(self.mock_application.wait_for_events(1))
+        self.assertEqual(["farmadosis.fd", "order.ppc_processed"], self.mock_handler.files_read)
+        patient_changes: list = IngestionWorker.take_patient_changes(self.mock_application.patient_changes)
+        self.assertEqual(["order.ppc_processed"], [patient_change["FileName"] for patient_change in patient_changes])
+
+    def test_worker_keeps_running_after_unreadable_file(self):
+        self.mock_application.production_loaded.set()
+        self.mock_application.queue.put(FileCreatedEvent("unreadable.ppc_processed"))
+        self.mock_application.queue.put(FileCreatedEvent("order.ppc_processed"))
+        self.assertTrue(self.mock_application.wait_for_events(1))
+        self.assertTrue(self.ingestion_worker.is_alive())
+        patient_changes: list = IngestionWorker.take_patient_changes(self.mock_application.patient_changes)
+        self.assertEqual(["order.ppc_processed"], [patient_change["FileName"] for patient_change in patient_changes])
+        self.assertEqual(["<<WatchdogEvent>>"], self.mock_application.generated_events)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+import zipfile
 from functools import reduce
-from Functions import DocxGeneration
+from io import BytesIO
+from Functions import DocxGeneration, DocxTemplates
 from TestConsts import populate_test_settings, load_test_settings, consts
 from Functions.XML import sanitise_and_encode_text_from_file, parse_xml_ppc
 from Functions.ModelBuilder import create_patient_object_from_pillpack_data
@@ -34,6 +36,47 @@ class KardexDocTests(unittest.TestCase):
         self.assertIsNotNone(prn_list)
         prn_list.close()
 
+    @staticmethod
+    def get_package_parts(package_bytes: bytes):
+        with zipfile.ZipFile(BytesIO(package_bytes)) as package:
+            return {part_name: package.read(part_name) for part_name in package.namelist()}
+
+    def test_kardex_template_matches_python_docx(self):
+        details: dict = DocxGeneration._get_kardex_details(self.mock_patient, "Test Production")
+        details["PatientName"] = " Name:\tJohn & <Jane>\nDoe "
+        medication_rows: list = DocxGeneration._get_kardex_medication_rows(self.mock_patient)
+        medication_rows.append(("Paracetamol 500mg (1)", None, "2", "", None))
+        kardex_doc = DocxGeneration.create_kardex_doc_file()
+        DocxGeneration._populate_kardex_doc(kardex_doc, details, medication_rows)
+        python_docx_kardex = BytesIO()
+        kardex_doc.save(python_docx_kardex)
+        template_kardex = BytesIO()
+        DocxTemplates.render_kardex_doc_file(template_kardex, details, medication_rows)
+        self.assertEqual(self.get_package_parts(python_docx_kardex.getvalue()),
+                         self.get_package_parts(template_kardex.getvalue()))
+
+    def test_dispensation_list_template_matches_python_docx(self):
+        details: dict = DocxGeneration._get_dispensation_list_details(self.mock_patient, "Test Production")
+        datamatrix_blocks: list = [
+            {"Heading": None, "Rows": [("Paracetamol 500mg", "2", "Take two\ttablets"), (None, "1", None)],
+             "Datamatrices": [("C:\\Users\\Farmadosis\\Test_(Pillpack)_datamatrix_0.png",
+                               DocxTemplates._get_placeholder_png(3))]},
+            {"Heading": "PRNs This Cycle(John Doe)", "Rows": [("Ibuprofen 200mg", "1", "When required")],
+             "Datamatrices": [("C:\\Users\\Farmadosis\\Test_(PRN)_datamatrix_0.png",
+                               DocxTemplates._get_placeholder_png(4)),
+                              ("C:\\Users\\Farmadosis\\Test_(PRN)_datamatrix_1.png",
+                               DocxTemplates._get_placeholder_png(3))]},
+            {"Heading": "Empty block", "Rows": [], "Datamatrices": []}
+        ]
+        prn_doc = DocxGeneration.create_prn_list_doc_file()
+        DocxGeneration._populate_dispensation_list_doc(prn_doc, details, datamatrix_blocks)
+        python_docx_list = BytesIO()
+        prn_doc.save(python_docx_list)
+        template_list = BytesIO()
+        DocxTemplates.render_dispensation_list_doc_file(template_list, details, datamatrix_blocks)
+        self.assertEqual(self.get_package_parts(python_docx_list.getvalue()),
+                         self.get_package_parts(template_list.getvalue()))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,8 @@ import unittest
 
 import Functions.ConfigSingleton
 from DataStructures import Models, Repositories
+from DataStructures.MedicationIndex import MedicationNameIndex
+from DataStructures.MedicationStatusTable import MedicationStatus
 from TestConsts import consts, load_test_settings, populate_test_settings
 
 
@@ -72,6 +74,59 @@ class ModelUnitTests(unittest.TestCase):
         self.mock_patient.remove_medication_from_incorrect_dosage_dict(self.mock_medicine1)
         self.assertEqual(0, len(self.mock_patient.incorrect_dosages_dict))
 
+    def test_production_medications_index(self):
+        index_patient = Models.PillpackPatient("Index", "Patient", datetime.date.today())
+        index_patient.add_medication_to_production_dict(self.mock_medicine1)
+        index_patient.add_medication_to_production_dict(self.mock_medicine2)
+        index = index_patient.get_production_medications_index()
+        self.assertEqual({"First medication"}, index.find_all("First medication 10mg tablets"))
+        self.assertEqual(None, index.first_contained_in("Third medication"))
+        index_patient.remove_medication_from_production_dict(self.mock_medicine1)
+        self.assertEqual(set(), index.find_all("First medication 10mg tablets"))
+        self.assertEqual("Second medication", index.first_contained_in("Second medication 5mg"))
+
+    def test_medication_name_index_matches_substring_search(self):
+        medication_names: list = ["Aspirin", "Aspirin 75mg", "75mg", "pirin", "Paracetamol 500mg", ""]
+        index = MedicationNameIndex(medication_names)
+        for text in ["Aspirin 75mg dispersible tablets", "Paracetamol 500mg caplets", "Ibuprofen", ""]:
+            expected_names: list = [name for name in medication_names if name in text]
+            self.assertEqual(set(expected_names), index.find_all(text))
+            self.assertEqual(expected_names[0], index.first_contained_in(text))
+
+    def test_medication_status_transitions(self):
+        status_patient = Models.PillpackPatient("Status", "Patient", datetime.date.today())
+        script_medicine = Models.Medication("First medication", 56, datetime.date.today())
+        missing_medications = status_patient.missing_medications_dict
+        status_patient.add_medication_to_production_dict(self.mock_medicine1)
+        status_patient.add_medication_to_production_dict(self.mock_medicine2)
+        status_patient.add_all_missing_medications()
+        status_patient.add_medication_to_incorrect_dosage_dict(script_medicine)
+        self.assertEqual(2, len(missing_medications))
+        self.assertIs(self.mock_medicine1, status_patient.missing_medications_dict["First medication"])
+        self.assertIs(script_medicine, status_patient.incorrect_dosages_dict["First medication"])
+        status_patient.determine_ready_to_produce_code()
+        self.assertEqual(Models.consts.DO_NOT_PRODUCE, status_patient.ready_to_produce_code)
+        status_patient.clear_medication_warnings(self.mock_medicine1)
+        self.assertEqual({"Second medication": self.mock_medicine2}, missing_medications)
+        self.assertEqual(0, status_patient.get_medication_count(MedicationStatus.INCORRECT_DOSAGE))
+        self.assertEqual(2, status_patient.get_medication_count(MedicationStatus.PRODUCTION))
+        status_patient.determine_ready_to_produce_code()
+        self.assertEqual(Models.consts.MISSING_MEDICATIONS, status_patient.ready_to_produce_code)
+        with self.assertRaises(TypeError):
+            status_patient.production_medications_dict["Third medication"] = self.mock_medicine3
+
+    def test_medication_status_order_matches_production_medications_index(self):
+        order_patient = Models.PillpackPatient("Order", "Patient", datetime.date.today())
+        order_patient.add_medication_to_production_dict(self.mock_medicine1)
+        order_patient.add_medication_to_production_dict(self.mock_medicine2)
+        order_patient.add_medication_to_missing_dict(self.mock_medicine1)
+        order_patient.remove_medication_from_production_dict(self.mock_medicine1)
+        order_patient.add_medication_to_production_dict(self.mock_medicine1)
+        self.assertEqual(["Second medication", "First medication"],
+                         list(order_patient.production_medications_dict))
+        self.assertEqual("Second medication", order_patient.get_production_medications_index().earliest_of(
+            {"First medication", "Second medication"}))
+
     def test_create_link(self):
         self.mock_patient.add_medication_to_production_dict(self.mock_medicine1)
         self.mock_patient.add_medication_to_missing_dict(self.mock_medicine2)
@@ -4,7 +4,10 @@ from TestConsts import consts, populate_test_settings, load_test_settings
 from Functions.XML import parse_xml_ppc, sanitise_and_encode_text_from_file
 from Functions.ModelBuilder import (create_patient_object_from_pillpack_data,
                                     get_medication_take_times,
-                                    get_specified_medication_take_times)
+                                    get_specified_medication_take_times,
+                                    generate_medication_from_order_medication,
+                                    generate_medications_from_order,
+                                    update_medication_dosage)
 from Functions.DAOFunctions import retrieve_prns_and_linked_medications
 from DataStructures import Models
 import datetime
@@ -107,6 +110,33 @@ class PatientAndMedicationTests(unittest.TestCase):
         self.assertEqual("1\n(18:00)", mock_medication.evening_dosage)
         self.assertEqual("1\n(21:00)", mock_medication.night_dosage)
 
+    def test_batched_medications_match_merged_medications(self):
+        order = Models.PillpackOrder("Hughes, Hogarth", "19851109")
+        order.medications = [
+            Models.PillpackOrderMedication("Aciclovir 400mg tablets", 14, "2024-07-16", "Morning:1;Evening:2;"),
+            Models.PillpackOrderMedication("Sertraline 50mg tablets", 28, "2024-07-18", "08H00:0.5;21H30:1;"),
+            Models.PillpackOrderMedication("Aciclovir 400mg tablets", 7, "2024-07-17", "Lunch:1;Bedtime:1.5;"),
+            Models.PillpackOrderMedication("Missing dose list", 7, "2024-07-17", None)
+        ]
+        merged_patient = Models.PillpackPatient("Hogarth", "Hughes", datetime.date.fromisoformat("1985-11-09"))
+        for order_medication in order.medications:
+            medication = generate_medication_from_order_medication(order_medication)
+            if isinstance(medication, Models.Medication):
+                update_medication_dosage(merged_patient, medication)
+                merged_patient.add_medication_to_production_dict(medication)
+        batched_medications, start_dates = generate_medications_from_order(order)
+        self.assertEqual(list(merged_patient.production_medications_dict.keys()), list(batched_medications.keys()))
+        self.assertEqual(3, len(start_dates))
+        for medication_name, merged_medication in merged_patient.production_medications_dict.items():
+            batched_medication: Models.Medication = batched_medications[medication_name]
+            for field_name in Models.Medication.__slots__:
+                self.assertEqual(getattr(merged_medication, field_name), getattr(batched_medication, field_name))
+        aciclovir: Models.Medication = batched_medications["Aciclovir 400mg tablets"]
+        self.assertEqual(14 * 3 + 7 * 2.5, aciclovir.dosage)
+        self.assertEqual((1, 1, 2, 1.5), (aciclovir.morning_dosage, aciclovir.afternoon_dosage,
+                                          aciclovir.evening_dosage, aciclovir.night_dosage))
+        self.assertEqual("0.5\n(8:00)", batched_medications["Sertraline 50mg tablets"].morning_dosage)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,115 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from DataStructures import Models, Repositories
+from Functions.ConfigSingleton import consts as app_consts, set_objects_path
+from Functions.ModelBuilder import generate_medication_from_order_medication
+from Functions.PatientHistory import (PatientHistoryStore, get_production_summaries, record_loaded_production,
+                                      record_archived_production, load_production_changes)
+from TestConsts import populate_test_settings
+
+
+class PatientHistoryTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        populate_test_settings()
+
+    def setUp(self):
+        self.mock_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        self.mock_patient2 = Models.PillpackPatient("Totally", "Real", datetime.date.fromisoformat("1980-01-01"))
+        self.mock_patient.add_medication_to_production_dict(Models.Medication("Paracetamol", 28,
+                                                                              datetime.date.today()))
+        self.mock_patient2.add_medication_to_production_dict(Models.Medication("Ibuprofen", 14, datetime.date.today()))
+        self.mock_collected_patients = Repositories.CollectedPatients()
+        self.mock_collected_patients.production_group_name = "First Production"
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient)
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient2)
+
+    def get_next_production(self):
+        next_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        redosed_medication = Models.Medication("Paracetamol", 56, datetime.date.today())
+        redosed_medication.morning_dosage = 1.0
+        next_patient.add_medication_to_production_dict(redosed_medication)
+        next_patient.add_medication_to_production_dict(Models.Medication("Aspirin", 28, datetime.date.today()))
+        new_patient = Models.PillpackPatient("Actually", "Real", datetime.date.fromisoformat("1990-01-01"))
+        next_collected_patients = Repositories.CollectedPatients()
+        next_collected_patients.production_group_name = "Second Production"
+        next_collected_patients.add_pillpack_patient(next_patient)
+        next_collected_patients.add_pillpack_patient(new_patient)
+        return next_collected_patients
+
+    def test_changes_since_last_archived_cycle(self):
+        with PatientHistoryStore() as patient_history_store:
+            patient_history_store.record_cycle("First Production",
+                                               get_production_summaries(self.mock_collected_patients), archived=True)
+            production_changes: dict = patient_history_store.get_production_changes(
+                get_production_summaries(self.get_next_production()))
+        self.assertEqual("First Production", production_changes["PreviousCycle"]["ProductionGroupName"])
+        patient_key: tuple = ("patient", "real", datetime.date.fromisoformat("1970-01-01"))
+        self.assertEqual([patient_key], list(production_changes["Changes"].keys()))
+        self.assertEqual(["Aspirin"], [name for name, dosages in production_changes["Changes"][patient_key]["Added"]])
+        self.assertEqual([("Paracetamol", (28, None, None, None, None), (56, 1.0, None, None, None))],
+                         production_changes["Changes"][patient_key]["Changed"])
+        self.assertEqual([("real", "actually", datetime.date.fromisoformat("1990-01-01"))],
+                         production_changes["NewPatients"])
+        self.assertEqual([("real", "totally", datetime.date.fromisoformat("1980-01-01"))],
+                         production_changes["RemovedPatients"])
+
+    @staticmethod
+    def get_production_with_supply(production_group_name: str, number_of_doses: int):
+        supplied_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        supplied_patient.add_medication_to_production_dict(generate_medication_from_order_medication(
+            Models.PillpackOrderMedication("Paracetamol", number_of_doses, "2024-08-22T08:00:00",
+                                           "Morning:1;Night:2")))
+        supplied_collected_patients = Repositories.CollectedPatients()
+        supplied_collected_patients.production_group_name = production_group_name
+        supplied_collected_patients.add_pillpack_patient(supplied_patient)
+        return supplied_collected_patients
+
+    def test_only_number_of_doses_changed(self):
+        with PatientHistoryStore() as patient_history_store:
+            patient_history_store.record_cycle("First Production", get_production_summaries(
+                self.get_production_with_supply("First Production", 28)), archived=True)
+            production_changes: dict = patient_history_store.get_production_changes(get_production_summaries(
+                self.get_production_with_supply("Second Production", 14)))
+        self.assertEqual("First Production", production_changes["PreviousCycle"]["ProductionGroupName"])
+        self.assertEqual({}, production_changes["Changes"])
+
+    def test_loading_again_replaces_open_cycle(self):
+        with PatientHistoryStore() as patient_history_store:
+            patient_history_store.record_cycle("First Production",
+                                               get_production_summaries(self.mock_collected_patients))
+            patient_history_store.record_cycle("First Production",
+                                               get_production_summaries(self.mock_collected_patients))
+            self.assertEqual(1, len(patient_history_store.get_cycles()))
+            self.assertEqual(None, patient_history_store.get_production_changes()["PreviousCycle"])
+            patient_history_store.record_cycle("First Production",
+                                               get_production_summaries(self.mock_collected_patients), archived=True)
+            patient_history_store.record_cycle("Second Production",
+                                               get_production_summaries(self.get_next_production()))
+            self.assertEqual([True, False], [cycle["Archived"] for cycle in patient_history_store.get_cycles()])
+            patient_history: list = patient_history_store.get_patient_history(" REAL ", "patient")
+            self.assertEqual(["First Production", "Second Production"],
+                             [patient_cycle["Cycle"]["ProductionGroupName"] for patient_cycle in patient_history])
+            self.assertEqual({"Paracetamol", "Aspirin"}, set(patient_history[1]["Summary"].keys()))
+            self.assertEqual(1, len(patient_history_store.get_production_changes()["Changes"]))
+
+    def test_history_recorded_as_productions_are_loaded_and_archived(self):
+        objects_path: str = app_consts.OBJECTS_PATH
+        with tempfile.TemporaryDirectory() as history_directory:
+            set_objects_path(history_directory)
+            try:
+                self.assertEqual(None, record_loaded_production(self.mock_collected_patients)["PreviousCycle"])
+                record_archived_production(self.mock_collected_patients)
+                production_changes: dict = record_loaded_production(self.get_next_production())
+                self.assertEqual(1, len(production_changes["Changes"]))
+                self.assertEqual(production_changes, load_production_changes())
+                self.assertTrue(os.path.exists(app_consts.PATIENT_HISTORY_DATABASE))
+            finally:
+                set_objects_path(objects_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import datetime
+import unittest
+
+from DataStructures import Models, Repositories
+from DataStructures.PatientRowModel import PatientRowModel, WARNING_IMAGE, READY_TO_PRODUCE_IMAGE
+from TestConsts import populate_test_settings
+
+
+class PatientRowModelTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        populate_test_settings()
+
+    def setUp(self):
+        self.mock_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        self.mock_patient2 = Models.PillpackPatient("Totally", "Real", datetime.date.fromisoformat("1980-01-01"))
+        self.mock_patient3 = Models.PillpackPatient("Actually", "Real", datetime.date.fromisoformat("1990-01-01"))
+        self.mock_collected_patients = Repositories.CollectedPatients()
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient)
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient2)
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient3)
+        self.mock_row_model = PatientRowModel()
+        self.mock_row_model.refresh(self.mock_collected_patients.pillpack_patient_dict, lambda patient: patient)
+
+    def test_rows_are_sorted_by_last_name(self):
+        self.assertEqual(["Real Patient", "Actually Real", "Totally Real"], self.mock_row_model.keys_in_order())
+        self.assertEqual(1, self.mock_row_model.index_of("Actually Real"))
+        self.assertEqual(READY_TO_PRODUCE_IMAGE, self.mock_row_model.rows["Real Patient"]["Image"])
+        self.assertEqual("1970-01-01", self.mock_row_model.rows["Real Patient"]["Values"][2])
+
+    def test_only_changed_rows_and_cells_are_returned(self):
+        self.assertEqual({"patient", "real"}, self.mock_collected_patients.take_changed_last_names())
+        medication = Models.Medication("It's a medication!", 28, datetime.date.today())
+        self.mock_patient2.add_medication_to_production_dict(medication)
+        self.mock_patient2.add_medication_to_missing_dict(medication)
+        self.mock_collected_patients.update_pillpack_patient_dict(self.mock_patient2)
+        new_patient = Models.PillpackPatient("New", "Guy", datetime.date.fromisoformat("1988-08-10"))
+        self.mock_collected_patients.add_pillpack_patient(new_patient)
+        self.mock_collected_patients.remove_pillpack_patient(self.mock_patient3)
+        changes: dict = self.mock_row_model.refresh(self.mock_collected_patients.pillpack_patient_dict,
+                                                    lambda patient: patient,
+                                                    self.mock_collected_patients.take_changed_last_names())
+        self.assertEqual(["New Guy"], changes["Inserted"])
+        self.assertEqual(["Actually Real"], changes["Deleted"])
+        self.assertEqual({"Totally Real": {"Cells": {"No. of Medications": 1, "Condition": "Missing medications"},
+                                           "Image": WARNING_IMAGE}}, changes["Updated"])
+        self.assertEqual(["New Guy", "Real Patient", "Totally Real"], self.mock_row_model.keys_in_order())
+        self.assertEqual(set(), self.mock_collected_patients.take_changed_last_names())
+
+    def test_filter_code_removes_rows(self):
+        changes: dict = self.mock_row_model.refresh(self.mock_collected_patients.pillpack_patient_dict,
+                                                    lambda patient: patient, None, Models.consts.READY_TO_PRODUCE_CODE)
+        self.assertEqual([], changes["Inserted"])
+        self.assertEqual(3, len(changes["Deleted"]))
+        self.assertEqual(0, len(self.mock_row_model))
+
+    def test_search_index_narrows_previous_results(self):
+        self.assertEqual({"Real Patient", "Actually Real", "Totally Real"},
+                         self.mock_row_model.search_index.search("REAL"))
+        self.assertEqual({"Totally Real"}, self.mock_row_model.search_index.search("totally"))
+        self.assertEqual(set(), self.mock_row_model.search_index.search("totally r"))
+        self.assertEqual({"Real Patient"}, self.mock_row_model.search_index.search("1970"))
+        self.assertEqual(set(), self.mock_row_model.search_index.search("real\npatient"))
+        self.mock_row_model.search_index.search("gu")
+        new_patient = Models.PillpackPatient("New", "Guy", datetime.date.fromisoformat("1988-08-10"))
+        self.mock_collected_patients.add_pillpack_patient(new_patient)
+        self.mock_row_model.refresh(self.mock_collected_patients.pillpack_patient_dict, lambda patient: patient,
+                                    self.mock_collected_patients.take_changed_last_names())
+        self.assertEqual({"New Guy"}, self.mock_row_model.search_index.search("guy"))
+        self.assertTrue(self.mock_row_model.search_index.matches("New Guy", "1988-08"))
+
+
+if __name__ == '__main__':
+    unittest.main()
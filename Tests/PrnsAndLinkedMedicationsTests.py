@@ -0,0 +1,81 @@
+import datetime
+import os
+import pickle
+import tempfile
+import unittest
+
+from DataStructures import Models, Repositories
+from DataStructures.PrnsAndLinkedMedications import SQLitePrnsAndLinkedMedications
+from Functions.ConfigSingleton import consts as app_consts, set_objects_path
+from Functions.DAOFunctions import (update_current_prns_and_linked_medications, retrieve_prns_and_linked_medications,
+                                    load_prns_and_linked_medications_from_object,
+                                    record_prns_and_linked_medications_cycle)
+from TestConsts import consts, populate_test_settings
+
+
+class PrnsAndLinkedMedicationsTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        populate_test_settings()
+
+    def setUp(self):
+        self.mock_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        self.mock_patient2 = Models.PillpackPatient("Totally", "Real", datetime.date.fromisoformat("1980-01-01"))
+        self.mock_prn = Models.Medication("Not real", 28, datetime.date.fromisoformat("2024-08-22"))
+        self.mock_collected_patients = Repositories.CollectedPatients()
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient)
+        self.mock_collected_patients.add_pillpack_patient(self.mock_patient2)
+        self.mock_store = SQLitePrnsAndLinkedMedications()
+
+    def tearDown(self):
+        self.mock_store.close()
+
+    def test_update_and_retrieve_single_patient(self):
+        self.mock_patient.add_medication_to_prn_dict(self.mock_prn)
+        update_current_prns_and_linked_medications(self.mock_patient, self.mock_collected_patients, self.mock_store)
+        self.assertEqual(["real patient 1970-01-01"], list(self.mock_store.keys()))
+        built_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        retrieve_prns_and_linked_medications(built_patient, self.mock_store)
+        self.assertEqual(["Not real"], list(built_patient.prn_medications_dict.keys()))
+        self.assertEqual(28, built_patient.prn_medications_dict["Not real"].dosage)
+        unknown_patient = Models.PillpackPatient("New", "Guy", datetime.date.fromisoformat("1988-08-10"))
+        self.assertEqual({}, retrieve_prns_and_linked_medications(unknown_patient, self.mock_store).prn_medications_dict)
+
+    def test_patients_not_seen_are_pruned(self):
+        for patient in (self.mock_patient, self.mock_patient2):
+            patient.add_medication_to_prn_dict(self.mock_prn)
+            update_current_prns_and_linked_medications(patient, self.mock_collected_patients, self.mock_store)
+        self.mock_collected_patients.remove_pillpack_patient(self.mock_patient2)
+        config: dict = {app_consts.PRN_RETENTION_CYCLES_KEY: 2}
+        self.assertEqual(0, record_prns_and_linked_medications_cycle(self.mock_store, self.mock_collected_patients,
+                                                                     config))
+        self.assertEqual(2, len(self.mock_store))
+        self.assertEqual(1, record_prns_and_linked_medications_cycle(self.mock_store, self.mock_collected_patients,
+                                                                     config))
+        self.assertEqual(["real patient 1970-01-01"], list(self.mock_store.keys()))
+        self.assertEqual(0, record_prns_and_linked_medications_cycle(self.mock_store, self.mock_collected_patients,
+                                                                     config))
+        self.assertEqual(3, self.mock_store.current_cycle)
+
+    def test_pickle_file_imported_once(self):
+        objects_path: str = app_consts.OBJECTS_PATH
+        with tempfile.TemporaryDirectory() as objects_directory:
+            set_objects_path(objects_directory)
+            try:
+                with open(app_consts.PRNS_AND_LINKED_MEDICATIONS_FILE, 'wb') as pickle_file:
+                    pickle.dump({"real patient 1970-01-01": {consts.PRN_KEY: {"Not real": self.mock_prn},
+                                                             consts.LINKED_MEDS_KEY: {}}}, pickle_file)
+                prns_and_linked_medications = load_prns_and_linked_medications_from_object()
+                self.assertEqual(1, len(prns_and_linked_medications))
+                del prns_and_linked_medications["real patient 1970-01-01"]
+                prns_and_linked_medications.close()
+                prns_and_linked_medications = load_prns_and_linked_medications_from_object()
+                self.assertEqual(0, len(prns_and_linked_medications))
+                prns_and_linked_medications.close()
+                self.assertTrue(os.path.exists(app_consts.PRNS_AND_LINKED_MEDICATIONS_DATABASE))
+            finally:
+                set_objects_path(objects_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import datetime
+import os
+import pickle
+import tempfile
+import unittest
+from zipfile import ZipFile
+
+from DataStructures import Models, Repositories
+from Functions.ConfigSingleton import consts as app_consts, set_objects_path
+from Functions.DAOFunctions import load_collected_patients_from_zip_file, archive_pillpack_production
+from Functions.MedicationDiff import diff_patient_medications, format_medication_diff
+from Functions.ProductionArchive import (add_production_to_archive, open_production_archives,
+                                         find_patient_in_archives, diff_archived_patients)
+from TestConsts import consts, populate_test_settings
+
+
+class ProductionArchiveTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        populate_test_settings()
+
+    def setUp(self):
+        self.archive_directory = tempfile.TemporaryDirectory()
+        self.archive_file_name = os.path.join(self.archive_directory.name, "archive.zip")
+        self.mock_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        self.mock_patient2 = Models.PillpackPatient("Totally", "Real", datetime.date.fromisoformat("1980-01-01"))
+        self.mock_patient3 = Models.PillpackPatient("Actually", "Real", datetime.date.fromisoformat("1990-01-01"))
+        self.mock_patient2.add_medication_to_production_dict(Models.Medication("Paracetamol", 28,
+                                                                               datetime.date.today()))
+        self.mock_collected_patients = Repositories.CollectedPatients()
+        self.mock_collected_patients.production_group_name = "First Production"
+        for patient in (self.mock_patient, self.mock_patient2, self.mock_patient3):
+            self.mock_collected_patients.add_pillpack_patient(patient)
+        self.mock_collected_patients.add_patient(self.mock_patient2, consts.PERFECT_MATCH)
+        self.mock_collected_patients.add_matched_patient(self.mock_patient2)
+
+    def tearDown(self):
+        self.archive_directory.cleanup()
+
+    def test_archived_production_round_trip(self):
+        add_production_to_archive(self.archive_file_name, self.mock_collected_patients)
+        with ZipFile(self.archive_file_name, 'r') as archived_production:
+            loaded_collected_patients = load_collected_patients_from_zip_file(archived_production)
+        self.assertEqual("First Production", loaded_collected_patients.production_group_name)
+        self.assertEqual(["patient", "real"], sorted(loaded_collected_patients.pillpack_patient_dict.keys()))
+        self.assertEqual(2, len(loaded_collected_patients.pillpack_patient_dict["real"]))
+        matched_patient = loaded_collected_patients.matched_patients["real"][0]
+        self.assertIs(matched_patient, loaded_collected_patients.all_patients["real"][0]["PatientObject"])
+        self.assertIn(matched_patient, loaded_collected_patients.pillpack_patient_dict["real"])
+        self.assertEqual(["Paracetamol"], list(matched_patient.production_medications_dict.keys()))
+
+    def test_find_patient_only_reads_its_record(self):
+        add_production_to_archive(self.archive_file_name, self.mock_collected_patients)
+        production_archives: list = open_production_archives(self.archive_file_name)
+        self.assertEqual(1, len(production_archives))
+        with production_archives[0] as production_archive:
+            self.assertEqual(3, len(production_archive))
+            self.assertEqual([datetime.date.fromisoformat("1980-01-01")],
+                             list(production_archive.patients_index[("real", "totally")].keys()))
+            read_records: list = []
+            read_record = production_archive.read_record
+            production_archive.read_record = lambda record_number: (read_records.append(record_number),
+                                                                    read_record(record_number))[1]
+            found_patients: list = production_archive.find_patients(" totally ", "REAL")
+            self.assertEqual([self.mock_patient2], found_patients)
+            self.assertEqual(1, len(read_records))
+            self.assertEqual([], production_archive.find_patients("Totally", "Real",
+                                                                  datetime.date.fromisoformat("1981-01-01")))
+            self.assertEqual(1, len(production_archive.find_patients("Totally", "Real",
+                                                                     name_of_dict="matched_patients")))
+
+    def test_legacy_archived_production(self):
+        with ZipFile(self.archive_file_name, 'w') as archived_production:
+            archived_production.writestr("archived_production_2024-01-01.pk1",
+                                         pickle.dumps(self.mock_collected_patients))
+        self.assertEqual([self.mock_patient3],
+                         [archived_patient["Patient"] for archived_patient
+                          in find_patient_in_archives([self.archive_file_name], "Actually", "Real")])
+        with ZipFile(self.archive_file_name, 'r') as archived_production:
+            loaded_collected_patients = load_collected_patients_from_zip_file(archived_production)
+        self.assertEqual(2, len(loaded_collected_patients.pillpack_patient_dict["real"]))
+
+    def test_diff_patient_across_archives(self):
+        add_production_to_archive(self.archive_file_name, self.mock_collected_patients)
+        self.mock_patient2.production_medications_dict["Paracetamol"].morning_dosage = 2
+        self.mock_patient2.add_medication_to_production_dict(Models.Medication("Ibuprofen", 28, datetime.date.today()))
+        self.mock_collected_patients.production_group_name = "Second Production"
+        second_archive_file_name = os.path.join(self.archive_directory.name, "second_archive.zip")
+        add_production_to_archive(second_archive_file_name, self.mock_collected_patients)
+        archived_patients: list = diff_archived_patients(find_patient_in_archives(
+            [second_archive_file_name, self.archive_file_name], "Totally", "Real",
+            datetime.date.fromisoformat("1980-01-01")))
+        self.assertEqual(["First Production", "Second Production"],
+                         [archived_patient["ProductionGroupName"] for archived_patient in archived_patients])
+        self.assertEqual(None, archived_patients[0]["Diff"])
+        self.assertEqual(["Ibuprofen"], [name for name, dosages in archived_patients[1]["Diff"]["Added"]])
+        self.assertEqual([], archived_patients[1]["Diff"]["Removed"])
+        self.assertEqual("Paracetamol", archived_patients[1]["Diff"]["Changed"][0][0])
+        self.assertEqual("No changes to the production medications",
+                         format_medication_diff(diff_patient_medications(self.mock_patient2, self.mock_patient2)))
+
+    def test_nothing_removed_if_production_not_archived(self):
+        objects_path: str = app_consts.OBJECTS_PATH
+        set_objects_path(self.archive_directory.name)
+        try:
+            config: dict = {"pillpackDataLocation": self.archive_directory.name}
+            with open(os.path.join(self.archive_directory.name, "order.ppc_processed"), 'w') as ppc_processed_file:
+                ppc_processed_file.write("<OrderInfo/>")
+            with open(app_consts.COLLECTED_PATIENTS_FILE, 'wb') as collected_patients_file:
+                pickle.dump(self.mock_collected_patients, collected_patients_file)
+            self.assertFalse(archive_pillpack_production(self.archive_directory.name, config,
+                                                         self.mock_collected_patients))
+            self.assertTrue(os.path.exists(app_consts.COLLECTED_PATIENTS_FILE))
+            self.assertTrue(os.path.exists(os.path.join(self.archive_directory.name, "order.ppc_processed")))
+            self.assertFalse(os.path.exists(app_consts.PATIENT_HISTORY_DATABASE))
+            self.assertTrue(archive_pillpack_production(self.archive_file_name, config, self.mock_collected_patients))
+            self.assertFalse(os.path.exists(app_consts.COLLECTED_PATIENTS_FILE))
+            self.assertFalse(os.path.exists(os.path.join(self.archive_directory.name, "order.ppc_processed")))
+            self.assertTrue(os.path.exists(app_consts.PATIENT_HISTORY_DATABASE))
+        finally:
+            set_objects_path(objects_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
 import datetime
+import os
 from functools import reduce
 from xml.dom import minidom
-from Functions.XML import parse_xml_ppc, sanitise_and_encode_text_from_file
+from Functions.XML import parse_xml_ppc, sanitise_and_encode_text_from_file, stream_orders, stream_orders_from_file, \
+    stream_orders_from_file_range
+from Functions.ModelFactory import get_patient_medicine_data_ppc, get_patient_medicine_data_ppc_parallel
 from Functions.DAOFunctions import scan_pillpack_folder
 from Functions.ModelBuilder import create_patient_object_from_pillpack_data
 
@@ -94,6 +97,61 @@ class ProductionDataXMLTests(unittest.TestCase):
                                   "has been parsed from the XML")
             self.assertEqual(datetime.date.fromisoformat("2024-07-16"), patient_object.start_date)
 
+    def test_stream_orders(self):
+        list_of_orders: list = list(stream_orders_from_file(consts.BAD_XML_PPC, consts.PPC_SEPARATING_TAG, self.config))
+        self.assertEqual(3, len(list_of_orders))
+        for order in list_of_orders:
+            self.assertIsInstance(order, Models.PillpackOrder)
+            self.assertEqual(0, len(order.medications))
+
+    def test_streamed_orders_match_parsed_orders(self):
+        parsed_orders: list = reduce(list.__add__, parse_xml_ppc(
+            sanitise_and_encode_text_from_file(consts.MOCK_PATIENT_XML_2,
+                                               consts.PPC_SEPARATING_TAG, self.config)
+        ))
+        with open(consts.MOCK_DATA_DIRECTORY + "\\" + consts.MOCK_PATIENT_XML_2, "rb") as ppc_file:
+            streamed_orders: list = list(stream_orders(ppc_file, consts.PPC_SEPARATING_TAG, chunk_size=16))
+        self.assertEqual(len(parsed_orders), len(streamed_orders))
+        for parsed_order, streamed_order in zip(parsed_orders, streamed_orders):
+            parsed_patient = create_patient_object_from_pillpack_data(parsed_order)
+            streamed_patient = create_patient_object_from_pillpack_data(streamed_order)
+            self.assertEqual(parsed_patient, streamed_patient)
+            self.assertEqual(parsed_patient.start_date, streamed_patient.start_date)
+            self.assertEqual(list(parsed_patient.production_medications_dict.keys()),
+                             list(streamed_patient.production_medications_dict.keys()))
+            for medication_name, parsed_medication in parsed_patient.production_medications_dict.items():
+                streamed_medication = streamed_patient.production_medications_dict[medication_name]
+                self.assertEqual(parsed_medication.dosage, streamed_medication.dosage)
+                self.assertEqual(parsed_medication.start_date, streamed_medication.start_date)
+                self.assertEqual(parsed_medication.morning_dosage, streamed_medication.morning_dosage)
+                self.assertEqual(parsed_medication.afternoon_dosage, streamed_medication.afternoon_dosage)
+                self.assertEqual(parsed_medication.evening_dosage, streamed_medication.evening_dosage)
+                self.assertEqual(parsed_medication.night_dosage, streamed_medication.night_dosage)
+
+    def test_stream_orders_from_file_ranges(self):
+        streamed_orders: list = list(stream_orders_from_file(consts.BAD_XML_PPC, consts.PPC_SEPARATING_TAG,
+                                                             self.config))
+        ranged_orders: list = []
+        file_size: int = os.path.getsize(os.path.join(self.config["pillpackDataLocation"], consts.BAD_XML_PPC))
+        range_start = 0
+        while range_start <= file_size:
+            ranged_orders.extend(stream_orders_from_file_range(consts.BAD_XML_PPC, consts.PPC_SEPARATING_TAG,
+                                                               self.config, range_start, range_start + 20))
+            range_start += 20
+        self.assertEqual([order.patient_name for order in streamed_orders],
+                         [order.patient_name for order in ranged_orders])
+
+    def test_parallel_load_matches_sequential_load(self):
+        sequential_patients: dict = get_patient_medicine_data_ppc({}, consts.PPC_SEPARATING_TAG, self.config)
+        parallel_patients: dict = get_patient_medicine_data_ppc_parallel({}, consts.PPC_SEPARATING_TAG, self.config,
+                                                                         number_of_processes=2, split_size=1024)
+        self.assertEqual(list(sequential_patients.keys()), list(parallel_patients.keys()))
+        for last_name, list_of_patients in sequential_patients.items():
+            self.assertEqual(list_of_patients, parallel_patients[last_name])
+            for sequential_patient, parallel_patient in zip(list_of_patients, parallel_patients[last_name]):
+                self.assertEqual(list(sequential_patient.production_medications_dict.keys()),
+                                 list(parallel_patient.production_medications_dict.keys()))
+
 
 if __name__ == '__main__':
     unittest.main()
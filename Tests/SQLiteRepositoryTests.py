@@ -0,0 +1,86 @@
+import datetime
+import unittest
+
+from DataStructures import Models, Repositories
+from TestConsts import consts, populate_test_settings
+
+
+class SQLiteRepositoryTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        populate_test_settings()
+
+    def setUp(self):
+        self.mock_patient = Models.PillpackPatient("Real", "Patient", datetime.date.fromisoformat("1970-01-01"))
+        self.mock_patient2 = Models.PillpackPatient("Totally", "Real", datetime.date.fromisoformat("1980-01-01"))
+        self.mock_patient3 = Models.PillpackPatient("Actually", "Real", datetime.date.fromisoformat("1990-01-01"))
+        self.mock_repository = Repositories.SQLiteCollectedPatients()
+        self.mock_repository.add_pillpack_patient(self.mock_patient)
+        self.mock_repository.add_pillpack_patient(self.mock_patient2)
+        self.mock_repository.add_pillpack_patient(self.mock_patient3)
+
+    def tearDown(self):
+        self.mock_repository.close()
+
+    def test_set_production_patient_dict(self):
+        self.assertEqual(2, len(self.mock_repository.pillpack_patient_dict))
+        self.assertEqual(["patient", "real"], list(self.mock_repository.pillpack_patient_dict.keys()))
+        self.assertEqual(2, len(self.mock_repository.pillpack_patient_dict.get("Real".lower())))
+        self.assertEqual(None, self.mock_repository.pillpack_patient_dict.get("Guy".lower()))
+
+    def test_patients_are_shared_between_dicts(self):
+        self.mock_repository.add_patient(self.mock_patient2, consts.PERFECT_MATCH)
+        self.mock_repository.add_matched_patient(self.mock_patient2)
+        wrapper: dict = self.mock_repository.all_patients.get("Real".lower())[0]
+        self.assertEqual(consts.PERFECT_MATCH, wrapper["Status"])
+        self.assertIs(self.mock_patient2, wrapper["PatientObject"])
+        self.assertIs(self.mock_patient2, self.mock_repository.matched_patients.get("Real".lower())[0])
+        self.assertEqual([self.mock_patient2], self.mock_repository.get_patients_with_status(consts.PERFECT_MATCH))
+
+    def test_add_update_and_remove_pillpack_production_patient(self):
+        patient_to_add: Models.PillpackPatient = Models.PillpackPatient("New", "Guy",
+                                                                        datetime.date.fromisoformat("1988-08-10"))
+        self.mock_repository.add_pillpack_patient(patient_to_add)
+        patient_to_add.add_medication_to_production_dict(Models.Medication("It's a medication!", 28,
+                                                                           datetime.date.today()))
+        self.assertTrue(self.mock_repository.update_pillpack_patient_dict(patient_to_add))
+        self.assertEqual([patient_to_add], self.mock_repository.find_patients("New", "Guy",
+                                                                             datetime.date.fromisoformat("1988-08-10")))
+        self.mock_repository.remove_pillpack_patient(patient_to_add)
+        self.assertEqual(None, self.mock_repository.pillpack_patient_dict.get("Guy".lower()))
+        self.assertEqual([], self.mock_repository.find_patients("New", "Guy"))
+
+    def test_patient_identity_index(self):
+        for repository in [self.mock_repository, Repositories.CollectedPatients()]:
+            if isinstance(repository, Repositories.CollectedPatients):
+                for patient in [self.mock_patient, self.mock_patient2, self.mock_patient3]:
+                    repository.add_pillpack_patient(patient)
+            script_patient = Models.PillpackPatient(" totally ", "REAL", datetime.date.fromisoformat("1980-01-01"))
+            self.assertEqual([self.mock_patient2], repository.get_patient_identity_index().find(script_patient))
+            script_patient.date_of_birth = datetime.date.fromisoformat("1981-01-01")
+            self.assertEqual([], repository.get_patient_identity_index().find(script_patient))
+            self.assertEqual([self.mock_patient2], repository.get_patient_identity_index().find_by_name(script_patient))
+            """Names are never treated as patterns, so a name containing '.' only matches itself"""
+            patient_to_add = Models.PillpackPatient("J.", "Real", datetime.date.fromisoformat("1990-01-01"))
+            repository.add_pillpack_patient(patient_to_add)
+            self.assertEqual([patient_to_add], repository.get_patient_identity_index().find_by_name(patient_to_add))
+            self.assertEqual([], repository.get_patient_identity_index().find_by_name(
+                Models.PillpackPatient("Jo", "Real", datetime.date.fromisoformat("1990-01-01"))))
+            repository.remove_pillpack_patient(self.mock_patient2)
+            self.assertEqual([], repository.get_patient_identity_index().find_by_name(self.mock_patient2))
+            self.assertEqual([self.mock_patient3], repository.get_patient_identity_index().find(self.mock_patient3))
+
+    def test_import_and_copy_collected_patients(self):
+        collected_patients = Repositories.CollectedPatients()
+        collected_patients.production_group_name = "Mock production"
+        collected_patients.add_pillpack_patient(self.mock_patient)
+        collected_patients.add_patient(self.mock_patient, consts.NO_MATCH)
+        self.mock_repository.import_collected_patients(collected_patients)
+        copied_patients: Repositories.CollectedPatients = self.mock_repository.to_collected_patients()
+        self.assertEqual("Mock production", copied_patients.production_group_name)
+        self.assertEqual(["patient"], list(copied_patients.pillpack_patient_dict.keys()))
+        self.assertEqual(consts.NO_MATCH, copied_patients.all_patients.get("patient")[0]["Status"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import threading
+import unittest
+
+from Application.ScanQueueWorker import ScanQueueWorker
+from DataStructures.Models import PillpackPatient
+from TestConsts import consts
+
+
+class MockApplication:
+    """Records the virtual events generated by a worker thread, in place of the tkinter App."""
+    def __init__(self):
+        self.generated_events: list = []
+        self.event_generated = threading.Condition()
+
+    def event_generate(self, sequence: str, when: str = None):
+        with self.event_generated:
+            self.generated_events.append(sequence)
+            self.event_generated.notify_all()
+
+    def wait_for_events(self, number_of_events: int):
+        with self.event_generated:
+            return self.event_generated.wait_for(lambda: len(self.generated_events) >= number_of_events, 5.0)
+
+
+class ScanQueueWorkerTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(consts.MOCK_DATA_DIRECTORY + "\\" + consts.MOCK_SCRIPT_XML) as script_file:
+            cls.mock_script = script_file.read()
+
+    def setUp(self):
+        self.mock_application = MockApplication()
+        self.scan_worker = ScanQueueWorker(self.mock_application)
+        self.scan_worker.start()
+
+    def tearDown(self):
+        self.scan_worker.stop()
+        self.scan_worker.join(5.0)
+
+    def test_scan_results_in_scan_order(self):
+        scanned_inputs: list = [self.mock_script, "Not a script", 12345, self.mock_script]
+        for scanned_input in scanned_inputs:
+            self.scan_worker.enqueue(scanned_input)
+        self.assertEqual(4, self.scan_worker.pending_scans)
+        self.assertTrue(self.mock_application.wait_for_events(4))
+        self.assertEqual(["<<ScanResults>>"] * 4, self.mock_application.generated_events)
+        scan_results: list = self.scan_worker.take_scan_results()
+        self.assertEqual(scanned_inputs, [scan_result["ScannedInput"] for scan_result in scan_results])
+        self.assertIsInstance(scan_results[0]["Patient"], PillpackPatient)
+        self.assertIsNone(scan_results[1]["Patient"])
+        self.assertIsNone(scan_results[2]["Patient"])
+        self.assertIsInstance(scan_results[3]["Patient"], PillpackPatient)
+        self.assertEqual(0, self.scan_worker.pending_scans)
+        self.assertEqual([], self.scan_worker.take_scan_results())
+
+    def test_worker_keeps_running_after_bad_script(self):
+        self.scan_worker.enqueue(12345)
+        self.assertTrue(self.mock_application.wait_for_events(1))
+        self.assertTrue(self.scan_worker.is_alive())
+        self.scan_worker.enqueue(self.mock_script)
+        self.assertTrue(self.mock_application.wait_for_events(2))
+        self.assertEqual([False, True], [isinstance(scan_result["Patient"], PillpackPatient)
+                                         for scan_result in self.scan_worker.take_scan_results()])
+        self.assertEqual(0, self.scan_worker.pending_scans)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,11 @@ from xml.dom import minidom
 from PIL.Image import Image
 
 from DataStructures.Models import PillpackPatient, Medication
+from DataStructures.Repositories import SQLiteCollectedPatients
 from TestConsts import consts, load_test_settings, populate_test_settings
-from Functions.XML import scan_script, encode_to_datamatrix, encode_medications_to_xml
+from Functions.BatchScriptImport import import_scanned_scripts, read_scanned_inputs
+from Functions.ModelBuilder import create_patient_object_from_script, create_patient_object_from_decoded_script
+from Functions.XML import scan_script, decode_script, encode_to_datamatrix, encode_medications_to_xml
 
 
 class ScriptTests(unittest.TestCase):
@@ -200,6 +203,38 @@ class ScriptTests(unittest.TestCase):
             self.fail("Script type incorrect. Expected type: {0}, Actual type: {1}".format(minidom.Document,
                                                                                            type(script_as_xml)))
 
+    def test_decoded_script_matches_parsed_script(self):
+        """The second script has a comment, which the decoder leaves to the XML parser"""
+        for script in [self.mock_script, self.mock_script.replace("</xml>", "<!--@comment@--></xml>")]:
+            decoded_script: dict = decode_script(script)
+            script_as_xml = scan_script(script)
+            self.assertIsNotNone(decoded_script)
+            for tag in ["sc", "pa", "pb", "dd"]:
+                parsed_elements: list = script_as_xml.getElementsByTagName(tag)
+                self.assertEqual([dict(element.attributes.items()) for element in parsed_elements], decoded_script[tag])
+            decoded_patient: PillpackPatient = create_patient_object_from_decoded_script(decoded_script)
+            parsed_patient: PillpackPatient = create_patient_object_from_script(script_as_xml)
+            self.assertEqual(parsed_patient, decoded_patient)
+            self.assertEqual("Dr Derek Nippl-e", decoded_patient.doctor_name)
+            self.assertEqual(parsed_patient.production_medications_dict, decoded_patient.production_medications_dict)
+        self.assertIsNone(decode_script(self.mock_script.replace("/>", ">", 1)))
+
+    def test_batch_import_matches_scripts_in_order(self):
+        scanned_inputs: list = list(read_scanned_inputs([self.mock_script + "\n", "\n", "Not a script\r\n",
+                                                         self.mock_script]))
+        self.assertEqual(3, len(scanned_inputs))
+        for number_of_processes in [1, 2]:
+            collected_patients = SQLiteCollectedPatients()
+            import_report: dict = import_scanned_scripts(collected_patients, scanned_inputs, number_of_processes,
+                                                         chunk_size=1)
+            self.assertEqual(3, import_report["Scripts"])
+            self.assertEqual(2, import_report["Imported"])
+            self.assertEqual(1, import_report["Failed"])
+            self.assertEqual(2, len(collected_patients.severe_mismatch_patients.get("johnson")))
+            self.assertEqual(3, len(collected_patients.severe_mismatch_patients.get("johnson")[0]
+                                    .unknown_medications_dict))
+            collected_patients.close()
+
     def test_encode_prn_medications(self):
         self.mock_patient.add_medication_to_prns_for_current_cycle(self.mock_medication_1)
         self.mock_patient.add_medication_to_prns_for_current_cycle(self.mock_medication_2)
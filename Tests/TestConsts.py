@@ -15,6 +15,7 @@ consts.PPC_SEPARATING_TAG = "OrderInfo"
 consts.PRN_KEY = "prns_dict"
 consts.LINKED_MEDS_KEY = "linked_meds_dict"
 consts.MOCK_OBJECT_FILE = "mock_pickle_object.pk1"
+consts.MOCK_JOURNALED_OBJECT_FILE = "mock_journaled_patients.pk1"
 consts.PERFECT_MATCH = "PERFECT_MATCH"
 consts.IMPERFECT_MATCH = "IMPERFECT_MATCH"
 consts.NO_MATCH = "NO_MATCH"
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import time
+import unittest
+
+from watchdog.events import FileCreatedEvent
+
+from Application.WatchdogEventCoalescer import WatchdogEventCoalescer
+
+
+class WatchdogEventCoalescerTests(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.TemporaryDirectory()
+        self.forwarded_events: list = []
+        self.event_coalescer = WatchdogEventCoalescer(self.forwarded_events.append, debounce_seconds=0.05,
+                                                      max_processed_versions=2)
+        self.event_coalescer.start()
+
+    def tearDown(self):
+        self.event_coalescer.stop()
+        self.data_directory.cleanup()
+
+    def write_file(self, file_name: str, contents: str):
+        file_path: str = os.path.join(self.data_directory.name, file_name)
+        with open(file_path, 'w') as data_file:
+            data_file.write(contents)
+        return file_path
+
+    def wait_until_settled(self):
+        """Waits for every pending file to be forwarded or dropped, then for longer than a debounce window."""
+        deadline: float = time.monotonic() + 5.0
+        while self.event_coalescer.get_counters()["PendingFiles"] > 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+
+    def test_burst_of_writes_forwarded_once(self):
+        file_path: str = self.write_file("order.ppc_processed", "<OrderInfo>")
+        self.event_coalescer.submit(FileCreatedEvent(file_path))
+        self.write_file("order.ppc_processed", "<OrderInfo></OrderInfo>")
+        self.event_coalescer.submit(FileCreatedEvent(file_path))
+        self.event_coalescer.submit(FileCreatedEvent(file_path))
+        self.wait_until_settled()
+        self.assertEqual([file_path], [event.src_path for event in self.forwarded_events])
+        counters: dict = self.event_coalescer.get_counters()
+        self.assertEqual(3, counters["EventsReceived"])
+        self.assertEqual(1, counters["FilesProcessed"])
+
+    def test_same_version_skipped_and_changed_version_forwarded_again(self):
+        file_path: str = self.write_file("order.ppc_processed", "<OrderInfo></OrderInfo>")
+        self.event_coalescer.submit(FileCreatedEvent(file_path))
+        self.wait_until_settled()
+        self.event_coalescer.submit(FileCreatedEvent(file_path))
+        self.wait_until_settled()
+        self.assertEqual(1, len(self.forwarded_events))
+        self.assertEqual(1, self.event_coalescer.get_counters()["DuplicateVersionsSkipped"])
+        self.write_file("order.ppc_processed", "<OrderInfo><MedItem/></OrderInfo>")
+        self.event_coalescer.submit(FileCreatedEvent(file_path))
+        self.wait_until_settled()
+        self.assertEqual(2, len(self.forwarded_events))
+
+    def test_fd_file_forwarded_without_waiting(self):
+        self.event_coalescer.debounce_seconds = 60.0
+        file_path: str = self.write_file("farmadosis.fd", "zip")
+        self.event_coalescer.submit(FileCreatedEvent(file_path))
+        self.assertEqual([file_path], [event.src_path for event in self.forwarded_events])
+        self.assertEqual(0, self.event_coalescer.get_counters()["PendingFiles"])
+
+    def test_file_deleted_before_settling_not_forwarded(self):
+        file_path: str = self.write_file("order.ppc_processed", "<OrderInfo></OrderInfo>")
+        self.event_coalescer.submit(FileCreatedEvent(file_path))
+        os.remove(file_path)
+        self.wait_until_settled()
+        self.assertEqual([], self.forwarded_events)
+        self.assertEqual(1, self.event_coalescer.get_counters()["FilesDisappeared"])
+
+    def test_least_recently_forwarded_versions_forgotten(self):
+        file_paths: list = [self.write_file("farmadosis {0}.fd".format(file_number), "zip")
+                            for file_number in range(3)]
+        for file_path in file_paths:
+            self.event_coalescer.submit(FileCreatedEvent(file_path))
+        self.event_coalescer.submit(FileCreatedEvent(file_paths[2]))
+        self.assertEqual(3, len(self.forwarded_events))
+        self.event_coalescer.submit(FileCreatedEvent(file_paths[0]))
+        self.assertEqual(4, len(self.forwarded_events))
+        self.assertEqual(1, self.event_coalescer.get_counters()["DuplicateVersionsSkipped"])
+
+
+if __name__ == '__main__':
+    unittest.main()